@@ -0,0 +1,384 @@
+# PyAlgoTrade
+#
+# Copyright 2013 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Tibor Kiss <tibor.kiss@gmail.com>
+
+Runs the benchmarks and optionally compares the results against a baseline saved in a previous run.
+
+Usage:
+    python benchmarks/run.py [--filter NAME] [--scale N] [--save results.json] [--baseline results.json]
+
+Each benchmark runs in its own process so that peak memory usage can be measured in isolation.
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import argparse
+import resource
+import timeit
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from pyalgotrade import strategy
+from pyalgotrade import dataseries
+from pyalgotrade.barfeed import Frequency
+from pyalgotrade.barfeed import yahoofeed
+from pyalgotrade.barfeed import ninjatraderfeed
+from pyalgotrade.barfeed import sqlitefeed
+from pyalgotrade.broker import backtesting
+from pyalgotrade.broker import Order
+from pyalgotrade.optimizer import local
+from pyalgotrade.stratanalyzer import returns
+from pyalgotrade.stratanalyzer import sharpe
+from pyalgotrade.stratanalyzer import sortino
+from pyalgotrade.stratanalyzer import drawdown
+from pyalgotrade.stratanalyzer import trades
+from pyalgotrade.technical import ma
+from pyalgotrade.technical import rsi
+from pyalgotrade.technical import roc
+from pyalgotrade.technical import ratio
+from pyalgotrade.technical import stats
+from pyalgotrade.technical import stoch
+from pyalgotrade.technical import trend
+from pyalgotrade.technical import vwap
+from pyalgotrade.technical import cross
+from pyalgotrade.technical import bollinger
+from pyalgotrade.technical import linebreak
+import synthetic
+
+try:
+    from pyalgotrade.providers.interactivebrokers import ibconnection
+except ImportError:
+    ibconnection = None
+
+# Regressions larger than this (as a fraction of the baseline) are reported.
+DEFAULT_TOLERANCE = 0.1
+
+class Benchmark:
+    """Base class for benchmarks. setUp is not timed. run returns the number of items (usually bars) processed."""
+
+    def __init__(self, name):
+        self.__name = name
+
+    def getName(self):
+        return self.__name
+
+    def setUp(self, scale, tmpDir):
+        pass
+
+    def run(self):
+        raise NotImplementedError()
+
+class YahooLoadBenchmark(Benchmark):
+    def __init__(self):
+        Benchmark.__init__(self, "feed.yahoo_csv_load")
+
+    def setUp(self, scale, tmpDir):
+        self.__bars = 5000 * scale
+        self.__path = os.path.join(tmpDir, "bars-yahoofinance.csv")
+        synthetic.write_yahoo_csv(self.__path, synthetic.random_walk(self.__bars, Frequency.DAY))
+
+    def run(self):
+        feed = yahoofeed.Feed()
+        feed.addBarsFromCSV("orcl", self.__path)
+        return self.__bars
+
+class NinjaTraderLoadBenchmark(Benchmark):
+    def __init__(self):
+        Benchmark.__init__(self, "feed.ninjatrader_csv_load")
+
+    def setUp(self, scale, tmpDir):
+        self.__bars = 20000 * scale
+        self.__path = os.path.join(tmpDir, "bars-ninjatrader.csv")
+        synthetic.write_ninjatrader_csv(self.__path, synthetic.random_walk(self.__bars, Frequency.MINUTE))
+
+    def run(self):
+        feed = ninjatraderfeed.Feed(Frequency.MINUTE)
+        feed.addBarsFromCSV("spy", self.__path)
+        return self.__bars
+
+class SQLiteLoadBenchmark(Benchmark):
+    def __init__(self):
+        Benchmark.__init__(self, "feed.sqlite_load")
+
+    def setUp(self, scale, tmpDir):
+        self.__bars = 5000 * scale
+        self.__path = os.path.join(tmpDir, "bars.sqlite")
+        db = sqlitefeed.Database(self.__path)
+        for bar_ in synthetic.random_walk(self.__bars, Frequency.DAY):
+            db.addBar("orcl", bar_, Frequency.DAY)
+
+    def run(self):
+        feed = sqlitefeed.Feed(self.__path, Frequency.DAY)
+        feed.loadBars("orcl")
+        return self.__bars
+
+class DispatchBenchmark(Benchmark):
+    def __init__(self):
+        Benchmark.__init__(self, "feed.membf_dispatch")
+
+    def setUp(self, scale, tmpDir):
+        self.__feed = synthetic.build_feed(synthetic.instrument_names(5), 10000 * scale, Frequency.MINUTE)
+
+    def run(self):
+        ret = 0
+        self.__feed.start()
+        while not self.__feed.stopDispatching():
+            self.__feed.dispatch()
+            ret += 1
+        return ret
+
+class IndicatorBenchmark(Benchmark):
+    """Appends bars one at a time and reads the last indicator value after each one, like a strategy would."""
+
+    def __init__(self, name, builder):
+        Benchmark.__init__(self, "technical." + name)
+        self.__builder = builder
+
+    def setUp(self, scale, tmpDir):
+        self.__bars = synthetic.random_walk(20000 * scale, Frequency.DAY)
+
+    def run(self):
+        barDS = dataseries.BarDataSeries()
+        indicator = self.__builder(barDS)
+        for bar_ in self.__bars:
+            barDS.appendValue(bar_)
+            indicator[-1]
+        return len(self.__bars)
+
+def indicator_benchmarks():
+    return [
+        IndicatorBenchmark("sma", lambda barDS: ma.SMA(barDS.getCloseDataSeries(), 20)),
+        IndicatorBenchmark("ema", lambda barDS: ma.EMA(barDS.getCloseDataSeries(), 20)),
+        IndicatorBenchmark("wma", lambda barDS: ma.WMA(barDS.getCloseDataSeries(), range(1, 21))),
+        IndicatorBenchmark("rsi", lambda barDS: rsi.RSI(barDS.getCloseDataSeries(), 14)),
+        IndicatorBenchmark("roc", lambda barDS: roc.RateOfChange(barDS.getCloseDataSeries(), 10)),
+        IndicatorBenchmark("ratio", lambda barDS: ratio.Ratio(barDS.getCloseDataSeries())),
+        IndicatorBenchmark("stddev", lambda barDS: stats.StdDev(barDS.getCloseDataSeries(), 20)),
+        IndicatorBenchmark("stoch", lambda barDS: stoch.StochasticOscillator(barDS, 14)),
+        IndicatorBenchmark("slope", lambda barDS: trend.Slope(barDS.getCloseDataSeries(), 20)),
+        IndicatorBenchmark("vwap", lambda barDS: vwap.VWAP(barDS, 20)),
+        IndicatorBenchmark("bollinger", lambda barDS: bollinger.BollingerBands(barDS.getCloseDataSeries(), 20, 2).getUpperBand()),
+        IndicatorBenchmark("cross_above", lambda barDS: cross.CrossAbove(barDS.getCloseDataSeries(), ma.SMA(barDS.getCloseDataSeries(), 20))),
+        IndicatorBenchmark("linebreak", lambda barDS: linebreak.LineBreak(barDS, 3)),
+        ]
+
+class RestingOrdersBenchmark(Benchmark):
+    """Runs the backtesting broker with many limit orders that never get filled."""
+
+    def __init__(self):
+        Benchmark.__init__(self, "broker.resting_orders")
+
+    def setUp(self, scale, tmpDir):
+        instruments = synthetic.instrument_names(5)
+        self.__feed = synthetic.build_feed(instruments, 2000 * scale, Frequency.DAY)
+        self.__broker = backtesting.Broker(1000000, self.__feed)
+        for instrument in instruments:
+            for i in xrange(200):
+                order = self.__broker.createLimitOrder(Order.Action.BUY, instrument, 0.001, 1, True)
+                self.__broker.placeOrder(order)
+
+    def run(self):
+        ret = 0
+        self.__feed.start()
+        while not self.__feed.stopDispatching():
+            self.__feed.dispatch()
+            ret += 1
+        return ret
+
+class TradingStrategy(strategy.Strategy):
+    """Alternates between entering and exiting a long position on every instrument."""
+
+    def __init__(self, feed, period):
+        strategy.Strategy.__init__(self, feed, 1000000)
+        self.__period = period
+        self.__positions = {}
+        self.__bars = 0
+
+    def onBars(self, bars):
+        self.__bars += 1
+        if self.__bars % self.__period:
+            return
+        for instrument in bars.getInstruments():
+            position = self.__positions.get(instrument)
+            if position is None:
+                self.__positions[instrument] = self.enterLong(instrument, 10, True)
+            elif position.getExitOrder() is None and position.getEntryOrder().isFilled():
+                self.exitPosition(position)
+                del self.__positions[instrument]
+
+class AnalyzersBenchmark(Benchmark):
+    def __init__(self):
+        Benchmark.__init__(self, "stratanalyzer.all")
+
+    def setUp(self, scale, tmpDir):
+        self.__feed = synthetic.build_feed(synthetic.instrument_names(5), 5000 * scale, Frequency.DAY)
+        self.__strat = TradingStrategy(self.__feed, 5)
+        for analyzer in [returns.Returns(), sharpe.SharpeRatio(), sortino.SortinoRatio(), drawdown.DrawDown(), trades.Trades()]:
+            self.__strat.attachAnalyzer(analyzer)
+
+    def run(self):
+        self.__strat.run()
+        return len(self.__feed[self.__feed.getDefaultInstrument()])
+
+class OptimizerBenchmark(Benchmark):
+    """Runs strategies through the local optimizer. Items are strategy runs."""
+
+    def __init__(self):
+        Benchmark.__init__(self, "optimizer.local")
+
+    def setUp(self, scale, tmpDir):
+        self.__feed = synthetic.build_feed(synthetic.instrument_names(1), 1000, Frequency.DAY)
+        self.__parameters = [(period,) for period in xrange(1, 1 + 20 * scale)]
+
+    def run(self):
+        port = local.find_port()
+        workers = local.create_workers(TradingStrategy, port, 2)
+        local.run(workers, port, self.__feed, self.__parameters)
+        return len(self.__parameters)
+
+class NullEClientSocket:
+    """Stand-in for the TWS client socket that discards every request."""
+
+    def eConnect(self, host, port, clientId):
+        pass
+
+    def reqRealTimeBars(self, tickerId, contract, barSize, whatToShow, useRTH):
+        pass
+
+    def reqMktData(self, tickerId, contract, genericTickList, snapshot):
+        pass
+
+class IBRoutingBenchmark(Benchmark):
+    """Delivers realtime bars and ticks for 1000 subscribed instruments. Items are callbacks."""
+
+    def __init__(self):
+        Benchmark.__init__(self, "ib.callback_routing")
+
+    def setUp(self, scale, tmpDir):
+        self.__callbacks = 100000 * scale
+        self.__conn = ibconnection.Connection(eClientSocket=NullEClientSocket())
+        handler = lambda instrumentBar: None
+        for instrument in synthetic.instrument_names(1000):
+            self.__conn.subscribeRealtimeBars(instrument, handler)
+            self.__conn.subscribeMarketBars(instrument, handler)
+
+    def run(self):
+        # Realtime bars use even tickerIds and market data odd ones, since both subscriptions were interleaved.
+        for i in xrange(self.__callbacks / 2):
+            tickerId = (i % 1000) * 2
+            self.__conn.realtimeBar(tickerId, 1356998400 + i, 10.0, 10.5, 9.5, 10.2, 100, 10.1, 5)
+            self.__conn.tickPrice(tickerId + 1, 4, 10.2, 0)
+        return self.__callbacks
+
+def all_benchmarks():
+    ret = [
+        YahooLoadBenchmark(),
+        NinjaTraderLoadBenchmark(),
+        SQLiteLoadBenchmark(),
+        DispatchBenchmark(),
+        ]
+    ret.extend(indicator_benchmarks())
+    ret.extend([
+        RestingOrdersBenchmark(),
+        AnalyzersBenchmark(),
+        OptimizerBenchmark(),
+        ])
+    if ibconnection is not None:
+        ret.append(IBRoutingBenchmark())
+    return ret
+
+def get_peak_memory():
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def run_benchmark(benchmark, scale, queue):
+    tmpDir = tempfile.mkdtemp()
+    try:
+        benchmark.setUp(scale, tmpDir)
+        memBefore = get_peak_memory()
+        begin = timeit.default_timer()
+        items = benchmark.run()
+        elapsed = timeit.default_timer() - begin
+        queue.put({"items": items, "secs": elapsed, "items_per_sec": items / elapsed, "peak_mb": get_peak_memory() - memBefore})
+    finally:
+        shutil.rmtree(tmpDir)
+
+def run_isolated(benchmark, scale):
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=run_benchmark, args=(benchmark, scale, queue))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise Exception("Benchmark %s failed" % (benchmark.getName()))
+    return queue.get()
+
+def compare(results, baseline, tolerance):
+    """Returns a list of (name, baseline items/sec, current items/sec) for the benchmarks that got slower."""
+    ret = []
+    for name in sorted(results):
+        if name in baseline:
+            before = baseline[name]["items_per_sec"]
+            after = results[name]["items_per_sec"]
+            if after < before * (1 - tolerance):
+                ret.append((name, before, after))
+    return ret
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the PyAlgoTrade benchmarks")
+    parser.add_argument("--filter", help="only run the benchmarks whose name contains this string")
+    parser.add_argument("--scale", type=int, default=1, help="multiply the amount of data by this factor")
+    parser.add_argument("--save", help="save the results to this JSON file")
+    parser.add_argument("--baseline", help="compare the results against this JSON file")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="fraction of slowdown to tolerate")
+    args = parser.parse_args()
+
+    results = {}
+    print "%-32s %10s %10s %14s %10s" % ("Benchmark", "Items", "Secs", "Items/sec", "Peak MB")
+    for benchmark in all_benchmarks():
+        if args.filter and args.filter not in benchmark.getName():
+            continue
+        result = run_isolated(benchmark, args.scale)
+        results[benchmark.getName()] = result
+        print "%-32s %10d %10.3f %14.1f %10.1f" % (benchmark.getName(), result["items"], result["secs"], result["items_per_sec"], result["peak_mb"])
+
+    if args.save:
+        f = open(args.save, "w")
+        try:
+            json.dump(results, f, indent=4, sort_keys=True)
+        finally:
+            f.close()
+
+    if args.baseline:
+        f = open(args.baseline)
+        try:
+            baseline = json.load(f)
+        finally:
+            f.close()
+        regressions = compare(results, baseline, args.tolerance)
+        for name, before, after in regressions:
+            print "REGRESSION: %s went from %.1f to %.1f items/sec" % (name, before, after)
+        if len(regressions):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
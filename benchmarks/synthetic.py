@@ -0,0 +1,126 @@
+# PyAlgoTrade
+#
+# Copyright 2013 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Tibor Kiss <tibor.kiss@gmail.com>
+
+Deterministic synthetic bar generators. The same seed always yields the same bars.
+"""
+
+import datetime
+import random
+import csv
+
+from pyalgotrade import bar
+from pyalgotrade import barfeed
+from pyalgotrade.barfeed import membf
+from pyalgotrade.utils import dt
+
+# Regular trading hours for intraday bars.
+SESSION_OPEN = datetime.time(9, 30)
+SESSION_CLOSE = datetime.time(16, 0)
+
+def session_datetimes(begin, count, frequency):
+    """Generates count datetimes starting at begin, skipping weekends and, for intraday frequencies, the time outside
+    regular trading hours."""
+    if frequency == barfeed.Frequency.DAY:
+        step = datetime.timedelta(days=1)
+    elif frequency == barfeed.Frequency.HOUR:
+        step = datetime.timedelta(hours=1)
+    elif frequency == barfeed.Frequency.MINUTE:
+        step = datetime.timedelta(minutes=1)
+    elif frequency == barfeed.Frequency.SECOND:
+        step = datetime.timedelta(seconds=1)
+    else:
+        raise Exception("Invalid frequency")
+
+    dateTime = begin
+    generated = 0
+    while generated < count:
+        if dateTime.weekday() > 4:
+            # Jump to Monday.
+            dateTime = datetime.datetime.combine(dateTime.date() + datetime.timedelta(days=7 - dateTime.weekday()), dateTime.time())
+            continue
+        if frequency != barfeed.Frequency.DAY:
+            if dateTime.time() < SESSION_OPEN:
+                dateTime = datetime.datetime.combine(dateTime.date(), SESSION_OPEN)
+            elif dateTime.time() >= SESSION_CLOSE:
+                dateTime = datetime.datetime.combine(dateTime.date() + datetime.timedelta(days=1), SESSION_OPEN)
+                continue
+        yield dateTime
+        generated += 1
+        dateTime += step
+
+def random_walk(count, frequency=barfeed.Frequency.DAY, seed=0, price=100.0, volatility=0.01, begin=datetime.datetime(2000, 1, 3)):
+    """Returns a list of :class:`pyalgotrade.bar.Bar` following a random walk.
+
+    :param count: The number of bars.
+    :param frequency: The bar frequency. Intraday bars only cover regular trading hours.
+    :param seed: The seed for the random number generator.
+    :param price: The initial price.
+    :param volatility: The standard deviation of the returns for each bar.
+    """
+    rnd = random.Random(seed)
+    ret = []
+    close = price
+    for dateTime in session_datetimes(begin, count, frequency):
+        open_ = close
+        close = max(0.01, round(open_ * (1 + rnd.gauss(0, volatility)), 2))
+        high = round(max(open_, close) * (1 + abs(rnd.gauss(0, volatility / 2))), 2)
+        low = round(min(open_, close) * (1 - abs(rnd.gauss(0, volatility / 2))), 2)
+        volume = rnd.randint(100, 100000)
+        ret.append(bar.Bar(dt.as_utc(dateTime), open_, high, low, close, volume, close))
+    return ret
+
+def instrument_names(count):
+    return ["inst%d" % (i) for i in xrange(count)]
+
+def build_bars(instruments, count, frequency=barfeed.Frequency.DAY, seed=0):
+    """Returns a dictionary that maps each instrument to a random walk of count bars. Each instrument uses a different
+    seed derived from seed."""
+    ret = {}
+    for i in xrange(len(instruments)):
+        ret[instruments[i]] = random_walk(count, frequency, seed=seed * 1000 + i, price=10.0 + 10 * i)
+    return ret
+
+def build_feed(instruments, count, frequency=barfeed.Frequency.DAY, seed=0):
+    """Returns a :class:`pyalgotrade.barfeed.membf.Feed` loaded with random walks for a set of instruments."""
+    ret = membf.Feed(frequency)
+    for instrument, bars in build_bars(instruments, count, frequency, seed).iteritems():
+        ret.addBarsFromSequence(instrument, bars)
+    return ret
+
+def write_yahoo_csv(path, bars):
+    """Writes daily bars to a file in Yahoo! Finance format."""
+    f = open(path, "wb")
+    try:
+        writer = csv.writer(f)
+        writer.writerow(["Date", "Open", "High", "Low", "Close", "Volume", "Adj Close"])
+        # Yahoo! Finance files are sorted in reverse order.
+        for bar_ in reversed(bars):
+            writer.writerow([bar_.getDateTime().strftime("%Y-%m-%d"), bar_.getOpen(), bar_.getHigh(), bar_.getLow(), bar_.getClose(), bar_.getVolume(), bar_.getAdjClose()])
+    finally:
+        f.close()
+
+def write_ninjatrader_csv(path, bars):
+    """Writes minute bars to a file in NinjaTrader format."""
+    f = open(path, "wb")
+    try:
+        writer = csv.writer(f, delimiter=";")
+        for bar_ in bars:
+            writer.writerow([bar_.getDateTime().strftime("%Y%m%d %H%M%S"), bar_.getOpen(), bar_.getHigh(), bar_.getLow(), bar_.getClose(), bar_.getVolume()])
+    finally:
+        f.close()
@@ -25,11 +25,13 @@ from pyalgotrade import dataseries
 from pyalgotrade import observer
 from pyalgotrade import bar
 from pyalgotrade import warninghelpers
+from pyalgotrade import technical
+from pyalgotrade.profiler import Phase
 
 class Frequency:
     SECOND  = 1
     MINUTE  = 2
-    # HOUR  = 3
+    HOUR    = 3
     DAY     = 4
 
 # This class is responsible for:
@@ -49,16 +51,27 @@ class BasicBarFeed:
         self.__currentBars = None
         self.__lastBars = {}
         self.__frequency = frequency
+        self.__profiler = None
+        self.__indicatorRegistry = technical.IndicatorRegistry()
+
+    def __updateDS(self, bars):
+        self.__currentBars = bars
+        # Update self.__lastBars and the dataseries.
+        for instrument in bars.getInstruments():
+            bar_ = bars.getBar(instrument)
+            self.__lastBars[instrument] = bar_
+            self.__ds[instrument].appendValue(bar_)
 
     def __getNextBarsAndUpdateDS(self):
-        bars = self.getNextBars()
-        if bars != None:
-            self.__currentBars = bars
-            # Update self.__lastBars and the dataseries.
-            for instrument in bars.getInstruments():
-                bar_ = bars.getBar(instrument)
-                self.__lastBars[instrument] = bar_
-                self.__ds[instrument].appendValue(bar_)
+        profiler = self.__profiler
+        if profiler is None:
+            bars = self.getNextBars()
+            if bars != None:
+                self.__updateDS(bars)
+        else:
+            bars = profiler.call(Phase.FEED_FETCH, self.getNextBars)
+            if bars != None:
+                profiler.call(Phase.DS_UPDATE, self.__updateDS, bars)
         return bars
 
     def __iter__(self):
@@ -72,6 +85,16 @@ class BasicBarFeed:
     def getFrequency(self):
         return self.__frequency
 
+    def getIndicatorRegistry(self):
+        """Returns the :class:`pyalgotrade.technical.IndicatorRegistry` for the indicators built on top of this feed."""
+        return self.__indicatorRegistry
+
+    def getProfiler(self):
+        return self.__profiler
+
+    def setProfiler(self, profiler):
+        self.__profiler = profiler
+
     def getCurrentBars(self):
         """Returns the current :class:`pyalgotrade.bar.Bars`."""
         return self.__currentBars
@@ -217,3 +240,7 @@ class OptimizerBarFeed(BasicBarFeed):
 
     def stopDispatching(self):
         return self.__nextBar >= len(self.__bars)
+
+    # Returns a list with the bars for a given instrument that were not dispatched yet, sorted by datetime.
+    def getBars(self, instrument):
+        return [bars[instrument] for bars in self.__bars[self.__nextBar:] if instrument in bars]
@@ -27,6 +27,7 @@ from pyalgotrade.utils.cache import memoize
 
 import csv
 import datetime
+import os
 import types
 import pytz
 
@@ -125,6 +126,9 @@ class BarFeed(membf.Feed):
         membf.Feed.__init__(self, frequency)
         self.__barFilter = None
         self.__dailyTime = datetime.time(23, 59, 59)
+        # The files that the bars were loaded from, so checkpoints can load them again instead of saving the bars.
+        self.__csvFiles = []
+        self.__reloadable = True
 
     def getDailyBarTime(self):
         """Returns the time to set to daily bars when that information is not present in CSV files. Defaults to 23:59:59.
@@ -146,16 +150,34 @@ class BarFeed(membf.Feed):
     def setBarFilter(self, barFilter):
         self.__barFilter = barFilter
 
-    def addBarsFromCSV(self, instrument, path, rowParser):
+    def __loadBars(self, path, rowParser, barFilter):
         # Load the csv file
-        loadedBars = []
+        ret = []
         reader = FastDictReader(open(path, "r"), fieldnames=rowParser.getFieldNames(), delimiter=rowParser.getDelimiter())
         for row in reader:
             bar_ = rowParser.parseBar(row)
-            if bar_ != None and (self.__barFilter is None or self.__barFilter.includeBar(bar_)):
-                loadedBars.append(bar_)
+            if bar_ != None and (barFilter is None or barFilter.includeBar(bar_)):
+                ret.append(bar_)
+        return ret
 
-        self.addBarsFromSequence(instrument, loadedBars)
+    def addBarsFromCSV(self, instrument, path, rowParser):
+        loadedBars = self.__loadBars(path, rowParser, self.__barFilter)
+        membf.Feed.addBarsFromSequence(self, instrument, loadedBars)
+        self.__csvFiles.append((instrument, os.path.abspath(path), rowParser, self.__barFilter))
+
+    def addBarsFromSequence(self, instrument, bars):
+        membf.Feed.addBarsFromSequence(self, instrument, bars)
+        # These bars can't be loaded again from the files.
+        self.__reloadable = False
+
+    def canReloadBars(self):
+        return self.__reloadable
+
+    def reloadBars(self):
+        ret = {}
+        for instrument, path, rowParser, barFilter in self.__csvFiles:
+            ret.setdefault(instrument, []).extend(self.__loadBars(path, rowParser, barFilter))
+        return ret
 
 ######################################################################
 ## Yahoo CSV parser
@@ -21,12 +21,19 @@
 from pyalgotrade import barfeed
 from pyalgotrade.barfeed import helpers
 
+# Sorts bars in descending datetime order.
+def sort_bars(bars):
+    barCmp = lambda x, y: cmp(x.getDateTime(), y.getDateTime())
+    bars.sort(barCmp, reverse=True)
+
 # This class is responsible for:
 # - Holding bars in memory.
 # - Aligning them with respect to time.
 #
 # Subclasses should:
 # - Forward the call to start() if they override it.
+# - Implement canReloadBars() and reloadBars() if the bars can be loaded again, so checkpoints don't have to save the
+#   bars that were not dispatched yet.
 
 class Feed(barfeed.BarFeed):
     def __init__(self, frequency):
@@ -34,8 +41,42 @@ class Feed(barfeed.BarFeed):
         self.__bars = {}
         self.__started = False
         self.__barsLeft = 0
+        # The datetime of the last bars returned by fetchNextBars.
+        self.__lastDateTime = None
+
+    def __getstate__(self):
+        ret = self.__dict__.copy()
+        if self.canReloadBars():
+            # Only the cursor is saved. The bars that were not dispatched yet get loaded again.
+            ret["_Feed__bars"] = None
+        return ret
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.__bars is None:
+            self.__bars = {}
+            for instrument, bars in self.reloadBars().iteritems():
+                sort_bars(bars)
+                if self.__started:
+                    helpers.set_session_close_attributes(bars)
+                # Skip the bars that were already dispatched.
+                if self.__lastDateTime is not None:
+                    while len(bars) and bars[-1].getDateTime() <= self.__lastDateTime:
+                        bars.pop()
+                self.__bars[instrument] = bars
+
+    def canReloadBars(self):
+        """Returns True if :meth:`reloadBars` can load the bars again."""
+        return False
+
+    def reloadBars(self):
+        """Loads the bars again and returns a dictionary mapping instruments to lists of bars."""
+        raise NotImplementedError()
 
     def start(self):
+        # A feed loaded from a checkpoint may already be started.
+        if self.__started:
+            return
         self.__started = True
         # Set session close attributes to bars.
         for instrument, bars in self.__bars.iteritems():
@@ -56,8 +97,7 @@ class Feed(barfeed.BarFeed):
 
         # Add and sort the bars
         self.__bars[instrument].extend(bars)
-        barCmp = lambda x, y: cmp(x.getDateTime(), y.getDateTime())
-        self.__bars[instrument].sort(barCmp, reverse=True)
+        sort_bars(self.__bars[instrument])
 
         self.registerInstrument(instrument)
 
@@ -90,8 +130,13 @@ class Feed(barfeed.BarFeed):
                 ret[instrument] = bars.pop()
 
         self.__barsLeft -= 1
+        self.__lastDateTime = smallestDateTime
         return ret
 
+    def getBars(self, instrument):
+        """Returns a list with the bars for a given instrument that were not dispatched yet, sorted by datetime."""
+        return self.__bars.get(instrument, [])[::-1]
+
     def getBarsLeft(self):
         return self.__barsLeft
 
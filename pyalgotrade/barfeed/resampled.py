@@ -0,0 +1,251 @@
+# PyAlgoTrade
+#
+# Copyright 2013 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Tibor Kiss <tibor.kiss@gmail.com>
+"""
+
+import collections
+
+from pyalgotrade import bar
+from pyalgotrade import barfeed
+from pyalgotrade.utils import dt
+
+def truncate_datetime(dateTime, frequency):
+    """Returns the start of the period of the given frequency that dateTime belongs to."""
+    if frequency == barfeed.Frequency.SECOND:
+        ret = dateTime.replace(microsecond=0)
+    elif frequency == barfeed.Frequency.MINUTE:
+        ret = dateTime.replace(second=0, microsecond=0)
+    elif frequency == barfeed.Frequency.HOUR:
+        ret = dateTime.replace(minute=0, second=0, microsecond=0)
+    elif frequency == barfeed.Frequency.DAY:
+        ret = dateTime.replace(hour=0, minute=0, second=0, microsecond=0)
+    else:
+        raise Exception("Invalid frequency")
+    return ret
+
+def get_slot_datetime(dateTime, frequency, timezone=None):
+    """Returns the start of the period of the given frequency that dateTime belongs to.
+
+    :param dateTime: The datetime to truncate.
+    :type dateTime: :class:`datetime.datetime`.
+    :param frequency: The period frequency.
+    :type frequency: :class:`pyalgotrade.barfeed.Frequency`.
+    :param timezone: The pytz timezone used to calculate period boundaries. Only used if dateTime is not naive.
+        Naive datetimes are assumed to be in the right timezone already.
+    """
+    if timezone is None or dt.datetime_is_naive(dateTime):
+        return truncate_datetime(dateTime, frequency)
+
+    # Truncate using the local time and localize again, so that daily boundaries are set at local midnight
+    # and DST transitions get the right offset.
+    localDateTime = dateTime.astimezone(timezone).replace(tzinfo=None)
+    return timezone.localize(truncate_datetime(localDateTime, frequency))
+
+class Bar(bar.Bar):
+    """A :class:`pyalgotrade.bar.Bar` built by aggregating finer bars.
+
+    :param vwap: Volume weighted average price.
+    :type vwap: float
+    :param barCount: The number of bars that were aggregated.
+    :type barCount: int
+    """
+    def __init__(self, dateTime, open_, high, low, close, volume, adjClose, vwap, barCount):
+        bar.Bar.__init__(self, dateTime, open_, high, low, close, volume, adjClose)
+        self.__vwap = vwap
+        self.__barCount = barCount
+
+    def getVWAP(self):
+        """Returns the Volume Weighted Average Price."""
+        return self.__vwap
+
+    def getBarCount(self):
+        """Returns the number of bars that were aggregated."""
+        return self.__barCount
+
+    def __getstate__(self):
+        return (bar.Bar.__getstate__(self), self.__vwap, self.__barCount)
+
+    def __setstate__(self, state):
+        baseState, self.__vwap, self.__barCount = state
+        bar.Bar.__setstate__(self, baseState)
+
+# Aggregates the bars for one instrument that fall in the same period.
+# Every update is O(1) so bars can be aggregated as they arrive.
+class BarAggregator:
+    def __init__(self, dateTime):
+        self.__dateTime = dateTime
+        self.__open = None
+        self.__high = None
+        self.__low = None
+        self.__close = None
+        self.__adjClose = None
+        self.__volume = 0
+        self.__priceVolume = 0.0
+        self.__barCount = 0
+
+    def addBar(self, bar_):
+        if self.__barCount == 0:
+            self.__open = bar_.getOpen()
+            self.__high = bar_.getHigh()
+            self.__low = bar_.getLow()
+        else:
+            self.__high = max(self.__high, bar_.getHigh())
+            self.__low = min(self.__low, bar_.getLow())
+        self.__close = bar_.getClose()
+        self.__adjClose = bar_.getAdjClose()
+
+        # Use the VWAP when the bars provide one (ie. Interactive Brokers bars), or the typical price otherwise.
+        volume = bar_.getVolume()
+        getVWAP = getattr(bar_, "getVWAP", None)
+        if getVWAP is not None:
+            price = getVWAP()
+        else:
+            price = bar_.getTypicalPrice()
+        self.__volume += volume
+        self.__priceVolume += price * volume
+
+        self.__barCount += 1
+
+    def getDateTime(self):
+        return self.__dateTime
+
+    def getBar(self, sessionClose):
+        assert(self.__barCount > 0)
+        if self.__volume:
+            vwap = self.__priceVolume / float(self.__volume)
+        else:
+            vwap = self.__close
+        ret = Bar(self.__dateTime, self.__open, self.__high, self.__low, self.__close, self.__volume, self.__adjClose, vwap, self.__barCount)
+        ret.setSessionClose(sessionClose)
+        return ret
+
+class ResampledBarFeed(barfeed.BasicBarFeed):
+    """A :class:`pyalgotrade.barfeed.BarFeed` that aggregates the bars from another feed into coarser bars.
+
+    :param barFeed: The bar feed to resample.
+    :type barFeed: :class:`pyalgotrade.barfeed.BarFeed`.
+    :param frequency: The frequency of the resampled bars. It has to be lower than the frequency of barFeed.
+    :type frequency: :class:`pyalgotrade.barfeed.Frequency`.
+    :param marketSession: If set, period boundaries are calculated using the market session timezone.
+    :type marketSession: :class:`pyalgotrade.marketsession.MarketSession`.
+
+    Resampled bars are :class:`Bar` instances. The datetime of each bar is the start of its period, and a bar is
+    complete once a bar from the next period shows up, or once the resampled feed is exhausted.
+    The last bar for each day is flagged as the session close.
+
+    The feed can be used in two ways:
+
+     * As the strategy feed. Bars are pulled from barFeed, which must not be dispatched by anyone else.
+     * Attached to the strategy feed (barFeed). The resampled bars are dispatched as soon as they are complete.
+       This is how to build multiple timeframes in a single pass, for example, by attaching an hourly and a daily
+       feed to a minute feed.
+
+    .. note::
+        Feeds can be chained, for example, to resample an hourly feed that resamples a minute feed.
+    """
+
+    def __init__(self, barFeed, frequency, marketSession=None):
+        if frequency <= barFeed.getFrequency():
+            raise Exception("The frequency must be lower than the one from the feed being resampled")
+
+        barfeed.BasicBarFeed.__init__(self, frequency)
+        self.__barFeed = barFeed
+        self.__timezone = None
+        if marketSession is not None:
+            self.__timezone = marketSession.getTimezone()
+        self.__slotDateTime = None
+        self.__aggregators = {}
+        self.__pendingBars = collections.deque()
+        self.__pulling = False
+
+        # Register the default instrument last so both feeds share it.
+        defaultInstrument = barFeed.getDefaultInstrument()
+        for instrument in barFeed.getRegisteredInstruments():
+            if instrument != defaultInstrument:
+                self.registerInstrument(instrument)
+        if defaultInstrument is not None:
+            self.registerInstrument(defaultInstrument)
+
+        barFeed.getNewBarsEvent().subscribe(self.__onBars)
+
+    def getResampledFeed(self):
+        """Returns the feed being resampled."""
+        return self.__barFeed
+
+    # nextSlotDateTime is the start of the period that follows, or None if there are no more bars.
+    def __closeSlot(self, nextSlotDateTime):
+        if len(self.__aggregators):
+            # Slot datetimes are already in the market session timezone, if one was set.
+            sessionClose = nextSlotDateTime is None or nextSlotDateTime.date() != self.__slotDateTime.date()
+            barDict = {}
+            for instrument, aggregator in self.__aggregators.iteritems():
+                barDict[instrument] = aggregator.getBar(sessionClose)
+            self.__pendingBars.append(bar.Bars(barDict))
+            self.__aggregators = {}
+        self.__slotDateTime = None
+
+    def __onBars(self, bars):
+        slotDateTime = get_slot_datetime(bars.getDateTime(), self.getFrequency(), self.__timezone)
+        if self.__slotDateTime is not None and slotDateTime != self.__slotDateTime:
+            self.__closeSlot(slotDateTime)
+        self.__slotDateTime = slotDateTime
+
+        for instrument in bars.getInstruments():
+            aggregator = self.__aggregators.get(instrument)
+            if aggregator is None:
+                aggregator = BarAggregator(slotDateTime)
+                self.__aggregators[instrument] = aggregator
+            aggregator.addBar(bars.getBar(instrument))
+
+        # Flush the last period as soon as the resampled feed is exhausted.
+        if self.__barFeed.stopDispatching():
+            self.__closeSlot(None)
+
+        # If nobody is pulling bars from this feed, dispatch them as soon as they are complete.
+        if not self.__pulling:
+            while len(self.__pendingBars):
+                self.dispatch()
+
+    def start(self):
+        self.__barFeed.start()
+
+    def stop(self):
+        self.__barFeed.stop()
+
+    def join(self):
+        self.__barFeed.join()
+
+    def stopDispatching(self):
+        return len(self.__pendingBars) == 0 and len(self.__aggregators) == 0 and self.__barFeed.stopDispatching()
+
+    def getNextBars(self):
+        if len(self.__pendingBars) == 0:
+            self.__pulling = True
+            try:
+                while len(self.__pendingBars) == 0 and not self.__barFeed.stopDispatching():
+                    self.__barFeed.dispatch()
+                # Flush the last period once the resampled feed is exhausted.
+                if len(self.__pendingBars) == 0 and self.__barFeed.stopDispatching():
+                    self.__closeSlot(None)
+            finally:
+                self.__pulling = False
+
+        ret = None
+        if len(self.__pendingBars):
+            ret = self.__pendingBars.popleft()
+        return ret
@@ -389,10 +389,17 @@ class Broker:
             self.__commission = commission
 
         self.__orderUpdatedEvent = observer.Event()
+        self.__profiler = None
 
     def getOrderUpdatedEvent(self):
         return self.__orderUpdatedEvent
 
+    def getProfiler(self):
+        return self.__profiler
+
+    def setProfiler(self, profiler):
+        self.__profiler = profiler
+
     def getCash(self):
         """Returns the available cash."""
         return self.__cash
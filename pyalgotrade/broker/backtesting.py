@@ -22,6 +22,7 @@ from pyalgotrade import broker
 from pyalgotrade.broker import Order
 from pyalgotrade import warninghelpers
 import pyalgotrade.logger
+import pyalgotrade.profiler
 import pyalgotrade.bar
 import copy
 import math
@@ -345,8 +346,9 @@ class Broker(broker.Broker):
         self.__fillStrategy = DefaultStrategy()
         self.__lastBarDT = None
 
-        # It is VERY important that the broker subscribes to barfeed events before the strategy.
-        barFeed.getNewBarsEvent().subscribe(self.onBars)
+        # It is VERY important that the broker processes barfeed events before the strategy, to avoid executing orders
+        # placed in the current tick. A higher priority takes care of that, no matter the subscription order.
+        barFeed.getNewBarsEvent().subscribe(self.onBars, priority=1)
         self.__barFeed = barFeed
         self.__allowNegativeCash = False
 
@@ -499,6 +501,13 @@ class Broker(broker.Broker):
             raise Exception("The order was already processed")
 
     def onBars(self, bars):
+        profiler = self.getProfiler()
+        if profiler is None:
+            self.__onBars(bars)
+        else:
+            profiler.call(pyalgotrade.profiler.Phase.BROKER, self.__onBars, bars)
+
+    def __onBars(self, bars):
         # Process day end & start first
         barDT = bars.getDateTime().date()
         if not self.__lastBarDT:
@@ -21,10 +21,22 @@
 import logging
 log = logging.getLogger(__name__)
 
+import array
+
 import bar
-from pyalgotrade.utils import intersect
+from pyalgotrade.utils import lt
 from pyalgotrade import warninghelpers
 
+# The number of values to keep for each bar dataseries when saving checkpoints, or None to keep all of them.
+_checkpointTailSize = None
+
+# Sets the number of values to keep for each bar dataseries when pickled, and returns the previous one.
+def set_checkpoint_tail_size(tailSize):
+    global _checkpointTailSize
+    ret = _checkpointTailSize
+    _checkpointTailSize = tailSize
+    return ret
+
 # It is important to inherit object to get __getitem__ to work properly.
 # Check http://code.activestate.com/lists/python-list/621258/
 class DataSeries(object):
@@ -134,6 +146,8 @@ class SequenceDataSeries(DataSeries):
                 self.__dateTimes = [None for v in self.__values]
             elif len(dateTimes) != len(values):
                 raise Exception("The number of datetimes don't match the number of values")
+            else:
+                self.__dateTimes = dateTimes
         else:
             self.__values = []
             self.__dateTimes = []
@@ -178,6 +192,28 @@ class SequenceDataSeries(DataSeries):
     def getDateTimes(self):
         return self.__dateTimes
 
+    # Returns the number of values to keep when pickled, or None to keep all of them.
+    def getCheckpointTailSize(self):
+        return None
+
+    def __getstate__(self):
+        ret = self.__dict__.copy()
+        tailSize = self.getCheckpointTailSize()
+        if tailSize is not None and len(self.__values) > tailSize:
+            # Only the last values are saved. The ones before are set to None when loaded, so positions don't change.
+            dropped = len(self.__values) - tailSize
+            ret["_SequenceDataSeries__values"] = self.__values[dropped:]
+            ret["_SequenceDataSeries__dateTimes"] = self.__dateTimes[dropped:]
+            ret["_SequenceDataSeries__dropped"] = dropped
+        return ret
+
+    def __setstate__(self, state):
+        dropped = state.pop("_SequenceDataSeries__dropped", 0)
+        self.__dict__.update(state)
+        if dropped:
+            self.__values = [None] * dropped + self.__values
+            self.__dateTimes = [None] * dropped + self.__dateTimes
+
 class BarValueDataSeries(DataSeries):
     def __init__(self, barDataSeries, barMethod):
         self.__barDataSeries = barDataSeries
@@ -203,111 +239,151 @@ class BarDataSeries(SequenceDataSeries):
 
     def __init__(self):
         SequenceDataSeries.__init__(self)
+        # The same BarValueDataSeries is returned for each bar method, so indicators built on top of them can be shared.
+        self.__valueDataSeries = {}
 
     def appendValue(self, value):
         # Check that bars are appended in order.
         assert(value != None)
         SequenceDataSeries.appendValueWithDatetime(self, value.getDateTime(), value)
 
+    def getCheckpointTailSize(self):
+        return _checkpointTailSize
+
+    def __getValueDataSeries(self, barMethod):
+        ret = self.__valueDataSeries.get(barMethod)
+        if ret is None:
+            ret = BarValueDataSeries(self, barMethod)
+            self.__valueDataSeries[barMethod] = ret
+        return ret
+
     def getOpenDataSeries(self):
         """Returns a :class:`DataSeries` with the open prices."""
-        return BarValueDataSeries(self, bar.Bar.getOpen)
+        return self.__getValueDataSeries(bar.Bar.getOpen)
 
     def getCloseDataSeries(self):
         """Returns a :class:`DataSeries` with the close prices."""
-        return BarValueDataSeries(self, bar.Bar.getClose)
+        return self.__getValueDataSeries(bar.Bar.getClose)
 
     def getHighDataSeries(self):
         """Returns a :class:`DataSeries` with the high prices."""
-        return BarValueDataSeries(self, bar.Bar.getHigh)
+        return self.__getValueDataSeries(bar.Bar.getHigh)
 
     def getLowDataSeries(self):
         """Returns a :class:`DataSeries` with the low prices."""
-        return BarValueDataSeries(self, bar.Bar.getLow)
+        return self.__getValueDataSeries(bar.Bar.getLow)
 
     def getVolumeDataSeries(self):
         """Returns a :class:`DataSeries` with the volume."""
-        return BarValueDataSeries(self, bar.Bar.getVolume)
+        return self.__getValueDataSeries(bar.Bar.getVolume)
 
     def getAdjCloseDataSeries(self):
         """Returns a :class:`DataSeries` with the adjusted close prices."""
-        return BarValueDataSeries(self, bar.Bar.getAdjClose)
+        return self.__getValueDataSeries(bar.Bar.getAdjClose)
 
-def datetime_aligned(ds1, ds2):
+def datetime_aligned(ds1, ds2, *dataSeries):
     """
-    Returns two dataseries that exhibit only those values whose datetimes are in both dataseries.
+    Returns dataseries that exhibit only those values whose datetimes are in all the dataseries.
 
     :param ds1: A DataSeries instance.
     :type ds1: :class:`DataSeries`
     :param ds2: A DataSeries instance.
     :type ds2: :class:`DataSeries`
-    """
-    aligned1 = AlignedDataSeries(ds1)
-    aligned2 = AlignedDataSeries(ds2)
-    shared = AlignedDataSeriesSharedState(aligned1, aligned2)
-    aligned1.setShared(shared)
-    aligned2.setShared(shared)
-    return (aligned1, aligned2)
+    :param dataSeries: Additional DataSeries instances to align with ds1 and ds2.
+    :type dataSeries: :class:`DataSeries`
+    :rtype: A tuple with one aligned :class:`DataSeries` for each of the dataseries supplied, in the same order.
 
+    .. note::
+            The datetimes in each dataseries are expected to be sorted.
+    """
+    ret = tuple([AlignedDataSeries(ds) for ds in (ds1, ds2) + dataSeries])
+    shared = AlignedDataSeriesSharedState(*ret)
+    for aligned in ret:
+        aligned.setShared(shared)
+    return ret
+
+# Incremental N-way alignment index.
+# Each decorated dataseries has a cursor pointing to the first datetime that was not consumed yet.
+# Every time any of the dataseries grows, the cursors are advanced until one of them reaches the end:
+# - If every cursor points to the same datetime, that datetime is common to all and gets recorded.
+# - Otherwise every cursor pointing to a datetime lower than the highest one gets advanced, since those datetimes
+#   can't be found in the dataseries whose cursor points to the highest datetime.
+# Datetimes are scanned only once, so the total cost is linear in the number of values appended.
 class AlignedDataSeriesSharedState:
-    def __init__(self, ds1, ds2):
-        self.__ds1 = ds1
-        self.__ds2 = ds2
-        self.__ds1Len = None
-        self.__ds2Len = None
-        # The position in each of the dataseries for the last intersection
-        self.__lastPos1 = None
-        self.__lastPos2 = None
+    def __init__(self, *alignedDataSeries):
+        assert(len(alignedDataSeries) > 1)
+        self.__aligned = alignedDataSeries
+        self.__decorated = [ds.getDecorated() for ds in alignedDataSeries]
+        # The datetimes common to all the dataseries. This list is shared by all the aligned dataseries.
+        self.__dateTimes = []
+        # The position of the next datetime to check in each of the dataseries.
+        self.__cursors = [0 for ds in alignedDataSeries]
+        # The length of each of the dataseries when the cursors were last advanced.
+        self.__lengths = [0 for ds in alignedDataSeries]
+
+    def getDateTimes(self):
+        return self.__dateTimes
 
     def __isDirty(self):
-        if self.__ds1.getDecorated().getLength() != self.__ds1Len:
-            return True
-        if self.__ds2.getDecorated().getLength() != self.__ds2Len:
-            return True
+        lengths = self.__lengths
+        i = 0
+        for ds in self.__decorated:
+            if ds.getLength() != lengths[i]:
+                return True
+            i += 1
         return False
 
-    def __resetDirty(self):
-        # Reset the dirty flag.
-        self.__ds1Len = self.__ds1.getDecorated().getLength()
-        self.__ds2Len = self.__ds2.getDecorated().getLength()
+    def __advance(self):
+        allDateTimes = [ds.getDateTimes() for ds in self.__decorated]
+        lengths = [len(dateTimes) for dateTimes in allDateTimes]
+        cursors = self.__cursors
+        count = len(cursors)
+        positions = [[] for i in xrange(count)]
+        dateTimes = []
+
+        while True:
+            # Stop as soon as one of the dataseries has no more datetimes to check.
+            heads = []
+            for i in xrange(count):
+                if cursors[i] >= lengths[i]:
+                    break
+                heads.append(allDateTimes[i][cursors[i]])
+            if len(heads) != count:
+                break
+
+            highest = heads[0]
+            for head in heads:
+                if lt(highest, head):
+                    highest = head
+
+            match = True
+            for i in xrange(count):
+                if heads[i] != highest:
+                    cursors[i] += 1
+                    match = False
+
+            if match:
+                dateTimes.append(highest)
+                for i in xrange(count):
+                    positions[i].append(cursors[i])
+                    cursors[i] += 1
+
+        self.__lengths = lengths
+        if len(dateTimes):
+            self.__dateTimes.extend(dateTimes)
+            for i in xrange(count):
+                self.__aligned[i].update(positions[i])
 
     def update(self):
         if self.__isDirty():
-            # Search for datetime intersections between the data series,
-            # but start right after the last one found.
-            ds1DateTimes = self.__ds1.getDecorated().getDateTimes()
-            ds2DateTimes = self.__ds2.getDecorated().getDateTimes()
-            if self.__lastPos1 != None:
-                ds1DateTimes = ds1DateTimes[self.__lastPos1+1:]
-            if self.__lastPos2 != None:
-                ds2DateTimes = ds2DateTimes[self.__lastPos2+1:]
-
-            # Calculate the intersections.
-            dateTimes, pos1, pos2 = intersect(ds1DateTimes, ds2DateTimes)
-
-            # Update each array's relative position to make them absolute positions.
-            if self.__lastPos1 != None and len(pos1):
-                pos1 = [self.__lastPos1 + pos + 1 for pos in pos1]
-            if self.__lastPos2 != None and len(pos2):
-                pos2 = [self.__lastPos2 + pos + 1 for pos in pos2]
-
-            # Update the last intersection.
-            if len(pos1):
-                self.__lastPos1 = pos1[-1]
-            if len(pos2):
-                self.__lastPos2 = pos2[-1]
-
-            # Update the aligned data series.
-            self.__ds1.update(dateTimes, pos1)
-            self.__ds2.update(dateTimes, pos2)
-            self.__resetDirty()
+            self.__advance()
 
 class AlignedDataSeries(DataSeries):
     def __init__(self, ds):
         self.__shared = None
         self.__ds = ds
-        self.__dateTimes = []
-        self.__positions = []
+        # Positions in the decorated dataseries for each aligned value.
+        self.__positions = array.array("l")
 
     def getDecorated(self):
         return self.__ds
@@ -315,9 +391,7 @@ class AlignedDataSeries(DataSeries):
     def setShared(self, shared):
         self.__shared = shared
 
-    def update(self, dateTimes, positions):
-        assert(len(dateTimes) == len(positions))
-        self.__dateTimes.extend(dateTimes)
+    def update(self, positions):
         self.__positions.extend(positions)
 
     def getFirstValidPos(self):
@@ -331,10 +405,10 @@ class AlignedDataSeries(DataSeries):
     def getValueAbsolute(self, pos):
         self.__shared.update()
         ret = None
-        if pos >= 0 and pos < self.getLength():
+        if pos >= 0 and pos < len(self.__positions):
             ret = self.__ds.getValueAbsolute(self.__positions[pos])
         return ret
 
     def getDateTimes(self):
         self.__shared.update()
-        return self.__dateTimes
+        return self.__shared.getDateTimes()
@@ -19,37 +19,55 @@
 """
 
 class Event:
+    """An event that notifies subscribed handlers when emitted.
+
+    Handlers are kept in an immutable tuple that gets replaced on subscribe/unsubscribe, so emitting doesn't
+    require any bookkeeping. Changes made while the event is being emitted take effect on the next emit.
+    """
+
     def __init__(self):
-        self.__handlers = []
-        self.__toSubscribe = []
-        self.__toUnsubscribe = []
-        self.__emitting = False
-
-    def __applyChanges(self):
-        for handler in self.__toSubscribe:
-            if handler not in self.__handlers:
-                self.__handlers.append(handler)
-        for handler in self.__toUnsubscribe:
-            self.__handlers.remove(handler)
-
-        self.__toSubscribe = []
-        self.__toUnsubscribe = []
-
-    def subscribe(self, handler):
-        if self.__emitting:
-            self.__toSubscribe.append(handler)
-        elif handler not in self.__handlers:
-            self.__handlers.append(handler)
+        # Handlers sorted by priority, in the order they should be called.
+        self.__handlers = ()
+        # (-priority, subscription number, handler) for each handler, sorted.
+        # Handlers are not required to be hashable (ie. bound methods of lists), so no dict is used.
+        self.__entries = []
+        self.__nextNumber = 0
+
+    def __find(self, handler):
+        for i in xrange(len(self.__entries)):
+            if self.__entries[i][2] == handler:
+                return i
+        return None
+
+    def __rebuild(self):
+        self.__handlers = tuple([entry[2] for entry in self.__entries])
+
+    def subscribe(self, handler, priority=0):
+        """Subscribes a handler to the event. Subscribing the same handler twice has no effect.
+
+        :param handler: The callable to call when the event is emitted.
+        :param priority: Handlers with higher priority get called first. Handlers with the same priority get called in
+            subscription order.
+        :type priority: int.
+        """
+        if self.__find(handler) is None:
+            key = (-priority, self.__nextNumber)
+            self.__nextNumber += 1
+            pos = len(self.__entries)
+            while pos > 0 and self.__entries[pos-1][:2] > key:
+                pos -= 1
+            self.__entries.insert(pos, key + (handler,))
+            self.__rebuild()
 
     def unsubscribe(self, handler):
-        if self.__emitting:
-            self.__toUnsubscribe.append(handler)
-        else:
-            self.__handlers.remove(handler)
+        """Unsubscribes a handler from the event. Raises ValueError if the handler was not subscribed."""
+        pos = self.__find(handler)
+        if pos is None:
+            raise ValueError("Handler not subscribed")
+        del self.__entries[pos]
+        self.__rebuild()
 
     def emit(self, *parameters):
-        self.__emitting = True
+        # The tuple is never modified, so subscribe/unsubscribe calls from the handlers won't affect this loop.
         for handler in self.__handlers:
             handler(*parameters)
-        self.__emitting = False
-        self.__applyChanges()
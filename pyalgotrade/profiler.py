@@ -0,0 +1,181 @@
+# PyAlgoTrade
+#
+# Copyright 2013 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Tibor Kiss <tibor.kiss@gmail.com>
+"""
+
+import timeit
+
+from pyalgotrade import observer
+
+class Phase:
+    """The phases timed while running a strategy."""
+
+    #: Fetching the next bars from the feed.
+    FEED_FETCH = "feed fetch"
+    #: Updating the feed dataseries with the new bars.
+    DS_UPDATE = "dataseries update"
+    #: Processing orders in the backtesting broker.
+    BROKER = "broker"
+    #: Notifying analyzers before the strategy processes the bars.
+    ANALYZERS = "analyzers"
+    #: The strategy onBars method.
+    ON_BARS = "onBars"
+    #: Placing orders for positions that exit on session close.
+    SESSION_CLOSE = "session close"
+    #: The bars processed event handlers.
+    BARS_PROCESSED = "bars processed"
+
+    all = [FEED_FETCH, DS_UPDATE, BROKER, ANALYZERS, ON_BARS, SESSION_CLOSE, BARS_PROCESSED]
+
+class PhaseStats:
+    def __init__(self):
+        self.__calls = 0
+        self.__elapsed = 0.0
+
+    def add(self, elapsed):
+        self.__calls += 1
+        self.__elapsed += elapsed
+
+    def getCalls(self):
+        """Returns the number of times the phase was timed."""
+        return self.__calls
+
+    def getElapsed(self):
+        """Returns the total time spent in the phase, in seconds."""
+        return self.__elapsed
+
+class Profiler:
+    """Times the different phases involved in running a strategy.
+
+    :param reportEvery: If set, the report event is emitted every reportEvery bars, besides at the end of the run.
+    :type reportEvery: int.
+
+    Use :meth:`pyalgotrade.strategy.Strategy.setProfiler` to instrument a strategy, its feed and its broker.
+    """
+
+    def __init__(self, reportEvery=None):
+        self.__timer = timeit.default_timer
+        self.__phases = {}
+        for phase in Phase.all:
+            self.__phases[phase] = PhaseStats()
+        self.__indicators = []
+        self.__bars = 0
+        self.__begin = None
+        self.__elapsed = 0.0
+        self.__reportEvery = reportEvery
+        self.__reportEvent = observer.Event()
+
+    def call(self, phase, method, *args):
+        """Calls method with args and adds the time spent to a given phase.
+
+        :param phase: The phase. Any string is valid, not just the ones in :class:`Phase`.
+        """
+        begin = self.__timer()
+        try:
+            return method(*args)
+        finally:
+            self.addElapsed(phase, self.__timer() - begin)
+
+    def addElapsed(self, phase, elapsed):
+        stats = self.__phases.get(phase)
+        if stats is None:
+            stats = PhaseStats()
+            self.__phases[phase] = stats
+        stats.add(elapsed)
+
+    def addIndicator(self, name, indicator):
+        """Registers a technical indicator to report its cache hit rate.
+
+        :param name: The name to use in the report.
+        :type name: string.
+        :param indicator: The technical indicator.
+        :type indicator: :class:`pyalgotrade.technical.TechnicalIndicatorBase`.
+        """
+        self.__indicators.append((name, indicator))
+
+    def getReportEvent(self):
+        """Returns the event emitted with this profiler as the only parameter every reportEvery bars and at the
+        end of the run."""
+        return self.__reportEvent
+
+    def start(self):
+        self.__begin = self.__timer()
+
+    def stop(self):
+        if self.__begin is not None:
+            self.__elapsed += self.__timer() - self.__begin
+            self.__begin = None
+        self.__reportEvent.emit(self)
+
+    def onBarsProcessed(self):
+        self.__bars += 1
+        if self.__reportEvery and self.__bars % self.__reportEvery == 0:
+            self.__reportEvent.emit(self)
+
+    def getPhaseStats(self, phase):
+        """Returns the :class:`PhaseStats` for a given phase, or None if the phase was never timed."""
+        return self.__phases.get(phase)
+
+    def getBarsProcessed(self):
+        """Returns the number of bars processed by the strategy."""
+        return self.__bars
+
+    def getElapsed(self):
+        """Returns the wall clock time, in seconds, since the run started."""
+        ret = self.__elapsed
+        if self.__begin is not None:
+            ret += self.__timer() - self.__begin
+        return ret
+
+    def getBarsPerSecond(self):
+        """Returns the number of bars processed per second."""
+        elapsed = self.getElapsed()
+        if elapsed == 0:
+            return 0.0
+        return self.__bars / elapsed
+
+    def getIndicatorStats(self):
+        """Returns a list of (name, hits, misses) tuples with the cache stats for each registered indicator."""
+        ret = []
+        for name, indicator in self.__indicators:
+            cache = indicator.getCache()
+            ret.append((name, cache.getHits(), cache.getMisses()))
+        return ret
+
+    def getReport(self):
+        """Returns a string with a summary of the stats collected."""
+        elapsed = self.getElapsed()
+        lines = []
+        lines.append("Bars: %d in %.3f secs (%.1f bars/sec)" % (self.__bars, elapsed, self.getBarsPerSecond()))
+        lines.append("%-20s %10s %12s %8s" % ("Phase", "Calls", "Secs", "%"))
+        # Known phases first, and then the custom ones.
+        phases = Phase.all + sorted([phase for phase in self.__phases if phase not in Phase.all])
+        for phase in phases:
+            stats = self.__phases[phase]
+            pct = 0.0
+            if elapsed:
+                pct = stats.getElapsed() * 100 / elapsed
+            lines.append("%-20s %10d %12.6f %8.2f" % (phase, stats.getCalls(), stats.getElapsed(), pct))
+        if len(self.__indicators):
+            lines.append("%-20s %10s %12s %8s" % ("Indicator", "Hits", "Misses", "Hit %"))
+            for name, hits, misses in self.getIndicatorStats():
+                hitRate = 0.0
+                if hits + misses:
+                    hitRate = hits * 100.0 / (hits + misses)
+                lines.append("%-20s %10d %12d %8.2f" % (name, hits, misses, hitRate))
+        return "\n".join(lines)
@@ -17,4 +17,4 @@
 """
 .. moduleauthor:: Tibor Kiss <tibor.kiss@gmail.com>
 """
-__all__ = ['ibbar', 'ibbroker', 'ibconnection', 'ibfeed']
+__all__ = ['ibbar', 'ibbroker', 'ibconnection', 'ibfeed', 'ibbarbuilder', 'ibpacing', 'ibsimulator', 'iborderqueue']
@@ -63,6 +63,13 @@ class Bar(bar.Bar):
     def getShortable(self):
         return self.__shortable
 
+    def __getstate__(self):
+        return (bar.Bar.__getstate__(self), self.__vwap, self.__tradeCount, self.__shortable)
+
+    def __setstate__(self, state):
+        baseState, self.__vwap, self.__tradeCount, self.__shortable = state
+        bar.Bar.__setstate__(self, baseState)
+
 
     def __repr__(self):
         return str("%s: open=%s, high=%s, low=%s, close=%s, volume=%s, vwap=%s, tradeCount=%s shortable=%s"
@@ -0,0 +1,182 @@
+# PyAlgoTrade
+#
+# Copyright 2013 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Tibor Kiss <tibor.kiss@gmail.com>
+"""
+
+from datetime import datetime
+import pytz
+
+from pyalgotrade import observer
+from ibbar import Bar
+
+# The state of the bar being built for one instrument. Every tick is processed in O(1).
+class BarState(object):
+    __slots__ = ('slotStart', 'open', 'high', 'low', 'close', 'lastTickTime', 'volume', 'priceVolume', 'tradeCount')
+
+    def __init__(self, slotStart):
+        self.slotStart = slotStart
+        self.open = None
+        self.high = None
+        self.low = None
+        self.close = None
+        self.lastTickTime = None
+        self.volume = 0
+        self.priceVolume = 0.0
+        self.tradeCount = 0
+
+    def addTick(self, tickTime, price, size):
+        if self.tradeCount == 0:
+            self.open = price
+            self.high = price
+            self.low = price
+            self.close = price
+            self.lastTickTime = tickTime
+        else:
+            if price > self.high:
+                self.high = price
+            if price < self.low:
+                self.low = price
+            # Ticks that arrive out of order don't change the close.
+            if tickTime >= self.lastTickTime:
+                self.close = price
+                self.lastTickTime = tickTime
+        self.volume += size
+        self.priceVolume += price * size
+        self.tradeCount += 1
+
+    def getBar(self, shortable):
+        if self.volume:
+            vwap = self.priceVolume / self.volume
+        else:
+            vwap = self.close
+        dateTime = datetime.utcfromtimestamp(self.slotStart).replace(tzinfo=pytz.utc)
+        return Bar(dateTime, self.open, self.high, self.low, self.close, self.volume, vwap, self.tradeCount, shortable)
+
+class TickBarBuilder(object):
+    '''Builds :class:`pyalgotrade.providers.interactivebrokers.ibbar.Bar` instances out of trades, for many instruments.
+
+    :param period: The bar period in seconds, for example, 1, 5 or 60.
+    :type period: int
+    :param mergeLateTicks: True to add late ticks to the bar being built, or False to drop them.
+    :type mergeLateTicks: boolean
+
+    Trade times are UNIX timestamps, and bars are aligned to multiples of the period. The datetime of each bar is the
+    beginning of its period. A bar is complete when:
+
+     * A trade for the same instrument that belongs to a later period shows up.
+     * :meth:`closeBars` is called with a time past the end of its period. Use the time of the latest trade to close bars
+       on exchange time boundaries, or the current time to close them on wall clock boundaries.
+
+    Trades older than the last bar completed for an instrument are late ticks.
+    Completed bars are emitted through the event returned by :meth:`getNewBarEvent`, so the builder can be fed both
+    from live market data or by replaying recorded trades.
+    '''
+
+    def __init__(self, period, mergeLateTicks=False):
+        assert(period > 0)
+        self.__period = period
+        self.__mergeLateTicks = mergeLateTicks
+        # Maps instruments to BarState instances.
+        self.__bars = {}
+        # Maps instruments to the end of the last bar that was completed.
+        self.__closedUntil = {}
+        self.__shortable = {}
+        # The earliest end among the bars being built.
+        self.__earliestEnd = None
+        self.__lateTicks = 0
+        self.__newBarEvent = observer.Event()
+
+    def getPeriod(self):
+        return self.__period
+
+    def getNewBarEvent(self):
+        """Returns the event that will be emitted with an (instrument, bar) tuple when a bar is complete."""
+        return self.__newBarEvent
+
+    def getLateTicks(self):
+        """Returns the number of late ticks seen so far."""
+        return self.__lateTicks
+
+    def setShortable(self, instrument, shortable):
+        """Sets the shortability for the following bars of an instrument."""
+        self.__shortable[instrument] = shortable
+
+    def __closeBar(self, instrument, state):
+        del self.__bars[instrument]
+        self.__closedUntil[instrument] = state.slotStart + self.__period
+        self.__newBarEvent.emit((instrument, state.getBar(self.__shortable.get(instrument, 3.0))))
+
+    def addTick(self, instrument, tickTime, price, size):
+        """Adds a trade.
+
+        :param instrument: Instrument identifier.
+        :type instrument: string.
+        :param tickTime: The time of the trade, as a UNIX timestamp.
+        :type tickTime: float
+        :param price: The trade price.
+        :type price: float
+        :param size: The trade size.
+        :type size: int
+        """
+        state = self.__bars.get(instrument)
+
+        closedUntil = self.__closedUntil.get(instrument)
+        if closedUntil is not None and tickTime < closedUntil:
+            self.__lateTicks += 1
+            if self.__mergeLateTicks and state is not None:
+                state.addTick(tickTime, price, size)
+            return
+
+        slotStart = tickTime - tickTime % self.__period
+        if state is not None and slotStart > state.slotStart:
+            self.__closeBar(instrument, state)
+            state = None
+
+        if state is None:
+            state = BarState(slotStart)
+            self.__bars[instrument] = state
+            slotEnd = slotStart + self.__period
+            if self.__earliestEnd is None or slotEnd < self.__earliestEnd:
+                self.__earliestEnd = slotEnd
+
+        state.addTick(tickTime, price, size)
+
+    def closeBars(self, now):
+        """Completes the bars whose period ended before a given time.
+
+        :param now: A UNIX timestamp.
+        :type now: float
+        """
+        if self.__earliestEnd is None or now < self.__earliestEnd:
+            return
+
+        closed = [(state.slotStart, instrument) for instrument, state in self.__bars.iteritems() if state.slotStart + self.__period <= now]
+        for slotStart, instrument in sorted(closed):
+            self.__closeBar(instrument, self.__bars[instrument])
+
+        self.__earliestEnd = None
+        for state in self.__bars.itervalues():
+            slotEnd = state.slotStart + self.__period
+            if self.__earliestEnd is None or slotEnd < self.__earliestEnd:
+                self.__earliestEnd = slotEnd
+
+    def removeInstrument(self, instrument):
+        """Drops the bar being built for an instrument and forgets about it."""
+        self.__bars.pop(instrument, None)
+        self.__closedUntil.pop(instrument, None)
+        self.__shortable.pop(instrument, None)
@@ -25,7 +25,10 @@
 
 
 from pyalgotrade import broker
+import iborderqueue
 
+import threading
+import time
 import logging
 log = logging.getLogger(__name__)
 
@@ -179,6 +182,177 @@ class StopLimitOrder(Order):
     def __repr__(self):
         return Order.__repr__(self) + 'stopPrice=%s limitPrice=%s' % (self.__stopPrice, self.__limitPrice)
 
+######################################################################
+## Account
+
+def parse_execution_time(value):
+    """Returns the number of seconds since the epoch for an execution time as reported by TWS, in the
+    'yyyymmdd  hh:mm:ss' format and in the local time zone, or None if it can't be parsed."""
+    try:
+        return time.mktime(time.strptime(" ".join(value.split()), "%Y%m%d %H:%M:%S"))
+    except (AttributeError, ValueError):
+        return None
+
+class AccountSnapshot(object):
+    '''A local copy of the account values and the portfolio of one account.
+
+    :param accountCode: The account to track. Updates for other accounts are ignored.
+    :type accountCode: string
+    :param currency: The currency of the cash balance.
+    :type currency: string
+    :param clock: A function that returns the current time in seconds.
+
+    The snapshot is refreshed by the account values and portfolio updates sent by TWS, and by executions as soon as they
+    take place, so reading it never blocks. TWS sends account updates every 3 minutes, or when positions change.
+
+    TWS may send an execution after the account updates that already include it, so executions are only applied to the
+    values that TWS updated before the execution took place.
+    '''
+
+    def __init__(self, accountCode, currency='USD', clock=time.time):
+        self.__accountCode = accountCode
+        self.__currency = currency
+        self.__clock = clock
+        self.__lock = threading.Lock()
+        self.__cash = None
+        self.__netLiquidation = None
+        self.__leverage = 0.0
+        # Maps instruments to shares and to the average cost per share.
+        self.__shares = {}
+        self.__avgCost = {}
+        # To skip executions that were already applied, since TWS sends them again when they are requested.
+        self.__execIds = set()
+        self.__lastUpdateTime = None
+        # The time of the last update from TWS for the cash, the net liquidation and each instrument's position.
+        self.__cashTime = None
+        self.__netLiquidationTime = None
+        self.__positionTimes = {}
+
+    def updateAccountValue(self, key, value, currency, accountName):
+        if accountName != self.__accountCode:
+            return
+        self.__lock.acquire()
+        try:
+            now = self.__clock()
+            if key == 'TotalCashBalance' and currency == self.__currency:
+                self.__cash = float(value)
+                self.__cashTime = now
+            elif key == 'NetLiquidation' and currency == self.__currency:
+                self.__netLiquidation = float(value)
+                self.__netLiquidationTime = now
+            elif key == 'Leverage-S':
+                self.__leverage = float(value)
+            else:
+                return
+            self.__lastUpdateTime = now
+        finally:
+            self.__lock.release()
+
+    def updatePortfolio(self, instrument, position, marketPrice, marketValue, avgCost, accountName):
+        if accountName != self.__accountCode:
+            return
+        self.__lock.acquire()
+        try:
+            if position == 0:
+                self.__shares.pop(instrument, None)
+                self.__avgCost.pop(instrument, None)
+            else:
+                self.__shares[instrument] = position
+                self.__avgCost[instrument] = avgCost
+            self.__lastUpdateTime = self.__clock()
+            self.__positionTimes[instrument] = self.__lastUpdateTime
+        finally:
+            self.__lock.release()
+
+    def addExecution(self, execId, instrument, quantity, price, commission, execTime=None):
+        """Applies an execution until TWS sends the updated account values and portfolio.
+        Returns False if the execution was already applied.
+
+        :param execId: The execution id.
+        :type execId: string
+        :param instrument: Instrument identifier.
+        :type instrument: string
+        :param quantity: The number of shares. Positive when buying, negative when selling.
+        :type quantity: int
+        :param price: The execution price.
+        :type price: float
+        :param commission: The commission for the execution.
+        :type commission: float
+        :param execTime: The time of the execution in seconds, like the clock. If None, the execution is assumed to
+            be newer than every update received from TWS.
+        :type execTime: float
+        """
+        self.__lock.acquire()
+        try:
+            if execId in self.__execIds:
+                return False
+            self.__execIds.add(execId)
+
+            if self.__cash is not None and not self.__isReported(self.__cashTime, execTime):
+                self.__cash -= price * quantity + commission
+            # Swapping cash for shares leaves the equity as it was, except for the commission.
+            if self.__netLiquidation is not None and not self.__isReported(self.__netLiquidationTime, execTime):
+                self.__netLiquidation -= commission
+
+            if self.__isReported(self.__positionTimes.get(instrument), execTime):
+                return True
+            shares = self.__shares.get(instrument, 0)
+            newShares = shares + quantity
+            if newShares == 0:
+                self.__shares.pop(instrument, None)
+                self.__avgCost.pop(instrument, None)
+            else:
+                if shares == 0 or (shares > 0) != (newShares > 0):
+                    # Opening a position, or reversing it.
+                    self.__avgCost[instrument] = price + commission / float(abs(quantity))
+                elif abs(newShares) > abs(shares):
+                    # Increasing a position. The average cost includes the commissions, like the one IB reports.
+                    cost = self.__avgCost[instrument] * abs(shares) + price * abs(quantity) + commission
+                    self.__avgCost[instrument] = cost / abs(newShares)
+                self.__shares[instrument] = newShares
+            return True
+        finally:
+            self.__lock.release()
+
+    # Returns True if an update received at updateTime already includes an execution that took place at execTime.
+    # TWS reports execution times in whole seconds, so executions in the same second as the update are assumed to be
+    # included. If they were not, TWS sends the updated values right after since positions changed.
+    def __isReported(self, updateTime, execTime):
+        return updateTime is not None and execTime is not None and execTime <= updateTime
+
+    def getCash(self):
+        return self.__cash
+
+    def getNetLiquidation(self):
+        return self.__netLiquidation
+
+    def getLeverage(self):
+        return self.__leverage
+
+    def getShares(self, instrument):
+        return self.__shares.get(instrument, 0)
+
+    def getAvgCost(self, instrument):
+        return self.__avgCost.get(instrument, 0.0)
+
+    def getPositions(self):
+        """Returns a dictionary that maps instruments to shares."""
+        self.__lock.acquire()
+        try:
+            return dict(self.__shares)
+        finally:
+            self.__lock.release()
+
+    def getLastUpdateTime(self):
+        """Returns the time of the last update received from TWS, or None if nothing was received yet."""
+        return self.__lastUpdateTime
+
+    def getAge(self):
+        """Returns the number of seconds since the last update received from TWS, or None if nothing was received yet."""
+        if self.__lastUpdateTime is None:
+            return None
+        return self.__clock() - self.__lastUpdateTime
+
 ######################################################################
 ## Broker
 
@@ -187,22 +361,101 @@ class Broker(broker.Broker):
 
     :param ibConnection: Object responsible to forward requests to TWS.
     :type ibConnection: :class:`IBConnection`
+    :param maxSnapshotAge: The number of seconds after which the account snapshot is considered stale if TWS didn't
+                           send any updates.
+    :type maxSnapshotAge: int
+
+    .. note::
+        Cash, shares and equity are served from an :class:`AccountSnapshot` that is kept up to date by TWS and by
+        executions, so they can be called on every bar without waiting on TWS.
+
+    .. note::
+        Orders and cancel requests go through an :class:`pyalgotrade.providers.interactivebrokers.iborderqueue.OrderQueue`.
+        The ones issued while processing bars are sent once all the handlers are done, cancels first. Anything
+        exceeding the message rate is sent later on, while dispatching.
+
+    .. note::
+        When saved in a checkpoint, the connection has to be supplied as an external. The account snapshot is not
+        saved. It is built again from the new connection by :meth:`start`.
     """
-    def __init__(self, barFeed, ibConnection, commission=FlatRateCommission()):
+    def __init__(self, barFeed, ibConnection, commission=FlatRateCommission(), maxSnapshotAge=600):
         self.__ibConnection = ibConnection
         self.__barFeed          = barFeed
+        self.__maxSnapshotAge = maxSnapshotAge
 
-        # Query the server for available funds
+        # Local buffer for Orders. Keys are the orderIds
+        self.__orders = {}
+
+        # Orders are queued while the bars are being processed, and sent right after.
+        self.__orderQueue = iborderqueue.OrderQueue(self.__sendOrder, self.__ibConnection.cancelOrder)
+        self.__processingBars = False
+
+        # Query the server for available funds. This waits until TWS sends the cash balance.
         self.__cash = self.__ibConnection.getCash()
 
+        # Call the base's constructor
+        broker.Broker.__init__(self, self.__cash, commission)
+
+        self.__subscribe()
+
+        self.__barFeed.getNewBarsEvent().subscribe(self.__onBarsBegin, priority=1)
+        self.__barFeed.getNewBarsEvent().subscribe(self.__onBarsEnd, priority=-1)
+
+    def __subscribe(self):
+        # Keep a local copy of the account, seeded with the values that the connection already has.
+        # Updates are subscribed last since the handlers get called from the TWS reader thread right away, and they
+        # use the orders and the commission.
+        accountCode = self.__ibConnection.getAccountCode()
+        self.__snapshot = AccountSnapshot(accountCode)
+        self.__ibConnection.subscribeAccountUpdates(self.__snapshot.updateAccountValue, self.__snapshot.updatePortfolio,
+                                                    self.__onExecution)
+        for currency, values in self.__ibConnection.getAccountValues().get(accountCode, {}).items():
+            for key, value in values.items():
+                self.__snapshot.updateAccountValue(key, value, currency, accountCode)
+        for instrument, position in self.__ibConnection.getPortfolio().get(accountCode, {}).items():
+            self.__snapshot.updatePortfolio(instrument, position['position'], position['marketPrice'],
+                                            position['marketValue'], position['avgCost'], accountCode)
+        if self.__snapshot.getCash() is None:
+            self.__snapshot.updateAccountValue('TotalCashBalance', self.__cash, 'USD', accountCode)
+
         # Subscribe for order updates from TWS
         self.__ibConnection.subscribeOrderUpdates(self.__orderUpdate)
 
-        # Local buffer for Orders. Keys are the orderIds
-        self.__orders = {}
+    def __getstate__(self):
+        ret = self.__dict__.copy()
+        # The account will be out of date by the time the checkpoint is loaded.
+        ret["_Broker__snapshot"] = None
+        return ret
 
-        # Call the base's constructor
-        broker.Broker.__init__(self, self.__cash, commission)
+    def __onBarsBegin(self, bars):
+        self.__processingBars = True
+
+    def __onBarsEnd(self, bars):
+        self.__processingBars = False
+        self.__orderQueue.flush()
+
+    def __sendOrder(self, orderId, instrument, action, lmtPrice, auxPrice, orderType, totalQty, minQty, tif, goodTillDate):
+        self.__ibConnection.createOrder(instrument, action, lmtPrice, auxPrice, orderType, totalQty, minQty,
+                                        tif, goodTillDate, trailingPct=0, trailStopPrice=0, transmit=True,
+                                        whatif=False, orderId=orderId)
+
+    def getOrderQueue(self):
+        """Returns the :class:`pyalgotrade.providers.interactivebrokers.iborderqueue.OrderQueue` used to send orders."""
+        return self.__orderQueue
+
+    def __onExecution(self, orderId, instrument, execution):
+        if execution.m_acctNumber and execution.m_acctNumber != self.__ibConnection.getAccountCode():
+            return
+        quantity = execution.m_shares
+        if execution.m_side == 'SLD':
+            quantity = -quantity
+        order = self.__orders.get(orderId)
+        if order is not None:
+            commission = self.getCommission().calculate(order, execution.m_price, execution.m_shares)
+        else:
+            commission = 0
+        self.__snapshot.addExecution(execution.m_execId, instrument, quantity, execution.m_price, commission,
+                                     parse_execution_time(execution.m_time))
 
     def __orderUpdate(self, orderId, instrument, status, filled, remaining, avgFillPrice, lastFillPrice):
         """Handles order updates from IBConnection. Processes its status and notifies the strategy's __onOrderUpdate()"""
@@ -248,31 +501,46 @@ class Broker(broker.Broker):
                 log.debug("Order %d partially complete. Instr: %s, cnt: %d, remaining: %d, avgFillPrice=%.2f, lastFillPrice=%.2f" %
                          (orderId, instrument, filled, remaining, avgFillPrice, lastFillPrice))
 
+    def getSnapshot(self):
+        """Returns the :class:`AccountSnapshot` that backs :meth:`getCash`, :meth:`getShares` and :meth:`getEquity`."""
+        return self.__snapshot
+
+    def isSnapshotStale(self):
+        """Returns True if TWS didn't update the account in the last maxSnapshotAge seconds."""
+        age = self.__snapshot.getAge()
+        return age is None or age > self.__maxSnapshotAge
+
     def getCash(self):
         """Returns the amount of cash."""
-        return self.__ibConnection.getCash()
+        return self.__snapshot.getCash()
 
     def setCash(self, cash):
         """Setting cash on real broker account. Quite impossible :)"""
         raise Exception("Setting cash on a real broker account? Please visit your bank.")
 
     def getShares(self, instrument):
-        return self.__ibConnection.getShares(instrument)
+        return self.__snapshot.getShares(instrument)
+
+    def getPositions(self):
+        return self.__snapshot.getPositions()
 
     def getEquity(self):
-        return self.__ibConnection.getNetLiquidation()
+        return self.__snapshot.getNetLiquidation()
 
     def getAvgCost(self, instrument):
-        return self.__ibConnection.getAvgCost(instrument)
+        return self.__snapshot.getAvgCost(instrument)
 
     def getTotalCost(self, instrument):
-        return self.__ibConnection.getAvgCost(instrument) * self.__ibConnection.getShares(instrument)
+        return self.__snapshot.getAvgCost(instrument) * self.__snapshot.getShares(instrument)
 
     def getLeverage(self):
-        return self.__ibConnection.getLeverage()
+        return self.__snapshot.getLeverage()
 
     def start(self):
-        pass
+        # Subscribe again if loaded from a checkpoint.
+        if self.__snapshot is None:
+            self.__cash = self.__ibConnection.getCash()
+            self.__subscribe()
 
     def stop(self):
         pass
@@ -281,12 +549,13 @@ class Broker(broker.Broker):
         pass
 
     def stopDispatching(self):
-        # If there are no more events in the barfeed, then there is nothing left for us to do
-        return self.__barFeed.stopDispatching()
+        # If there are no more events in the barfeed and all the orders were sent, then there is nothing left for us to do
+        return self.__barFeed.stopDispatching() and self.__orderQueue.getQueueSize() == 0
 
     def dispatch(self):
-        # All events were already emitted while handling barfeed events.
-        pass
+        # All events were already emitted while handling barfeed events. Send the orders that were held back by the
+        # message rate.
+        self.__orderQueue.flush()
 
     def placeOrder(self, order):
         """Submits an order.
@@ -335,13 +604,15 @@ class Broker(broker.Broker):
         totalQty = order.getQuantity()
 
         orderId_ = order.getOrderId()
-        orderId_ = self.__ibConnection.createOrder(instrument, action, lmtPrice, auxPrice, orderType, totalQty, minQty,
-                                                   tif, goodTillDate, trailingPct=0, trailStopPrice=0, transmit=True,
-                                                   whatif=False, orderId=orderId_)
-
-        order.setOrderId(orderId_)
+        if orderId_ is None:
+            orderId_ = self.__ibConnection.getNextOrderId()
+            order.setOrderId(orderId_)
 
         self.__orders[orderId_] = order
+        self.__orderQueue.placeOrder(orderId_, instrument, action, lmtPrice, auxPrice, orderType, totalQty, minQty, tif,
+                                     goodTillDate)
+        if not self.__processingBars:
+            self.__orderQueue.flush()
         return orderId_
 
     def createMarketOrder(self, action, instrument, quantity, onClose=False, goodTillCanceled=False):
@@ -363,6 +634,11 @@ class Broker(broker.Broker):
         if order.getOrderId() is None:
             raise Exception("Can't cancel order which was not submitted")
 
-        self.__ibConnection.cancelOrder(order.getOrderId())
+        if not self.__orderQueue.cancelOrder(order.getOrderId()):
+            # The order was still queued, so it never reached TWS.
+            order.setState(broker.Order.State.CANCELED)
+            self.getOrderUpdatedEvent().emit(self, order)
+        elif not self.__processingBars:
+            self.__orderQueue.flush()
 
 # vim: noet:ci:pi:sts=0:sw=4:ts=4
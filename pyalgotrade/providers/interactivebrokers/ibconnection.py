@@ -24,7 +24,6 @@
 """
 
 import threading, copy
-from time import sleep
 from datetime import datetime
 import pytz
 
@@ -33,6 +32,8 @@ from collections import defaultdict
 from pyalgotrade import observer
 
 from ibbar import Bar
+import ibbarbuilder
+import ibpacing
 
 from ib.ext.EWrapper import EWrapper
 from ib.ext.EClientSocket import EClientSocket
@@ -46,6 +47,11 @@ log = logging.getLogger(__name__)
 
 TIMEOUT = 15.0 # seconds
 
+# Seconds to wait before reissuing a historical data request rejected for a pacing violation
+HISTORICAL_DATA_RETRY_DELAY = 30
+# Times a historical data request is reissued after a pacing violation before giving up
+HISTORICAL_DATA_MAX_RETRIES = 3
+
 class FieldStore(object):
     __slots__ = ()  # Override this to create a custom field store
     def __init__(self):
@@ -67,6 +73,129 @@ class RTVolume(FieldStore):
 class IBConnectionException(Exception):
     pass
 
+class TickerIdRegistry(object):
+    '''Bidirectional mapping between tickerIds and instruments, so that callbacks can find the instrument
+    for a tickerId (and subscriptions the tickerId for an instrument) in constant time.'''
+
+    def __init__(self):
+        self.__instruments = {}
+        self.__tickerIds = {}
+
+    def __len__(self):
+        return len(self.__instruments)
+
+    def add(self, tickerId, instrument):
+        assert(tickerId not in self.__instruments)
+        assert(instrument not in self.__tickerIds)
+        self.__instruments[tickerId] = instrument
+        self.__tickerIds[instrument] = tickerId
+
+    def removeInstrument(self, instrument):
+        """Removes an instrument and returns its tickerId."""
+        tickerId = self.__tickerIds.pop(instrument)
+        del self.__instruments[tickerId]
+        return tickerId
+
+    def hasInstrument(self, instrument):
+        return instrument in self.__tickerIds
+
+    def getInstrument(self, tickerId, default=None):
+        return self.__instruments.get(tickerId, default)
+
+    def getTickerId(self, instrument, default=None):
+        return self.__tickerIds.get(instrument, default)
+
+class HistoricalDataRequest(object):
+    '''A historical data request that may still be waiting for data.
+    Returned by :meth:`Connection.submitHistoricalDataRequest`.'''
+
+    def __init__(self, instrument, secType, exchange, currency, endTime, duration, barSize, whatToShow, useRTH):
+        self.__instrument = instrument
+        self.__contract = Contract()
+        self.__contract.m_symbol = instrument
+        self.__contract.m_secType = secType
+        self.__contract.m_exchange = exchange
+        self.__contract.m_currency = currency
+        self.__endTime = endTime
+        self.__duration = duration
+        self.__barSize = barSize
+        self.__whatToShow = whatToShow
+        self.__useRTH = useRTH
+        self.__contractKey = (instrument, secType, exchange, currency, whatToShow)
+        self.__requestKey = self.__contractKey + (endTime, duration, barSize, useRTH)
+
+        self.__bars = []
+        self.__error = None
+        self.__retries = 0
+        self.__done = threading.Event()
+
+    def getInstrument(self):
+        return self.__instrument
+
+    def getContract(self):
+        return self.__contract
+
+    def getEndTime(self):
+        return self.__endTime
+
+    def getDuration(self):
+        return self.__duration
+
+    def getBarSize(self):
+        return self.__barSize
+
+    def getWhatToShow(self):
+        return self.__whatToShow
+
+    def getUseRTH(self):
+        return self.__useRTH
+
+    def getContractKey(self):
+        """Returns a key shared by the requests for the same contract, exchange and tick type."""
+        return self.__contractKey
+
+    def getRequestKey(self):
+        """Returns a key shared by identical requests."""
+        return self.__requestKey
+
+    def getRetries(self):
+        return self.__retries
+
+    def addRetry(self):
+        self.__retries += 1
+
+    def addBar(self, bar):
+        self.__bars.append(bar)
+
+    def setFinished(self):
+        self.__done.set()
+
+    def setError(self, errorCode, errorString):
+        self.__bars = None
+        self.__error = (errorCode, errorString)
+        self.__done.set()
+
+    def isDone(self):
+        """Returns True if all the data was received or the request failed."""
+        return self.__done.is_set()
+
+    def wait(self, timeout=None):
+        """Waits until the request is done. Returns True if the request is done.
+
+        :param timeout: The maximum number of seconds to wait, or None to wait until the request is done.
+        :type timeout: float
+        """
+        self.__done.wait(timeout)
+        return self.__done.is_set()
+
+    def getBars(self):
+        """Returns the list of Bar instances, or None if the request failed."""
+        return self.__bars
+
+    def getError(self):
+        """Returns an (errorCode, errorString) tuple if the request failed, or None otherwise."""
+        return self.__error
+
 class Connection(EWrapper):
     '''Wrapper class for Interactive Brokers TWS Connection.
 
@@ -102,6 +231,7 @@ class Connection(EWrapper):
 
         # Unique Ticker ID stream for each TWS Request
         self.__tickerId = 0
+        self.__tickerIdLock = threading.Lock()
 
         # Unique Order ID for each TWS Order
         # Initial value is set by nextValidId() callback
@@ -111,14 +241,17 @@ class Connection(EWrapper):
         self.__orderIds = {}
 
         self.__currentTicks = defaultdict(IBTicks)
-        self.__marketDataTickerIDs = {}
-        self.__marketData = defaultdict(list)
+        # Registry of market data tickerIds and instruments
+        self.__marketDataTickerIDs = TickerIdRegistry()
+        # Builds bars out of the trades received as market data
         self.__marketDataEmitFrequency = 5 # in seconds
+        self.__marketDataBarBuilder = ibbarbuilder.TickBarBuilder(self.__marketDataEmitFrequency)
+        self.__marketDataBarBuilder.getNewBarEvent().subscribe(self.__onMarketDataBar)
         self.__marketDataEvents = {}
         self.__marketDataListeners = {}
 
-        # Dictionary to map instruments to realtime bar tickerIds
-        self.__realtimeBarIDs = {}
+        # Registry of realtime bar tickerIds and instruments
+        self.__realtimeBarIDs = TickerIdRegistry()
 
         # Dictionary to map instruments to realtime bar observer events
         self.__realtimeBarEvents = {}
@@ -126,20 +259,18 @@ class Connection(EWrapper):
         # Number of active listeners for the realtime stream
         self.__realtimeBarListeners = {}
 
-        # Dictionary to map instruments to historical data tickerIds
-        self.__historicalDataTickerIds = {}
-
-        # List to buffer historical data which is produced by
-        # historicalData(), consumed by requestHistoricalData()
-        self.__historicalDataBuffer = []
+        # Dictionary to map historical data tickerIds to HistoricalDataRequest instances.
+        # Entries are removed once the request is done.
+        self.__historicalDataRequests = {}
 
-        # Bool to mark completion of historical data receiving
-        self.__historicalDataReceived = False
+        # Dictionary to map HistoricalDataRequest instances waiting to be reissued to their timers.
+        self.__historicalDataRetries = {}
+        self.__historicalDataRetriesLock = threading.Lock()
 
-        # Lock for the historicalDataBuffer
-        self.__historicalDataLock = threading.Condition()
+        # Delays historical data requests to avoid pacing violations
+        self.__historicalDataPacer = ibpacing.HistoricalDataPacer()
 
-        # Dictionary to map instruments to tickerIds for market scanner
+        # Dictionary to map market scanner tickerIds to scan codes
         self.__marketScannerIDs = {}
 
         # Lock for the historicalDataBuffer
@@ -161,6 +292,11 @@ class Connection(EWrapper):
         # Observer for Order Updates
         self.__orderUpdateHandler = observer.Event()
 
+        # Observers for account values, portfolio updates and executions
+        self.__accountValueEvent = observer.Event()
+        self.__portfolioEvent = observer.Event()
+        self.__executionEvent = observer.Event()
+
         # Create EClientSocket for TWS Connection
         if eClientSocket is None:
             self.__tws = EClientSocket(self)
@@ -171,10 +307,19 @@ class Connection(EWrapper):
         self.__connected = False
         self.__accountUpdatesSubscribed = False
 
+    def __getstate__(self):
+        raise IBConnectionException("Connections can't be saved in checkpoints. Supply the connection in the externals "
+                                    "argument of pyalgotrade.strategy.Strategy.saveCheckpoint instead")
+
     def __getNextTickerId(self):
         """Returns the next unique Ticker ID"""
-        tickerId = copy.copy(self.__tickerId)
-        self.__tickerId += 1
+        # Historical data requests may be reissued from other threads
+        self.__tickerIdLock.acquire()
+        try:
+            tickerId = copy.copy(self.__tickerId)
+            self.__tickerId += 1
+        finally:
+            self.__tickerIdLock.release()
         return tickerId
 
     def __getNextOrderId(self):
@@ -183,6 +328,11 @@ class Connection(EWrapper):
         self.__orderId += 1
         return orderId
 
+    def getNextOrderId(self):
+        """Reserves an Order ID to be used with createOrder() later on."""
+        self.connect()
+        return self.__getNextOrderId()
+
     def connect(self):
         """Initiates TWS Connection"""
         if not self.__connected:
@@ -309,6 +459,22 @@ class Connection(EWrapper):
         self.connect()
         self.__orderUpdateHandler.subscribe(handler)
 
+    def subscribeAccountUpdates(self, accountValueHandler, portfolioHandler, executionHandler):
+        """Subscribes handlers for account values, portfolio updates and executions, and subscribes for account updates.
+
+        :param accountValueHandler: Function called with (key, value, currency, accountName) from updateAccountValue().
+        :type accountValueHandler: Function
+        :param portfolioHandler: Function called with (instrument, position, marketPrice, marketValue, avgCost, accountName)
+                                 from updatePortfolio().
+        :type portfolioHandler: Function
+        :param executionHandler: Function called with (orderId, instrument, execution) from execDetails().
+        :type executionHandler: Function
+        """
+        self.__accountValueEvent.subscribe(accountValueHandler)
+        self.__portfolioEvent.subscribe(portfolioHandler)
+        self.__executionEvent.subscribe(executionHandler)
+        self.requestAccountUpdate()
+
     def subscribeRealtimeBars(self, instrument, handler,
                                                       secType='STK', exchange='SMART', currency='USD',
                                                       barSize=5, whatToShow='TRADES', useRTH=True):
@@ -339,10 +505,10 @@ class Connection(EWrapper):
         :type useRTH: bool
         """
         self.connect()
-        if instrument not in self.__realtimeBarIDs:
+        if not self.__realtimeBarIDs.hasInstrument(instrument):
             # Register the tickerId with the instrument name
             tickerId = self.__getNextTickerId()
-            self.__realtimeBarIDs[instrument] = tickerId
+            self.__realtimeBarIDs.add(tickerId, instrument)
 
             # Prepare the contract
             contract = Contract()
@@ -373,14 +539,13 @@ class Connection(EWrapper):
         :type handler: Function
         """
         self.connect()
-        if instrument in self.__realtimeBarIDs:
+        if self.__realtimeBarIDs.hasInstrument(instrument):
             self.__realtimeBarEvents[instrument].unsubscribe(handler)
             self.__realtimeBarListeners[instrument] -= 1
 
             if self.__realtimeBarListeners[instrument] == 0:
-                tickerId = self.__realtimeBarIDs[instrument]
+                tickerId = self.__realtimeBarIDs.removeInstrument(instrument)
                 self.__tws.cancelRealTimeBars(tickerId)
-                del self.__realtimeBarIDs[instrument]
 
         else:
             # Instrument was not subscribed, ignore
@@ -389,15 +554,9 @@ class Connection(EWrapper):
     def subscribeMarketBars(self, instrument, handler, secType='STK', exchange='SMART', currency='USD', ):
         self.connect()
 
-        found = False
-        for value in self.__marketDataTickerIDs.values():
-            if instrument == value:
-                found = True
-                break
-
-        if not found:
+        if not self.__marketDataTickerIDs.hasInstrument(instrument):
             tickerId = self.__getNextTickerId()
-            self.__marketDataTickerIDs[tickerId] = instrument
+            self.__marketDataTickerIDs.add(tickerId, instrument)
 
             contract = Contract()
             contract.m_symbol   = instrument
@@ -425,22 +584,24 @@ class Connection(EWrapper):
         :type handler: Function
         """
         self.connect()
-        if instrument in self.__marketDataTickerIDs:
+        if self.__marketDataTickerIDs.hasInstrument(instrument):
             self.__marketDataEvents[instrument].unsubscribe(handler)
             self.__marketDataListeners[instrument] -= 1
 
             if self.__marketDataListeners[instrument] == 0:
-                tickerId = self.__marketDataTickerIDs[instrument]
+                tickerId = self.__marketDataTickerIDs.removeInstrument(instrument)
+                self.__marketDataBarBuilder.removeInstrument(instrument)
                 self.__tws.cancelMktData(tickerId)
-                del self.__marketDataTickerIDs[instrument]
         else:
             # Instrument was not subscribed, ignore
             pass
 
-    def requestHistoricalData(self, instrument, endTime, duration, barSize,
+    def submitHistoricalDataRequest(self, instrument, endTime, duration, barSize,
                                                       secType='STK', exchange='SMART', currency='USD',
                                                       whatToShow='TRADES', useRTH=0):
-        """Requests historical data. The historical bars are returned as a list of Bar instances.
+        """Requests historical data without waiting for it, so that many requests can be in flight at the same time.
+        Requests are delayed, if needed, to comply with the TWS pacing rules, and requests rejected for a pacing
+        violation are reissued automatically.
 
         :param instrument: Instrument's symbol
         :type instrument: str
@@ -471,65 +632,83 @@ class Connection(EWrapper):
                                    1: Only data within the regular trading hours is returned, even if the requested time span
                                    falls partially or completely outside of the RTH.
         :type useRTH: int
-        :param formatDate: Determines the date format applied to returned bars. Valid values include:
-                                           1: Dates applying to bars returned in the format: yyyymmdd{space}{space}hh:mm:dd .
-                                           2: Dates are returned as a long integer specifying the number of seconds since 1/1/1970 GMT .
+
+        :rtype: :class:`HistoricalDataRequest`
         """
         self.connect()
 
+        request = HistoricalDataRequest(instrument, secType, exchange, currency, endTime, duration, barSize, whatToShow, useRTH)
+        self.__sendHistoricalDataRequest(request)
+        return request
+
+    def requestHistoricalData(self, instrument, endTime, duration, barSize,
+                                                      secType='STK', exchange='SMART', currency='USD',
+                                                      whatToShow='TRADES', useRTH=0):
+        """Requests historical data and waits for it. The historical bars are returned as a list of Bar instances,
+        or None if the request failed, in which case :meth:`getError` returns the error. The parameters are the same as
+        in :meth:`submitHistoricalDataRequest`.
+        """
         self.clearError()
+        request = self.submitHistoricalDataRequest(instrument, endTime, duration, barSize, secType, exchange, currency, whatToShow, useRTH)
+        request.wait()
+        return request.getBars()
+
+    def __sendHistoricalDataRequest(self, request):
+        # Blocks until the request can be made without violating the pacing rules
+        self.__historicalDataPacer.acquire(request.getContractKey(), request.getRequestKey())
+
+        # The connection may have been closed while waiting. TWS would report that without a tickerId.
+        if not self.__tws.isConnected():
+            self.__historicalDataPacer.release()
+            request.setError(None, "Not connected")
+            return
 
         # Get a unique tickerId for the request
         tickerId = self.__getNextTickerId()
-        self.__historicalDataTickerIds[tickerId] = instrument
-
-        # Prepare the Contract for the historical data order
-        contract = Contract()
-        contract.m_symbol = instrument
-        contract.m_secType = secType
-        contract.m_exchange = exchange
-        contract.m_currency = currency
+        self.__historicalDataRequests[tickerId] = request
 
         # Set up requested date format:
         # Dates are returned as a long integer specifying the number of seconds since 1/1/1970 GMT .
         formatDate = 2
 
-        # Request historical data
-        self.__historicalDataBuffer = []
-        self.__historicalDataReceived = False
-        self.__tws.reqHistoricalData(tickerId, contract, endTime, duration, barSize, whatToShow, useRTH, formatDate)
-
-        while not self.__historicalDataReceived:
-            # Wait for the result to appear in the buffer
-            self.__historicalDataLock.acquire()
-            self.__historicalDataLock.wait(TIMEOUT)
-            self.__historicalDataLock.release()
-
-            err = self.getError()
-            self.clearError()
-            if err is None or err['tickerId'] is None or err['tickerId'] != tickerId:
-                continue
-            else:
-                if err['errorCode'] == 162:
-                # Historical data request pacing violation
-                # Wait 30 secs and reissue the request
-                    log.warning("Violated the historical data pace requirements, retry in 30 secs")
-                    sleep(30)
-                    tickerId = self.__getNextTickerId()
-                    self.__historicalDataTickerIds[tickerId] = instrument
-                    self.__tws.reqHistoricalData(tickerId, contract, endTime, duration, barSize, whatToShow, useRTH, formatDate)
-                    continue
-                elif err['errorCode'] == 200:
-                    # No security definition has been found for the request
-                    return None
-                else:
-                    print err
-                    return None
-
-        # Copy the downloaded historical data and empty the buffer
-        historicalData = copy.copy(self.__historicalDataBuffer)
-
-        return historicalData
+        self.__tws.reqHistoricalData(tickerId, request.getContract(), request.getEndTime(), request.getDuration(),
+                                                                 request.getBarSize(), request.getWhatToShow(), request.getUseRTH(), formatDate)
+
+    def __onHistoricalDataError(self, tickerId, errorCode, errorString):
+        # 165: Historical Market Data Service query message. Informational only.
+        if errorCode == 165 or errorCode >= 1000:
+            return
+
+        request = self.__historicalDataRequests.pop(tickerId)
+        self.__historicalDataPacer.release()
+
+        if errorCode == 162 and errorString is not None and errorString.find("no data") != -1:
+            # The query returned no data, which is not an error for the caller.
+            request.setFinished()
+        elif errorCode == 162 and request.getRetries() < HISTORICAL_DATA_MAX_RETRIES:
+            # Historical data request pacing violation. Reissue the request later without blocking this thread.
+            log.warning("Violated the historical data pace requirements, retry in %d secs" % HISTORICAL_DATA_RETRY_DELAY)
+            request.addRetry()
+            timer = threading.Timer(HISTORICAL_DATA_RETRY_DELAY, self.__retryHistoricalDataRequest, [request])
+            timer.daemon = True
+            self.__historicalDataRetriesLock.acquire()
+            try:
+                self.__historicalDataRetries[request] = timer
+            finally:
+                self.__historicalDataRetriesLock.release()
+            timer.start()
+        else:
+            request.setError(errorCode, errorString)
+
+    def __retryHistoricalDataRequest(self, request):
+        # The retry is abandoned if the connection was closed in the meantime.
+        self.__historicalDataRetriesLock.acquire()
+        try:
+            pending = self.__historicalDataRetries.pop(request, None) is not None
+        finally:
+            self.__historicalDataRetriesLock.release()
+        if pending:
+            self.__sendHistoricalDataRequest(request)
 
     def requestMarketScanner(self, numberOfRows=10,
                                                      scanCode='TOP_PERC_GAIN', stockTypeFilter='STOCK',
@@ -586,6 +765,7 @@ class Connection(EWrapper):
         self.connect()
 
         tickerId = self.__getNextTickerId()
+        self.__marketScannerIDs[tickerId] = scanCode
 
         subscript = ScannerSubscription()
         subscript.numberOfRows(numberOfRows)
@@ -603,6 +783,7 @@ class Connection(EWrapper):
         self.__marketScannerLock.release()
 
         self.__tws.cancelScannerSubscription(tickerId)
+        del self.__marketScannerIDs[tickerId]
 
         marketScannerData = copy.copy(self.__marketScannerBuffer)
         self.__marketScannerBuffer = []
@@ -617,6 +798,9 @@ class Connection(EWrapper):
             self.__tws.reqAccountUpdates(True, self.__accountCode)
             self.__accountUpdatesSubscribed = True
 
+    def getAccountCode(self):
+        return self.__accountCode
+
     def getCash(self, currency='USD'):
         """Returns the cash (TotalCashBalance) available for the currency."""
         self.requestAccountUpdate()
@@ -672,26 +856,25 @@ class Connection(EWrapper):
     # EWrapper callbacks
     ########################################################################################
     def historicalData(self, tickerId, date, open_, high, low, close, volume, tradeCount, vwap, hasGaps):
+        # Ignore data for requests that were already abandoned (ie. reissued after a pacing violation).
+        request = self.__historicalDataRequests.get(tickerId)
+        if request is None:
+            log.debug("Historical data received for unregistered tickerId: %s" % tickerId)
+            return
+
         # EOD is signaled in the date variable, eg.:
         # date='finished-20120628  00:00:00-20120630  00:00:00'
         if date.find("finished") != -1:
-            self.__historicalDataReceived = True
-
-            # Signal the requestHistoricalData
-            self.__historicalDataLock.acquire()
-            self.__historicalDataLock.notify()
-            self.__historicalDataLock.release()
-
+            del self.__historicalDataRequests[tickerId]
+            self.__historicalDataPacer.release()
+            request.setFinished()
             return
 
         # Returned data is in Unix time, convert it to UTC with TZ info
         dt = datetime.utcfromtimestamp(int(date)).replace(tzinfo=pytz.utc)
 
-        # Create the bar
-        bar = Bar(dt, open_, high, low, close, volume, vwap, tradeCount)
-
-        # Append it to the buffer
-        self.__historicalDataBuffer.append(bar)
+        # Create the bar and append it to the request buffer
+        request.addBar(Bar(dt, open_, high, low, close, volume, vwap, tradeCount))
 
     def realtimeBar(self, tickerId, time_, open_, high, low, close, volume, vwap, tradeCount):
         """
@@ -725,11 +908,7 @@ class Connection(EWrapper):
         dt = datetime.utcfromtimestamp(time_).replace(tzinfo=pytz.utc)
 
         # Look up the instrument's name based on its tickerId
-        instrument = None
-        for i in self.__realtimeBarIDs:
-            if self.__realtimeBarIDs[i] == tickerId:
-                instrument = i
-                break
+        instrument = self.__realtimeBarIDs.getInstrument(tickerId)
 
         if instrument:
             bar = Bar(dt,open_, high, low, close, volume, vwap, tradeCount)
@@ -738,7 +917,7 @@ class Connection(EWrapper):
             instrumentBar = (instrument, bar)
             self.__realtimeBarEvents[instrument].emit(instrumentBar)
         else:
-            log.warning("Realtime bar received for unregistered instrument: %s" % instrument)
+            log.warning("Realtime bar received for unregistered tickerId: %s" % tickerId)
 
     def scannerData(self, reqId, rank, contractDetails, distance, benchmark, projection, legsStr=False):
         """
@@ -762,6 +941,10 @@ class Connection(EWrapper):
         :type legsStr: str
         """
 
+        if reqId not in self.__marketScannerIDs:
+            log.debug("Market scanner data received for unregistered tickerId: %s" % reqId)
+            return
+
         msd = { 'instrument': contractDetails.m_summary.m_symbol, 'secType': contractDetails.m_summary.m_secType,
                         'rank': rank, 'distance': distance, 'benchmark': benchmark, 'projection': projection,
                         'legsStr': legsStr }
@@ -819,6 +1002,8 @@ class Connection(EWrapper):
         self.__accUpdateLock.notify()
         self.__accUpdateLock.release()
 
+        self.__accountValueEvent.emit(key, value, currency, accountName)
+
     def updatePortfolio(self, contract, position, marketPrice, marketValue,
                                             avgCost, unrealizedPNL, realizedPNL, accountName):
         """
@@ -873,6 +1058,8 @@ class Connection(EWrapper):
         self.__portfolioLock.notify()
         self.__portfolioLock.release()
 
+        self.__portfolioEvent.emit(instrument, position, marketPrice, marketValue, avgCost, accountName)
+
     def accountDownloadEnd(self, accountName):
         pass
 
@@ -951,7 +1138,9 @@ class Connection(EWrapper):
         :type liquidation: Not documented
 
         """
-        pass
+        log.debug("execDetails: orderId: %s, instrument: %s, side: %s, shares: %s, price: %s" %
+                  (orderId, contract.m_symbol, execution.m_side, execution.m_shares, execution.m_price))
+        self.__executionEvent.emit(orderId, contract.m_symbol, execution)
 
     def execDetailsEnd(self, reqId):
         """This function is called once all executions have been sent to a client in response to reqExecutions().
@@ -982,10 +1171,10 @@ class Connection(EWrapper):
         self.__error['errorString'] = errorString
 
         # Try to find stock for tickerID
-        if tickerId in self.__marketDataTickerIDs:
-            instr = self.__marketDataTickerIDs[tickerId]
-        else:
-            instr = 'UNKNOWN'
+        instr = self.__getRequestName(tickerId)
+
+        if tickerId in self.__historicalDataRequests:
+            self.__onHistoricalDataError(tickerId, errorCode, errorString)
 
         if 0 <= errorCode < 1000:
             # Errors
@@ -1006,6 +1195,19 @@ class Connection(EWrapper):
         if tickerId != -1:
             log.error( 'error: %s, %s, %s' %(tickerId, errorCode, errorString))
 
+    def __getRequestName(self, tickerId):
+        """Returns the instrument (or scan code) associated with a tickerId, or UNKNOWN."""
+        ret = self.__marketDataTickerIDs.getInstrument(tickerId)
+        if ret is None:
+            ret = self.__realtimeBarIDs.getInstrument(tickerId)
+        if ret is None:
+            request = self.__historicalDataRequests.get(tickerId)
+            if request is not None:
+                ret = request.getInstrument()
+        if ret is None:
+            ret = self.__marketScannerIDs.get(tickerId, 'UNKNOWN')
+        return ret
+
     def clearError(self):
         """Clears the error dictionary.
         Keys: tickerId, errorCode, errorString
@@ -1026,6 +1228,22 @@ class Connection(EWrapper):
         """Connection closed handler for the IB Connection."""
         log.error("Connection closed")
 
+        # Historical data requests in flight, or waiting to be reissued, will never finish
+        for tickerId, request in self.__historicalDataRequests.items():
+            del self.__historicalDataRequests[tickerId]
+            self.__historicalDataPacer.release()
+            request.setError(None, "Connection closed")
+
+        self.__historicalDataRetriesLock.acquire()
+        try:
+            retries = self.__historicalDataRetries.items()
+            self.__historicalDataRetries.clear()
+        finally:
+            self.__historicalDataRetriesLock.release()
+        for request, timer in retries:
+            timer.cancel()
+            request.setError(None, "Connection closed")
+
     def tickPrice(self, tickerId, field, price, canAutoExecute):
         self.__processTick(int(tickerId), tickType=field, value=price)
 
@@ -1043,7 +1261,10 @@ class Connection(EWrapper):
         if tickType not in (4, 8, 45, 46, 48, 54):
             return
 
-        instr = self.__marketDataTickerIDs[tickerId]
+        instr = self.__marketDataTickerIDs.getInstrument(tickerId)
+        if instr is None:
+            # Ticks may still arrive for a while after cancelling the subscription.
+            return
 
         if tickType == 45:  # LAST_TIMESTAMP
             dt = datetime.utcfromtimestamp(int(value))
@@ -1056,6 +1277,7 @@ class Connection(EWrapper):
             self.__currentTicks[instr].tradeCount = int(value)
         elif tickType == 46:  # SHORTABLE
             self.__currentTicks[instr].shortable = float(value)
+            self.__marketDataBarBuilder.setShortable(instr, float(value))
         elif tickType == 48:
             # Format:
             # Last trade price; Last trade size;Last trade time;Total volume;VWAP;Single trade flag
@@ -1075,33 +1297,17 @@ class Connection(EWrapper):
             rtVolume.vwap = float(VWAP)
             rtVolume.singleTradeFlag = singleTradeFlag
 
-            self.__marketData[instr].append(rtVolume)
-
-            if len(self.__marketData[instr]) > 2:
-                timeRange = self.__marketData[instr][-1].lastTradeTime - self.__marketData[instr][0].lastTradeTime
-                if timeRange >= self.__marketDataEmitFrequency:
-                    self.__emitTicks(instr)
-
-    def __emitTicks(self, instr):
-        if len(self.__marketData[instr]) > 2:
-            dt = datetime.utcfromtimestamp(self.__marketData[instr][0].lastTradeTime).replace(tzinfo=pytz.utc)
-            open_ = self.__marketData[instr][0].lastTradePrice
-            high = max([e.lastTradePrice for e in self.__marketData[instr]])
-            low = min([e.lastTradePrice for e in self.__marketData[instr]])
-            close = self.__marketData[instr][0].lastTradePrice
-            volume = self.__marketData[instr][-1].totalVolume - self.__marketData[instr][0].totalVolume
-            vwap = sum([e.vwap for e in self.__marketData[instr]]) / len(self.__marketData[instr])
-            tradeCount = sum([e.lastTradeSize for e in self.__marketData[instr]])
-            shortable = self.__currentTicks[instr].shortable
-
-            self.__marketData[instr] = []
-
-            bar = Bar(dt, open_, high, low, close, volume, vwap, tradeCount, shortable)
+            self.__marketDataBarBuilder.addTick(instr, rtVolume.lastTradeTime, rtVolume.lastTradePrice, rtVolume.lastTradeSize)
+            # Complete the bars for the other instruments on exchange time boundaries
+            self.__marketDataBarBuilder.closeBars(rtVolume.lastTradeTime)
 
-            log.debug("Market Data %s: %s", instr, bar)
+    def __onMarketDataBar(self, instrumentBar):
+        instr, bar = instrumentBar
+        log.debug("Market Data %s: %s", instr, bar)
 
-            instrumentBar = (instr, bar)
-            self.__marketDataEvents[instr].emit(instrumentBar)
+        event = self.__marketDataEvents.get(instr)
+        if event is not None:
+            event.emit(instrumentBar)
 
 
 # vim: noet:ci:pi:sts=0:sw=4:ts=4
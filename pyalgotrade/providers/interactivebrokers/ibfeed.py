@@ -23,7 +23,12 @@ from pyalgotrade.providers.interactivebrokers import ibbar
 
 import pytz
 import datetime
-from threading import Lock
+import time
+import threading
+import collections
+
+import logging
+log = logging.getLogger(__name__)
 
 ######################################################################
 ## Interactive Brokers CSV parser
@@ -92,8 +97,43 @@ class CSVFeed(csvfeed.BarFeed):
         csvfeed.BarFeed.addBarsFromCSV(self, instrument, path, rowParser)
 
 
+class DropPolicy:
+    """What :class:`LiveFeed` does with a new set of bars when its queue is full."""
+
+    #: Block the TWS reader thread until there is room in the queue.
+    BLOCK = 1
+    #: Drop the oldest bars in the queue.
+    DROP_OLDEST = 2
+    #: Drop the new bars.
+    DROP_NEWEST = 3
+
 class LiveFeed(BarFeed):
-    def __init__(self, ibConnection, timezone=pytz.utc, barsToInject=None):
+    """A :class:`pyalgotrade.barfeed.BarFeed` that receives bars from TWS.
+
+    :param ibConnection: The connection to TWS.
+    :type ibConnection: :class:`pyalgotrade.providers.interactivebrokers.ibconnection.Connection`
+    :param timezone: The timezone for the bars.
+    :param barsToInject: A list of dictionaries mapping instruments to bars, to dispatch as soon as their datetime is due.
+    :param maxQueueSize: The maximum number of sets of bars waiting to be dispatched.
+    :type maxQueueSize: int
+    :param dropPolicy: What to do when the queue is full. One of the :class:`DropPolicy` constants.
+    :param maxCoalesceDelay: The maximum number of seconds to wait for bars from other instruments with the same datetime.
+    :type maxCoalesceDelay: float
+    :param dispatchTimeout: The maximum number of seconds :meth:`dispatch` waits for new bars.
+    :type dispatchTimeout: float
+
+    Bars are received in the TWS reader thread and queued, so that the strategy processes them in the thread that
+    calls :meth:`pyalgotrade.strategy.Strategy.run`, and a slow strategy doesn't stall the TWS connection.
+    Bars for different instruments with the same datetime are dispatched together. They are queued once a bar with a
+    later datetime shows up, or once maxCoalesceDelay seconds have passed since the first one was received.
+    Bars older than the ones being coalesced are dropped.
+
+    .. note::
+        When saved in a checkpoint, the connection has to be supplied as an external. The bars waiting to be
+        dispatched are not saved, and the subscriptions are made again on the new connection by :meth:`start`.
+    """
+
+    def __init__(self, ibConnection, timezone=pytz.utc, barsToInject=None, maxQueueSize=1000, dropPolicy=DropPolicy.DROP_OLDEST, maxCoalesceDelay=1, dispatchTimeout=0.1):
         BarFeed.__init__(self, Frequency.SECOND)
 
         # The zone specifies the offset from Coordinated Universal Time (UTC)
@@ -101,58 +141,212 @@ class LiveFeed(BarFeed):
 
         # Connection to the IB's TWS
         self.__ibConnection = ibConnection
+        # Subscriptions, to make them again once loaded from a checkpoint.
+        self.__realtimeBars = {}
+        self.__marketBars = set()
+        self.__subscribed = True
 
-        self.__newBarsEventLock = Lock()
         self.__running = True
 
         self.__barsToInject = barsToInject
 
+        self.__maxQueueSize = maxQueueSize
+        self.__dropPolicy = dropPolicy
+        self.__maxCoalesceDelay = maxCoalesceDelay
+        self.__dispatchTimeout = dispatchTimeout
+        # Bar dictionaries ready to be dispatched, along with the time they were queued.
+        self.__queue = collections.deque()
+        self.__queueLock = threading.Condition()
+        # Bars with the same datetime waiting for the bars from other instruments.
+        self.__coalescingDateTime = None
+        self.__coalescingBars = {}
+        self.__coalescingSince = None
+
+        # Stats
+        self.__droppedBars = 0
+        self.__lateBars = 0
+        self.__dispatchedBars = 0
+        self.__totalLatency = 0.0
+        self.__maxLatency = 0.0
+
+    def __getstate__(self):
+        ret = self.__dict__.copy()
+        # The queued bars will be stale by the time the checkpoint is loaded.
+        for name in ("queue", "queueLock", "coalescingDateTime", "coalescingBars", "coalescingSince"):
+            del ret["_LiveFeed__" + name]
+        return ret
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__queue = collections.deque()
+        self.__queueLock = threading.Condition()
+        self.__coalescingDateTime = None
+        self.__coalescingBars = {}
+        self.__coalescingSince = None
+        self.__subscribed = False
+
     def start(self):
-        pass
+        # Subscribe again if loaded from a checkpoint.
+        if not self.__subscribed:
+            for instrument, useRTH_ in self.__realtimeBars.iteritems():
+                self.__ibConnection.subscribeRealtimeBars(instrument, self.onIBBar, useRTH=useRTH_)
+            for instrument in self.__marketBars:
+                self.__ibConnection.subscribeMarketBars(instrument, self.onIBBar)
+            self.__subscribed = True
 
     def stop(self):
-        self.__running = False
+        self.__queueLock.acquire()
+        try:
+            self.__running = False
+            # The bars being coalesced won't get any company, so queue them for dispatching.
+            self.__flushCoalescingBars()
+            # Wake up the reader thread if it is blocked waiting for room in the queue.
+            self.__queueLock.notifyAll()
+        finally:
+            self.__queueLock.release()
 
     def join(self):
         pass
 
     def stopDispatching(self):
-        return not self.__running
-
-    def dispatch(self):
-        # IB Live feed's dispatch functionality is implemented in onIBBar() method.
-        # Here we only deal with the injectable bars defined by the user
+        # Bars that were queued before stopping are still dispatched.
+        return not self.__running and len(self.__queue) == 0
+
+    # Must be called with the lock held.
+    def __enqueue(self, barDict):
+        # Once stopped, the remaining bars are queued regardless of the size limit.
+        if self.__running and len(self.__queue) >= self.__maxQueueSize:
+            if self.__dropPolicy == DropPolicy.BLOCK:
+                while self.__running and len(self.__queue) >= self.__maxQueueSize:
+                    self.__queueLock.wait()
+            elif self.__dropPolicy == DropPolicy.DROP_OLDEST:
+                self.__queue.popleft()
+                self.__droppedBars += 1
+                log.warning("Bar queue is full, dropping the oldest bars")
+            else:
+                self.__droppedBars += 1
+                log.warning("Bar queue is full, dropping the newest bars")
+                return
+        self.__queue.append((barDict, time.time()))
+        self.__queueLock.notifyAll()
+
+    # Must be called with the lock held.
+    def __flushCoalescingBars(self):
+        if len(self.__coalescingBars):
+            barDict = self.__coalescingBars
+            self.__coalescingBars = {}
+            self.__coalescingDateTime = None
+            self.__coalescingSince = None
+            self.__enqueue(barDict)
+
+    def __injectBars(self):
         while self.__barsToInject:
             barDict = self.__barsToInject[0]
-            for instr in barDict:
-                barDict_dt = self.__barsToInject[0][instr].getDateTime()
-
-                if barDict_dt <= datetime.datetime.now(tz=barDict_dt.tzinfo):
-                    barDictToEmit = self.__barsToInject.pop(0)
-                    with self.__newBarsEventLock:
-                        barsToEmit = Bars(barDictToEmit)
-                        self.getNewBarsEvent().emit(barsToEmit)
-        return
+            dateTime = barDict.values()[0].getDateTime()
+            if dateTime > datetime.datetime.now(tz=dateTime.tzinfo):
+                break
+            self.__barsToInject.pop(0)
+            self.__queueLock.acquire()
+            try:
+                self.__enqueue(barDict)
+            finally:
+                self.__queueLock.release()
+
+    def fetchNextBars(self):
+        """Returns the next dictionary of bars waiting to be dispatched, waiting up to dispatchTimeout seconds for it.
+        Returns None if there are no bars."""
+        self.__injectBars()
+
+        self.__queueLock.acquire()
+        try:
+            deadline = time.time() + self.__dispatchTimeout
+            while len(self.__queue) == 0:
+                now = time.time()
+                if self.__coalescingSince is not None and now - self.__coalescingSince >= self.__maxCoalesceDelay:
+                    self.__flushCoalescingBars()
+                    break
+                if not self.__running or now >= deadline:
+                    break
+                timeout = deadline - now
+                if self.__coalescingSince is not None:
+                    timeout = min(timeout, self.__coalescingSince + self.__maxCoalesceDelay - now)
+                self.__queueLock.wait(timeout)
+
+            if len(self.__queue) == 0:
+                return None
+
+            barDict, queuedAt = self.__queue.popleft()
+            # Wake up the reader thread if it is blocked waiting for room in the queue.
+            self.__queueLock.notifyAll()
+        finally:
+            self.__queueLock.release()
+
+        latency = time.time() - queuedAt
+        self.__dispatchedBars += 1
+        self.__totalLatency += latency
+        self.__maxLatency = max(self.__maxLatency, latency)
+        return barDict
 
     def subscribeRealtimeBars(self, instrument, useRTH_=0):
         self.__ibConnection.subscribeRealtimeBars(instrument, self.onIBBar, useRTH=useRTH_)
+        self.__realtimeBars[instrument] = useRTH_
         self.registerInstrument(instrument)
 
     def unsubscribeRealtimeBars(self, instrument):
         self.__ibConnection.unsubscribeRealtimeBars(instrument, self.onIBBar)
+        self.__realtimeBars.pop(instrument, None)
         # XXX: Deregistering instrument is not yet possible, missing from BarFeed
 
     def subscribeMarketBars(self, instrument):
         self.__ibConnection.subscribeMarketBars(instrument, self.onIBBar)
+        self.__marketBars.add(instrument)
         self.registerInstrument(instrument)
 
     def unsubscribeMarketBars(self, instrument):
         self.__ibConnection.unsubscribeMarketBars(instrument, self.onIBBar)
+        self.__marketBars.discard(instrument)
 
     def onIBBar(self, instrumentBar):
+        """Receives a bar from TWS. Only queues the bar, which is dispatched later on by :meth:`dispatch`."""
         instrument, bar = instrumentBar
-        with self.__newBarsEventLock:
-            bars = Bars({instrument: bar})
-            self.getNewBarsEvent().emit(bars)
+        dateTime = bar.getDateTime()
+        self.__queueLock.acquire()
+        try:
+            if self.__coalescingDateTime is not None:
+                if dateTime > self.__coalescingDateTime:
+                    self.__flushCoalescingBars()
+                elif dateTime < self.__coalescingDateTime:
+                    self.__lateBars += 1
+                    log.warning("Dropping late bar for %s: %s" % (instrument, dateTime))
+                    return
+
+            if self.__coalescingDateTime is None:
+                self.__coalescingDateTime = dateTime
+                self.__coalescingSince = time.time()
+            self.__coalescingBars[instrument] = bar
+        finally:
+            self.__queueLock.release()
+
+    def getQueueSize(self):
+        """Returns the number of sets of bars waiting to be dispatched."""
+        return len(self.__queue)
+
+    def getDroppedBars(self):
+        """Returns the number of sets of bars dropped because the queue was full."""
+        return self.__droppedBars
+
+    def getLateBars(self):
+        """Returns the number of bars dropped because they were older than the ones being coalesced."""
+        return self.__lateBars
+
+    def getAverageQueueLatency(self):
+        """Returns the average number of seconds the bars waited in the queue before being dispatched."""
+        if self.__dispatchedBars == 0:
+            return 0.0
+        return self.__totalLatency / self.__dispatchedBars
+
+    def getMaxQueueLatency(self):
+        """Returns the maximum number of seconds the bars waited in the queue before being dispatched."""
+        return self.__maxLatency
 
 # vim: noet:ci:pi:sts=0:sw=4:ts=4
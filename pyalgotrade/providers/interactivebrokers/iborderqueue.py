@@ -0,0 +1,173 @@
+# PyAlgoTrade
+#
+# Copyright 2013 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Tibor Kiss <tibor.kiss@gmail.com>
+"""
+
+import collections
+import threading
+import time
+
+import ibpacing
+
+class OrderQueue(object):
+    '''Queues order messages and sends them to TWS without exceeding a message rate.
+
+    :param placeOrder: A function that sends an order to TWS, called with the orderId and the arguments given to
+                       :meth:`placeOrder`.
+    :param cancelOrder: A function that sends a cancel request to TWS, called with the orderId.
+    :param messagesPerSecond: The number of messages that can be sent every second.
+    :type messagesPerSecond: int
+    :param burst: The number of messages that can be sent at once.
+    :type burst: int
+    :param clock: A function that returns the current time in seconds.
+
+    Messages are only sent when :meth:`flush` is called:
+
+     * Cancel requests are sent before orders.
+     * Placing an order that is still queued replaces it, so only the last version is sent.
+     * Canceling an order that is still queued drops it, and nothing is sent.
+
+    The queue can be used from different threads. Messages are sent outside the lock.
+    '''
+
+    def __init__(self, placeOrder, cancelOrder, messagesPerSecond=ibpacing.ORDER_MESSAGES_PER_SECOND,
+                 burst=ibpacing.ORDER_BURST, clock=time.time):
+        self.__placeOrder = placeOrder
+        self.__cancelOrder = cancelOrder
+        self.__clock = clock
+        # Protects the queues, the bucket and the stats.
+        self.__lock = threading.Lock()
+        self.__bucket = ibpacing.TokenBucket(burst, messagesPerSecond, clock)
+        # Map orderIds to (arguments, queue time) for orders, and to the queue time for cancel requests.
+        self.__orders = collections.OrderedDict()
+        self.__cancels = collections.OrderedDict()
+        # Ids of the orders that were sent to TWS.
+        self.__sentOrderIds = set()
+        self.__sentMessages = 0
+        self.__coalescedMessages = 0
+        self.__totalQueueDelay = 0.0
+        self.__maxQueueDelay = 0.0
+
+    def __getstate__(self):
+        ret = self.__dict__.copy()
+        del ret["_OrderQueue__lock"]
+        return ret
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
+
+    def placeOrder(self, orderId, *args):
+        """Queues an order, or replaces the queued order with the same orderId."""
+        self.__lock.acquire()
+        try:
+            if orderId in self.__orders:
+                self.__orders[orderId] = (args, self.__orders[orderId][1])
+                self.__coalescedMessages += 1
+            else:
+                self.__orders[orderId] = (args, self.__clock())
+        finally:
+            self.__lock.release()
+
+    def cancelOrder(self, orderId):
+        """Queues a cancel request. Returns False if the order was never sent to TWS, so there is nothing to cancel."""
+        self.__lock.acquire()
+        try:
+            if orderId in self.__orders:
+                del self.__orders[orderId]
+                self.__coalescedMessages += 1
+                if orderId not in self.__sentOrderIds:
+                    return False
+            if orderId in self.__cancels:
+                self.__coalescedMessages += 1
+            else:
+                self.__cancels[orderId] = self.__clock()
+            return True
+        finally:
+            self.__lock.release()
+
+    def __onSent(self, queuedAt):
+        delay = self.__clock() - queuedAt
+        self.__sentMessages += 1
+        self.__totalQueueDelay += delay
+        self.__maxQueueDelay = max(self.__maxQueueDelay, delay)
+
+    # Dequeues the next message to send, if the message rate allows it.
+    # Returns (isCancel, orderId, args), or None if there is nothing to send.
+    def __dequeue(self):
+        self.__lock.acquire()
+        try:
+            ret = None
+            if len(self.__cancels) and self.__bucket.consume():
+                orderId, queuedAt = self.__cancels.popitem(last=False)
+                ret = (True, orderId, ())
+            elif len(self.__cancels) == 0 and len(self.__orders) and self.__bucket.consume():
+                orderId, (args, queuedAt) = self.__orders.popitem(last=False)
+                self.__sentOrderIds.add(orderId)
+                ret = (False, orderId, args)
+            if ret is not None:
+                self.__onSent(queuedAt)
+            return ret
+        finally:
+            self.__lock.release()
+
+    def flush(self):
+        """Sends as many queued messages as the message rate allows. Returns the number of messages sent."""
+        ret = 0
+        message = self.__dequeue()
+        while message is not None:
+            isCancel, orderId, args = message
+            if isCancel:
+                self.__cancelOrder(orderId)
+            else:
+                self.__placeOrder(orderId, *args)
+            ret += 1
+            message = self.__dequeue()
+        return ret
+
+    def getDelay(self):
+        """Returns the number of seconds until the next message can be sent, or None if there is nothing to send."""
+        self.__lock.acquire()
+        try:
+            if len(self.__orders) + len(self.__cancels) == 0:
+                return None
+            return self.__bucket.getDelay()
+        finally:
+            self.__lock.release()
+
+    def getQueueSize(self):
+        """Returns the number of messages waiting to be sent."""
+        return len(self.__orders) + len(self.__cancels)
+
+    def getSentMessages(self):
+        """Returns the number of messages sent so far."""
+        return self.__sentMessages
+
+    def getCoalescedMessages(self):
+        """Returns the number of messages that were never sent because a later message replaced them."""
+        return self.__coalescedMessages
+
+    def getAverageQueueDelay(self):
+        """Returns the average number of seconds that sent messages waited in the queue."""
+        if self.__sentMessages == 0:
+            return 0.0
+        return self.__totalQueueDelay / self.__sentMessages
+
+    def getMaxQueueDelay(self):
+        """Returns the maximum number of seconds that a sent message waited in the queue."""
+        return self.__maxQueueDelay
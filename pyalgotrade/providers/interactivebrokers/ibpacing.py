@@ -0,0 +1,186 @@
+# PyAlgoTrade
+#
+# Copyright 2013 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Tibor Kiss <tibor.kiss@gmail.com>
+
+Pacing of historical data requests. TWS rejects historical data requests with error 162 if:
+
+ * More than 60 requests are made within any 10 minute period.
+ * Identical requests are made within 15 seconds.
+ * Six or more requests for the same contract, exchange and tick type are made within 2 seconds.
+
+It also limits the number of simultaneous open historical data requests.
+
+Order messages are paced separately, see :class:`pyalgotrade.providers.interactivebrokers.iborderqueue.OrderQueue`.
+"""
+
+import collections
+import threading
+import time
+
+# At most 60 requests in any 10 minute period.
+MAX_REQUESTS = 60
+REQUESTS_PERIOD = 600
+# A token bucket allows at most capacity + rate * period requests in any period, so a burst of 10 requests
+# and a refill rate of 50 requests every 10 minutes never exceeds the limit.
+BURST = 10
+# No identical requests within 15 seconds.
+IDENTICAL_PERIOD = 15
+# Less than 6 requests for the same contract within 2 seconds.
+MAX_CONTRACT_REQUESTS = 5
+CONTRACT_PERIOD = 2
+# Simultaneous open requests.
+MAX_IN_FLIGHT = 50
+
+# TWS disconnects clients that send more than 50 messages per second. Orders get 40 of them, sent in bursts of at
+# most 10, so that there is room left for the rest of the requests.
+ORDER_MESSAGES_PER_SECOND = 40
+ORDER_BURST = 10
+
+class TokenBucket(object):
+    '''A token bucket that starts full.
+
+    :param capacity: The maximum number of tokens in the bucket.
+    :type capacity: int
+    :param rate: The number of tokens added every second.
+    :type rate: float
+    :param clock: A function that returns the current time in seconds.
+    '''
+
+    def __init__(self, capacity, rate, clock=time.time):
+        assert(capacity > 0)
+        assert(rate > 0)
+        self.__capacity = capacity
+        self.__rate = float(rate)
+        self.__clock = clock
+        self.__tokens = float(capacity)
+        self.__lastRefill = clock()
+
+    def __refill(self):
+        now = self.__clock()
+        self.__tokens = min(self.__capacity, self.__tokens + (now - self.__lastRefill) * self.__rate)
+        self.__lastRefill = now
+
+    def getTokens(self):
+        self.__refill()
+        return self.__tokens
+
+    def getDelay(self):
+        """Returns the number of seconds to wait until a token is available."""
+        tokens = self.getTokens()
+        if tokens >= 1:
+            return 0
+        return (1 - tokens) / self.__rate
+
+    def consume(self):
+        """Takes a token from the bucket. Returns False if the bucket is empty."""
+        if self.getTokens() < 1:
+            return False
+        self.__tokens -= 1
+        return True
+
+class HistoricalDataPacer(object):
+    '''Delays historical data requests so that they don't violate the TWS pacing rules.
+
+    :param maxInFlight: The maximum number of requests waiting for data at the same time.
+    :type maxInFlight: int
+    :param clock: A function that returns the current time in seconds.
+    :param sleep: A function that waits for a given number of seconds.
+
+    Requests are identified by two keys. Requests with the same contractKey are requests for the same contract, exchange
+    and tick type, and requests with the same requestKey are identical requests.
+    '''
+
+    def __init__(self, maxInFlight=MAX_IN_FLIGHT, clock=time.time, sleep=time.sleep):
+        self.__clock = clock
+        self.__sleep = sleep
+        self.__bucket = TokenBucket(BURST, (MAX_REQUESTS - BURST) / float(REQUESTS_PERIOD), clock)
+        # Maps requestKey to the last time the request was made.
+        self.__requestTimes = {}
+        # Maps contractKey to the times of the requests made within the last CONTRACT_PERIOD seconds.
+        self.__contractTimes = {}
+        self.__maxInFlight = maxInFlight
+        self.__inFlight = 0
+        self.__lock = threading.Condition()
+
+    def __purge(self, now):
+        for requestKey, requestTime in self.__requestTimes.items():
+            if now - requestTime >= IDENTICAL_PERIOD:
+                del self.__requestTimes[requestKey]
+        for contractKey, times in self.__contractTimes.items():
+            while len(times) and now - times[0] >= CONTRACT_PERIOD:
+                times.popleft()
+            if len(times) == 0:
+                del self.__contractTimes[contractKey]
+
+    def getDelay(self, contractKey, requestKey):
+        """Returns the number of seconds to wait before making a request, ignoring the requests in flight."""
+        now = self.__clock()
+        self.__purge(now)
+        ret = self.__bucket.getDelay()
+
+        requestTime = self.__requestTimes.get(requestKey)
+        if requestTime is not None:
+            ret = max(ret, requestTime + IDENTICAL_PERIOD - now)
+
+        times = self.__contractTimes.get(contractKey)
+        if times is not None and len(times) >= MAX_CONTRACT_REQUESTS:
+            ret = max(ret, times[-MAX_CONTRACT_REQUESTS] + CONTRACT_PERIOD - now)
+        return ret
+
+    def tryAcquire(self, contractKey, requestKey):
+        """Registers a request if it can be made right away. Returns True if the request was registered.
+        :meth:`release` must be called once the request is done."""
+        self.__lock.acquire()
+        try:
+            if self.__inFlight >= self.__maxInFlight or self.getDelay(contractKey, requestKey) > 0:
+                return False
+            now = self.__clock()
+            assert(self.__bucket.consume())
+            self.__requestTimes[requestKey] = now
+            self.__contractTimes.setdefault(contractKey, collections.deque()).append(now)
+            self.__inFlight += 1
+            return True
+        finally:
+            self.__lock.release()
+
+    def acquire(self, contractKey, requestKey):
+        """Waits until a request can be made and registers it. :meth:`release` must be called once the request is done."""
+        while True:
+            self.__lock.acquire()
+            try:
+                while self.__inFlight >= self.__maxInFlight:
+                    self.__lock.wait()
+                if self.tryAcquire(contractKey, requestKey):
+                    return
+                delay = self.getDelay(contractKey, requestKey)
+            finally:
+                self.__lock.release()
+            self.__sleep(delay)
+
+    def release(self):
+        """Signals that a request is done."""
+        self.__lock.acquire()
+        try:
+            assert(self.__inFlight > 0)
+            self.__inFlight -= 1
+            self.__lock.notify()
+        finally:
+            self.__lock.release()
+
+    def getInFlight(self):
+        return self.__inFlight
@@ -0,0 +1,394 @@
+# PyAlgoTrade
+#
+# Copyright 2013 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Tibor Kiss <tibor.kiss@gmail.com>
+"""
+
+import csv
+import threading
+import time
+
+from pyalgotrade import broker
+from pyalgotrade import observer
+from pyalgotrade.broker import backtesting
+from pyalgotrade.utils import dt
+from ibconnection import TickerIdRegistry
+
+from ib.ext.Contract import Contract
+from ib.ext.Execution import Execution
+
+import logging
+log = logging.getLogger(__name__)
+
+class SimulatedEClientSocket(object):
+    '''An in-process replacement for TWS that replays bars from a feed, to run the live trading path
+    (:class:`pyalgotrade.providers.interactivebrokers.ibconnection.Connection`,
+    :class:`pyalgotrade.providers.interactivebrokers.ibfeed.LiveFeed` and
+    :class:`pyalgotrade.providers.interactivebrokers.ibbroker.Broker`) without network access.
+
+    :param barFeed: The bars to replay, for example, a :class:`pyalgotrade.providers.interactivebrokers.ibfeed.CSVFeed`
+        loaded with recorded bars.
+    :type barFeed: :class:`pyalgotrade.barfeed.BarFeed`
+    :param cash: The initial amount of cash in the simulated account.
+    :type cash: int or float.
+    :param speed: How many times faster than real time bars are replayed, or None to replay them as fast as possible.
+    :type speed: float
+    :param commission: The commission charged for each fill.
+    :type commission: :class:`pyalgotrade.broker.Commission`
+    :param accountCode: The code of the simulated account.
+    :type accountCode: str
+
+    Orders are filled by a :class:`pyalgotrade.broker.backtesting.Broker` that processes the replayed bars, so fills
+    are the same as when backtesting. Subscribers to realtime bars get each replayed bar through realtimeBar, and
+    subscribers to market data get the open, high/low and close of each bar as RTVolume ticks through tickString.
+    Recorded trades can be loaded with :meth:`addTicksFromCSV` to send those instead.
+
+    Pass the simulator as the eClientSocket when building the connection, and call :meth:`setWrapper` with the
+    connection right after. Bars are replayed from a separate thread, like the TWS reader thread, once :meth:`start`
+    is called. Use :meth:`getReplayFinishedEvent` to stop the feed when all the bars were replayed.
+    '''
+
+    def __init__(self, barFeed, cash=1000000, speed=None, commission=None, accountCode='SIMULATED'):
+        self.__barFeed = barFeed
+        self.__speed = speed
+        self.__accountCode = accountCode
+        self.__wrapper = None
+        self.__connected = False
+        self.__clientId = None
+        self.__running = False
+        self.__thread = None
+        # Reentrant because callbacks may place orders.
+        self.__lock = threading.Condition(threading.RLock())
+        self.__replayFinishedEvent = observer.Event()
+
+        # The exchange fills the orders as bars are replayed.
+        self.__exchange = backtesting.Broker(cash, barFeed, commission)
+        self.__exchange.getOrderUpdatedEvent().subscribe(self.__onOrderUpdated)
+
+        # Bars are sent to the client after the exchange processed them.
+        barFeed.getNewBarsEvent().subscribe(self.__onBars)
+        barFeed.getNewBarsEvent().subscribe(self.__pace, priority=2)
+        self.__replayBegin = None
+
+        self.__realtimeBarIDs = TickerIdRegistry()
+        self.__marketDataIDs = TickerIdRegistry()
+        self.__totalVolume = {}
+        # Maps instruments to the recorded (time, price, size) trades, to the position of the next one to send, and to
+        # the traded value so far (to calculate the VWAP).
+        self.__ticks = {}
+        self.__nextTick = {}
+        self.__tradedValue = {}
+
+        # Maps orderIds to (contract, backtesting order) tuples, and backtesting orders to orderIds.
+        self.__orders = {}
+        self.__orderIds = {}
+        self.__nextExecId = 1
+        self.__accountUpdates = False
+
+    def setWrapper(self, wrapper):
+        """Sets the :class:`ib.ext.EWrapper.EWrapper` that receives the callbacks, usually the connection."""
+        self.__wrapper = wrapper
+
+    def getExchange(self):
+        """Returns the :class:`pyalgotrade.broker.backtesting.Broker` that fills the orders."""
+        return self.__exchange
+
+    def addTicksFromCSV(self, instrument, path):
+        """Loads recorded trades for an instrument. Market data subscribers get these as RTVolume ticks instead of
+        the ones made up from the bars. Each trade is sent right before the first replayed bar whose datetime is not
+        earlier than the trade time, so trades after the last bar are not sent. Call before :meth:`start`.
+
+        :param instrument: Instrument identifier.
+        :type instrument: string.
+        :param path: The path to a CSV file with Time (seconds since the epoch, in UTC), Price and Size columns.
+        :type path: string.
+        """
+        ticks = self.__ticks.setdefault(instrument, [])
+        f = open(path, "r")
+        try:
+            for row in csv.DictReader(f):
+                ticks.append((float(row["Time"]), float(row["Price"]), int(row["Size"])))
+        finally:
+            f.close()
+        ticks.sort()
+        self.__nextTick[instrument] = 0
+
+    def getReplayFinishedEvent(self):
+        """Returns the event emitted, with no parameters, once all the bars were replayed."""
+        return self.__replayFinishedEvent
+
+    ########################################################################################
+    # Replay
+    ########################################################################################
+    def start(self):
+        """Starts replaying bars in a separate thread."""
+        assert(self.__thread is None)
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__replay, name="SimulatedTWS")
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def stop(self):
+        self.__lock.acquire()
+        try:
+            self.__running = False
+            self.__lock.notifyAll()
+        finally:
+            self.__lock.release()
+
+    def join(self):
+        if self.__thread is not None:
+            self.__thread.join()
+
+    def __replay(self):
+        self.__barFeed.start()
+        try:
+            while self.__running and not self.__barFeed.stopDispatching():
+                self.__lock.acquire()
+                try:
+                    self.__barFeed.dispatch()
+                finally:
+                    self.__lock.release()
+        finally:
+            self.__barFeed.stop()
+            self.__barFeed.join()
+        self.__replayFinishedEvent.emit()
+
+    # Waits until it is time to replay the bars. The lock is released while waiting so orders can be placed.
+    def __pace(self, bars):
+        if self.__speed is None:
+            return
+        barTime = dt.datetime_to_timestamp(bars.getDateTime())
+        now = time.time()
+        if self.__replayBegin is None:
+            self.__replayBegin = (now, barTime)
+        wallBegin, barBegin = self.__replayBegin
+        target = wallBegin + (barTime - barBegin) / float(self.__speed)
+        while self.__running and now < target:
+            self.__lock.wait(target - now)
+            now = time.time()
+
+    def __onBars(self, bars):
+        if self.__wrapper is None:
+            return
+        barTime = dt.datetime_to_timestamp(bars.getDateTime())
+        for instrument in bars.getInstruments():
+            bar_ = bars.getBar(instrument)
+
+            tickerId = self.__realtimeBarIDs.getTickerId(instrument)
+            if tickerId is not None:
+                vwap = bar_.getTypicalPrice()
+                getVWAP = getattr(bar_, "getVWAP", None)
+                if getVWAP is not None:
+                    vwap = getVWAP()
+                tradeCount = 1
+                getTradeCount = getattr(bar_, "getTradeCount", None)
+                if getTradeCount is not None:
+                    tradeCount = getTradeCount()
+                self.__wrapper.realtimeBar(tickerId, barTime, bar_.getOpen(), bar_.getHigh(), bar_.getLow(), bar_.getClose(),
+                                           bar_.getVolume(), vwap, tradeCount)
+
+            tickerId = self.__marketDataIDs.getTickerId(instrument)
+            if instrument in self.__ticks:
+                # Recorded trades are consumed even if there are no subscribers.
+                self.__sendRecordedTicks(tickerId, instrument, barTime)
+            elif tickerId is not None:
+                self.__sendTicks(tickerId, instrument, barTime, bar_)
+
+        if self.__accountUpdates:
+            self.__sendAccountUpdates()
+
+    # Sends the bar as four trades, one for the open, the high and the low, and the close.
+    def __sendTicks(self, tickerId, instrument, barTime, bar_):
+        if bar_.getClose() >= bar_.getOpen():
+            prices = (bar_.getOpen(), bar_.getLow(), bar_.getHigh(), bar_.getClose())
+        else:
+            prices = (bar_.getOpen(), bar_.getHigh(), bar_.getLow(), bar_.getClose())
+        size = int(bar_.getVolume() / len(prices))
+        for i in xrange(len(prices)):
+            if i == len(prices) - 1:
+                tradeSize = int(bar_.getVolume()) - size * (len(prices) - 1)
+            else:
+                tradeSize = size
+            totalVolume = self.__totalVolume.get(instrument, 0) + tradeSize
+            self.__totalVolume[instrument] = totalVolume
+            rtVolume = "%s;%d;%d;%d;%s;true" % (prices[i], tradeSize, barTime * 1000 + i, totalVolume, bar_.getTypicalPrice())
+            self.__wrapper.tickString(tickerId, 48, rtVolume)
+
+    # Sends the recorded trades up to the bar time.
+    def __sendRecordedTicks(self, tickerId, instrument, barTime):
+        ticks = self.__ticks[instrument]
+        pos = self.__nextTick[instrument]
+        while pos < len(ticks) and ticks[pos][0] <= barTime:
+            tickTime, price, size = ticks[pos]
+            totalVolume = self.__totalVolume.get(instrument, 0) + size
+            self.__totalVolume[instrument] = totalVolume
+            tradedValue = self.__tradedValue.get(instrument, 0.0) + price * size
+            self.__tradedValue[instrument] = tradedValue
+            if tickerId is not None:
+                vwap = tradedValue / totalVolume if totalVolume else price
+                rtVolume = "%s;%d;%d;%d;%s;true" % (price, size, int(tickTime * 1000), totalVolume, vwap)
+                self.__wrapper.tickString(tickerId, 48, rtVolume)
+            pos += 1
+        self.__nextTick[instrument] = pos
+
+    def __sendAccountUpdates(self):
+        self.__wrapper.updateAccountValue('TotalCashBalance', str(self.__exchange.getCash()), 'USD', self.__accountCode)
+        self.__wrapper.updateAccountValue('NetLiquidation', str(self.__exchange.getEquity()), 'USD', self.__accountCode)
+        self.__wrapper.updateAccountValue('Leverage-S', str(self.__exchange.getLeverage()), '', self.__accountCode)
+        for instrument, shares in self.__exchange.getPositions().iteritems():
+            contract = Contract()
+            contract.m_symbol = instrument
+            contract.m_secType = 'STK'
+            contract.m_currency = 'USD'
+            lastBar = self.__barFeed.getLastBar(instrument)
+            marketPrice = 0.0
+            if lastBar is not None:
+                marketPrice = lastBar.getClose()
+            marketValue = marketPrice * shares
+            avgCost = 0.0
+            if shares != 0:
+                avgCost = self.__exchange.getAvgCost(instrument)
+            self.__wrapper.updatePortfolio(contract, shares, marketPrice, marketValue, avgCost, marketValue - avgCost * shares, 0.0, self.__accountCode)
+
+    def __onOrderUpdated(self, exchange, order):
+        orderId = self.__orderIds.get(order)
+        if orderId is None:
+            # Replaced orders are canceled silently.
+            return
+
+        contract, order_ = self.__orders.pop(orderId)
+        del self.__orderIds[order]
+
+        if order.isFilled():
+            executionInfo = order.getExecutionInfo()
+            price = executionInfo.getPrice()
+            quantity = executionInfo.getQuantity()
+
+            execution = Execution()
+            execution.m_orderId = orderId
+            execution.m_clientId = self.__clientId
+            execution.m_execId = "%08d" % self.__nextExecId
+            # Like TWS, in the local time zone and when the order gets filled.
+            execution.m_time = time.strftime("%Y%m%d  %H:%M:%S")
+            execution.m_acctNumber = self.__accountCode
+            execution.m_side = "BOT" if order.getAction() in [broker.Order.Action.BUY, broker.Order.Action.BUY_TO_COVER] else "SLD"
+            execution.m_shares = quantity
+            execution.m_price = price
+            execution.m_permId = orderId
+            execution.m_cumQty = quantity
+            execution.m_avgPrice = price
+            self.__nextExecId += 1
+
+            self.__wrapper.execDetails(orderId, contract, execution)
+            self.__wrapper.orderStatus(orderId, 'Filled', quantity, 0, price, orderId, 0, price, self.__clientId, '')
+            # TWS sends the account updates when positions change.
+            if self.__accountUpdates:
+                self.__sendAccountUpdates()
+        else:
+            self.__wrapper.orderStatus(orderId, 'Cancelled', 0, order.getQuantity(), 0.0, orderId, 0, 0.0, self.__clientId, '')
+
+    ########################################################################################
+    # EClientSocket
+    ########################################################################################
+    def eConnect(self, host, port, clientId):
+        self.__connected = True
+        self.__clientId = clientId
+        self.__wrapper.managedAccounts(self.__accountCode)
+        self.__wrapper.nextValidId(1)
+
+    def eDisconnect(self):
+        self.__connected = False
+        self.stop()
+
+    def isConnected(self):
+        return self.__connected
+
+    def reqRealTimeBars(self, tickerId, contract, barSize, whatToShow, useRTH):
+        self.__realtimeBarIDs.add(tickerId, contract.m_symbol)
+
+    def cancelRealTimeBars(self, tickerId):
+        self.__realtimeBarIDs.removeInstrument(self.__realtimeBarIDs.getInstrument(tickerId))
+
+    def reqMktData(self, tickerId, contract, genericTickList, snapshot):
+        self.__marketDataIDs.add(tickerId, contract.m_symbol)
+
+    def cancelMktData(self, tickerId):
+        self.__marketDataIDs.removeInstrument(self.__marketDataIDs.getInstrument(tickerId))
+
+    def reqHistoricalData(self, tickerId, contract, endDateTime, durationStr, barSizeSetting, whatToShow, useRTH, formatDate):
+        self.__wrapper.error(tickerId, 321, "Error validating request: historical data is not simulated")
+
+    def reqAccountUpdates(self, subscribe, acctCode):
+        self.__lock.acquire()
+        try:
+            self.__accountUpdates = subscribe
+            if subscribe:
+                self.__sendAccountUpdates()
+        finally:
+            self.__lock.release()
+
+    def placeOrder(self, orderId, contract, order):
+        action = {
+            "BUY": broker.Order.Action.BUY,
+            "SELL": broker.Order.Action.SELL,
+            "SSHORT": broker.Order.Action.SELL_SHORT,
+            }[order.m_action]
+        instrument = contract.m_symbol
+        quantity = order.m_totalQuantity
+        goodTillCanceled = order.m_tif == "GTC"
+
+        if order.m_orderType == "MKT":
+            exchangeOrder = self.__exchange.createMarketOrder(action, instrument, quantity, False, goodTillCanceled)
+        elif order.m_orderType == "LMT":
+            exchangeOrder = self.__exchange.createLimitOrder(action, instrument, order.m_lmtPrice, quantity, goodTillCanceled)
+        elif order.m_orderType == "STP":
+            exchangeOrder = self.__exchange.createStopOrder(action, instrument, order.m_auxPrice, quantity, goodTillCanceled)
+        elif order.m_orderType == "STP LMT":
+            exchangeOrder = self.__exchange.createStopLimitOrder(action, instrument, order.m_auxPrice, order.m_lmtPrice, quantity, goodTillCanceled)
+        else:
+            self.__wrapper.error(orderId, 387, "Unsupported order type: %s" % order.m_orderType)
+            return
+
+        self.__lock.acquire()
+        try:
+            # Placing an order with an existing orderId modifies it.
+            previous = self.__orders.pop(orderId, None)
+            if previous is not None:
+                previousOrder = previous[1]
+                del self.__orderIds[previousOrder]
+                self.__exchange.cancelOrder(previousOrder)
+
+            self.__orders[orderId] = (contract, exchangeOrder)
+            self.__orderIds[exchangeOrder] = orderId
+            self.__exchange.placeOrder(exchangeOrder)
+        finally:
+            self.__lock.release()
+        self.__wrapper.orderStatus(orderId, 'Submitted', 0, quantity, 0.0, orderId, 0, 0.0, self.__clientId, '')
+
+    def cancelOrder(self, orderId):
+        self.__lock.acquire()
+        try:
+            entry = self.__orders.get(orderId)
+            if entry is None:
+                self.__wrapper.error(orderId, 135, "Can't find order with id = %s" % orderId)
+                return
+            self.__exchange.cancelOrder(entry[1])
+            # The backtesting broker doesn't notify cancellations until the next bar.
+            self.__onOrderUpdated(self.__exchange, entry[1])
+        finally:
+            self.__lock.release()
@@ -0,0 +1,135 @@
+# PyAlgoTrade
+#
+# Copyright 2013 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+
+Vectorized metrics for a :class:`pyalgotrade.stratanalyzer.recorder.Recording`. The results match the ones from the
+analyzers that calculate them as the strategy runs.
+"""
+
+import math
+
+import numpy
+
+from pyalgotrade.stratanalyzer import trades
+
+def returns(recording):
+    """Returns a numpy.array with the portfolio return for each bar."""
+    equity = numpy.concatenate(([recording.getInitialEquity()], recording.getEquity()))
+    return equity[1:] / equity[:-1] - 1
+
+def cumulative_returns(recording):
+    """Returns a numpy.array with the cumulative portfolio return for each bar."""
+    return recording.getEquity() / float(recording.getInitialEquity()) - 1
+
+def sharpe_ratio(recording, riskFreeRate, tradingPeriods, annualized = True):
+    """Returns the Sharpe ratio. See :meth:`pyalgotrade.stratanalyzer.sharpe.SharpeRatio.getSharpeRatio`."""
+    ret = 0.0
+    netReturns = returns(recording)
+    if len(netReturns) > 1:
+        volatility = netReturns.std(ddof=1)
+        if volatility != 0:
+            ret = (netReturns.mean() - riskFreeRate / float(tradingPeriods)) / volatility
+            if annualized:
+                ret = ret * math.sqrt(tradingPeriods)
+    return ret
+
+def sortino_ratio(recording, targetReturn = 0):
+    """Returns the annualized Sortino ratio. See :class:`pyalgotrade.stratanalyzer.sortino.SortinoRatio`."""
+    ret = 0
+    netReturns = returns(recording)
+    if len(netReturns):
+        diffs = netReturns - targetReturn
+        downsideDeviation = math.sqrt(numpy.square(diffs[diffs < 0]).sum() / len(netReturns))
+        if downsideDeviation > 0.0001:
+            ret = (netReturns.mean() - targetReturn) / downsideDeviation * math.sqrt(252)
+    return ret
+
+def drawdowns(recording):
+    """Returns a numpy.array with the drawdown for each bar, as a negative fraction of the highest equity so far."""
+    equity = recording.getEquity()
+    highWatermark = numpy.maximum.accumulate(numpy.concatenate(([recording.getInitialEquity()], equity)))[1:]
+    return (equity - highWatermark) / highWatermark
+
+def max_drawdown(recording):
+    """Returns the max. (deepest) drawdown."""
+    ret = 0
+    if len(recording):
+        ret = abs(min(0, drawdowns(recording).min()))
+    return ret
+
+def drawdown_durations(recording):
+    """Returns a numpy.array with the number of bars that each drawdown has been going on for, at each bar."""
+    below = drawdowns(recording) < 0
+    # Count the bars below the high watermark, restarting the count at every new high.
+    counts = below.cumsum()
+    resets = numpy.maximum.accumulate(numpy.where(below, 0, counts))
+    return counts - resets
+
+def longest_drawdown_duration(recording):
+    """Returns the duration of the longest drawdown."""
+    ret = 0
+    if len(recording):
+        ret = int(drawdown_durations(recording).max())
+    return ret
+
+def annualized_return(recording, tradingPeriods = 252):
+    """Returns the compound annual return."""
+    ret = 0
+    if len(recording):
+        ret = (recording.getEquity()[-1] / float(recording.getInitialEquity())) ** (tradingPeriods / float(len(recording))) - 1
+    return ret
+
+def calmar_ratio(recording, tradingPeriods = 252):
+    """Returns the annualized return over the max. drawdown. If there was no drawdown, 0 is returned."""
+    ret = 0
+    maxDD = max_drawdown(recording)
+    if maxDD != 0:
+        ret = annualized_return(recording, tradingPeriods) / maxDD
+    return ret
+
+def rolling_sharpe_ratio(recording, window, riskFreeRate, tradingPeriods, annualized = True):
+    """Returns a numpy.array with the Sharpe ratio for the last window bars, at each bar.
+    Values for the first window - 1 bars are NaN."""
+    assert(window > 1)
+    netReturns = returns(recording)
+    ret = numpy.empty(len(netReturns))
+    ret.fill(numpy.nan)
+    if len(netReturns) >= window:
+        # Rolling sums of the returns and the squared returns.
+        sums = numpy.concatenate(([0], netReturns.cumsum()))
+        squares = numpy.concatenate(([0], numpy.square(netReturns).cumsum()))
+        windowSums = sums[window:] - sums[:-window]
+        windowSquares = squares[window:] - squares[:-window]
+        means = windowSums / window
+        variances = numpy.maximum(windowSquares - window * numpy.square(means), 0) / (window - 1)
+        volatilities = numpy.sqrt(variances)
+        sharpe = numpy.zeros(len(means))
+        nonZero = volatilities > 1e-12
+        sharpe[nonZero] = (means[nonZero] - riskFreeRate / float(tradingPeriods)) / volatilities[nonZero]
+        if annualized:
+            sharpe *= math.sqrt(tradingPeriods)
+        ret[window-1:] = sharpe
+    return ret
+
+def trade_stats(recording):
+    """Returns a :class:`pyalgotrade.stratanalyzer.trades.Trades` with the trades calculated from the recorded fills."""
+    ret = trades.Trades()
+    instruments = recording.getInstruments()
+    for fill in recording.getFills():
+        ret.addFill(instruments[fill["instrument"]], fill["quantity"], fill["price"], fill["commission"])
+    return ret
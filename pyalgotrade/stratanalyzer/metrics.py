@@ -0,0 +1,187 @@
+# PyAlgoTrade
+#
+# Copyright 2013 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+from pyalgotrade import stratanalyzer
+from pyalgotrade import observer
+from pyalgotrade.utils import stats
+
+import math
+
+class DrawDownHelper:
+    def __init__(self, initialValue):
+        self.__highWatermark = initialValue
+        self.__lowWatermark = initialValue
+        self.__lastLow = initialValue
+        self.__duration = 0
+
+    # The drawdown duration, not necessarily the max drawdown duration.
+    def getDuration(self):
+        return self.__duration
+
+    def getMaxDrawDown(self):
+        return (self.__lowWatermark - self.__highWatermark) / float(self.__highWatermark)
+
+    def getCurrentDrawDown(self):
+        return (self.__lastLow - self.__highWatermark) / float(self.__highWatermark)
+
+    def update(self, low, high):
+        assert(low <= high)
+        self.__lastLow = low
+        if high < self.__highWatermark:
+            self.__duration += 1
+            self.__lowWatermark = min(self.__lowWatermark, low)
+        else:
+            self.__highWatermark = high
+            self.__lowWatermark = low
+            if low == high:
+                self.__duration = 0
+            else:
+                self.__duration = 1
+
+class PortfolioMetrics(stratanalyzer.StrategyAnalyzer):
+    """A :class:`pyalgotrade.stratanalyzer.StrategyAnalyzer` that values the portfolio once per bar and keeps the
+    running state needed for returns, drawdown, Sharpe, Sortino and Calmar ratios. Every metric is available at any
+    bar in constant time.
+
+    The returns, drawdown, Sharpe ratio and Sortino ratio analyzers are views over an instance shared by all of them
+    (see :meth:`getOrCreateShared`), so the equity is calculated only once per bar no matter how many of them are
+    attached.
+    """
+
+    def __init__(self):
+        self.__netRet = 0
+        self.__cumRet = 0
+        self.__event = observer.Event()
+        self.__lastPortfolioValue = None
+        self.__drawDown = None
+        self.__maxDD = 0
+        self.__longestDDDuration = 0
+        self.__returnStats = stats.RunningStats()
+        # Sum of the squared negative returns.
+        self.__downsideSum = 0.0
+
+    @classmethod
+    def getOrCreateShared(cls, strat):
+        name = "PortfolioMetrics"
+        # Get or create the shared PortfolioMetrics.
+        ret = strat.getNamedAnalyzer(name)
+        if ret == None:
+            ret = PortfolioMetrics()
+            strat.attachAnalyzerEx(ret, name)
+        return ret
+
+    def attached(self, strat):
+        self.__lastPortfolioValue = strat.getBroker().getEquity()
+        self.__drawDown = DrawDownHelper(self.__lastPortfolioValue)
+
+    # An event will be notified when metrics are calculated at each bar. The hander should receive 1 parameter:
+    # 1: This analyzer's instance
+    def getEvent(self):
+        return self.__event
+
+    def beforeOnBars(self, strat):
+        currentPortfolioValue = strat.getBroker().getEquity()
+        netReturn = (currentPortfolioValue - self.__lastPortfolioValue) / float(self.__lastPortfolioValue)
+        self.__lastPortfolioValue = currentPortfolioValue
+
+        self.__netRet = netReturn
+        self.__cumRet = (1 + self.__cumRet) * (1 + netReturn) - 1
+        self.__returnStats.push(netReturn)
+        if netReturn < 0:
+            self.__downsideSum += netReturn ** 2
+
+        self.__drawDown.update(currentPortfolioValue, currentPortfolioValue)
+        self.__longestDDDuration = max(self.__longestDDDuration, self.__drawDown.getDuration())
+        self.__maxDD = min(self.__maxDD, self.__drawDown.getMaxDrawDown())
+
+        # Notify that new metrics are available.
+        self.__event.emit(self)
+
+    def getEquity(self):
+        """Returns the portfolio value for the last bar."""
+        return self.__lastPortfolioValue
+
+    def getNetReturn(self):
+        return self.__netRet
+
+    def getCumulativeReturn(self):
+        return self.__cumRet
+
+    def getReturnStats(self):
+        """Returns a :class:`pyalgotrade.utils.stats.RunningStats` with the mean and variance of the returns."""
+        return self.__returnStats
+
+    def getMaxDrawDown(self):
+        """Returns the max. (deepest) drawdown."""
+        return abs(self.__maxDD)
+
+    def getCurrentDrawDown(self):
+        ret = 0
+        if self.__drawDown is not None:
+            ret = abs(self.__drawDown.getCurrentDrawDown())
+        return ret
+
+    def getLongestDrawDownDuration(self):
+        """Returns the duration of the longest drawdown."""
+        return self.__longestDDDuration
+
+    def getSharpeRatio(self, riskFreeRate, tradingPeriods, annualized = True):
+        """Returns the Sharpe ratio. See :meth:`pyalgotrade.stratanalyzer.sharpe.SharpeRatio.getSharpeRatio`."""
+        ret = 0.0
+        volatility = self.__returnStats.getStdDev(1)
+        if volatility:
+            avgExcessReturns = self.__returnStats.getMean() - riskFreeRate / float(tradingPeriods)
+            ret = avgExcessReturns / volatility
+            if annualized:
+                ret = ret * math.sqrt(tradingPeriods)
+        return ret
+
+    def getSortinoRatio(self):
+        """Returns the annualized Sortino ratio for a target return of 0, assuming daily returns."""
+        ret = 0
+        if self.__returnStats.getCount():
+            downsideDeviation = math.sqrt(self.__downsideSum / self.__returnStats.getCount())
+            if downsideDeviation > 0.0001:
+                ret = self.__returnStats.getMean() / downsideDeviation * math.sqrt(252)
+        return ret
+
+    def getAnnualizedReturn(self, tradingPeriods = 252):
+        """Returns the compound annual return.
+
+        :param tradingPeriods: The number of trading periods per annum.
+        :type tradingPeriods: int/float.
+        """
+        ret = 0
+        count = self.__returnStats.getCount()
+        if count:
+            ret = (1 + self.__cumRet) ** (tradingPeriods / float(count)) - 1
+        return ret
+
+    def getCalmarRatio(self, tradingPeriods = 252):
+        """Returns the Calmar ratio, the annualized return over the max. drawdown.
+        If there was no drawdown, 0 is returned.
+
+        :param tradingPeriods: The number of trading periods per annum.
+        :type tradingPeriods: int/float.
+        """
+        ret = 0
+        if self.__maxDD != 0:
+            ret = self.getAnnualizedReturn(tradingPeriods) / abs(self.__maxDD)
+        return ret
@@ -0,0 +1,201 @@
+# PyAlgoTrade
+#
+# Copyright 2013 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import array
+import datetime
+
+import numpy
+import pytz
+
+from pyalgotrade import stratanalyzer
+from pyalgotrade import broker
+from pyalgotrade.stratanalyzer import metrics
+from pyalgotrade.utils import align
+
+class Recording:
+    """The equity curve, cash and fills recorded during a strategy execution.
+    Use the functions in :mod:`pyalgotrade.stratanalyzer.batch` to calculate metrics out of it.
+
+    :param initialEquity: The equity before the first bar.
+    :type initialEquity: float.
+    :param dateTimes: The :class:`datetime.datetime` for each bar.
+    :type dateTimes: list.
+    :param equity: The equity for each bar.
+    :type equity: numpy.array.
+    :param cash: The cash for each bar.
+    :type cash: numpy.array.
+    :param instruments: The instruments traded.
+    :type instruments: list.
+    :param fills: A numpy structured array with the bar, instrument index, quantity, price and commission for each fill.
+    :type fills: numpy.array.
+    :param initialShares: The shares held for each instrument before the first bar. If None, no shares are assumed.
+    :type initialShares: numpy.array.
+
+    .. note::
+        The bar of a fill is the index of the first bar whose equity includes it. A fill that arrives after the last bar
+        was recorded, something that can happen with live brokers, has the bar set to the number of bars recorded.
+    """
+
+    #: The dtype of the fills array.
+    FILL_DTYPE = numpy.dtype([("bar", numpy.int64), ("instrument", numpy.int32), ("quantity", numpy.float64),
+                              ("price", numpy.float64), ("commission", numpy.float64)])
+
+    def __init__(self, initialEquity, dateTimes, equity, cash, instruments, fills, initialShares = None):
+        assert(len(dateTimes) == len(equity) == len(cash))
+        if initialShares is None:
+            initialShares = numpy.zeros(len(instruments))
+        assert(len(initialShares) == len(instruments))
+        self.__initialEquity = initialEquity
+        self.__dateTimes = dateTimes
+        self.__equity = equity
+        self.__cash = cash
+        self.__instruments = instruments
+        self.__fills = fills
+        self.__initialShares = initialShares
+
+    def __len__(self):
+        return len(self.__equity)
+
+    def getInitialEquity(self):
+        return self.__initialEquity
+
+    def getDateTimes(self):
+        return self.__dateTimes
+
+    def getEquity(self):
+        """Returns a numpy.array with the equity for each bar."""
+        return self.__equity
+
+    def getCash(self):
+        """Returns a numpy.array with the cash for each bar."""
+        return self.__cash
+
+    def getInstruments(self):
+        return self.__instruments
+
+    def getFills(self):
+        """Returns a numpy structured array with the fields in :attr:`FILL_DTYPE` for each fill."""
+        return self.__fills
+
+    def getInitialShares(self):
+        """Returns a numpy.array with the shares held for each instrument before the first bar."""
+        return self.__initialShares
+
+    def getPositions(self):
+        """Returns a numpy.array with one row per bar and one column per instrument with the shares held at each bar.
+        Fills that arrived after the last bar are included in the last row.
+        """
+        ret = numpy.zeros((len(self.__equity), len(self.__instruments)))
+        if len(ret) == 0:
+            return ret
+        ret[0] = self.__initialShares
+        if len(self.__fills):
+            bars = numpy.minimum(self.__fills["bar"], len(ret) - 1)
+            numpy.add.at(ret, (bars, self.__fills["instrument"]), self.__fills["quantity"])
+        return ret.cumsum(axis=0)
+
+    def save(self, path):
+        """Saves the recording to a .npz file.
+
+        .. note::
+                Datetimes are saved in UTC, and they are loaded back as UTC datetimes. Naive datetimes are assumed to be in UTC.
+        """
+        numpy.savez(path, initialEquity=numpy.array([self.__initialEquity]),
+                    timestamps=align.to_timestamps(self.__dateTimes), equity=self.__equity, cash=self.__cash,
+                    instruments=numpy.array(self.__instruments, dtype=str), fills=self.__fills,
+                    initialShares=self.__initialShares)
+
+def load(path):
+    """Loads a :class:`Recording` saved with :meth:`Recording.save`."""
+    data = numpy.load(path)
+    epoch = datetime.datetime(1970, 1, 1, tzinfo=pytz.utc)
+    dateTimes = [epoch + datetime.timedelta(microseconds=int(timestamp)) for timestamp in data["timestamps"]]
+    fills = data["fills"].astype(Recording.FILL_DTYPE)
+    return Recording(float(data["initialEquity"][0]), dateTimes, data["equity"], data["cash"],
+                     [str(instrument) for instrument in data["instruments"]], fills, data["initialShares"])
+
+class Recorder(stratanalyzer.StrategyAnalyzer):
+    """A :class:`pyalgotrade.stratanalyzer.StrategyAnalyzer` that records the equity and cash for each bar, and every
+    fill, in compact arrays. Metrics can then be calculated after the strategy execution using
+    :meth:`getRecording` and :mod:`pyalgotrade.stratanalyzer.batch`, without attaching their analyzers.
+    """
+
+    def __init__(self):
+        self.__metrics = None
+        self.__broker = None
+        self.__feed = None
+        self.__initialEquity = None
+        self.__dateTimes = []
+        self.__equity = array.array("d")
+        self.__cash = array.array("d")
+        self.__instruments = []
+        self.__instrumentIdx = {}
+        self.__initialShares = array.array("d")
+        self.__fills = []
+
+    def beforeAttach(self, strat):
+        # The equity is taken from the shared PortfolioMetrics, so it is not calculated again.
+        self.__metrics = metrics.PortfolioMetrics.getOrCreateShared(strat)
+        self.__metrics.getEvent().subscribe(self.__onMetrics)
+
+    def attached(self, strat):
+        self.__broker = strat.getBroker()
+        self.__feed = strat.getFeed()
+        self.__initialEquity = self.__metrics.getEquity()
+        # Shares held before the strategy starts, for example the open positions of a live account.
+        for instrument, shares in self.__broker.getPositions().iteritems():
+            if shares != 0:
+                self.__getInstrumentIdx(instrument, shares)
+        self.__broker.getOrderUpdatedEvent().subscribe(self.__onOrderUpdate)
+
+    def __onMetrics(self, portfolioMetrics):
+        self.__dateTimes.append(self.__feed.getCurrentBars().getDateTime())
+        self.__equity.append(portfolioMetrics.getEquity())
+        self.__cash.append(self.__broker.getCash())
+
+    def __getInstrumentIdx(self, instrument, initialShares = 0):
+        ret = self.__instrumentIdx.get(instrument)
+        if ret is None:
+            ret = len(self.__instruments)
+            self.__instruments.append(instrument)
+            self.__instrumentIdx[instrument] = ret
+            self.__initialShares.append(initialShares)
+        return ret
+
+    def __onOrderUpdate(self, broker_, order):
+        # Only interested in filled orders.
+        if not order.isFilled():
+            return
+
+        instrumentIdx = self.__getInstrumentIdx(order.getInstrument())
+        executionInfo = order.getExecutionInfo()
+        quantity = executionInfo.getQuantity()
+        if order.getAction() in [broker.Order.Action.SELL, broker.Order.Action.SELL_SHORT]:
+            quantity = quantity * -1
+        # The fill belongs to the next bar to be recorded. With the backtesting broker that is the bar being processed,
+        # while fills from live brokers may arrive at any time, even after the last bar was recorded.
+        self.__fills.append((len(self.__equity), instrumentIdx, quantity, executionInfo.getPrice(), executionInfo.getCommission()))
+
+    def getRecording(self):
+        """Returns a :class:`Recording` with what was recorded so far."""
+        return Recording(self.__initialEquity, list(self.__dateTimes),
+                         numpy.array(self.__equity, dtype=numpy.float64), numpy.array(self.__cash, dtype=numpy.float64),
+                         list(self.__instruments), numpy.array(self.__fills, dtype=Recording.FILL_DTYPE),
+                         numpy.array(self.__initialShares, dtype=numpy.float64))
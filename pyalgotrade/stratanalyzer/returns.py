@@ -19,8 +19,8 @@
 """
 
 from pyalgotrade import stratanalyzer
-from pyalgotrade import observer
 from pyalgotrade import dataseries
+from pyalgotrade.stratanalyzer import metrics
 
 # Helper class to calculate returns and net profit.
 class PositionTracker:
@@ -93,49 +93,8 @@ class PositionTracker:
         self.__cash = self.__shares * -1 * price
         self.__cost = abs(self.__shares) * price
 
-class ReturnsAnalyzerBase(stratanalyzer.StrategyAnalyzer):
-    def __init__(self):
-        self.__netRet = 0
-        self.__cumRet = 0
-        self.__event = observer.Event()
-        self.__lastPortfolioValue = None
-
-    @classmethod
-    def getOrCreateShared(cls, strat):
-        name = cls.__name__
-        # Get or create the shared ReturnsAnalyzerBase.
-        ret = strat.getNamedAnalyzer(name)
-        if ret == None:
-            ret = ReturnsAnalyzerBase()
-            strat.attachAnalyzerEx(ret, name)
-        return ret
-
-    def attached(self, strat):
-        self.__lastPortfolioValue = strat.getBroker().getEquity()
-
-    # An event will be notified when return are calculated at each bar. The hander should receive 1 parameter:
-    # 1: This analyzer's instance
-    def getEvent(self):
-        return self.__event
-
-    def getNetReturn(self):
-        return self.__netRet
-
-    def getCumulativeReturn(self):
-        return self.__cumRet
-
-    def beforeOnBars(self, strat):
-        currentPortfolioValue = strat.getBroker().getEquity()
-        netReturn = (currentPortfolioValue - self.__lastPortfolioValue) / float(self.__lastPortfolioValue)
-        self.__lastPortfolioValue = currentPortfolioValue
-
-        self.__netRet = netReturn
-
-        # Calculate cumulative return.
-        self.__cumRet = (1 + self.__cumRet) * (1 + netReturn) - 1
-
-        # Notify that new returns are available.
-        self.__event.emit(self)
+# Returns are calculated by the shared PortfolioMetrics, along with the rest of the portfolio metrics.
+ReturnsAnalyzerBase = metrics.PortfolioMetrics
 
 class Returns(stratanalyzer.StrategyAnalyzer):
     """A :class:`pyalgotrade.stratanalyzer.StrategyAnalyzer` that calculates
@@ -146,13 +105,13 @@ class Returns(stratanalyzer.StrategyAnalyzer):
         self.__cumReturns = dataseries.SequenceDataSeries()
 
     def beforeAttach(self, strat):
-        # Get or create a shared ReturnsAnalyzerBase
-        analyzer = ReturnsAnalyzerBase.getOrCreateShared(strat)
+        # Get or create the shared PortfolioMetrics
+        analyzer = metrics.PortfolioMetrics.getOrCreateShared(strat)
         analyzer.getEvent().subscribe(self.__onReturns)
 
-    def __onReturns(self, returnsAnalyzerBase):
-        self.__netReturns.appendValue(returnsAnalyzerBase.getNetReturn())
-        self.__cumReturns.appendValue(returnsAnalyzerBase.getCumulativeReturn())
+    def __onReturns(self, portfolioMetrics):
+        self.__netReturns.appendValue(portfolioMetrics.getNetReturn())
+        self.__cumReturns.appendValue(portfolioMetrics.getCumulativeReturn())
 
     def getReturns(self):
         """Returns a :class:`pyalgotrade.dataseries.DataSeries` with the returns for each bar."""
@@ -19,7 +19,7 @@
 """
 
 from pyalgotrade import stratanalyzer
-from pyalgotrade.stratanalyzer import returns
+from pyalgotrade.stratanalyzer import metrics
 from pyalgotrade.utils import stats
 
 import math
@@ -72,18 +72,17 @@ def sharpe_ratio_2(returns, riskFreeRate, firstDateTime, lastDateTime, annualize
 
 class SharpeRatio(stratanalyzer.StrategyAnalyzer):
     """A :class:`pyalgotrade.stratanalyzer.StrategyAnalyzer` that calculates
-    Sharpe ratio for the whole portfolio."""
+    Sharpe ratio for the whole portfolio.
+
+    Only the running mean and variance of the returns are kept, so the Sharpe ratio can be calculated at any bar in
+    constant time and memory."""
 
     def __init__(self):
-        self.__netReturns = []
+        self.__metrics = None
 
     def beforeAttach(self, strat):
-        # Get or create a shared ReturnsAnalyzerBase
-        analyzer = returns.ReturnsAnalyzerBase.getOrCreateShared(strat)
-        analyzer.getEvent().subscribe(self.__onReturns)
-
-    def __onReturns(self, returnsAnalyzerBase):
-        self.__netReturns.append(returnsAnalyzerBase.getNetReturn())
+        # Get or create the shared PortfolioMetrics, which keeps the running mean and variance of the returns.
+        self.__metrics = metrics.PortfolioMetrics.getOrCreateShared(strat)
 
     def getSharpeRatio(self, riskFreeRate, tradingPeriods, annualized = True):
         """
@@ -101,4 +100,7 @@ class SharpeRatio(stratanalyzer.StrategyAnalyzer):
                 * If using daily bars, tradingPeriods should be set to 252.
                 * If using hourly bars (with 6.5 trading hours a day) then tradingPeriods should be set to 252 * 6.5 = 1638.
         """
-        return sharpe_ratio(self.__netReturns, riskFreeRate, tradingPeriods, annualized)
+        ret = 0.0
+        if self.__metrics is not None:
+            ret = self.__metrics.getSharpeRatio(riskFreeRate, tradingPeriods, annualized)
+        return ret
@@ -19,8 +19,7 @@
 """
 
 from pyalgotrade import stratanalyzer
-from pyalgotrade.stratanalyzer import returns
-from pyalgotrade.utils import stats
+from pyalgotrade.stratanalyzer import metrics
 import numpy as np
 import math
 
@@ -56,18 +55,57 @@ def days_traded(begin, end):
 
 class SortinoRatio(stratanalyzer.StrategyAnalyzer):
     """A :class:`pyalgotrade.stratanalyzer.StrategyAnalyzer` that calculates
-    Sharpe ratio for the whole portfolio."""
+    Sortino ratio for the whole portfolio.
 
-    def __init__(self):
-        self.__netReturns = []
+    :param targetReturn: The target return for which the downside deviation is calculated as returns come in.
+    :type targetReturn: int/float.
+    :param keepReturns: True to keep every return, so that the Sortino ratio can be calculated for any target return.
+    :type keepReturns: boolean.
+
+    .. note::
+            The Sortino ratio for targetReturn is calculated in constant time.
+            If keepReturns is False memory usage is constant as well.
+    """
+
+    def __init__(self, targetReturn=0, keepReturns=True):
+        self.__targetReturn = targetReturn
+        self.__netReturns = None
+        if keepReturns:
+            self.__netReturns = []
+        self.__metrics = None
+        # Sum of the squared differences for returns below the target return.
+        self.__downsideSum = 0.0
 
     def beforeAttach(self, strat):
-        # Get or create a shared ReturnsAnalyzerBase
-        analyzer = returns.ReturnsAnalyzerBase.getOrCreateShared(strat)
-        analyzer.getEvent().subscribe(self.__onReturns)
+        # Get or create the shared PortfolioMetrics, which keeps the running mean of the returns.
+        self.__metrics = metrics.PortfolioMetrics.getOrCreateShared(strat)
+        self.__metrics.getEvent().subscribe(self.__onReturns)
+
+    def __onReturns(self, portfolioMetrics):
+        netReturn = portfolioMetrics.getNetReturn()
+        if self.__netReturns is not None:
+            self.__netReturns.append(netReturn)
+        diff = netReturn - self.__targetReturn
+        if diff < 0:
+            self.__downsideSum += diff ** 2
+
+    def getSortinoRatio(self, targetReturns=None):
+        """Returns the annualized Sortino ratio.
 
-    def __onReturns(self, returnsAnalyzerBase):
-        self.__netReturns.append(returnsAnalyzerBase.getNetReturn())
+        :param targetReturns: The target return. If None, the one given in the constructor is used.
+        :type targetReturns: int/float.
+        """
+        if targetReturns is None or targetReturns == self.__targetReturn:
+            ret = 0
+            returnStats = None
+            if self.__metrics is not None:
+                returnStats = self.__metrics.getReturnStats()
+            if returnStats is not None and returnStats.getCount():
+                targetDownsideDeviation = math.sqrt(self.__downsideSum / returnStats.getCount())
+                if targetDownsideDeviation > 0.0001:
+                    ret = (returnStats.getMean() - self.__targetReturn) / targetDownsideDeviation * math.sqrt(252)
+            return ret
 
-    def getSortinoRatio(self, targetReturns=0):
+        if self.__netReturns is None:
+            raise Exception("Returns were not kept. Only the Sortino ratio for a target return of %s is available" % (self.__targetReturn))
         return sortino_ratio(self.__netReturns, targetReturns, annualized=True)
@@ -118,14 +118,6 @@ class Trades(stratanalyzer.StrategyAnalyzer):
         if not order.isFilled():
             return
 
-        # Get or create the tracker for this instrument.
-        try:
-            posTracker = self.__posTrackers[order.getInstrument()]
-        except KeyError:
-            posTracker = returns.PositionTracker()
-            self.__posTrackers[order.getInstrument()] = posTracker
-
-        # Update the tracker for this order.
         price = order.getExecutionInfo().getPrice()
         commission = order.getExecutionInfo().getCommission()
         action = order.getAction()
@@ -136,6 +128,29 @@ class Trades(stratanalyzer.StrategyAnalyzer):
         else: # Unknown action
             assert(False)
 
+        self.addFill(order.getInstrument(), quantity, price, commission)
+
+    def addFill(self, instrument, quantity, price, commission):
+        """Updates the trades with a fill. This is called for every filled order when the analyzer is attached
+        to a strategy, and can be used to calculate trades from recorded fills as well.
+
+        :param instrument: Instrument identifier.
+        :type instrument: string.
+        :param quantity: The number of shares. Positive when buying, negative when selling.
+        :type quantity: int.
+        :param price: The fill price.
+        :type price: float.
+        :param commission: The commission for the fill.
+        :type commission: float.
+        """
+        # Get or create the tracker for this instrument.
+        try:
+            posTracker = self.__posTrackers[instrument]
+        except KeyError:
+            posTracker = returns.PositionTracker()
+            self.__posTrackers[instrument] = posTracker
+
+        # Update the tracker for this fill.
         self.__updatePosTracker(posTracker, price, commission, quantity)
 
     def attached(self, strat):
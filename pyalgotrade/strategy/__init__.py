@@ -18,9 +18,16 @@
 .. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
 """
 
+import cPickle
+import copy_reg
+import inspect
+import types
+
 import pyalgotrade.broker
 import pyalgotrade.broker.backtesting
+import pyalgotrade.dataseries
 import pyalgotrade.observer
+import pyalgotrade.profiler
 import pyalgotrade.strategy.position
 
 #################################################################################
@@ -32,6 +39,72 @@ import pyalgotrade.strategy.position
 #################################################################################
 
 
+# Methods (ie. event handlers) can't be pickled by default, so while saving checkpoints they get pickled as the object
+# (or the class for unbound methods) and the attribute name, taking care of private names.
+def _get_method_name(method):
+    ret = method.im_func.__name__
+    if ret.startswith("__") and not ret.endswith("__"):
+        for cls in inspect.getmro(method.im_class):
+            mangled = "_%s%s" % (cls.__name__.lstrip("_"), ret)
+            if cls.__dict__.get(mangled) is method.im_func:
+                ret = mangled
+                break
+    return ret
+
+def _reduce_method(method):
+    obj = method.im_self
+    if obj is None:
+        # Unbound method.
+        obj = method.im_class
+    return (getattr, (obj, _get_method_name(method)))
+
+# Pickles obj with _reduce_method registered and the bar dataseries tail size set only for the duration of the call,
+# so pickling anywhere else is not affected.
+# Objects in externals are not pickled. Only their names are saved.
+def _dump_checkpoint(obj, f, tailSize, externals):
+    previous = copy_reg.dispatch_table.get(types.MethodType)
+    copy_reg.pickle(types.MethodType, _reduce_method)
+    previousTailSize = pyalgotrade.dataseries.set_checkpoint_tail_size(tailSize)
+    try:
+        pickler = cPickle.Pickler(f, cPickle.HIGHEST_PROTOCOL)
+        if externals:
+            names = dict([(id(external), name) for name, external in externals.iteritems()])
+            pickler.persistent_id = lambda obj_: names.get(id(obj_))
+        pickler.dump(obj)
+    finally:
+        pyalgotrade.dataseries.set_checkpoint_tail_size(previousTailSize)
+        if previous is None:
+            del copy_reg.dispatch_table[types.MethodType]
+        else:
+            copy_reg.dispatch_table[types.MethodType] = previous
+
+def load_checkpoint(path, externals = None):
+    """Loads a strategy saved with :meth:`Strategy.saveCheckpoint`. Call :meth:`Strategy.resume` on it to continue
+    running it.
+
+    :param path: The path to the checkpoint file.
+    :type path: string.
+    :param externals: The objects to use in place of the externals supplied to :meth:`Strategy.saveCheckpoint`,
+        with the same names.
+    :type externals: dictionary.
+    :rtype: :class:`Strategy`.
+    """
+    if externals is None:
+        externals = {}
+
+    def persistent_load(name):
+        if name not in externals:
+            raise Exception("The checkpoint references an external object named '%s' that was not supplied" % (name))
+        return externals[name]
+
+    f = open(path, "rb")
+    try:
+        unpickler = cPickle.Unpickler(f)
+        unpickler.persistent_load = persistent_load
+        return unpickler.load()
+    finally:
+        f.close()
+
 class Strategy:
     """Base class for strategies.
 
@@ -49,14 +122,18 @@ class Strategy:
 
     def __init__(self, barFeed, cash = 1000000, broker = None):
         self.__feed = barFeed
-        self.__activePositions = set()
+        # Active positions indexed by instrument.
+        self.__activePositions = {}
         self.__orderToPosition = {}
         self.__barsProcessedEvent = pyalgotrade.observer.Event()
         self.__analyzers = []
         self.__namedAnalyzers = {}
+        self.__profiler = None
+        self.__running = False
+        self.__pendingCheckpoint = None
 
         if broker == None:
-            # When doing backtesting (broker == None), the broker should subscribe to barFeed events before the strategy.
+            # When doing backtesting (broker == None), the broker handles barFeed events before the strategy.
             # This is to avoid executing orders placed in the current tick.
             self.__broker = pyalgotrade.broker.backtesting.Broker(cash, barFeed)
         else:
@@ -69,22 +146,87 @@ class Strategy:
     def getBarsProcessedEvent(self):
         return self.__barsProcessedEvent
 
+    def getProfiler(self):
+        """Returns the :class:`pyalgotrade.profiler.Profiler` set with :meth:`setProfiler`, or None."""
+        return self.__profiler
+
+    def setProfiler(self, profiler):
+        """Sets a :class:`pyalgotrade.profiler.Profiler` to time the strategy, the feed and the broker while running.
+        Call before :meth:`run`.
+
+        :param profiler: The profiler, or None to disable profiling.
+        :type profiler: :class:`pyalgotrade.profiler.Profiler`.
+        """
+        self.__profiler = profiler
+        self.__feed.setProfiler(profiler)
+        self.__broker.setProfiler(profiler)
+
+    def saveCheckpoint(self, path, tailSize = None, externals = None):
+        """Saves the state of the strategy, including the feed, the broker, the positions, the indicators and the
+        analyzers, so it can be loaded later with :func:`load_checkpoint` and resumed. If the strategy is running, the
+        checkpoint is saved once the current bars were processed.
+
+        :param path: The path to the checkpoint file.
+        :type path: string.
+        :param tailSize: The number of bars to save for each instrument, or None to save all of them.
+        :type tailSize: int.
+        :param externals: Objects that should not be saved, like connections, indexed by name. They have to be
+            supplied to :func:`load_checkpoint` with the same names.
+        :type externals: dictionary.
+
+        .. note::
+            * Every object reachable from the strategy, other than the externals, has to be picklable.
+            * Lambda functions can't be pickled, so they should not be used as event handlers.
+            * The bars that were not dispatched yet by CSV based feeds are not saved. They are loaded again from the
+              files, so those have to be available when the checkpoint is loaded.
+            * The bars older than the last tailSize ones are not available once the checkpoint is loaded, so tailSize
+              has to cover the periods of the indicators.
+        """
+        if self.__running:
+            self.__pendingCheckpoint = (path, tailSize, externals)
+        else:
+            self.__writeCheckpoint(path, tailSize, externals)
+
+    def __writeCheckpoint(self, path, tailSize, externals):
+        f = open(path, "wb")
+        try:
+            _dump_checkpoint(self, f, tailSize, externals)
+        finally:
+            f.close()
+
     def __registerOrder(self, position, order):
         assert(position.isOpen()) # Why would be registering an order for a closed position ?
-        self.__activePositions.add(position)
+        self.__activePositions.setdefault(position.getInstrument(), set()).add(position)
         assert(order.isAccepted())
         self.__orderToPosition[order] = position
 
     def __unregisterOrder(self, position, order):
         del self.__orderToPosition[order]
         if not position.isOpen():
-            self.__activePositions.remove(position)
+            positions = self.__activePositions[position.getInstrument()]
+            positions.remove(position)
+            if len(positions) == 0:
+                del self.__activePositions[position.getInstrument()]
 
     def __registerActivePosition(self, position):
         for order in [position.getEntryOrder(), position.getExitOrder()]:
             if order and order.isAccepted():
                 self.__registerOrder(position, order)
 
+    def getActivePositions(self, instrument = None):
+        """Returns a list with the positions that have orders pending.
+
+        :param instrument: If not None, only the positions for this instrument are returned.
+        :type instrument: string.
+        """
+        if instrument is None:
+            ret = []
+            for positions in self.__activePositions.itervalues():
+                ret.extend(positions)
+        else:
+            ret = list(self.__activePositions.get(instrument, []))
+        return ret
+
     def __notifyAnalyzers(self, lambdaExpression):
         for s in self.__analyzers:
             lambdaExpression(s)
@@ -415,13 +557,23 @@ class Strategy:
             assert(order.isCanceled())
 
     def __checkExitOnSessionClose(self, bars):
-        for position in self.__activePositions:
-            order = position.checkExitOnSessionClose(bars)
-            if order:
-                self.__registerOrder(position, order)
+        # Only the instruments with active positions whose session is about to close need to be checked.
+        for instrument, positions in self.__activePositions.items():
+            bar = bars.getBar(instrument)
+            if bar is None or bar.getBarsTillSessionClose() != 1:
+                continue
+            for position in list(positions):
+                if position.getExitOnSessionClose():
+                    order = position.checkExitOnSessionClose(bars)
+                    if order:
+                        self.__registerOrder(position, order)
 
     def __onBars(self, bars):
         # THE ORDER HERE IS VERY IMPORTANT
+        profiler = self.__profiler
+        if profiler is not None:
+            self.__onBarsProfiled(profiler, bars)
+            return
 
         self.__notifyAnalyzers(lambda s: s.beforeOnBars(self))
 
@@ -434,14 +586,45 @@ class Strategy:
         # 3: Notify that the bars were processed.
         self.__barsProcessedEvent.emit(self, bars)
 
+    # Same as __onBars, but timing each step.
+    def __onBarsProfiled(self, profiler, bars):
+        Phase = pyalgotrade.profiler.Phase
+        profiler.call(Phase.ANALYZERS, self.__notifyAnalyzers, lambda s: s.beforeOnBars(self))
+        profiler.call(Phase.ON_BARS, self.onBars, bars)
+        profiler.call(Phase.SESSION_CLOSE, self.__checkExitOnSessionClose, bars)
+        profiler.call(Phase.BARS_PROCESSED, self.__barsProcessedEvent.emit, self, bars)
+        profiler.onBarsProcessed()
+
     def run(self):
         """Call once (**and only once**) to backtest the strategy. """
         try:
             self.__feed.getNewBarsEvent().subscribe(self.__onBars)
             self.__feed.start()
             self.__broker.start()
+            if self.__profiler is not None:
+                self.__profiler.start()
             self.onStart()
+            self.__dispatch()
+        finally:
+            self.__stop()
+
+    def resume(self):
+        """Call once to continue running a strategy loaded with :func:`load_checkpoint`.
+        :meth:`onStart` is not called again."""
+        try:
+            self.__feed.getNewBarsEvent().subscribe(self.__onBars)
+            # Live feeds and brokers subscribe again to the connection when started.
+            self.__feed.start()
+            self.__broker.start()
+            if self.__profiler is not None:
+                self.__profiler.start()
+            self.__dispatch()
+        finally:
+            self.__stop()
 
+    def __dispatch(self):
+        self.__running = True
+        try:
             # Dispatch events as long as the feed or the broker have something to dispatch.
             stopDispBroker = self.__broker.stopDispatching()
             stopDispFeed = self.__feed.stopDispatching()
@@ -450,16 +633,28 @@ class Strategy:
                     self.__broker.dispatch()
                 if not stopDispFeed:
                     self.__feed.dispatch()
+                if self.__pendingCheckpoint is not None:
+                    self.__running = False
+                    path, tailSize, externals = self.__pendingCheckpoint
+                    self.__pendingCheckpoint = None
+                    self.__writeCheckpoint(path, tailSize, externals)
+                    self.__running = True
                 stopDispBroker = self.__broker.stopDispatching()
                 stopDispFeed = self.__feed.stopDispatching()
-
-            if self.__feed.getCurrentBars() != None:
-                self.onFinish(self.__feed.getCurrentBars())
-            else:
-                raise Exception("Feed was empty")
         finally:
-            self.__feed.getNewBarsEvent().unsubscribe(self.__onBars)
-            self.__broker.stop()
-            self.__feed.stop()
-            self.__broker.join()
-            self.__feed.join()
+            self.__running = False
+
+        if self.__profiler is not None:
+            self.__profiler.stop()
+
+        if self.__feed.getCurrentBars() != None:
+            self.onFinish(self.__feed.getCurrentBars())
+        else:
+            raise Exception("Feed was empty")
+
+    def __stop(self):
+        self.__feed.getNewBarsEvent().unsubscribe(self.__onBars)
+        self.__broker.stop()
+        self.__feed.stop()
+        self.__broker.join()
+        self.__feed.join()
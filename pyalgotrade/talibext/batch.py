@@ -0,0 +1,167 @@
+# PyAlgoTrade
+#
+# Copyright 2013 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import numpy
+
+from pyalgotrade import dataseries
+from pyalgotrade import bar
+
+# Bar values that can be used as TA-Lib inputs.
+BAR_VALUES = {
+    "o": bar.Bar.getOpen,
+    "h": bar.Bar.getHigh,
+    "l": bar.Bar.getLow,
+    "c": bar.Bar.getClose,
+    "v": bar.Bar.getVolume,
+    "a": bar.Bar.getAdjClose,
+}
+
+class Indicator:
+    """A TA-Lib function to calculate with :func:`compute`.
+
+    :param inputs: The bar values to feed the TA-Lib function with, one character per value: **o** for open, **h** for
+        high, **l** for low, **c** for close, **v** for volume and **a** for adjusted close. For example, "c" for
+        talib.SMA or "hlc" for talib.ADX.
+    :type inputs: string.
+    :param talibFunc: The TA-Lib function.
+    :param parameters: Additional parameters for the TA-Lib function.
+    """
+
+    def __init__(self, inputs, talibFunc, *parameters):
+        for value in inputs:
+            if value not in BAR_VALUES:
+                raise Exception("Invalid input '%s'" % (value))
+        self.__inputs = inputs
+        self.__talibFunc = talibFunc
+        self.__parameters = parameters
+
+    def getInputs(self):
+        return self.__inputs
+
+    def calculate(self, columns):
+        ret = self.__talibFunc(*([columns[value] for value in self.__inputs] + list(self.__parameters)))
+        if not isinstance(ret, tuple):
+            ret = (ret,)
+        return ret
+
+class ComputedDataSeries(dataseries.DataSeries):
+    """A :class:`pyalgotrade.dataseries.DataSeries` with values calculated beforehand, aligned with the
+    :class:`pyalgotrade.dataseries.BarDataSeries` of the instrument they were calculated for. As bars get
+    dispatched, the values for them become available, so position -1 always has the value for the current bar.
+    """
+
+    def __init__(self, barDs, values):
+        self.__barDs = barDs
+        # The bars that were dispatched before calculating the values have no value.
+        self.__offset = barDs.getLength()
+        self.__values = values
+
+    def getFirstValidPos(self):
+        return 0
+
+    def getLength(self):
+        return min(self.__barDs.getLength(), self.__offset + len(self.__values))
+
+    def getValueAbsolute(self, pos):
+        ret = None
+        if pos >= self.__offset and pos < self.getLength():
+            ret = self.__values[pos - self.__offset]
+            if numpy.isnan(ret):
+                ret = None
+            else:
+                ret = float(ret)
+        return ret
+
+    def getDateTimes(self):
+        return self.__barDs.getDateTimes()[:self.getLength()]
+
+    def getValues(self):
+        """Returns a numpy.array with every value calculated, including the ones for bars not dispatched yet.
+        NaN is used for the values that couldn't be calculated."""
+        return self.__values
+
+class Results:
+    """The results returned by :func:`compute`."""
+
+    def __init__(self):
+        self.__dataSeries = {}
+
+    def add(self, instrument, name, dataSeries):
+        self.__dataSeries.setdefault(instrument, {})[name] = dataSeries
+
+    def getInstruments(self):
+        return self.__dataSeries.keys()
+
+    def getDataSeries(self, instrument, name, output = 0):
+        """Returns a :class:`ComputedDataSeries` with the values for an indicator.
+
+        :param instrument: Instrument identifier.
+        :type instrument: string.
+        :param name: The indicator name, as given to :func:`compute`.
+        :type name: string.
+        :param output: The output index. For example, 0 for the MACD, 1 for the signal and 2 for the histogram when
+            using talib.MACD.
+        :type output: int.
+        """
+        return self.__dataSeries[instrument][name][output]
+
+def bars_to_columns(bars, values):
+    """Returns a dictionary with a numpy.array of floats for each one of the bar values requested.
+
+    :param bars: A sequence of :class:`pyalgotrade.bar.Bar`.
+    :param values: The bar values to convert. See :class:`Indicator`.
+    :type values: string.
+    """
+    ret = {}
+    for value in values:
+        if value not in ret:
+            method = BAR_VALUES[value]
+            ret[value] = numpy.fromiter((method(bar_) for bar_ in bars), dtype=numpy.float64, count=len(bars))
+    return ret
+
+def compute(feed, indicators, instruments = None):
+    """Calculates TA-Lib functions over the whole history of a feed, with a single call per function and instrument.
+    This should be called before running the strategy, and the strategy can then use the dataseries returned as
+    it would use the ones from :mod:`pyalgotrade.technical`.
+
+    :param feed: A feed that holds every bar in memory, like :class:`pyalgotrade.barfeed.csvfeed.BarFeed` or
+        the one used by the optimizer.
+    :param indicators: A dictionary from names to :class:`Indicator` instances.
+    :type indicators: dict.
+    :param instruments: The instruments to calculate the indicators for. If None, every instrument in the feed is used.
+    :type instruments: list.
+    :rtype: A :class:`Results` instance.
+
+    .. note::
+        Only the bars not dispatched yet are used.
+    """
+    if instruments is None:
+        instruments = feed.getRegisteredInstruments()
+
+    inputs = "".join([indicator.getInputs() for indicator in indicators.itervalues()])
+    ret = Results()
+    for instrument in instruments:
+        barDs = feed.getDataSeries(instrument)
+        # Each bar value gets converted only once, no matter how many indicators use it.
+        columns = bars_to_columns(feed.getBars(instrument), inputs)
+        for name, indicator in indicators.iteritems():
+            outputs = indicator.calculate(columns)
+            ret.add(instrument, name, [ComputedDataSeries(barDs, values) for values in outputs])
+    return ret
@@ -0,0 +1,212 @@
+# PyAlgoTrade
+#
+# Copyright 2013 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import numpy
+
+from pyalgotrade import dataseries
+
+class Buffer:
+    """A growable numpy.array of floats. Values are appended in place and :meth:`getValues` returns a view, so
+    nothing gets copied when passing the values to TA-Lib."""
+
+    def __init__(self, capacity = 1024):
+        self.__values = numpy.empty(max(capacity, 1), dtype=numpy.float64)
+        self.__length = 0
+
+    def __len__(self):
+        return self.__length
+
+    def __reserve(self, length):
+        if length > len(self.__values):
+            values = numpy.empty(max(length, len(self.__values) * 2), dtype=numpy.float64)
+            values[:self.__length] = self.__values[:self.__length]
+            self.__values = values
+
+    def append(self, value):
+        self.__reserve(self.__length + 1)
+        self.__values[self.__length] = value
+        self.__length += 1
+
+    def extend(self, values):
+        self.__reserve(self.__length + len(values))
+        self.__values[self.__length:self.__length + len(values)] = values
+        self.__length += len(values)
+
+    def getValues(self, begin = 0, end = None):
+        """Returns a view of the values in [begin, end)."""
+        if end is None:
+            end = self.__length
+        return self.__values[begin:end]
+
+class Indicator:
+    """Calculates a TA-Lib function over one or more dataseries as they grow, converting each value only once and
+    calculating only the values that were not calculated before.
+
+    :param inputs: The dataseries to feed TA-Lib with. They should all have the same length.
+    :type inputs: list of :class:`pyalgotrade.dataseries.DataSeries`.
+    :param lookback: The number of past values that each new value depends on. For example, 9 for talib.SMA with a
+        timeperiod of 10.
+    :type lookback: int.
+    :param talibFunc: The TA-Lib function.
+    :param parameters: Additional parameters for the TA-Lib function.
+    :param memory: False if the TA-Lib function has no memory, like SMA, where each value depends only on the
+        **lookback** values before it. True for functions like EMA, MACD or ADX, where each value depends on every
+        value before it. Must be passed as a keyword argument.
+    :type memory: boolean.
+
+    Each value is calculated over itself and the **lookback** values before it, so passing **count** - 1 as the
+    lookback gives the same values that the functions in :mod:`pyalgotrade.talibext.indicator` return for the last
+    position when called with **count**, regardless of how often :meth:`update` gets called. For functions with
+    memory, that takes one TA-Lib call per new value, and the bigger the lookback the closer the values get to those
+    calculated over the whole history. For functions without memory, the new values are calculated with a single
+    TA-Lib call.
+
+    Values that can't be calculated (not enough values or None values in the window) are None.
+
+    .. note::
+        The values are calculated when the dataseries returned by :meth:`getDataSeries` are accessed, or when
+        :meth:`update` gets called.
+    """
+
+    def __init__(self, inputs, lookback, talibFunc, *parameters, **kwargs):
+        assert(len(inputs) > 0)
+        assert(lookback >= 0)
+        self.__memory = kwargs.pop("memory", True)
+        if len(kwargs):
+            raise Exception("Invalid arguments %s" % (kwargs.keys()))
+        self.__inputs = inputs
+        self.__lookback = lookback
+        self.__talibFunc = talibFunc
+        self.__parameters = parameters
+        self.__buffers = [Buffer() for ds in inputs]
+        # One buffer per TA-Lib output. Built after the first call since the number of outputs is not known until then.
+        self.__outputs = None
+        self.__dataSeries = {}
+
+    def __convertNewValues(self):
+        length = min([ds.getLength() for ds in self.__inputs])
+        for ds, buf in zip(self.__inputs, self.__buffers):
+            for i in xrange(len(buf), length):
+                value = ds.getValueAbsolute(i)
+                if value is None:
+                    value = numpy.nan
+                buf.append(value)
+        return length
+
+    def __calculate(self, begin, end):
+        values = [buf.getValues(begin, end) for buf in self.__buffers]
+        ret = self.__talibFunc(*(values + list(self.__parameters)))
+        if not isinstance(ret, tuple):
+            ret = (ret,)
+        if self.__outputs is None:
+            self.__outputs = [Buffer() for output in ret]
+        return ret
+
+    def update(self):
+        """Calculates the values for the new values in the dataseries. Returns the number of values calculated."""
+        calculated = 0 if self.__outputs is None else len(self.__outputs[0])
+        length = self.__convertNewValues()
+        if length == calculated:
+            return 0
+
+        if self.__memory:
+            # One call per value, so the values don't depend on how many of them are calculated at once.
+            for pos in xrange(calculated, length):
+                result = self.__calculate(max(0, pos - self.__lookback), pos + 1)
+                for buf, output in zip(self.__outputs, result):
+                    buf.append(output[-1])
+        else:
+            begin = max(0, calculated - self.__lookback)
+            result = self.__calculate(begin, length)
+            # Only the tail was not calculated before.
+            skip = calculated - begin
+            for buf, output in zip(self.__outputs, result):
+                buf.extend(output[skip:])
+        return length - calculated
+
+    def getValues(self, output = 0):
+        """Returns a numpy.array view with the values calculated so far for a given output. NaN is used for the values
+        that couldn't be calculated."""
+        self.update()
+        if self.__outputs is None:
+            return numpy.empty(0, dtype=numpy.float64)
+        return self.__outputs[output].getValues()
+
+    def getDataSeries(self, output = 0):
+        """Returns a :class:`pyalgotrade.dataseries.DataSeries` for one of the outputs of the TA-Lib function.
+
+        :param output: The output index. For example, 0 for the MACD, 1 for the signal and 2 for the histogram when
+            using talib.MACD.
+        :type output: int.
+        """
+        ret = self.__dataSeries.get(output)
+        if ret is None:
+            ret = IndicatorDataSeries(self, output)
+            self.__dataSeries[output] = ret
+        return ret
+
+    def getInputs(self):
+        return self.__inputs
+
+class IndicatorDataSeries(dataseries.DataSeries):
+    def __init__(self, indicator, output):
+        self.__indicator = indicator
+        self.__output = output
+
+    def getFirstValidPos(self):
+        return 0
+
+    def getLength(self):
+        return len(self.__indicator.getValues(self.__output))
+
+    def getValueAbsolute(self, pos):
+        ret = None
+        values = self.__indicator.getValues(self.__output)
+        if pos >= 0 and pos < len(values):
+            ret = values[pos]
+            if numpy.isnan(ret):
+                ret = None
+            else:
+                ret = float(ret)
+        return ret
+
+    def getDateTimes(self):
+        return self.__indicator.getInputs()[0].getDateTimes()
+
+# Calculates a talib function incrementally over a dataseries.
+def ds_indicator(ds, lookback, talibFunc, *parameters, **kwargs):
+    return Indicator([ds], lookback, talibFunc, *parameters, **kwargs)
+
+# hlcv: High, Low, Close and Volume.
+def hlcv_indicator(barDs, lookback, talibFunc, *parameters, **kwargs):
+    inputs = [barDs.getHighDataSeries(), barDs.getLowDataSeries(), barDs.getCloseDataSeries(), barDs.getVolumeDataSeries()]
+    return Indicator(inputs, lookback, talibFunc, *parameters, **kwargs)
+
+def hlc_indicator(barDs, lookback, talibFunc, *parameters, **kwargs):
+    inputs = [barDs.getHighDataSeries(), barDs.getLowDataSeries(), barDs.getCloseDataSeries()]
+    return Indicator(inputs, lookback, talibFunc, *parameters, **kwargs)
+
+def ohlc_indicator(barDs, lookback, talibFunc, *parameters, **kwargs):
+    inputs = [barDs.getOpenDataSeries(), barDs.getHighDataSeries(), barDs.getLowDataSeries(), barDs.getCloseDataSeries()]
+    return Indicator(inputs, lookback, talibFunc, *parameters, **kwargs)
+
+def hl_indicator(barDs, lookback, talibFunc, *parameters, **kwargs):
+    inputs = [barDs.getHighDataSeries(), barDs.getLowDataSeries()]
+    return Indicator(inputs, lookback, talibFunc, *parameters, **kwargs)
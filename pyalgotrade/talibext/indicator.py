@@ -26,10 +26,12 @@ def value_ds_to_numpy(ds, count):
     ret = None
     try:
         values = ds[count*-1:]
-        ret = numpy.array([float(value) for value in values])
+        # numpy converts None to NaN, so check for it before converting all the values at once.
+        if None not in values:
+            ret = numpy.array(values, dtype=numpy.float64)
     except IndexError:
         pass
-    except TypeError: # In case we try to convert None to float.
+    except (TypeError, ValueError): # In case there are values that can't be converted to float.
         pass
     return ret
 
@@ -56,71 +58,71 @@ def bar_ds_volume_to_numpy(barDs, count):
 # Calls a talib function with the last values of a dataseries.
 def call_talib_with_ds(ds, count, talibFunc, *parameters):
     data = value_ds_to_numpy(ds, count)
-    if data == None:
+    if data is None:
         return None
     return talibFunc(data, *parameters)
 
 # hlcv: High, Low, Close and Volume.
 def call_talib_with_hlcv(barDs, count, talibFunc, *parameters):
     high = bar_ds_high_to_numpy(barDs, count)
-    if high == None:
+    if high is None:
         return None
 
     low = bar_ds_low_to_numpy(barDs, count)
-    if low == None:
+    if low is None:
         return None
 
     close = bar_ds_close_to_numpy(barDs, count)
-    if close == None:
+    if close is None:
         return None
 
     volume = bar_ds_volume_to_numpy(barDs, count)
-    if volume == None:
+    if volume is None:
         return None
 
     return talibFunc(high, low, close, volume, *parameters)
 
 def call_talib_with_hlc(barDs, count, talibFunc, *parameters):
     high = bar_ds_high_to_numpy(barDs, count)
-    if high == None:
+    if high is None:
         return None
 
     low = bar_ds_low_to_numpy(barDs, count)
-    if low == None:
+    if low is None:
         return None
 
     close = bar_ds_close_to_numpy(barDs, count)
-    if close == None:
+    if close is None:
         return None
 
     return talibFunc(high, low, close, *parameters)
 
 def call_talib_with_ohlc(barDs, count, talibFunc, *parameters):
     open_ = bar_ds_open_to_numpy(barDs, count)
-    if open_ == None:
+    if open_ is None:
         return None
 
     high = bar_ds_high_to_numpy(barDs, count)
-    if high == None:
+    if high is None:
         return None
 
     low = bar_ds_low_to_numpy(barDs, count)
-    if low == None:
+    if low is None:
         return None
 
     close = bar_ds_close_to_numpy(barDs, count)
-    if close == None:
+    if close is None:
         return None
 
     return talibFunc(open_, high, low, close, *parameters)
 
 def call_talib_with_hl(barDs, count, talibFunc, *parameters):
     high = bar_ds_high_to_numpy(barDs, count)
-    if high == None:
+    if high is None:
         return None
 
     low = bar_ds_low_to_numpy(barDs, count)
-    if low == None:
+    if low is None:
         return None
 
     return talibFunc(high, low, *parameters)
@@ -151,7 +153,7 @@ def APO(ds, count, fastperiod=-2**31, slowperiod=-2**31, matype=0):
 def AROON(barDs, count, timeperiod=-2**31):
     """Aroon"""
     ret = call_talib_with_hl(barDs, count, talib.AROON, timeperiod)
-    if ret == None:
+    if ret is None:
         ret = (None, None)
     return ret
 
@@ -170,17 +172,17 @@ def AVGPRICE(barDs, count):
 def BBANDS(ds, count, timeperiod=-2**31, nbdevup=-4e37, nbdevdn=-4e37, matype=0):
     """Bollinger Bands"""
     ret = call_talib_with_ds(ds, count, talib.BBANDS, timeperiod, nbdevup, nbdevdn, matype)
-    if ret == None:
+    if ret is None:
         ret = (None, None, None)
     return ret
 
 def BETA(ds1, ds2, count, timeperiod=-2**31):
     """Beta"""
     data1 = value_ds_to_numpy(ds1, count)
-    if data1 == None:
+    if data1 is None:
         return None
     data2 = value_ds_to_numpy(ds2, count)
-    if data2 == None:
+    if data2 is None:
         return None
     return talib.BETA(data1, data2, timeperiod)
 
@@ -443,10 +445,10 @@ def CMO(ds, count, timeperiod=-2**31):
 def CORREL(ds1, ds2, count, timeperiod=-2**31):
     """Pearson's Correlation Coefficient (r)"""
     data1 = value_ds_to_numpy(ds1, count)
-    if data1 == None:
+    if data1 is None:
         return None
     data2 = value_ds_to_numpy(ds2, count)
-    if data2 == None:
+    if data2 is None:
         return None
     return talib.CORREL(data1, data2, timeperiod)
 
@@ -473,14 +475,14 @@ def HT_DCPHASE(ds, count):
 def HT_PHASOR(ds, count):
     """Hilbert Transform - Phasor Components"""
     ret = call_talib_with_ds(ds, count, talib.HT_PHASOR)
-    if ret == None:
+    if ret is None:
         ret = (None, None)
     return ret
 
 def HT_SINE(ds, count):
     """Hilbert Transform - SineWave"""
     ret = call_talib_with_ds(ds, count, talib.HT_SINE)
-    if ret == None:
+    if ret is None:
         ret = (None, None)
     return ret
 
@@ -519,28 +521,28 @@ def MA(ds, count, timeperiod=-2**31, matype=0):
 def MACD(ds, count, fastperiod=-2**31, slowperiod=-2**31, signalperiod=-2**31):
     """Moving Average Convergence/Divergence"""
     ret = call_talib_with_ds(ds, count, talib.MACD, fastperiod, slowperiod, signalperiod)
-    if ret == None:
+    if ret is None:
         ret = (None, None, None)
     return ret
 
 def MACDEXT(ds, count, fastperiod=-2**31, fastmatype=0, slowperiod=-2**31, slowmatype=0, signalperiod=-2**31, signalmatype=0):
     """MACD with controllable MA type"""
     ret = call_talib_with_ds(ds, count, talib.MACDEXT, fastperiod, fastmatype, slowperiod, slowmatype, signalperiod, signalmatype)
-    if ret == None:
+    if ret is None:
         ret = (None, None, None)
     return ret
 
 def MACDFIX(ds, count, signalperiod=-2**31):
     """Moving Average Convergence/Divergence Fix 12/26"""
     ret = call_talib_with_ds(ds, count, talib.MACDFIX, signalperiod)
-    if ret == None:
+    if ret is None:
         ret = (None, None, None)
     return ret
 
 def MAMA(ds, count, fastlimit=-4e37, slowlimit=-4e37):
     """MESA Adaptive Moving Average"""
     ret = call_talib_with_ds(ds, count, talib.MAMA, fastlimit, slowlimit)
-    if ret == None:
+    if ret is None:
         ret = (None, None)
     return ret
 
@@ -579,14 +581,14 @@ def MININDEX(ds, count, timeperiod=-2**31):
 def MINMAX(ds, count, timeperiod=-2**31):
     """Lowest and highest values over a specified period"""
     ret = call_talib_with_ds(ds, count, talib.MINMAX, timeperiod)
-    if ret == None:
+    if ret is None:
         ret = (None, None)
     return ret
 
 def MINMAXINDEX(ds, count, timeperiod=-2**31):
     """Indexes of lowest and highest values over a specified period"""
     ret = call_talib_with_ds(ds, count, talib.MINMAXINDEX, timeperiod)
-    if ret == None:
+    if ret is None:
         ret = (None, None)
     return ret
 
@@ -609,10 +611,10 @@ def NATR(barDs, count, timeperiod=-2**31):
 def OBV(ds1, volumeDs, count):
     """On Balance Volume"""
     data1 = value_ds_to_numpy(ds1, count)
-    if data1 == None:
+    if data1 is None:
         return None
     data2 = value_ds_to_numpy(volumeDs, count)
-    if data2 == None:
+    if data2 is None:
         return None
     return talib.OBV(data1, data2)
 
@@ -667,21 +669,21 @@ def STDDEV(ds, count, timeperiod=-2**31, nbdev=-4e37):
 def STOCH(barDs, count, fastk_period=-2**31, slowk_period=-2**31, slowk_matype=0, slowd_period=-2**31, slowd_matype=0):
     """Stochastic"""
     ret = call_talib_with_hlc(barDs, count, talib.STOCH, fastk_period, slowk_period, slowk_matype, slowd_period, slowd_matype)
-    if ret == None:
+    if ret is None:
         ret = (None, None)
     return ret
 
 def STOCHF(barDs, count, fastk_period=-2**31, fastd_period=-2**31, fastd_matype=0):
     """Stochastic Fast"""
     ret = call_talib_with_hlc(barDs, count, talib.STOCHF, fastk_period, fastd_period, fastd_matype)
-    if ret == None:
+    if ret is None:
         ret = (None, None)
     return ret
 
 def STOCHRSI(ds, count, timeperiod=-2**31, fastk_period=-2**31, fastd_period=-2**31, fastd_matype=0):
     """Stochastic Relative Strength Index"""
     ret = call_talib_with_ds(ds, count, talib.STOCHRSI, timeperiod, fastk_period, fastd_period, fastd_matype)
-    if ret == None:
+    if ret is None:
         ret = (None, None)
     return ret
 
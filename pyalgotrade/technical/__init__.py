@@ -18,6 +18,8 @@
 .. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
 """
 
+import inspect
+
 from pyalgotrade import dataseries
 
 class TechnicalIndicatorBase(dataseries.DataSeries):
@@ -95,6 +97,62 @@ class DataSeriesFilter(TechnicalIndicatorBase):
     def getDateTimes(self):
         return self.__dataSeries.getDateTimes()
 
+# Builds a hashable key out of indicator constructor arguments. DataSeries instances are compared by identity.
+def make_key(value):
+    if isinstance(value, (list, tuple)):
+        return tuple([make_key(item) for item in value])
+    elif isinstance(value, dict):
+        return tuple([(k, make_key(v)) for k, v in sorted(value.iteritems())])
+    return value
+
+class IndicatorRegistry:
+    """Keeps a single instance of each indicator, so identical indicators built by different strategies or by other
+    indicators are calculated only once. Indicators are identified by their class and the arguments used to build them,
+    and the dataseries they filter are compared by identity.
+
+    A registry is available for each feed through :meth:`pyalgotrade.barfeed.BasicBarFeed.getIndicatorRegistry`.
+    """
+
+    def __init__(self):
+        self.__indicators = {}
+        self.__hits = 0
+
+    def __len__(self):
+        return len(self.__indicators)
+
+    def getOrCreate(self, cls, *args, **kwargs):
+        """Returns the instance of an indicator built with the given arguments, building it if necessary.
+
+        :param cls: The indicator class.
+        :param args: The positional arguments for the indicator constructor.
+        :param kwargs: The keyword arguments for the indicator constructor. The **registry** argument, if any, is not
+            taken into account to identify the indicator.
+
+        .. note::
+            Arguments are matched to the constructor parameters, so SMA(ds, 20) and SMA(ds, period=20) are the same indicator.
+        """
+        callArgs = inspect.getcallargs(cls.__init__, None, *args, **kwargs)
+        callArgs.pop("self", None)
+        callArgs.pop("registry", None)
+        key = (cls, make_key(callArgs))
+        ret = self.__indicators.get(key)
+        if ret is None:
+            ret = cls(*args, **kwargs)
+            self.__indicators[key] = ret
+        else:
+            self.__hits += 1
+        return ret
+
+    def getHits(self):
+        """Returns the number of times an existing indicator was returned instead of building a new one."""
+        return self.__hits
+
+# Builds an indicator through a registry, if one is given.
+def get_or_create(indicatorRegistry, cls, *args, **kwargs):
+    if indicatorRegistry is None:
+        return cls(*args, **kwargs)
+    return indicatorRegistry.getOrCreate(cls, *args, **kwargs)
+
 # Cache with FIFO replacement policy.
 class Cache:
     class ValueNotCached:
@@ -105,12 +163,25 @@ class Cache:
         self.__size = size
         self.__cache = {}
         self.__pos = []
+        self.__hits = 0
+        self.__misses = 0
 
     def isCached(self, pos):
         return pos in self.__cache
 
     def getValue(self, pos, default=None):
-        return self.__cache.get(pos, default)
+        ret = self.__cache.get(pos, default)
+        if ret is default:
+            self.__misses += 1
+        else:
+            self.__hits += 1
+        return ret
+
+    def getHits(self):
+        return self.__hits
+
+    def getMisses(self):
+        return self.__misses
 
     def putValue(self, pos, value):
         self.__cache[pos] = value
@@ -23,9 +23,12 @@ from pyalgotrade.technical import ma
 from pyalgotrade.technical import stats
 
 class Band(technical.DataSeriesFilter):
-    def __init__(self, middleBandDS, priceDS, n, k):
+    def __init__(self, middleBandDS, priceDS, n, k, registry = None, stdDev = None):
         technical.DataSeriesFilter.__init__(self, middleBandDS, 1)
-        self.__stdDev = stats.StdDev(priceDS, n)
+        # The standard deviation of priceDS over n values can be given to share it with other bands.
+        if stdDev is None:
+            stdDev = technical.get_or_create(registry, stats.StdDev, priceDS, n)
+        self.__stdDev = stdDev
         self.__k = k
 
     def calculateValue(self, firstPos, lastPos):
@@ -45,12 +48,17 @@ class BollingerBands:
     :type period: int.
     :param numStdDev: The number of standard deviations to use for the upper and lower bands.
     :type numStdDev: int.
+    :param registry: If not None, the SMA and the standard deviation are taken from this registry, so they are shared with
+        other indicators.
+    :type registry: :class:`pyalgotrade.technical.IndicatorRegistry`.
     """
 
-    def __init__(self, dataSeries, period, numStdDev):
-        self.__middleBand = ma.SMA(dataSeries, period)
-        self.__upperBand = Band(self.__middleBand, dataSeries, period, numStdDev)
-        self.__lowerBand = Band(self.__middleBand, dataSeries, period, numStdDev*-1)
+    def __init__(self, dataSeries, period, numStdDev, registry = None):
+        self.__middleBand = technical.get_or_create(registry, ma.SMA, dataSeries, period)
+        # Both bands share the same standard deviation, so it is calculated only once.
+        stdDev = technical.get_or_create(registry, stats.StdDev, dataSeries, period)
+        self.__upperBand = technical.get_or_create(registry, Band, self.__middleBand, dataSeries, period, numStdDev, stdDev=stdDev)
+        self.__lowerBand = technical.get_or_create(registry, Band, self.__middleBand, dataSeries, period, numStdDev*-1, stdDev=stdDev)
 
     def getUpperBand(self):
         """
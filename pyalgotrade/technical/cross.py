@@ -20,6 +20,10 @@
 
 from pyalgotrade import technical
 
+import collections
+
+import numpy
+
 def compute_diff(values1, values2):
     assert(len(values1) == len(values2))
     ret = []
@@ -39,6 +43,10 @@ def positive(value):
 def negative(value):
     return value < 0
 
+# Returns True if the sign check passes for diff but not for prevDiff.
+def is_cross(prevDiff, diff, signCheck):
+    return prevDiff is not None and diff is not None and not signCheck(prevDiff) and signCheck(diff)
+
 class Base(technical.TechnicalIndicatorBase):
     def __init__(self, ds1, ds2, period, signCheck):
         assert(period > 1)
@@ -47,6 +55,13 @@ class Base(technical.TechnicalIndicatorBase):
         self.__ds2 = ds2
         self.__period = period
         self.__signCheck = signCheck
+        # State for the last position calculated, to calculate the next one in O(1).
+        self.__lastPos = None
+        self.__lastDiff = None
+        # 1 for the positions in the window where a cross took place, 0 otherwise. The first position in the window is
+        # not included since the value before it is not in the window.
+        self.__crosses = collections.deque()
+        self.__crossCount = 0
 
     def getDateTimes(self):
         # I'm using self.__ds1 because this is basically a wrapper on top of the first dataseries.
@@ -59,22 +74,37 @@ class Base(technical.TechnicalIndicatorBase):
         # I'm using self.__ds1 because this is basically a wrapper on top of the first dataseries.
         return self.__ds1.getLength()
 
-    def calculateValue(self, firstPos, lastPos):
-        # Get both set of values.
-        firstPos = max(lastPos - (self.__period - 1), 0)
-        valuesDS1 = self.__ds1.getValuesAbsolute(firstPos, lastPos, True)
-        valuesDS2 = self.__ds2.getValuesAbsolute(firstPos, lastPos, True)
-
-        # Compute differences and check sign changes.
-        ret = 0
-        diffs = compute_diff(valuesDS1, valuesDS2)
-        prevDiff = None
-        for diff in diffs:
-            if prevDiff != None and not self.__signCheck(prevDiff) and self.__signCheck(diff):
-                ret += 1
-            prevDiff = diff
+    def __getDiff(self, pos):
+        ret = None
+        v1 = self.__ds1.getValueAbsolute(pos)
+        v2 = self.__ds2.getValueAbsolute(pos)
+        if v1 != None and v2 != None:
+            ret = v1 - v2
         return ret
 
+    def __addCross(self, diff):
+        cross = int(is_cross(self.__lastDiff, diff, self.__signCheck))
+        self.__crosses.append(cross)
+        self.__crossCount += cross
+        if len(self.__crosses) > self.__period - 1:
+            self.__crossCount -= self.__crosses.popleft()
+        self.__lastDiff = diff
+
+    def calculateValue(self, firstPos, lastPos):
+        if self.__lastPos is not None and self.__lastPos == lastPos - 1:
+            # Slide the window one position.
+            self.__addCross(self.__getDiff(lastPos))
+        else:
+            # Check sign changes over the whole window.
+            firstPos = max(lastPos - (self.__period - 1), 0)
+            self.__crosses.clear()
+            self.__crossCount = 0
+            self.__lastDiff = self.__getDiff(firstPos)
+            for pos in xrange(firstPos + 1, lastPos + 1):
+                self.__addCross(self.__getDiff(pos))
+        self.__lastPos = lastPos
+        return self.__crossCount
+
 class CrossAbove(Base):
     """Checks for a cross above conditions over the specified period between two DataSeries objects.
 
@@ -106,3 +136,34 @@ class CrossBelow(Base):
 
     def __init__(self, ds1, ds2, period = 2):
         Base.__init__(self, ds1, ds2, period, negative)
+
+######################################################################
+## Batch versions
+
+def cross_positions(values1, values2, signCheck):
+    diffs = numpy.asarray(values1, dtype=numpy.float64) - numpy.asarray(values2, dtype=numpy.float64)
+    valid = ~numpy.isnan(diffs)
+    with numpy.errstate(invalid="ignore"):
+        checks = signCheck(diffs)
+    crosses = valid[:-1] & valid[1:] & ~checks[:-1] & checks[1:]
+    return numpy.flatnonzero(crosses) + 1
+
+def cross_above_positions(values1, values2):
+    """Returns a numpy.array with the positions where values1 crossed above values2.
+
+    :param values1: The values that cross. NaN is used for missing values.
+    :type values1: numpy.array.
+    :param values2: The values being crossed. NaN is used for missing values.
+    :type values2: numpy.array.
+    """
+    return cross_positions(values1, values2, positive)
+
+def cross_below_positions(values1, values2):
+    """Returns a numpy.array with the positions where values1 crossed below values2.
+
+    :param values1: The values that cross. NaN is used for missing values.
+    :type values1: numpy.array.
+    :param values2: The values being crossed. NaN is used for missing values.
+    :type values2: numpy.array.
+    """
+    return cross_positions(values1, values2, negative)
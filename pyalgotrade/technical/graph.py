@@ -0,0 +1,264 @@
+# PyAlgoTrade
+#
+# Copyright 2013 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import collections
+
+from pyalgotrade import dataseries
+from pyalgotrade.technical import cross
+
+class Node(dataseries.DataSeries):
+    """Base class for indicators that get their values pushed by an :class:`IndicatorGraph`, instead of calculating
+    them when they are accessed. Values are stored as they are calculated, so accessing them takes constant time.
+
+    :param inputs: The dataseries this indicator is calculated from. They can be other nodes or any other
+        :class:`pyalgotrade.dataseries.DataSeries`.
+    :type inputs: list.
+
+    .. note::
+        This is a base class and should not be used directly. Subclasses should override :meth:`calculateValue`.
+    """
+
+    def __init__(self, inputs):
+        assert(len(inputs) > 0)
+        self.__inputs = inputs
+        self.__values = []
+
+    def getInputs(self):
+        return self.__inputs
+
+    def calculateValue(self, pos):
+        """Override to calculate the value for a given position. Values are calculated in order, once for each
+        position, and the inputs have at least pos + 1 values when this gets called.
+
+        :param pos: Absolute position of the value to calculate.
+        :type pos: int.
+        """
+        raise NotImplementedError()
+
+    def update(self):
+        """Calculates the values for the new values in the inputs."""
+        length = min([ds.getLength() for ds in self.__inputs])
+        values = self.__values
+        for pos in xrange(len(values), length):
+            values.append(self.calculateValue(pos))
+
+    def getFirstValidPos(self):
+        return 0
+
+    def getLength(self):
+        return len(self.__values)
+
+    def getValueAbsolute(self, pos):
+        ret = None
+        if pos >= 0 and pos < len(self.__values):
+            ret = self.__values[pos]
+        return ret
+
+    def getDateTimes(self):
+        return self.__inputs[0].getDateTimes()[:len(self.__values)]
+
+class SMA(Node):
+    """Simple Moving Average. The values are the same as the ones from :class:`pyalgotrade.technical.ma.SMA`.
+
+    :param dataSeries: The DataSeries instance being filtered.
+    :type dataSeries: :class:`pyalgotrade.dataseries.DataSeries`.
+    :param period: The number of values to use to calculate the SMA.
+    :type period: int.
+    """
+
+    def __init__(self, dataSeries, period):
+        assert(period > 0)
+        Node.__init__(self, [dataSeries])
+        self.__period = period
+        self.__window = collections.deque()
+        self.__sum = 0.0
+        self.__noneCount = 0
+
+    def getPeriod(self):
+        return self.__period
+
+    def calculateValue(self, pos):
+        value = self.getInputs()[0].getValueAbsolute(pos)
+        self.__window.append(value)
+        if value is None:
+            self.__noneCount += 1
+        else:
+            self.__sum += value
+        if len(self.__window) > self.__period:
+            value = self.__window.popleft()
+            if value is None:
+                self.__noneCount -= 1
+            else:
+                self.__sum -= value
+
+        ret = None
+        if len(self.__window) == self.__period and self.__noneCount == 0:
+            ret = self.__sum / float(self.__period)
+        return ret
+
+class EMA(Node):
+    """Exponential Moving Average. The first value is the SMA of the first **period** values, and the values are the
+    same as the ones from :class:`pyalgotrade.technical.ma.EMA`. None values in the dataseries yield None and are
+    skipped.
+
+    :param dataSeries: The DataSeries instance being filtered.
+    :type dataSeries: :class:`pyalgotrade.dataseries.DataSeries`.
+    :param period: The number of values to use to calculate the EMA.
+    :type period: int.
+    """
+
+    def __init__(self, dataSeries, period):
+        assert(period > 0)
+        Node.__init__(self, [dataSeries])
+        self.__period = period
+        self.__multiplier = (2.0 / (period + 1))
+        self.__seed = SMA(dataSeries, period)
+        self.__ema = None
+
+    def getPeriod(self):
+        return self.__period
+
+    def calculateValue(self, pos):
+        value = self.getInputs()[0].getValueAbsolute(pos)
+        if self.__ema is None:
+            self.__seed.update()
+            self.__ema = self.__seed.getValueAbsolute(pos)
+            ret = self.__ema
+        elif value is None:
+            ret = None
+        else:
+            self.__ema = (value - self.__ema) * self.__multiplier + self.__ema
+            ret = self.__ema
+        return ret
+
+class Cross(Node):
+    def __init__(self, ds1, ds2, period, signCheck):
+        assert(period > 1)
+        Node.__init__(self, [ds1, ds2])
+        self.__period = period
+        self.__signCheck = signCheck
+        self.__prevDiff = None
+        # 1 for the positions where a cross took place, for the last period - 1 positions.
+        self.__crosses = collections.deque()
+        self.__crossCount = 0
+
+    def calculateValue(self, pos):
+        ds1, ds2 = self.getInputs()
+        v1 = ds1.getValueAbsolute(pos)
+        v2 = ds2.getValueAbsolute(pos)
+        diff = None
+        if v1 is not None and v2 is not None:
+            diff = v1 - v2
+
+        crossed = int(cross.is_cross(self.__prevDiff, diff, self.__signCheck))
+        self.__prevDiff = diff
+        self.__crosses.append(crossed)
+        self.__crossCount += crossed
+        if len(self.__crosses) > self.__period - 1:
+            self.__crossCount -= self.__crosses.popleft()
+        return self.__crossCount
+
+class CrossAbove(Cross):
+    """Returns the number of times ds1 crossed above ds2 during the given period. The values are the same as the ones
+    from :class:`pyalgotrade.technical.cross.CrossAbove`, except that 0 is returned instead of None for the first
+    positions.
+
+    :param ds1: The DataSeries that crosses.
+    :type ds1: :class:`pyalgotrade.dataseries.DataSeries`.
+    :param ds2: The DataSeries being crossed.
+    :type ds2: :class:`pyalgotrade.dataseries.DataSeries`.
+    :param period: Max number of values to check for cross above conditions. Must be > 1.
+    :type period: int.
+    """
+
+    def __init__(self, ds1, ds2, period = 2):
+        Cross.__init__(self, ds1, ds2, period, cross.positive)
+
+class CrossBelow(Cross):
+    """Returns the number of times ds1 crossed below ds2 during the given period. The values are the same as the ones
+    from :class:`pyalgotrade.technical.cross.CrossBelow`, except that 0 is returned instead of None for the first
+    positions.
+
+    :param ds1: The DataSeries that crosses.
+    :type ds1: :class:`pyalgotrade.dataseries.DataSeries`.
+    :param ds2: The DataSeries being crossed.
+    :type ds2: :class:`pyalgotrade.dataseries.DataSeries`.
+    :param period: Max number of values to check for cross below conditions. Must be > 1.
+    :type period: int.
+    """
+
+    def __init__(self, ds1, ds2, period = 2):
+        Cross.__init__(self, ds1, ds2, period, cross.negative)
+
+class IndicatorGraph:
+    """Updates :class:`Node` instances once per new bar, making sure that every node gets updated after the nodes it
+    depends on.
+
+    :param barFeed: If not None, the nodes are updated when new bars are available in this feed, before the strategy
+        gets them. If None, :meth:`update` has to be called.
+    :type barFeed: :class:`pyalgotrade.barfeed.BasicBarFeed`.
+    """
+
+    def __init__(self, barFeed = None):
+        self.__nodes = []
+        # Nodes sorted so that every node comes after its inputs. Rebuilt when needed.
+        self.__sorted = None
+        if barFeed is not None:
+            # Higher priority than the strategy, so the values are ready by the time it gets the bars.
+            barFeed.getNewBarsEvent().subscribe(self.__onBars, priority=1)
+
+    def __onBars(self, bars):
+        self.update()
+
+    def add(self, node):
+        """Adds a node to the graph, and any node that it depends on. Returns the node."""
+        if node not in self.__nodes:
+            self.__nodes.append(node)
+            self.__sorted = None
+        return node
+
+    def getNodes(self):
+        """Returns the nodes sorted in update order."""
+        if self.__sorted is None:
+            self.__sorted = self.__sort()
+        return self.__sorted
+
+    # Depth-first topological sort. Inputs that are nodes get included even if they were not added.
+    def __sort(self):
+        ret = []
+        visited = set()
+        for root in self.__nodes:
+            stack = [(root, False)]
+            while len(stack):
+                node, expanded = stack.pop()
+                if expanded:
+                    ret.append(node)
+                elif id(node) not in visited:
+                    visited.add(id(node))
+                    stack.append((node, True))
+                    for ds in reversed(node.getInputs()):
+                        if isinstance(ds, Node) and id(ds) not in visited:
+                            stack.append((ds, False))
+        return ret
+
+    def update(self):
+        """Updates every node."""
+        for node in self.getNodes():
+            node.update()
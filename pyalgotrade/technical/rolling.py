@@ -0,0 +1,561 @@
+# PyAlgoTrade
+#
+# Copyright 2013 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import bisect
+import collections
+import math
+
+import numpy
+from numpy.lib import stride_tricks
+
+from pyalgotrade import technical
+
+######################################################################
+## Window state
+## These classes keep the state for the values in a window. Values get added at the end of the window and removed from
+## its beginning.
+
+class MonotonicQueue:
+    """Keeps track of the min. or max. value in a window in O(1) amortized time per value.
+
+    :param minimum: True to track the min. value, False to track the max. value.
+    :type minimum: boolean.
+    """
+
+    def __init__(self, minimum):
+        self.__minimum = minimum
+        # (position, value) with values sorted from best to worst. Older values come first when they are equal.
+        self.__queue = collections.deque()
+
+    def reset(self):
+        self.__queue.clear()
+
+    def add(self, pos, value):
+        queue = self.__queue
+        if self.__minimum:
+            while len(queue) and queue[-1][1] > value:
+                queue.pop()
+        else:
+            while len(queue) and queue[-1][1] < value:
+                queue.pop()
+        queue.append((pos, value))
+
+    def remove(self, pos, value):
+        if len(self.__queue) and self.__queue[0][0] == pos:
+            self.__queue.popleft()
+
+    def getValue(self):
+        return self.__queue[0][1]
+
+    def getPos(self):
+        return self.__queue[0][0]
+
+class Moments:
+    """Keeps track of the count, sum and variance of the values in a window in O(1) time per value.
+
+    Sums are kept relative to the first value added, to avoid losing precision when the values are big compared to
+    their variance.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.__shift = None
+        self.__count = 0
+        self.__sum = 0.0
+        self.__sumSquares = 0.0
+
+    def add(self, pos, value):
+        if self.__shift is None:
+            self.__shift = value
+        diff = value - self.__shift
+        self.__count += 1
+        self.__sum += diff
+        self.__sumSquares += diff * diff
+
+    def remove(self, pos, value):
+        diff = value - self.__shift
+        self.__count -= 1
+        self.__sum -= diff
+        self.__sumSquares -= diff * diff
+
+    def getCount(self):
+        return self.__count
+
+    def getSum(self):
+        return self.__shift * self.__count + self.__sum
+
+    def getMean(self):
+        return self.__shift + self.__sum / float(self.__count)
+
+    def getVariance(self, ddof = 0):
+        ret = None
+        if self.__count > ddof:
+            ret = max(0, self.__sumSquares - self.__sum * self.__sum / float(self.__count)) / float(self.__count - ddof)
+        return ret
+
+class CoMoments:
+    """Keeps track of the covariance of (x, y) pairs in a window in O(1) time per pair."""
+
+    def __init__(self):
+        self.__x = Moments()
+        self.__y = Moments()
+        self.reset()
+
+    def reset(self):
+        self.__x.reset()
+        self.__y.reset()
+        self.__shift = None
+        self.__sumProducts = 0.0
+
+    def add(self, pos, value):
+        x, y = value
+        if self.__shift is None:
+            self.__shift = value
+        self.__x.add(pos, x)
+        self.__y.add(pos, y)
+        self.__sumProducts += (x - self.__shift[0]) * (y - self.__shift[1])
+
+    def remove(self, pos, value):
+        x, y = value
+        self.__x.remove(pos, x)
+        self.__y.remove(pos, y)
+        self.__sumProducts -= (x - self.__shift[0]) * (y - self.__shift[1])
+
+    def getX(self):
+        return self.__x
+
+    def getY(self):
+        return self.__y
+
+    def __getCoMoment(self):
+        count = self.__x.getCount()
+        sumX = self.__x.getSum() - self.__shift[0] * count
+        sumY = self.__y.getSum() - self.__shift[1] * count
+        return self.__sumProducts - sumX * sumY / float(count)
+
+    def getCovariance(self, ddof = 0):
+        ret = None
+        count = self.__x.getCount()
+        if count > ddof:
+            ret = self.__getCoMoment() / float(count - ddof)
+        return ret
+
+    def getCorrelation(self):
+        ret = None
+        if self.__x.getCount():
+            varX = self.__x.getVariance()
+            varY = self.__y.getVariance()
+            if varX > 0 and varY > 0:
+                ret = self.__getCoMoment() / float(self.__x.getCount()) / math.sqrt(varX * varY)
+                ret = max(-1, min(1, ret))
+        return ret
+
+class SortedWindow:
+    """Keeps the values in a window sorted, in O(log n) time per value plus the cost of moving them in a list."""
+
+    def __init__(self):
+        self.__values = []
+
+    def reset(self):
+        self.__values = []
+
+    def add(self, pos, value):
+        bisect.insort(self.__values, value)
+
+    def remove(self, pos, value):
+        del self.__values[bisect.bisect_left(self.__values, value)]
+
+    def countBelow(self, value):
+        return bisect.bisect_left(self.__values, value)
+
+    def getCount(self):
+        return len(self.__values)
+
+######################################################################
+## Filters
+
+class RollingFilter(technical.DataSeriesFilter):
+    """Base class for filters that keep some state for the values in the window. When values are calculated in
+    order, the state is updated with the value that enters the window and the one that leaves it, so each value takes
+    O(1) time to calculate. Otherwise the state is built again from the values in the window.
+
+    If there are None values in the window, the value is None.
+
+    :param dataSeries: The DataSeries instance being filtered.
+    :type dataSeries: :class:`pyalgotrade.dataseries.DataSeries`.
+    :param period: The number of values in the window.
+    :type period: int.
+    :param state: The window state. Must have reset, add and remove methods.
+
+    .. note::
+        This is a base class and should not be used directly. Subclasses should override :meth:`calculateFromState`.
+    """
+
+    def __init__(self, dataSeries, period, state):
+        technical.DataSeriesFilter.__init__(self, dataSeries, period)
+        self.__state = state
+        self.__lastPos = None
+        self.__noneCount = 0
+        # Number of updates since the state was last built from scratch. The state is rebuilt every period
+        # updates so that rounding errors don't accumulate.
+        self.__updates = 0
+
+    def getPeriod(self):
+        return self.getWindowSize()
+
+    def getState(self):
+        return self.__state
+
+    def getInputValue(self, pos):
+        """Returns the value to add to the state for a given position, or None."""
+        return self.getDataSeries().getValueAbsolute(pos)
+
+    def calculateFromState(self, state, lastPos):
+        """Override to calculate the value for the window that ends at lastPos, from the window state."""
+        raise NotImplementedError()
+
+    def __add(self, pos):
+        value = self.getInputValue(pos)
+        if value is None:
+            self.__noneCount += 1
+        else:
+            self.__state.add(pos, value)
+
+    def __remove(self, pos):
+        value = self.getInputValue(pos)
+        if value is None:
+            self.__noneCount -= 1
+        else:
+            self.__state.remove(pos, value)
+
+    def calculateValue(self, firstPos, lastPos):
+        if self.__lastPos is not None and self.__lastPos == lastPos - 1 and self.__updates < self.getWindowSize():
+            self.__add(lastPos)
+            self.__remove(firstPos - 1)
+            self.__updates += 1
+        else:
+            self.__state.reset()
+            self.__noneCount = 0
+            self.__updates = 0
+            for pos in xrange(firstPos, lastPos + 1):
+                self.__add(pos)
+        self.__lastPos = lastPos
+
+        ret = None
+        if self.__noneCount == 0:
+            ret = self.calculateFromState(self.__state, lastPos)
+        return ret
+
+class PairRollingFilter(RollingFilter):
+    def __init__(self, ds1, ds2, period, state):
+        RollingFilter.__init__(self, ds1, period, state)
+        self.__ds2 = ds2
+
+    def getFirstValidPos(self):
+        return max(RollingFilter.getFirstValidPos(self), self.__ds2.getFirstValidPos() + self.getWindowSize() - 1)
+
+    def getInputValue(self, pos):
+        ret = None
+        x = self.getDataSeries().getValueAbsolute(pos)
+        y = self.__ds2.getValueAbsolute(pos)
+        if x is not None and y is not None:
+            ret = (x, y)
+        return ret
+
+class Min(RollingFilter):
+    """The min. value over a window.
+
+    :param dataSeries: The DataSeries instance being filtered.
+    :type dataSeries: :class:`pyalgotrade.dataseries.DataSeries`.
+    :param period: The number of values to use.
+    :type period: int.
+    """
+
+    def __init__(self, dataSeries, period):
+        RollingFilter.__init__(self, dataSeries, period, MonotonicQueue(True))
+
+    def calculateFromState(self, state, lastPos):
+        return state.getValue()
+
+class Max(RollingFilter):
+    """The max. value over a window.
+
+    :param dataSeries: The DataSeries instance being filtered.
+    :type dataSeries: :class:`pyalgotrade.dataseries.DataSeries`.
+    :param period: The number of values to use.
+    :type period: int.
+    """
+
+    def __init__(self, dataSeries, period):
+        RollingFilter.__init__(self, dataSeries, period, MonotonicQueue(False))
+
+    def calculateFromState(self, state, lastPos):
+        return state.getValue()
+
+class ArgMin(RollingFilter):
+    """The absolute position of the min. value over a window. If the min. value shows up more than once, the first
+    position is returned.
+
+    :param dataSeries: The DataSeries instance being filtered.
+    :type dataSeries: :class:`pyalgotrade.dataseries.DataSeries`.
+    :param period: The number of values to use.
+    :type period: int.
+    """
+
+    def __init__(self, dataSeries, period):
+        RollingFilter.__init__(self, dataSeries, period, MonotonicQueue(True))
+
+    def calculateFromState(self, state, lastPos):
+        return state.getPos()
+
+class ArgMax(RollingFilter):
+    """The absolute position of the max. value over a window. If the max. value shows up more than once, the first
+    position is returned.
+
+    :param dataSeries: The DataSeries instance being filtered.
+    :type dataSeries: :class:`pyalgotrade.dataseries.DataSeries`.
+    :param period: The number of values to use.
+    :type period: int.
+    """
+
+    def __init__(self, dataSeries, period):
+        RollingFilter.__init__(self, dataSeries, period, MonotonicQueue(False))
+
+    def calculateFromState(self, state, lastPos):
+        return state.getPos()
+
+class Sum(RollingFilter):
+    """The sum of the values over a window.
+
+    :param dataSeries: The DataSeries instance being filtered.
+    :type dataSeries: :class:`pyalgotrade.dataseries.DataSeries`.
+    :param period: The number of values to use.
+    :type period: int.
+    """
+
+    def __init__(self, dataSeries, period):
+        RollingFilter.__init__(self, dataSeries, period, Moments())
+
+    def calculateFromState(self, state, lastPos):
+        return state.getSum()
+
+class Mean(RollingFilter):
+    """The mean of the values over a window.
+
+    :param dataSeries: The DataSeries instance being filtered.
+    :type dataSeries: :class:`pyalgotrade.dataseries.DataSeries`.
+    :param period: The number of values to use.
+    :type period: int.
+    """
+
+    def __init__(self, dataSeries, period):
+        RollingFilter.__init__(self, dataSeries, period, Moments())
+
+    def calculateFromState(self, state, lastPos):
+        return state.getMean()
+
+class Variance(RollingFilter):
+    """The variance of the values over a window.
+
+    :param dataSeries: The DataSeries instance being filtered.
+    :type dataSeries: :class:`pyalgotrade.dataseries.DataSeries`.
+    :param period: The number of values to use.
+    :type period: int.
+    :param ddof: Delta degrees of freedom.
+    :type ddof: int.
+    """
+
+    def __init__(self, dataSeries, period, ddof = 0):
+        RollingFilter.__init__(self, dataSeries, period, Moments())
+        self.__ddof = ddof
+
+    def calculateFromState(self, state, lastPos):
+        return state.getVariance(self.__ddof)
+
+class ZScore(RollingFilter):
+    """The number of standard deviations that the last value is above or below the mean of the values over a window.
+    If the standard deviation is 0, the value is None.
+
+    :param dataSeries: The DataSeries instance being filtered.
+    :type dataSeries: :class:`pyalgotrade.dataseries.DataSeries`.
+    :param period: The number of values to use.
+    :type period: int.
+    :param ddof: Delta degrees of freedom.
+    :type ddof: int.
+    """
+
+    def __init__(self, dataSeries, period, ddof = 0):
+        RollingFilter.__init__(self, dataSeries, period, Moments())
+        self.__ddof = ddof
+
+    def calculateFromState(self, state, lastPos):
+        ret = None
+        variance = state.getVariance(self.__ddof)
+        if variance:
+            ret = (self.getDataSeries().getValueAbsolute(lastPos) - state.getMean()) / math.sqrt(variance)
+        return ret
+
+class PercentRank(RollingFilter):
+    """The percentage of the previous period - 1 values that are below the last value.
+
+    :param dataSeries: The DataSeries instance being filtered.
+    :type dataSeries: :class:`pyalgotrade.dataseries.DataSeries`.
+    :param period: The number of values to use. Must be > 1.
+    :type period: int.
+    """
+
+    def __init__(self, dataSeries, period):
+        assert(period > 1)
+        RollingFilter.__init__(self, dataSeries, period, SortedWindow())
+
+    def calculateFromState(self, state, lastPos):
+        below = state.countBelow(self.getDataSeries().getValueAbsolute(lastPos))
+        return below * 100 / float(state.getCount() - 1)
+
+class Covariance(PairRollingFilter):
+    """The covariance of two dataseries over a window.
+
+    :param ds1: The first DataSeries instance.
+    :type ds1: :class:`pyalgotrade.dataseries.DataSeries`.
+    :param ds2: The second DataSeries instance.
+    :type ds2: :class:`pyalgotrade.dataseries.DataSeries`.
+    :param period: The number of values to use.
+    :type period: int.
+    :param ddof: Delta degrees of freedom.
+    :type ddof: int.
+    """
+
+    def __init__(self, ds1, ds2, period, ddof = 0):
+        PairRollingFilter.__init__(self, ds1, ds2, period, CoMoments())
+        self.__ddof = ddof
+
+    def calculateFromState(self, state, lastPos):
+        return state.getCovariance(self.__ddof)
+
+class Correlation(PairRollingFilter):
+    """The Pearson correlation coefficient of two dataseries over a window. If any of them has no variance, the value
+    is None.
+
+    :param ds1: The first DataSeries instance.
+    :type ds1: :class:`pyalgotrade.dataseries.DataSeries`.
+    :param ds2: The second DataSeries instance.
+    :type ds2: :class:`pyalgotrade.dataseries.DataSeries`.
+    :param period: The number of values to use. Must be > 1.
+    :type period: int.
+    """
+
+    def __init__(self, ds1, ds2, period):
+        assert(period > 1)
+        PairRollingFilter.__init__(self, ds1, ds2, period, CoMoments())
+
+    def calculateFromState(self, state, lastPos):
+        return state.getCorrelation()
+
+######################################################################
+## Batch versions
+## These functions receive numpy.arrays and return a numpy.array with the value for the window that ends at each
+## position. The values for the first period - 1 positions, and for windows with NaN values, are NaN.
+
+# Returns a read-only view with one row per window.
+def windows(values, period):
+    values = numpy.asarray(values, dtype=numpy.float64)
+    assert(period > 0)
+    count = max(0, len(values) - period + 1)
+    stride = values.strides[0]
+    return stride_tricks.as_strided(values, shape=(count, period), strides=(stride, stride))
+
+def pad(values, period, length):
+    ret = numpy.empty(length)
+    ret.fill(numpy.nan)
+    ret[period-1:] = values
+    return ret
+
+def has_nan(values, period):
+    return windows(numpy.isnan(values).astype(numpy.float64), period).max(axis=1) > 0
+
+def rolling_min(values, period):
+    return pad(windows(values, period).min(axis=1), period, len(values))
+
+def rolling_max(values, period):
+    return pad(windows(values, period).max(axis=1), period, len(values))
+
+def rolling_argmin(values, period):
+    w = windows(values, period)
+    ret = (w.argmin(axis=1) + numpy.arange(len(w))).astype(numpy.float64)
+    ret[has_nan(values, period)] = numpy.nan
+    return pad(ret, period, len(values))
+
+def rolling_argmax(values, period):
+    w = windows(values, period)
+    ret = (w.argmax(axis=1) + numpy.arange(len(w))).astype(numpy.float64)
+    ret[has_nan(values, period)] = numpy.nan
+    return pad(ret, period, len(values))
+
+def rolling_sum(values, period):
+    return pad(windows(values, period).sum(axis=1), period, len(values))
+
+def rolling_mean(values, period):
+    return pad(windows(values, period).mean(axis=1), period, len(values))
+
+def rolling_variance(values, period, ddof = 0):
+    return pad(windows(values, period).var(axis=1, ddof=ddof), period, len(values))
+
+def rolling_zscore(values, period, ddof = 0):
+    values = numpy.asarray(values, dtype=numpy.float64)
+    w = windows(values, period)
+    stdDev = w.std(axis=1, ddof=ddof)
+    ret = numpy.empty(len(w))
+    ret.fill(numpy.nan)
+    # NaN standard deviations are neither.
+    with numpy.errstate(invalid="ignore"):
+        nonZero = stdDev > 0
+    ret[nonZero] = (values[period-1:][nonZero] - w.mean(axis=1)[nonZero]) / stdDev[nonZero]
+    return pad(ret, period, len(values))
+
+def rolling_percent_rank(values, period):
+    assert(period > 1)
+    values = numpy.asarray(values, dtype=numpy.float64)
+    w = windows(values, period)
+    with numpy.errstate(invalid="ignore"):
+        ret = (w < values[period-1:].reshape(-1, 1)).sum(axis=1) * 100 / float(period - 1)
+    ret[has_nan(values, period)] = numpy.nan
+    return pad(ret, period, len(values))
+
+def rolling_covariance(values1, values2, period, ddof = 0):
+    w1 = windows(values1, period)
+    w2 = windows(values2, period)
+    coMoments = ((w1 - w1.mean(axis=1).reshape(-1, 1)) * (w2 - w2.mean(axis=1).reshape(-1, 1))).sum(axis=1)
+    return pad(coMoments / float(period - ddof), period, len(w1) + period - 1)
+
+def rolling_correlation(values1, values2, period):
+    assert(period > 1)
+    w1 = windows(values1, period)
+    w2 = windows(values2, period)
+    d1 = w1 - w1.mean(axis=1).reshape(-1, 1)
+    d2 = w2 - w2.mean(axis=1).reshape(-1, 1)
+    ret = numpy.empty(len(w1))
+    ret.fill(numpy.nan)
+    denominator = numpy.sqrt(numpy.square(d1).sum(axis=1) * numpy.square(d2).sum(axis=1))
+    with numpy.errstate(invalid="ignore"):
+        nonZero = denominator > 0
+    ret[nonZero] = (d1 * d2).sum(axis=1)[nonZero] / denominator[nonZero]
+    return pad(numpy.clip(ret, -1, 1), period, len(w1) + period - 1)
@@ -18,10 +18,11 @@
 .. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
 """
 
-from pyalgotrade import technical
-import numpy
+from pyalgotrade.technical import rolling
 
-class StdDev(technical.DataSeriesFilter):
+import math
+
+class StdDev(rolling.RollingFilter):
     """Standard deviation filter.
 
     :param dataSeries: The DataSeries instance being filtered.
@@ -33,12 +34,12 @@ class StdDev(technical.DataSeriesFilter):
     """
 
     def __init__(self, dataSeries, period, ddof=0):
-        technical.DataSeriesFilter.__init__(self, dataSeries, period)
+        rolling.RollingFilter.__init__(self, dataSeries, period, rolling.Moments())
         self.__ddof = ddof
 
-    def calculateValue(self, firstPos, lastPos):
+    def calculateFromState(self, state, lastPos):
         ret = None
-        values = self.getDataSeries().getValuesAbsolute(firstPos, lastPos)
-        if values:
-            ret =  numpy.array(values).std(ddof=self.__ddof)
+        variance = state.getVariance(self.__ddof)
+        if variance is not None:
+            ret = math.sqrt(variance)
         return ret
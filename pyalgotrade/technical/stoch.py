@@ -20,6 +20,7 @@
 
 from pyalgotrade import technical
 from pyalgotrade.technical import ma
+from pyalgotrade.technical import rolling
 
 class BarWrapper:
     def __init__(self, useAdjusted):
@@ -65,22 +66,41 @@ class StochasticOscillator(technical.DataSeriesFilter):
     :type dSMAPeriod: int.
     :param useAdjustedValues: True to use adjusted Low/High/Close values.
     :type useAdjustedValues: boolean.
+    :param registry: If not None, the %D SMA is taken from this registry, so it is shared with other indicators.
+    :type registry: :class:`pyalgotrade.technical.IndicatorRegistry`.
     """
 
-    def __init__(self, barDataSeries, period, dSMAPeriod = 3, useAdjustedValues = False):
+    def __init__(self, barDataSeries, period, dSMAPeriod = 3, useAdjustedValues = False, registry = None):
         assert(period > 1)
         assert(dSMAPeriod > 1)
         technical.DataSeriesFilter.__init__(self, barDataSeries, period)
-        self.__d = ma.SMA(self, dSMAPeriod)
+        self.__d = technical.get_or_create(registry, ma.SMA, self, dSMAPeriod)
         self.__barWrapper = BarWrapper(useAdjustedValues)
+        self.__lowestLow = rolling.MonotonicQueue(True)
+        self.__highestHigh = rolling.MonotonicQueue(False)
+        self.__lastPos = None
+
+    def __add(self, pos):
+        bar_ = self.getDataSeries().getValueAbsolute(pos)
+        self.__lowestLow.add(pos, self.__barWrapper.getLow(bar_))
+        self.__highestHigh.add(pos, self.__barWrapper.getHigh(bar_))
 
     def calculateValue(self, firstPos, lastPos):
-        bars = self.getDataSeries().getValuesAbsolute(firstPos, lastPos)
-        if bars == None:
-            return None
+        # Slide the window if the previous value was the last one calculated. Otherwise start from scratch.
+        if self.__lastPos is not None and self.__lastPos == lastPos - 1:
+            self.__add(lastPos)
+            self.__lowestLow.remove(firstPos - 1, None)
+            self.__highestHigh.remove(firstPos - 1, None)
+        else:
+            self.__lowestLow.reset()
+            self.__highestHigh.reset()
+            for pos in xrange(firstPos, lastPos + 1):
+                self.__add(pos)
+        self.__lastPos = lastPos
 
-        lowestLow, highestHigh = get_low_high_values(self.__barWrapper, bars)
-        currentClose = self.__barWrapper.getClose(bars[-1])
+        lowestLow = self.__lowestLow.getValue()
+        highestHigh = self.__highestHigh.getValue()
+        currentClose = self.__barWrapper.getClose(self.getDataSeries().getValueAbsolute(lastPos))
         return (currentClose - lowestLow) / float(highestHigh - lowestLow) * 100
 
     def getD(self):
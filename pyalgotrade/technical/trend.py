@@ -18,12 +18,56 @@
 .. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
 """
 
-from pyalgotrade import technical
+from pyalgotrade.technical import rolling
 
 import numpy
-from scipy import stats
 
-class Slope(technical.DataSeriesFilter):
+class LinearRegression(rolling.CoMoments):
+    """Keeps the least-squares regression line for the values in a window, in O(1) time per value.
+    Values are added and removed as (position, value) pairs.
+    """
+
+    def getSlope(self):
+        ret = None
+        varX = self.getX().getVariance()
+        if varX:
+            ret = self.getCovariance() / varX
+        return ret
+
+    def getIntercept(self):
+        """Returns the value of the regression line at position 0."""
+        ret = None
+        slope = self.getSlope()
+        if slope is not None:
+            ret = self.getY().getMean() - slope * self.getX().getMean()
+        return ret
+
+    def getForecast(self, pos):
+        """Returns the value of the regression line at a given position."""
+        ret = None
+        slope = self.getSlope()
+        if slope is not None:
+            ret = self.getY().getMean() + slope * (pos - self.getX().getMean())
+        return ret
+
+    def getRSquared(self):
+        """Returns the coefficient of determination. If all the values are the same, None is returned."""
+        ret = self.getCorrelation()
+        if ret is not None:
+            ret = ret * ret
+        return ret
+
+class RegressionFilter(rolling.RollingFilter):
+    def __init__(self, dataSeries, period):
+        rolling.RollingFilter.__init__(self, dataSeries, period, LinearRegression())
+
+    def getInputValue(self, pos):
+        ret = self.getDataSeries().getValueAbsolute(pos)
+        if ret is not None:
+            ret = (pos, ret)
+        return ret
+
+class Slope(RegressionFilter):
     """The Slope filter calculates the slope of the least-squares regression line.
 
     :param dataSeries: The DataSeries instance being filtered.
@@ -33,19 +77,46 @@ class Slope(technical.DataSeriesFilter):
     """
 
     def __init__(self, dataSeries, period):
-        technical.DataSeriesFilter.__init__(self, dataSeries, period)
-        self.__x = numpy.array(range(period))
+        RegressionFilter.__init__(self, dataSeries, period)
 
     def getTrendDays(self):
         return self.getWindowSize()
 
-    def calculateValue(self, firstPos, lastPos):
-        values = self.getDataSeries().getValuesAbsolute(firstPos, lastPos)
-        if values is None:
-            return None
+    def calculateFromState(self, state, lastPos):
+        return state.getSlope()
 
-        y = numpy.array(values)
-        return stats.linregress(self.__x, y)[0]
+class RSquared(RegressionFilter):
+    """The coefficient of determination of the least-squares regression line.
+
+    :param dataSeries: The DataSeries instance being filtered.
+    :type dataSeries: :class:`pyalgotrade.dataseries.DataSeries`.
+    :param period: The number of values to use.
+    :type period: int.
+    """
+
+    def __init__(self, dataSeries, period):
+        RegressionFilter.__init__(self, dataSeries, period)
+
+    def calculateFromState(self, state, lastPos):
+        return state.getRSquared()
+
+class Forecast(RegressionFilter):
+    """The value of the least-squares regression line a number of positions after the last value.
+
+    :param dataSeries: The DataSeries instance being filtered.
+    :type dataSeries: :class:`pyalgotrade.dataseries.DataSeries`.
+    :param period: The number of values to use.
+    :type period: int.
+    :param offset: The number of positions after the last value. Use 0 for the value of the line at the last position.
+    :type offset: int.
+    """
+
+    def __init__(self, dataSeries, period, offset = 0):
+        RegressionFilter.__init__(self, dataSeries, period)
+        self.__offset = offset
+
+    def calculateFromState(self, state, lastPos):
+        return state.getForecast(lastPos + self.__offset)
 
 class Trend(Slope):
     def __init__(self, dataSeries, trendDays, positiveThreshold = 0, negativeThreshold = 0):
@@ -65,3 +136,39 @@ class Trend(Slope):
             elif slope < self.__negativeThreshold:
                 ret = False
         return ret
+
+######################################################################
+## Batch versions
+## These functions receive a numpy.array and return a numpy.array with the value for the window that ends at each
+## position. The values for the first period - 1 positions, and for windows with NaN values, are NaN.
+
+# Returns the windows, the centered x values, the sum of their squares and the slope for each window.
+def linear_regression_windows(values, period):
+    w = rolling.windows(values, period)
+    x = numpy.arange(period, dtype=numpy.float64)
+    x -= x.mean()
+    sumSquaresX = numpy.square(x).sum()
+    # Centering x is enough since the centered values add up to 0.
+    slopes = w.dot(x) / sumSquaresX
+    return (w, x, sumSquaresX, slopes)
+
+def rolling_slope(values, period):
+    assert(period > 1)
+    w, x, sumSquaresX, slopes = linear_regression_windows(values, period)
+    return rolling.pad(slopes, period, len(values))
+
+def rolling_forecast(values, period, offset = 0):
+    assert(period > 1)
+    w, x, sumSquaresX, slopes = linear_regression_windows(values, period)
+    return rolling.pad(w.mean(axis=1) + slopes * (x[-1] + offset), period, len(values))
+
+def rolling_rsquared(values, period):
+    assert(period > 1)
+    w, x, sumSquaresX, slopes = linear_regression_windows(values, period)
+    sumSquaresY = w.var(axis=1) * period
+    ret = numpy.empty(len(w))
+    ret.fill(numpy.nan)
+    with numpy.errstate(invalid="ignore"):
+        nonZero = sumSquaresY > 0
+    ret[nonZero] = numpy.square(slopes[nonZero]) * sumSquaresX / sumSquaresY[nonZero]
+    return rolling.pad(numpy.minimum(ret, 1), period, len(values))
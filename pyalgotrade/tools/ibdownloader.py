@@ -19,7 +19,7 @@
 
 .. moduleauthor:: Tibor Kiss <tibor.kiss@gmail.com>
 """
-import csv, datetime, time
+import csv, datetime, os
 
 from pyalgotrade.providers.interactivebrokers import ibconnection
 
@@ -93,6 +93,7 @@ def get_historical_data(instrument, endTime, duration, barSize,
     :param formatDate: Determines the date format applied to returned bars. Valid values include:
                        1: Dates applying to bars returned in the format: yyyymmdd{space}{space}hh:mm:dd .
                        2: Dates are returned as a long integer specifying the number of seconds since 1/1/1970 GMT .
+                       Ignored, dates are always requested in the second format.
     :type formatDate: int
     :param twsHost: IP Address or Host where the TWS is running.
     :type twsHost: string
@@ -103,46 +104,173 @@ def get_historical_data(instrument, endTime, duration, barSize,
     """
 
     if twsConnection == None:
-        twsConnection = ibconnection.Connection('', 0, twsHost, twsPort, twsClientID)
+        twsConnection = ibconnection.Connection(twsHost=twsHost, twsPort=twsPort, twsClientId=twsClientID)
 
     if duration == '1 D' and barSize == '5 secs' and endTime.endswith('16:00:00 EST'):
-        bars = []
         et = endTime[:-12] # Crop the '16:00:00 EST' from the end
-        for endTime_ in ('11:30:00 EST', '13:30:00 EST'):
-            b = twsConnection.requestHistoricalData(instrument, et+endTime_, '7200 S', barSize,
-                                                                                            secType, exchange, currency,
-                                                                                            whatToShow, useRTH, formatDate)
-            if b == None:
-                print 'error with endTime: ', endTime_
-            bars.extend(b)
-
-            time.sleep(1)
-
-        b = twsConnection.requestHistoricalData(instrument, et+'16:00:00 EST', '9000 S', barSize, # 13:30 - 16:00
-                                                                                        secType, exchange, currency,
-                                                                                        whatToShow, useRTH, formatDate)
-        if b == None:
-            print 'error2'
-
-        bars.extend(b)
-        
-        if (bars[0].getDateTime().time() != datetime.time(9,30,00) or
-            bars[-1].getDateTime().time() != datetime.time(15, 59, 55) or
+        # Submit all the chunks at once and wait for them afterwards
+        requests = []
+        for endTime_, duration_ in (('11:30:00 EST', '7200 S'), ('13:30:00 EST', '7200 S'), ('16:00:00 EST', '9000 S')):
+            requests.append(twsConnection.submitHistoricalDataRequest(instrument, et+endTime_, duration_, barSize,
+                                                                      secType, exchange, currency,
+                                                                      whatToShow, useRTH))
+
+        bars = []
+        for request in requests:
+            request.wait()
+            if request.getBars() == None:
+                print 'error with endTime: ', request.getEndTime(), request.getError()
+                return None
+            bars.extend(request.getBars())
+
+        if (len(bars) == 0 or
+                bars[0].getDateTime().time() != datetime.time(9,30,00) or
+                bars[-1].getDateTime().time() != datetime.time(15, 59, 55) or
                 len(bars) != 4680):
             print 'Error, bars are missing for instrument ', instrument
     else:
-        bars = twsConnection.requestHistoricalData(instrument, endTime, duration, barSize,
-                                                 secType, exchange, currency,
-                                                 whatToShow, useRTH, formatDate)
+        request = twsConnection.submitHistoricalDataRequest(instrument, endTime, duration, barSize,
+                                                            secType, exchange, currency,
+                                                            whatToShow, useRTH)
+        request.wait()
+        bars = request.getBars()
 
-    # Check for errors
-    error = twsConnection.getError()
-    if error['tickerId'] != None and error['tickerId'] != -1:
-        print "ERROR: ", error
+        # Check for errors. The connection errors may belong to other requests.
+        if request.getError() != None:
+            print "ERROR: ", request.getError()
 
     # Return the loaded bars
     return bars
 
+# Maximum time span covered by a single request for each bar size, according to the IB historical data limitations.
+MAX_CHUNK_DURATION = {
+    '1 sec':   datetime.timedelta(seconds=1800),
+    '5 secs':  datetime.timedelta(seconds=7200),
+    '15 secs': datetime.timedelta(seconds=14400),
+    '30 secs': datetime.timedelta(seconds=28800),
+    '1 min':   datetime.timedelta(days=1),
+    '2 mins':  datetime.timedelta(days=2),
+    '3 mins':  datetime.timedelta(weeks=1),
+    '5 mins':  datetime.timedelta(weeks=1),
+    '15 mins': datetime.timedelta(weeks=2),
+    '30 mins': datetime.timedelta(days=30),
+    '1 hour':  datetime.timedelta(days=30),
+    '1 day':   datetime.timedelta(days=365),
+}
+
+def split_period(begin, end, barSize):
+    """Splits a period into chunks that can be downloaded with a single request each.
+    Intraday chunks that fall entirely in a weekend are skipped.
+
+    :param begin: The beginning of the period, in UTC.
+    :type begin: datetime.datetime
+    :param end: The end of the period, in UTC.
+    :type end: datetime.datetime
+    :param barSize: The bar size, as in :func:`get_historical_data`.
+    :type barSize: str
+    :rtype: A list of (endTime, duration) tuples, where endTime is a datetime.datetime and duration a str.
+    """
+    maxDuration = MAX_CHUNK_DURATION[barSize]
+    ret = []
+    chunkBegin = begin
+    while chunkBegin < end:
+        chunkEnd = min(chunkBegin + maxDuration, end)
+        chunkDuration = chunkEnd - chunkBegin
+        lastSecond = chunkEnd - datetime.timedelta(seconds=1)
+        if chunkDuration > datetime.timedelta(days=1) or chunkBegin.weekday() < 5 or lastSecond.weekday() < 5:
+            seconds = chunkDuration.days * 86400 + chunkDuration.seconds
+            if seconds <= 86400:
+                duration = '%d S' % seconds
+            else:
+                # Durations longer than a day must be expressed in days.
+                duration = '%d D' % ((seconds + 86399) / 86400)
+            ret.append((chunkEnd, duration))
+        chunkBegin = chunkEnd
+    return ret
+
+def merge_csv(filenames, filename):
+    """Merges CSV files saved with :func:`bars_to_csv`, in order, into a single one. Bars that show up in more than
+    one file are saved once."""
+    with open(filename, "w") as csvFile:
+        writer = None
+        lastDate = None
+        for inputFilename in filenames:
+            with open(inputFilename, "r") as inputFile:
+                reader = csv.DictReader(inputFile)
+                if writer is None:
+                    writer = csv.DictWriter(csvFile, reader.fieldnames)
+                    writer.writeheader()
+                for row in reader:
+                    # Dates are all in UTC so they can be compared as strings.
+                    if lastDate is None or row['Date'] > lastDate:
+                        writer.writerow(row)
+                        lastDate = row['Date']
+
+def download(instrument, begin, end, barSize, directory,
+             secType='STK', exchange='SMART', currency='USD',
+             whatToShow='TRADES', useRTH=0,
+             twsConnection=None,
+             twsHost='localhost', twsPort=7496, twsClientID=0):
+    """Downloads a long period of historical data from IB through TWS, split into chunks that are requested concurrently.
+    Each chunk is saved to a CSV file in directory as soon as it is received. Chunks that were already saved are
+    not requested again, so an interrupted download can be resumed by calling this function again with the same
+    parameters.
+
+    :param instrument: Ticker symbol
+    :type instrument:  str
+    :param begin: The beginning of the period, in UTC.
+    :type begin: datetime.datetime
+    :param end: The end of the period, in UTC.
+    :type end: datetime.datetime
+    :param barSize: The bar size, as in :func:`get_historical_data`.
+    :type barSize:  str
+    :param directory: The directory where chunks are saved.
+    :type directory: str
+    :rtype: The list of chunk filenames sorted by date, or None if any chunk failed to download.
+    """
+
+    if twsConnection == None:
+        twsConnection = ibconnection.Connection(twsHost=twsHost, twsPort=twsPort, twsClientId=twsClientID)
+
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    def save(filename, request):
+        bars = request.getBars()
+        if bars == None:
+            print 'Error downloading %s: %s' % (filename, request.getError())
+            return False
+        # Write to a temporary file first, so that a partially written chunk is not taken as saved.
+        bars_to_csv(bars, filename + '.tmp', useRTH)
+        os.rename(filename + '.tmp', filename)
+        return True
+
+    ret = []
+    pending = []
+    ok = True
+    for chunkEnd, duration in split_period(begin, end, barSize):
+        filename = os.path.join(directory, '%s-%s.csv' % (instrument, chunkEnd.strftime('%Y%m%d%H%M%S')))
+        ret.append(filename)
+        if os.path.exists(filename):
+            continue
+
+        # submitHistoricalDataRequest blocks if needed to comply with the pacing rules, which gives time to the
+        # requests in flight to finish.
+        request = twsConnection.submitHistoricalDataRequest(instrument, chunkEnd.strftime('%Y%m%d %H:%M:%S GMT'), duration, barSize,
+                                                            secType, exchange, currency,
+                                                            whatToShow, useRTH)
+        pending.append((filename, request))
+        while len(pending) and pending[0][1].isDone():
+            ok = save(*pending.pop(0)) and ok
+
+    for filename, request in pending:
+        request.wait()
+        ok = save(filename, request) and ok
+
+    if not ok:
+        return None
+    return ret
+
 def get_historical_data_year(instrument, year, barSize, twsConnection=None): 
     bars = get_historical_data(instrument, "%d1231 16:30:00", "1 Y", "1 day")
     return bars
@@ -153,8 +281,13 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Historical data downloader from Interactive Broker\'s  TWS')
     parser.add_argument('--instrument',   help='Ticker symbol', required=True)
     parser.add_argument('--endtime',  help='Use the format yyyymmdd hh:mm:ss tmz, where the time zone is allowed (optionally) after a space at the end.',
-                            nargs='*', required=True,
+                            nargs='*',
                        )
+    parser.add_argument('--begin', help='Download the period that starts at this date (yyyymmdd, UTC) in chunks, '
+                                            'instead of using --endtime and --duration.')
+    parser.add_argument('--end', help='The end of the period (yyyymmdd, UTC) when using --begin. Default: today.')
+    parser.add_argument('--directory', help='Directory for the chunks downloaded when using --begin. '
+                                                '(Re)running the same download resumes it.')
     parser.add_argument('--duration', help='This is the time span the request will cover, and is specified using the format:\n'
                                                '<integer> <unit>, i.e., 1 D, where valid units are:\n'
                                                'S (seconds),  D (days),  W (weeks),  M (months),  Y (years)\n'
@@ -176,12 +309,30 @@ if __name__ == '__main__':
     logging.basicConfig(level=logging.DEBUG, format=LOGFMT)
 
     rth=False
-    bars = get_historical_data(args.instrument, " ".join(args.endtime), " ".join(args.duration), " ".join(args.barsize), useRTH=rth)
-    if bars != None:
-        bars_to_csv(bars, args.filename, rth)
-        print 'Historical data saved to %s.' % args.filename
+    if args.begin != None:
+        begin = datetime.datetime.strptime(args.begin, '%Y%m%d')
+        if args.end != None:
+            end = datetime.datetime.strptime(args.end, '%Y%m%d')
+        else:
+            end = datetime.datetime.combine(datetime.date.today(), datetime.time())
+        directory = args.directory
+        if directory == None:
+            directory = args.filename + '.chunks'
+        filenames = download(args.instrument, begin, end, " ".join(args.barsize), directory, useRTH=rth)
+        if filenames != None:
+            merge_csv(filenames, args.filename)
+            print 'Historical data saved to %s.' % args.filename
+        else:
+            print 'Some chunks failed to download. Run again to resume.'
+    elif args.endtime:
+        bars = get_historical_data(args.instrument, " ".join(args.endtime), " ".join(args.duration), " ".join(args.barsize), useRTH=rth)
+        if bars != None:
+            bars_to_csv(bars, args.filename, rth)
+            print 'Historical data saved to %s.' % args.filename
+        else:
+            print 'No data returned!'
     else:
-        print 'No data returned!'
+        parser.error('Either --endtime or --begin is required')
 
 
 # vim: noet:ci:pi:sts=0:sw=4:ts=4
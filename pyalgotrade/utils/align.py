@@ -0,0 +1,135 @@
+# PyAlgoTrade
+#
+# Copyright 2013 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Tibor Kiss <tibor.kiss@gmail.com>
+"""
+
+import calendar
+
+import numpy
+
+class FillPolicy:
+    """How :func:`aligned_matrix` deals with datetimes missing in some of the dataseries."""
+
+    #: Only the datetimes present in every dataseries are kept.
+    INTERSECT = 1
+    #: Every datetime is kept. Missing values are set to NaN.
+    NAN = 2
+    #: Every datetime is kept. Missing values are set to the previous value available (or NaN if there is none).
+    FORWARD = 3
+
+def datetime_to_microseconds(dateTime):
+    """Converts a datetime.datetime to the number of microseconds since the epoch (UTC).
+    Naive datetimes are assumed to be in UTC."""
+    return calendar.timegm(dateTime.utctimetuple()) * 1000000 + dateTime.microsecond
+
+def to_timestamps(dateTimes):
+    """Returns a numpy.array of int64 with the microsecond timestamps for a sequence of datetime.datetime."""
+    return numpy.fromiter((datetime_to_microseconds(dateTime) for dateTime in dateTimes), dtype=numpy.int64, count=len(dateTimes))
+
+def to_values(dataSeries):
+    """Returns a numpy.array of floats with the values of a dataseries. None values are converted to NaN."""
+    values = dataSeries[:]
+    ret = numpy.empty(len(values), dtype=numpy.float64)
+    for i in xrange(len(values)):
+        value = values[i]
+        if value is None:
+            ret[i] = numpy.nan
+        else:
+            ret[i] = value
+    return ret
+
+# Returns (values, [ix1, ix2, ...])
+# Each of the timestamps arrays is assumed to be sorted. For repeated values, the index of the first one is used.
+def intersect(*timestamps):
+    """Vectorized version of :func:`pyalgotrade.utils.intersect` for any number of sorted arrays.
+
+    :param timestamps: Sorted numpy.array instances (usually int64 timestamps).
+    :rtype: A tuple with the common values and a list with the indices of those values in each of the arrays.
+    """
+    assert(len(timestamps) > 0)
+    values = timestamps[0]
+    for other in timestamps[1:]:
+        values = numpy.intersect1d(values, other)
+    indices = [numpy.searchsorted(ts, values, side="left") for ts in timestamps]
+    return (values, indices)
+
+def union(*timestamps):
+    """Returns a sorted numpy.array with the values found in any of the arrays, without repetitions."""
+    assert(len(timestamps) > 0)
+    return numpy.unique(numpy.concatenate(timestamps))
+
+def find_exact_positions(timestamps, grid):
+    positions = numpy.searchsorted(timestamps, grid, side="left")
+    found = positions < len(timestamps)
+    found[found] = timestamps[positions[found]] == grid[found]
+    return (positions, found)
+
+def find_previous_positions(timestamps, grid):
+    positions = numpy.searchsorted(timestamps, grid, side="right") - 1
+    return (positions, positions >= 0)
+
+def aligned_matrix(dataSeriesList, fillPolicy=FillPolicy.INTERSECT, dateTimes=None):
+    """Aligns any number of dataseries with respect to time and returns their values as columns in a matrix.
+
+    :param dataSeriesList: The DataSeries instances to align. The datetimes in each dataseries are expected to be sorted.
+    :type dataSeriesList: list of :class:`pyalgotrade.dataseries.DataSeries`.
+    :param fillPolicy: How to deal with datetimes missing in some of the dataseries.
+    :type fillPolicy: :class:`FillPolicy`.
+    :param dateTimes: The sorted datetimes to resample the dataseries to. If None, the datetimes are taken from the
+        dataseries.
+    :type dateTimes: list of :class:`datetime.datetime`.
+    :rtype: A tuple with the list of :class:`datetime.datetime` for each row and a 2D numpy.array
+        with one row per datetime and one column per dataseries.
+    """
+    assert(len(dataSeriesList) > 0)
+    allDateTimes = [ds.getDateTimes() for ds in dataSeriesList]
+    allTimestamps = [to_timestamps(dts) for dts in allDateTimes]
+    allValues = [to_values(ds) for ds in dataSeriesList]
+
+    # Build the grid of timestamps for the rows.
+    if dateTimes is not None:
+        rowDateTimes = list(dateTimes)
+        grid = to_timestamps(rowDateTimes)
+    elif fillPolicy == FillPolicy.INTERSECT:
+        grid, indices = intersect(*allTimestamps)
+        rowDateTimes = [allDateTimes[0][i] for i in indices[0]]
+    else:
+        grid, first = numpy.unique(numpy.concatenate(allTimestamps), return_index=True)
+        concatenated = []
+        for dts in allDateTimes:
+            concatenated.extend(dts)
+        rowDateTimes = [concatenated[i] for i in first]
+
+    ret = numpy.empty((len(grid), len(dataSeriesList)), dtype=numpy.float64)
+    ret.fill(numpy.nan)
+    keep = numpy.ones(len(grid), dtype=bool)
+    for column in xrange(len(dataSeriesList)):
+        timestamps = allTimestamps[column]
+        if fillPolicy == FillPolicy.FORWARD:
+            positions, found = find_previous_positions(timestamps, grid)
+        else:
+            positions, found = find_exact_positions(timestamps, grid)
+        ret[found, column] = allValues[column][positions[found]]
+        keep &= found
+
+    # When resampling to a given set of datetimes, drop the rows missing in any of the dataseries.
+    if fillPolicy == FillPolicy.INTERSECT and not keep.all():
+        ret = ret[keep]
+        rowDateTimes = [rowDateTimes[i] for i in numpy.flatnonzero(keep)]
+
+    return (rowDateTimes, ret)
@@ -18,6 +18,7 @@
 .. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
 """
 import sys
+import math
 
 import numpy
 
@@ -32,3 +33,39 @@ def stddev(values, ddof = 1):
     if len(values):
         ret =  numpy.array([e for e in values]).std(ddof=ddof)
     return ret
+
+class RunningStats(object):
+    """Mean and variance of a stream of values, updated in O(1) using Welford's method."""
+
+    def __init__(self):
+        self.__count = 0
+        self.__mean = 0.0
+        # Sum of the squared differences from the mean.
+        self.__m2 = 0.0
+
+    def push(self, value):
+        self.__count += 1
+        delta = value - self.__mean
+        self.__mean += delta / self.__count
+        self.__m2 += delta * (value - self.__mean)
+
+    def getCount(self):
+        return self.__count
+
+    def getMean(self):
+        ret = None
+        if self.__count:
+            ret = self.__mean
+        return ret
+
+    def getVariance(self, ddof = 1):
+        ret = None
+        if self.__count > ddof:
+            ret = self.__m2 / (self.__count - ddof)
+        return ret
+
+    def getStdDev(self, ddof = 1):
+        ret = self.getVariance(ddof)
+        if ret is not None:
+            ret = math.sqrt(ret)
+        return ret
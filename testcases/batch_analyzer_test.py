@@ -0,0 +1,134 @@
+# PyAlgoTrade
+#
+# Copyright 2013 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import unittest
+import tempfile
+import shutil
+import os
+
+import numpy
+import pytz
+
+from pyalgotrade.barfeed import yahoofeed
+from pyalgotrade.stratanalyzer import recorder
+from pyalgotrade.stratanalyzer import batch
+from pyalgotrade.stratanalyzer import returns
+from pyalgotrade.stratanalyzer import sharpe
+from pyalgotrade.stratanalyzer import sortino
+from pyalgotrade.stratanalyzer import drawdown
+from pyalgotrade.stratanalyzer import metrics
+from pyalgotrade.stratanalyzer import trades
+from pyalgotrade import broker
+
+import strategy_test
+import common
+
+class BatchTestCase(unittest.TestCase):
+    def setUp(self):
+        barFeed = yahoofeed.Feed()
+        barFeed.addBarsFromCSV("orcl", common.get_data_file_path("orcl-2000-yahoofinance.csv"))
+        self.strat = strategy_test.DummyStrategy(barFeed, 1000)
+        self.recorder = recorder.Recorder()
+        self.strat.attachAnalyzer(self.recorder)
+        self.retAnalyzer = returns.Returns()
+        self.strat.attachAnalyzer(self.retAnalyzer)
+        self.sharpeAnalyzer = sharpe.SharpeRatio()
+        self.strat.attachAnalyzer(self.sharpeAnalyzer)
+        self.sortinoAnalyzer = sortino.SortinoRatio()
+        self.strat.attachAnalyzer(self.sortinoAnalyzer)
+        self.ddAnalyzer = drawdown.DrawDown()
+        self.strat.attachAnalyzer(self.ddAnalyzer)
+        self.tradesAnalyzer = trades.Trades()
+        self.strat.attachAnalyzer(self.tradesAnalyzer)
+
+        self.strat.setBrokerOrdersGTC(True)
+        createOrder = self.strat.getBroker().createMarketOrder
+        self.strat.addOrder(strategy_test.datetime_from_date(2000, 1, 3), createOrder, broker.Order.Action.BUY, "orcl", 5)
+        self.strat.addOrder(strategy_test.datetime_from_date(2000, 3, 1), createOrder, broker.Order.Action.SELL, "orcl", 5)
+        self.strat.addOrder(strategy_test.datetime_from_date(2000, 5, 1), createOrder, broker.Order.Action.SELL_SHORT, "orcl", 2)
+        self.strat.addOrder(strategy_test.datetime_from_date(2000, 8, 1), createOrder, broker.Order.Action.BUY_TO_COVER, "orcl", 2)
+        self.strat.addOrder(strategy_test.datetime_from_date(2000, 10, 2), createOrder, broker.Order.Action.BUY, "orcl", 3)
+        self.strat.run()
+
+    def __checkRecording(self, recording):
+        self.assertEqual(len(recording), len(self.retAnalyzer.getReturns()))
+        numpy.testing.assert_allclose(batch.returns(recording), self.retAnalyzer.getReturns()[:], atol=1e-12)
+        numpy.testing.assert_allclose(batch.cumulative_returns(recording), self.retAnalyzer.getCumulativeReturns()[:], atol=1e-12)
+        self.assertAlmostEqual(batch.sharpe_ratio(recording, 0.04, 252), self.sharpeAnalyzer.getSharpeRatio(0.04, 252))
+        self.assertAlmostEqual(batch.sortino_ratio(recording), self.sortinoAnalyzer.getSortinoRatio())
+        self.assertAlmostEqual(batch.max_drawdown(recording), self.ddAnalyzer.getMaxDrawDown())
+        self.assertEqual(batch.longest_drawdown_duration(recording), self.ddAnalyzer.getLongestDrawDownDuration())
+        portfolioMetrics = metrics.PortfolioMetrics.getOrCreateShared(self.strat)
+        self.assertAlmostEqual(batch.calmar_ratio(recording), portfolioMetrics.getCalmarRatio())
+
+        tradeStats = batch.trade_stats(recording)
+        self.assertEqual(tradeStats.getCount(), self.tradesAnalyzer.getCount())
+        numpy.testing.assert_allclose(tradeStats.getAll(), self.tradesAnalyzer.getAll())
+        numpy.testing.assert_allclose(tradeStats.getAllReturns(), self.tradesAnalyzer.getAllReturns())
+
+        positions = recording.getPositions()
+        self.assertEqual(recording.getInstruments(), ["orcl"])
+        self.assertEqual(positions[-1, 0], 3)
+        self.assertEqual(positions.min(), -2)
+        self.assertEqual(positions.max(), 5)
+        self.assertEqual(recording.getCash()[-1], self.strat.getBroker().getCash())
+
+    def testMatchesAnalyzers(self):
+        recording = self.recorder.getRecording()
+        self.assertEqual(len(recording.getFills()), 5)
+        self.__checkRecording(recording)
+
+    def testSaveAndLoad(self):
+        tmpDir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpDir, "recording.npz")
+            recording = self.recorder.getRecording()
+            recording.save(path)
+            loaded = recorder.load(path)
+            self.assertEqual(loaded.getDateTimes(), [dateTime.astimezone(pytz.utc) for dateTime in recording.getDateTimes()])
+            self.__checkRecording(loaded)
+        finally:
+            shutil.rmtree(tmpDir)
+
+    def testRollingSharpeRatio(self):
+        recording = self.recorder.getRecording()
+        window = 20
+        rolling = batch.rolling_sharpe_ratio(recording, window, 0.04, 252)
+        self.assertTrue(numpy.isnan(rolling[:window-1]).all())
+        netReturns = batch.returns(recording)
+        for i in [window - 1, 100, len(netReturns) - 1]:
+            expected = sharpe.sharpe_ratio(netReturns[i-window+1:i+1], 0.04, 252)
+            self.assertAlmostEqual(rolling[i], expected)
+
+class RecordingTestCase(unittest.TestCase):
+    def __buildRecording(self, fills, initialShares = None):
+        dateTimes = [strategy_test.datetime_from_date(2000, 1, day) for day in range(3, 7)]
+        equity = numpy.array([1000, 1001, 1002, 1003], dtype=numpy.float64)
+        fills = numpy.array(fills, dtype=recorder.Recording.FILL_DTYPE)
+        return recorder.Recording(1000, dateTimes, equity, equity.copy(), ["orcl", "ibm"], fills, initialShares)
+
+    def testInitialShares(self):
+        recording = self.__buildRecording([(1, 0, -2, 10, 0)], numpy.array([5, 1], dtype=numpy.float64))
+        numpy.testing.assert_array_equal(recording.getPositions(), [[5, 1], [3, 1], [3, 1], [3, 1]])
+
+    def testFillAfterLastBar(self):
+        # A live broker may fill an order after the last bar was recorded.
+        recording = self.__buildRecording([(0, 0, 2, 10, 0), (4, 1, 3, 10, 0)])
+        numpy.testing.assert_array_equal(recording.getPositions(), [[2, 0], [2, 0], [2, 0], [2, 3]])
@@ -21,6 +21,7 @@
 import pytest
 import unittest
 import datetime
+import cPickle
 
 from pyalgotrade import dataseries
 from pyalgotrade import bar
@@ -156,6 +157,34 @@ class TestBarDataSeries(unittest.TestCase):
             self.assertEqual(ds[i].getDateTime(), ds.getDateTimes()[i])
             self.assertEqual(ds.getDateTimes()[i], firstDt + datetime.timedelta(seconds=i))
 
+    def testCheckpointTailSize(self):
+        ds = dataseries.BarDataSeries()
+        firstDt = datetime.datetime.now()
+        for i in range(10):
+            ds.appendValue( bar.Bar(firstDt + datetime.timedelta(seconds=i), i, i, i, i, 10, i) )
+
+        previous = dataseries.set_checkpoint_tail_size(3)
+        try:
+            loaded = cPickle.loads(cPickle.dumps(ds, cPickle.HIGHEST_PROTOCOL))
+        finally:
+            dataseries.set_checkpoint_tail_size(previous)
+
+        # Positions don't change, but only the last 3 bars are available.
+        self.assertEqual(len(loaded), 10)
+        self.assertEqual(loaded[6], None)
+        self.assertEqual(loaded.getDateTimes()[6], None)
+        self.assertEqual(loaded.getCloseDataSeries()[6], None)
+        for i in range(7, 10):
+            self.assertEqual(loaded[i].getClose(), i)
+            self.assertEqual(loaded.getDateTimes()[i], firstDt + datetime.timedelta(seconds=i))
+        self.assertEqual(loaded.getCloseDataSeries()[-1], 9)
+        loaded.appendValue( bar.Bar(firstDt + datetime.timedelta(seconds=10), 10, 10, 10, 10, 10, 10) )
+        self.assertEqual(loaded[-1].getClose(), 10)
+
+        # All the bars are kept unless a tail size is set.
+        loaded = cPickle.loads(cPickle.dumps(ds, cPickle.HIGHEST_PROTOCOL))
+        self.assertEqual(loaded[0].getClose(), 0)
+
 class TestDateAlignedDataSeries(unittest.TestCase):
     def testNotAligned(self):
         size = 20
@@ -236,3 +265,50 @@ class TestDateAlignedDataSeries(unittest.TestCase):
             self.assertEqual(ads1[:], ads2[:])
             self.assertEqual(ads1.getDateTimes()[:], ads2.getDateTimes()[:])
 
+
+    def testIncrementalNotInSync(self):
+        size = 20
+        ds1 = dataseries.SequenceDataSeries()
+        ds2 = dataseries.SequenceDataSeries()
+        ads1, ads2 = dataseries.datetime_aligned(ds1, ds2)
+
+        now = datetime.datetime.now()
+        # ds1 is always a few values ahead of ds2, and ds2 skips every third datetime.
+        for i in range(size):
+            ds1.appendValueWithDatetime(now + datetime.timedelta(seconds=i), i)
+            if i >= 3 and (i - 3) % 3 != 0:
+                ds2.appendValueWithDatetime(now + datetime.timedelta(seconds=i-3), (i-3) * 10)
+            self.assertEqual(ads1.getLength(), ads2.getLength())
+
+        expected = [i for i in range(size-3) if i % 3 != 0]
+        self.assertEqual(ads1[:], expected)
+        self.assertEqual(ads2[:], [i * 10 for i in expected])
+        self.assertEqual(ads1.getDateTimes(), [now + datetime.timedelta(seconds=i) for i in expected])
+        self.assertEqual(ads1.getDateTimes(), ads2.getDateTimes())
+
+    def testMultipleDataSeries(self):
+        size = 30
+        allDS = [dataseries.SequenceDataSeries() for i in range(4)]
+        aligned = dataseries.datetime_aligned(*allDS)
+        self.assertEqual(len(aligned), len(allDS))
+
+        now = datetime.datetime.now()
+        for i in range(size):
+            for j in range(len(allDS)):
+                # Dataseries j skips datetimes that are multiples of j+2.
+                if i % (j + 2) != 0:
+                    allDS[j].appendValueWithDatetime(now + datetime.timedelta(seconds=i), i * (j + 1))
+
+        expected = [i for i in range(size) if i % 2 and i % 3 and i % 4 and i % 5]
+        for j in range(len(aligned)):
+            self.assertEqual(aligned[j].getLength(), len(expected))
+            self.assertEqual(aligned[j][:], [i * (j + 1) for i in expected])
+            self.assertEqual(aligned[j].getDateTimes(), [now + datetime.timedelta(seconds=i) for i in expected])
+
+    def testDuplicateDateTimes(self):
+        ds1 = dataseries.SequenceDataSeries([1, 2, 3, 4, 5, 6], [1, 1, 2, 2, 3, 3])
+        ds2 = dataseries.SequenceDataSeries([10, 20, 30], [1, 2, 3])
+        ads1, ads2 = dataseries.datetime_aligned(ds1, ds2)
+        self.assertEqual(ads1[:], [1, 3, 5])
+        self.assertEqual(ads2[:], [10, 20, 30])
+        self.assertEqual(ads1.getDateTimes(), [1, 2, 3])
@@ -80,7 +80,7 @@ class TestEClientSocket(EClientSocket):
         self.host = host
         self.port = port
         self.clientId = clientId
-        self.conncted = True
+        self.connected = True
 
     def eDisconnect(self):
         self.tc.assertTrue(self.connected == True)
@@ -90,6 +90,9 @@ class TestEClientSocket(EClientSocket):
         self.clientId  = None
         self.connected = False
 
+    def isConnected(self):
+        return self.connected == True
+
     def reqScannerSubscription(self, tickerId, subscription):
         self.tc.assertTrue(self.connected == True)
         self.tc.assertTrue(self.tickerId == None)
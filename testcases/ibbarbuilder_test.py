@@ -0,0 +1,114 @@
+# PyAlgoTrade
+#
+# Copyright 2013 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Tibor Kiss <tibor.kiss@gmail.com>
+"""
+
+import unittest
+import datetime
+import pytz
+
+from pyalgotrade.providers.interactivebrokers import ibbarbuilder
+
+# 2013-01-02 14:30:00 UTC
+BEGIN = 1357137000
+
+class TickBarBuilderTestCase(unittest.TestCase):
+    def __buildBars(self, builder):
+        bars = []
+        builder.getNewBarEvent().subscribe(lambda instrumentBar: bars.append(instrumentBar))
+        return bars
+
+    def testOHLC(self):
+        builder = ibbarbuilder.TickBarBuilder(5)
+        bars = self.__buildBars(builder)
+        builder.addTick("ABC", BEGIN + 0.1, 10, 100)
+        builder.addTick("ABC", BEGIN + 1, 12, 100)
+        builder.addTick("ABC", BEGIN + 2, 9, 200)
+        builder.addTick("ABC", BEGIN + 4.9, 11, 100)
+        self.assertEqual(len(bars), 0)
+        # A trade in the next period completes the bar.
+        builder.addTick("ABC", BEGIN + 5, 11.5, 100)
+        self.assertEqual(len(bars), 1)
+
+        instrument, bar = bars[0]
+        self.assertEqual(instrument, "ABC")
+        self.assertEqual(bar.getDateTime(), datetime.datetime(2013, 1, 2, 14, 30, tzinfo=pytz.utc))
+        self.assertEqual(bar.getOpen(), 10)
+        self.assertEqual(bar.getHigh(), 12)
+        self.assertEqual(bar.getLow(), 9)
+        self.assertEqual(bar.getClose(), 11)
+        self.assertEqual(bar.getVolume(), 500)
+        self.assertEqual(bar.getTradeCount(), 4)
+        self.assertEqual(bar.getVWAP(), (10 * 100 + 12 * 100 + 9 * 200 + 11 * 100) / 500.0)
+
+    def testCloseBars(self):
+        builder = ibbarbuilder.TickBarBuilder(1)
+        bars = self.__buildBars(builder)
+        builder.addTick("ABC", BEGIN, 10, 100)
+        builder.addTick("DEF", BEGIN + 1.5, 20, 100)
+        builder.closeBars(BEGIN + 0.5)
+        self.assertEqual(len(bars), 0)
+        builder.closeBars(BEGIN + 1)
+        self.assertEqual([instrument for instrument, bar in bars], ["ABC"])
+        builder.closeBars(BEGIN + 10)
+        self.assertEqual([instrument for instrument, bar in bars], ["ABC", "DEF"])
+        self.assertEqual(bars[1][1].getDateTime(), datetime.datetime(2013, 1, 2, 14, 30, 1, tzinfo=pytz.utc))
+
+    def testOutOfOrderTicks(self):
+        builder = ibbarbuilder.TickBarBuilder(5)
+        bars = self.__buildBars(builder)
+        builder.addTick("ABC", BEGIN + 2, 10, 100)
+        # Out of order within the same bar, updates the high but not the close.
+        builder.addTick("ABC", BEGIN + 1, 15, 100)
+        builder.closeBars(BEGIN + 5)
+        self.assertEqual(bars[0][1].getHigh(), 15)
+        self.assertEqual(bars[0][1].getClose(), 10)
+        self.assertEqual(builder.getLateTicks(), 0)
+
+    def testLateTicks(self):
+        builder = ibbarbuilder.TickBarBuilder(5)
+        bars = self.__buildBars(builder)
+        builder.addTick("ABC", BEGIN, 10, 100)
+        builder.addTick("ABC", BEGIN + 5, 11, 100)
+        # The first bar is already complete.
+        builder.addTick("ABC", BEGIN + 4, 20, 100)
+        self.assertEqual(builder.getLateTicks(), 1)
+        builder.closeBars(BEGIN + 10)
+        self.assertEqual(len(bars), 2)
+        self.assertEqual(bars[1][1].getHigh(), 11)
+        self.assertEqual(bars[1][1].getVolume(), 100)
+
+    def testMergeLateTicks(self):
+        builder = ibbarbuilder.TickBarBuilder(5, mergeLateTicks=True)
+        bars = self.__buildBars(builder)
+        builder.addTick("ABC", BEGIN, 10, 100)
+        builder.addTick("ABC", BEGIN + 5, 11, 100)
+        builder.addTick("ABC", BEGIN + 4, 20, 100)
+        builder.closeBars(BEGIN + 10)
+        self.assertEqual(builder.getLateTicks(), 1)
+        self.assertEqual(bars[1][1].getHigh(), 20)
+        self.assertEqual(bars[1][1].getClose(), 11)
+        self.assertEqual(bars[1][1].getVolume(), 200)
+
+    def testShortable(self):
+        builder = ibbarbuilder.TickBarBuilder(5)
+        bars = self.__buildBars(builder)
+        builder.setShortable("ABC", 1.0)
+        builder.addTick("ABC", BEGIN, 10, 100)
+        builder.closeBars(BEGIN + 5)
+        self.assertEqual(bars[0][1].getShortable(), 1.0)
@@ -21,13 +21,18 @@
 import pytest
 import unittest
 import time, datetime
+import tempfile
+import shutil
+import os
 
+from pyalgotrade import strategy
 from pyalgotrade.providers.interactivebrokers.ibconnection import Connection
 from pyalgotrade.providers.interactivebrokers.ibbar import Bar
 from pyalgotrade.providers.interactivebrokers.ibfeed import LiveFeed
 from pyalgotrade.providers.interactivebrokers.ibbroker import FlatRateCommission
 from pyalgotrade.providers.interactivebrokers.ibbroker import Order, MarketOrder, LimitOrder
-from pyalgotrade.providers.interactivebrokers.ibbroker import StopOrder, StopLimitOrder, Broker
+from pyalgotrade.providers.interactivebrokers.ibbroker import StopOrder, StopLimitOrder, Broker, AccountSnapshot
+from pyalgotrade.providers.interactivebrokers.ibbroker import parse_execution_time
 from ib_testeclientsocket import TestEClientSocket
 
 
@@ -57,6 +62,45 @@ class IBBrokerTestCase(unittest.TestCase):
         # Setting the cash should not be possible
         self.assertRaises(Exception, self.__broker.setCash, 420)
 
+    def testSnapshot(self):
+        # Account values are served from the snapshot seeded by the account updates.
+        self.assertEqual(self.__broker.getEquity(), 980848.80)
+        self.assertEqual(self.__broker.getShares('XMX'), 0)
+        self.assertFalse(self.__broker.isSnapshotStale())
+
+        self.__conn.updateAccountValue('TotalCashBalance', '1000.00', 'USD', 'DU123456')
+        self.assertEqual(self.__broker.getCash(), 1000)
+
+    def testCheckpoint(self):
+        strat = strategy.Strategy(self.__feed, broker=self.__broker)
+        tmpDir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpDir, "checkpoint.pickle")
+            # The connection can only be saved as an external.
+            self.assertRaises(Exception, strat.saveCheckpoint, path)
+            strat.saveCheckpoint(path, externals={"ib": self.__conn})
+
+            testTWS = TestEClientSocket(self)
+            conn = Connection(eClientSocket=testTWS, accountCode='DU123456')
+            testTWS.setIBConnection(conn)
+            loaded = strategy.load_checkpoint(path, externals={"ib": conn})
+        finally:
+            shutil.rmtree(tmpDir)
+
+        # The account snapshot is built again from the new connection once started.
+        broker_ = loaded.getBroker()
+        self.assertEqual(broker_.getSnapshot(), None)
+        broker_.start()
+        self.assertEqual(broker_.getEquity(), 980848.80)
+        conn.updateAccountValue('TotalCashBalance', '1000.00', 'USD', 'DU123456')
+        self.assertEqual(broker_.getCash(), 1000)
+
+        # Orders are sent through the new connection.
+        order = broker_.createMarketOrder(action=Order.Action.BUY, instrument='XMX', quantity=10)
+        orderId = broker_.placeOrder(order)
+        self.assertEqual(orderId, testTWS.orderId)
+        self.assertEqual('XMX', testTWS.orderContract.m_symbol)
+
     def __validateOrderEntry(self, instrument, orderId, orderType, action, auxPrice, lmtPrice, quantity,
                              goodTillCanceled):
         self.assertEqual(instrument, self.__testTWS.orderContract.m_symbol)
@@ -214,4 +258,80 @@ class IBBrokerTestCase(unittest.TestCase):
 
             self.assertNotEqual(orderIdLong, orderIdShort)
 
+class AccountSnapshotTestCase(unittest.TestCase):
+    def setUp(self):
+        self.__now = 1000
+        self.__snapshot = AccountSnapshot('DU123456', clock=lambda: self.__now)
+        self.__snapshot.updateAccountValue('TotalCashBalance', '10000.00', 'USD', 'DU123456')
+        self.__snapshot.updateAccountValue('NetLiquidation', '10000.00', 'USD', 'DU123456')
+
+    def testAccountValues(self):
+        self.assertEqual(self.__snapshot.getCash(), 10000)
+        self.assertEqual(self.__snapshot.getNetLiquidation(), 10000)
+        # Other accounts and other currencies are ignored.
+        self.__snapshot.updateAccountValue('TotalCashBalance', '5.00', 'USD', 'DU654321')
+        self.__snapshot.updateAccountValue('TotalCashBalance', '5.00', 'CHF', 'DU123456')
+        self.assertEqual(self.__snapshot.getCash(), 10000)
+
+    def testAge(self):
+        self.assertEqual(AccountSnapshot('DU123456').getAge(), None)
+        self.__now += 30
+        self.assertEqual(self.__snapshot.getAge(), 30)
+        self.__snapshot.updatePortfolio('XMX', 10, 11, 110, 10, 'DU123456')
+        self.assertEqual(self.__snapshot.getAge(), 0)
+
+    def testExecutions(self):
+        self.assertTrue(self.__snapshot.addExecution('0001', 'XMX', 10, 100, 1))
+        self.assertEqual(self.__snapshot.getCash(), 10000 - 1001)
+        self.assertEqual(self.__snapshot.getNetLiquidation(), 10000 - 1)
+        self.assertEqual(self.__snapshot.getShares('XMX'), 10)
+        self.assertEqual(self.__snapshot.getAvgCost('XMX'), 100.1)
+
+        # Executions are applied only once.
+        self.assertFalse(self.__snapshot.addExecution('0001', 'XMX', 10, 100, 1))
+        self.assertEqual(self.__snapshot.getShares('XMX'), 10)
+
+        self.assertTrue(self.__snapshot.addExecution('0002', 'XMX', 10, 110, 1))
+        self.assertEqual(self.__snapshot.getShares('XMX'), 20)
+        self.assertAlmostEqual(self.__snapshot.getAvgCost('XMX'), 105.1)
+
+        # Selling doesn't change the average cost.
+        self.assertTrue(self.__snapshot.addExecution('0003', 'XMX', -5, 120, 1))
+        self.assertEqual(self.__snapshot.getShares('XMX'), 15)
+        self.assertAlmostEqual(self.__snapshot.getAvgCost('XMX'), 105.1)
+
+        self.assertTrue(self.__snapshot.addExecution('0004', 'XMX', -15, 120, 1))
+        self.assertEqual(self.__snapshot.getShares('XMX'), 0)
+        self.assertEqual(self.__snapshot.getPositions(), {})
+
+    def testPortfolioOverridesExecutions(self):
+        self.__snapshot.addExecution('0001', 'XMX', 10, 100, 1)
+        self.__snapshot.updatePortfolio('XMX', 12, 101, 1212, 99.5, 'DU123456')
+        self.assertEqual(self.__snapshot.getShares('XMX'), 12)
+        self.assertEqual(self.__snapshot.getAvgCost('XMX'), 99.5)
+        self.__snapshot.updatePortfolio('XMX', 0, 101, 0, 0, 'DU123456')
+        self.assertEqual(self.__snapshot.getPositions(), {})
+
+    def testPortfolioBeforeExecution(self):
+        # TWS sends the updates that already include the execution before the execution itself.
+        self.__now += 10
+        self.__snapshot.updatePortfolio('XMX', 10, 101, 1010, 100.1, 'DU123456')
+        self.__snapshot.updateAccountValue('TotalCashBalance', '8999.00', 'USD', 'DU123456')
+        self.assertTrue(self.__snapshot.addExecution('0001', 'XMX', 10, 100, 1, self.__now - 1))
+        self.assertEqual(self.__snapshot.getShares('XMX'), 10)
+        self.assertEqual(self.__snapshot.getAvgCost('XMX'), 100.1)
+        self.assertEqual(self.__snapshot.getCash(), 8999)
+        # The net liquidation was not updated since the execution.
+        self.assertEqual(self.__snapshot.getNetLiquidation(), 10000 - 1)
+
+        # Newer executions are applied.
+        self.assertTrue(self.__snapshot.addExecution('0002', 'XMX', -5, 110, 1, self.__now + 1))
+        self.assertEqual(self.__snapshot.getShares('XMX'), 5)
+        self.assertEqual(self.__snapshot.getCash(), 8999 + 549)
+
+    def testParseExecutionTime(self):
+        self.assertEqual(parse_execution_time("20130102  10:30:05"), time.mktime((2013, 1, 2, 10, 30, 5, 0, 0, -1)))
+        self.assertEqual(parse_execution_time(None), None)
+        self.assertEqual(parse_execution_time(""), None)
+
 # vim: noet:ci:pi:sts=0:sw=4:ts=4
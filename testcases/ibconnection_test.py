@@ -23,7 +23,11 @@ import unittest
 import time, datetime
 
 
+from pyalgotrade.providers.interactivebrokers import ibconnection
+from pyalgotrade.providers.interactivebrokers import ibpacing
 from pyalgotrade.providers.interactivebrokers.ibconnection import Connection
+from pyalgotrade.providers.interactivebrokers.ibconnection import TickerIdRegistry
+from pyalgotrade.providers.interactivebrokers.ibconnection import HistoricalDataRequest
 from pyalgotrade.providers.interactivebrokers.ibbar import Bar
 from ib_testeclientsocket import TestEClientSocket
 
@@ -164,11 +168,121 @@ class IBConnectionTestCase(unittest.TestCase):
                     testHandlerBar = None
 
     def testHistoricalData(self): pass
+
+    def __submitHistoricalDataRequest(self):
+        return self.__conn.submitHistoricalDataRequest('XXX', '20130102 16:00:00 EST', '1 D', '1 min', useRTH=False)
+
+    def testHistoricalDataNoData(self):
+        request = self.__submitHistoricalDataRequest()
+        self.__conn.error(self.__testTWS.historicalTickerId, 162, 'Historical Market Data Service error message:HMDS query returned no data: XXX@SMART Trades')
+        self.assertTrue(request.isDone())
+        self.assertEqual(request.getBars(), [])
+        self.assertEqual(request.getError(), None)
+
+    def testHistoricalDataError(self):
+        request = self.__submitHistoricalDataRequest()
+        self.__conn.error(self.__testTWS.historicalTickerId, 200, 'No security definition has been found for the request')
+        self.assertTrue(request.isDone())
+        self.assertEqual(request.getBars(), None)
+        self.assertEqual(request.getError(), (200, 'No security definition has been found for the request'))
+
+    def testHistoricalDataPacingRetries(self):
+        retryDelay = ibconnection.HISTORICAL_DATA_RETRY_DELAY
+        identicalPeriod = ibpacing.IDENTICAL_PERIOD
+        ibconnection.HISTORICAL_DATA_RETRY_DELAY = 0
+        ibpacing.IDENTICAL_PERIOD = 0
+        try:
+            request = self.__submitHistoricalDataRequest()
+            for retry in xrange(ibconnection.HISTORICAL_DATA_MAX_RETRIES + 1):
+                tickerId = self.__testTWS.historicalTickerId
+                self.assertNotEqual(tickerId, None)
+                self.__testTWS.historicalTickerId = None
+                self.__conn.error(tickerId, 162, 'Historical Market Data Service error message:Historical data request pacing violation')
+                if retry < ibconnection.HISTORICAL_DATA_MAX_RETRIES:
+                    # The request is reissued from another thread.
+                    self.assertFalse(request.isDone())
+                    for i in xrange(100):
+                        if self.__testTWS.historicalTickerId is not None:
+                            break
+                        time.sleep(0.05)
+                    self.assertNotEqual(self.__testTWS.historicalTickerId, tickerId)
+                    self.assertEqual(request.getRetries(), retry + 1)
+            # Once the retries are exhausted, the pacing violation is reported.
+            self.assertTrue(request.isDone())
+            self.assertEqual(request.getError()[0], 162)
+        finally:
+            ibconnection.HISTORICAL_DATA_RETRY_DELAY = retryDelay
+            ibpacing.IDENTICAL_PERIOD = identicalPeriod
+
+    def testHistoricalDataConnectionClosed(self):
+        identicalPeriod = ibpacing.IDENTICAL_PERIOD
+        ibpacing.IDENTICAL_PERIOD = 0
+        try:
+            inFlight = self.__submitHistoricalDataRequest()
+            self.__testTWS.historicalTickerId = None
+            retrying = self.__submitHistoricalDataRequest()
+            # The second request waits to be reissued after a pacing violation.
+            self.__conn.error(self.__testTWS.historicalTickerId, 162, 'Historical Market Data Service error message:Historical data request pacing violation')
+            self.assertFalse(retrying.isDone())
+
+            self.__testTWS.eDisconnect()
+            self.__conn.connectionClosed()
+            for request in [inFlight, retrying]:
+                self.assertTrue(request.isDone())
+                self.assertEqual(request.getError(), (None, "Connection closed"))
+
+            # Requests made after the connection was closed fail right away.
+            request = self.__submitHistoricalDataRequest()
+            self.assertTrue(request.isDone())
+            self.assertEqual(request.getError(), (None, "Not connected"))
+        finally:
+            ibpacing.IDENTICAL_PERIOD = identicalPeriod
     def testMarketScanner(self): pass
     def testAccountUpdates(self): pass
     def testGetCash(self): pass
     def testGetAccountValues(self): pass
     def testGetPortfolio(self): pass
 
+class TickerIdRegistryTestCase(unittest.TestCase):
+    def testRegistry(self):
+        registry = TickerIdRegistry()
+        for tickerId in xrange(1000):
+            registry.add(tickerId, "INSTR%d" % tickerId)
+        self.assertEqual(len(registry), 1000)
+        self.assertEqual(registry.getInstrument(123), "INSTR123")
+        self.assertEqual(registry.getTickerId("INSTR123"), 123)
+        self.assertTrue(registry.hasInstrument("INSTR999"))
+
+        self.assertEqual(registry.removeInstrument("INSTR123"), 123)
+        self.assertFalse(registry.hasInstrument("INSTR123"))
+        self.assertEqual(registry.getInstrument(123), None)
+        self.assertEqual(registry.getTickerId("INSTR123", -1), -1)
+        self.assertEqual(len(registry), 999)
+
+class HistoricalDataRequestTestCase(unittest.TestCase):
+    def testKeys(self):
+        req1 = HistoricalDataRequest("ABC", "STK", "SMART", "USD", "20130102 16:00:00 EST", "7200 S", "5 secs", "TRADES", False)
+        req2 = HistoricalDataRequest("ABC", "STK", "SMART", "USD", "20130102 14:00:00 EST", "7200 S", "5 secs", "TRADES", False)
+        self.assertEqual(req1.getContractKey(), req2.getContractKey())
+        self.assertNotEqual(req1.getRequestKey(), req2.getRequestKey())
+        self.assertEqual(req1.getContract().m_symbol, "ABC")
+
+    def testFinished(self):
+        req = HistoricalDataRequest("ABC", "STK", "SMART", "USD", "20130102 16:00:00 EST", "1 D", "1 min", "TRADES", False)
+        self.assertFalse(req.isDone())
+        self.assertFalse(req.wait(0))
+        req.addBar(Bar(datetime.datetime(2013, 1, 2, 9, 30), 1, 2, 0.5, 1.5, 100, 1.2, 10))
+        req.setFinished()
+        self.assertTrue(req.wait())
+        self.assertEqual(len(req.getBars()), 1)
+        self.assertEqual(req.getError(), None)
+
+    def testError(self):
+        req = HistoricalDataRequest("ABC", "STK", "SMART", "USD", "20130102 16:00:00 EST", "1 D", "1 min", "TRADES", False)
+        req.setError(200, "No security definition has been found for the request")
+        self.assertTrue(req.isDone())
+        self.assertEqual(req.getBars(), None)
+        self.assertEqual(req.getError()[0], 200)
+
 
 # vim: noet:ci:pi:sts=0:sw=4:ts=4
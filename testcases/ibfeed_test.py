@@ -21,13 +21,18 @@
 import pytest
 import unittest
 import datetime
+import threading
+import tempfile
+import shutil
+import os
 
 import pytz
 
 import common
 
+from pyalgotrade import strategy
 from pyalgotrade.barfeed import csvfeed
-from pyalgotrade.providers.interactivebrokers.ibfeed import CSVFeed, LiveFeed, RowParser
+from pyalgotrade.providers.interactivebrokers.ibfeed import CSVFeed, LiveFeed, RowParser, DropPolicy
 from pyalgotrade.providers.interactivebrokers.ibconnection import Connection
 from pyalgotrade.providers.interactivebrokers.ibbar import Bar
 from ib_testeclientsocket import TestEClientSocket
@@ -173,7 +178,6 @@ class IBLiveFeedTestCase(unittest.TestCase):
 
             self.__feed.unsubscribeRealtimeBars(instrument3)
 
-    @pytest.mark.xfail(strict=True)
     def testRealtimeBars(self):
         # Call onRealtimeBar with the instrument & bar tuple.
         # The result should appear in the consecutive fetchNextBars call
@@ -217,5 +221,118 @@ class IBLiveFeedTestCase(unittest.TestCase):
         self.assertNotIn(instrument4, bars.keys())
         self.assertEqual(bars[instrument3], bar3)
 
+# Records the subscriptions made by the feed.
+class SubscriptionRecorder:
+    def __init__(self):
+        self.realtimeBars = []
+        self.marketBars = []
+
+    def subscribeRealtimeBars(self, instrument, handler, useRTH):
+        self.realtimeBars.append((instrument, useRTH))
+
+    def subscribeMarketBars(self, instrument, handler):
+        self.marketBars.append(instrument)
+
+class IBLiveFeedQueueTestCase(unittest.TestCase):
+    def __buildBar(self, second, close=10):
+        return Bar(datetime.datetime(2012, 8, 9, 12, 20, second), open_=close, high=close, low=close, close=close,
+                   volume=10, vwap=close, tradeCount=1)
+
+    def testDispatch(self):
+        feed = LiveFeed(None, dispatchTimeout=0)
+        feed.registerInstrument("XXX")
+        feed.registerInstrument("YYY")
+        received = []
+        feed.getNewBarsEvent().subscribe(lambda bars: received.append(bars))
+
+        feed.onIBBar(("XXX", self.__buildBar(0)))
+        feed.onIBBar(("YYY", self.__buildBar(0)))
+        feed.onIBBar(("XXX", self.__buildBar(5)))
+        self.assertEqual(feed.getQueueSize(), 1)
+        # Bars are only dispatched from dispatch, and update the dataseries.
+        self.assertEqual(len(received), 0)
+        feed.dispatch()
+        self.assertEqual(len(received), 1)
+        self.assertEqual(sorted(received[0].getInstruments()), ["XXX", "YYY"])
+        self.assertEqual(len(feed["XXX"]), 1)
+        self.assertEqual(feed.getQueueSize(), 0)
+        self.assertTrue(feed.getMaxQueueLatency() >= 0)
+
+        # Nothing queued, the bars for the last datetime are still being coalesced.
+        feed.dispatch()
+        self.assertEqual(len(received), 1)
+
+    def testCoalesceDelay(self):
+        feed = LiveFeed(None, maxCoalesceDelay=0, dispatchTimeout=0)
+        feed.onIBBar(("XXX", self.__buildBar(0)))
+        self.assertEqual(feed.fetchNextBars().keys(), ["XXX"])
+
+    def testLateBars(self):
+        feed = LiveFeed(None, dispatchTimeout=0)
+        feed.onIBBar(("XXX", self.__buildBar(5)))
+        feed.onIBBar(("YYY", self.__buildBar(0)))
+        self.assertEqual(feed.getLateBars(), 1)
+
+    def testDropOldest(self):
+        feed = LiveFeed(None, maxQueueSize=2, dispatchTimeout=0)
+        for second in xrange(5):
+            feed.onIBBar(("XXX", self.__buildBar(second, close=second + 1)))
+        self.assertEqual(feed.getQueueSize(), 2)
+        self.assertEqual(feed.getDroppedBars(), 2)
+        self.assertEqual(feed.fetchNextBars()["XXX"].getClose(), 3)
+
+    def testDropNewest(self):
+        feed = LiveFeed(None, maxQueueSize=2, dropPolicy=DropPolicy.DROP_NEWEST, dispatchTimeout=0)
+        for second in xrange(5):
+            feed.onIBBar(("XXX", self.__buildBar(second, close=second + 1)))
+        self.assertEqual(feed.getQueueSize(), 2)
+        self.assertEqual(feed.getDroppedBars(), 2)
+        self.assertEqual(feed.fetchNextBars()["XXX"].getClose(), 1)
+
+    def testBlock(self):
+        feed = LiveFeed(None, maxQueueSize=1, dropPolicy=DropPolicy.BLOCK, dispatchTimeout=1)
+        feed.onIBBar(("XXX", self.__buildBar(0)))
+        feed.onIBBar(("XXX", self.__buildBar(1)))
+        # The reader thread blocks until the strategy thread takes the first bar from the queue.
+        reader = threading.Thread(target=feed.onIBBar, args=(("XXX", self.__buildBar(2)),))
+        reader.start()
+        self.assertEqual(feed.fetchNextBars()["XXX"].getDateTime().second, 0)
+        reader.join()
+        self.assertEqual(feed.fetchNextBars()["XXX"].getDateTime().second, 1)
+        self.assertEqual(feed.getDroppedBars(), 0)
+
+    def testCheckpoint(self):
+        conn = SubscriptionRecorder()
+        feed = LiveFeed(conn, dispatchTimeout=0)
+        feed.subscribeRealtimeBars("XXX", 1)
+        feed.subscribeMarketBars("YYY")
+        feed.onIBBar(("XXX", self.__buildBar(0)))
+        feed.onIBBar(("XXX", self.__buildBar(5)))
+        feed.dispatch()
+        feed.onIBBar(("XXX", self.__buildBar(10)))
+
+        tmpDir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpDir, "checkpoint.pickle")
+            strategy.Strategy(feed).saveCheckpoint(path, externals={"ib": conn})
+            newConn = SubscriptionRecorder()
+            loaded = strategy.load_checkpoint(path, externals={"ib": newConn}).getFeed()
+        finally:
+            shutil.rmtree(tmpDir)
+
+        # The dispatched bars are kept, but not the ones waiting to be dispatched.
+        self.assertEqual(len(loaded["XXX"]), 1)
+        self.assertEqual(loaded.getQueueSize(), 0)
+        self.assertEqual(newConn.realtimeBars, [])
+        loaded.start()
+        self.assertEqual(newConn.realtimeBars, [("XXX", 1)])
+        self.assertEqual(newConn.marketBars, ["YYY"])
+
+        loaded.onIBBar(("XXX", self.__buildBar(15)))
+        loaded.onIBBar(("XXX", self.__buildBar(20)))
+        loaded.dispatch()
+        self.assertEqual(len(loaded["XXX"]), 2)
+        self.assertEqual(loaded["XXX"][-1].getDateTime().second, 15)
+
 
 # vim: noet:ci:pi:sts=0:sw=4:ts=4
@@ -0,0 +1,112 @@
+# PyAlgoTrade
+#
+# Copyright 2013 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Tibor Kiss <tibor.kiss@gmail.com>
+"""
+
+import unittest
+import threading
+
+from pyalgotrade.providers.interactivebrokers import iborderqueue
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+class OrderQueueTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.sent = []
+        self.queue = iborderqueue.OrderQueue(self.__placeOrder, self.__cancelOrder, 2, 2, self.clock.time)
+
+    def __placeOrder(self, orderId, *args):
+        self.sent.append(("place", orderId) + args)
+
+    def __cancelOrder(self, orderId):
+        self.sent.append(("cancel", orderId))
+
+    def testRate(self):
+        for orderId in xrange(5):
+            self.queue.placeOrder(orderId, "orcl", 10)
+        self.assertEqual(self.queue.flush(), 2)
+        self.assertEqual(self.queue.getQueueSize(), 3)
+        self.assertEqual(self.queue.getDelay(), 0.5)
+
+        self.clock.now += 1
+        self.assertEqual(self.queue.flush(), 2)
+        self.clock.now += 0.5
+        self.assertEqual(self.queue.flush(), 1)
+        self.assertEqual(self.queue.getDelay(), None)
+        self.assertEqual([msg[1] for msg in self.sent], range(5))
+        self.assertEqual(self.queue.getSentMessages(), 5)
+        self.assertEqual(self.queue.getMaxQueueDelay(), 1.5)
+        self.assertEqual(self.queue.getAverageQueueDelay(), (0 + 0 + 1 + 1 + 1.5) / 5)
+
+    def testCancelsFirst(self):
+        self.queue.placeOrder(1, "orcl", 10)
+        self.queue.flush()
+        self.queue.placeOrder(2, "orcl", 10)
+        self.queue.cancelOrder(1)
+        self.clock.now += 1
+        self.queue.flush()
+        self.assertEqual(self.sent, [("place", 1, "orcl", 10), ("cancel", 1), ("place", 2, "orcl", 10)])
+
+    def testCoalesce(self):
+        self.queue.placeOrder(1, "orcl", 10)
+        self.queue.placeOrder(1, "orcl", 20)
+        self.queue.placeOrder(2, "orcl", 10)
+        # The order was never sent, so there is nothing to cancel.
+        self.assertFalse(self.queue.cancelOrder(2))
+        self.assertEqual(self.queue.flush(), 1)
+        self.assertEqual(self.sent, [("place", 1, "orcl", 20)])
+        self.assertEqual(self.queue.getCoalescedMessages(), 2)
+
+        # Replacing an order that was sent, and canceling it, only sends the cancel request.
+        self.queue.placeOrder(1, "orcl", 30)
+        self.assertTrue(self.queue.cancelOrder(1))
+        self.assertTrue(self.queue.cancelOrder(1))
+        self.assertEqual(self.queue.flush(), 1)
+        self.assertEqual(self.sent[-1], ("cancel", 1))
+        self.assertEqual(self.queue.getCoalescedMessages(), 4)
+
+    def testThreads(self):
+        sent = []
+        errors = []
+        # No rate limit, so the threads are always competing for the queued messages.
+        queue = iborderqueue.OrderQueue(lambda orderId, *args: sent.append(orderId), lambda orderId: None, 1000000, 1000000, self.clock.time)
+
+        def run(firstId):
+            try:
+                for orderId in xrange(firstId, firstId + 2000):
+                    queue.placeOrder(orderId, "orcl", 10)
+                    queue.flush()
+            except Exception, e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(i * 2000,)) for i in xrange(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        # Every order was sent exactly once.
+        self.assertEqual(sorted(sent), range(4000))
+        self.assertEqual(queue.getSentMessages(), 4000)
+        self.assertEqual(queue.getQueueSize(), 0)
@@ -0,0 +1,101 @@
+# PyAlgoTrade
+#
+# Copyright 2013 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Tibor Kiss <tibor.kiss@gmail.com>
+"""
+
+import unittest
+
+from pyalgotrade.providers.interactivebrokers import ibpacing
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, secs):
+        self.now += secs
+
+class TokenBucketTestCase(unittest.TestCase):
+    def testConsume(self):
+        clock = FakeClock()
+        bucket = ibpacing.TokenBucket(2, 0.5, clock.time)
+        self.assertTrue(bucket.consume())
+        self.assertTrue(bucket.consume())
+        self.assertFalse(bucket.consume())
+        self.assertEqual(bucket.getDelay(), 2)
+        clock.sleep(1)
+        self.assertEqual(bucket.getDelay(), 1)
+        clock.sleep(1)
+        self.assertTrue(bucket.consume())
+        # The bucket never holds more than its capacity.
+        clock.sleep(100)
+        self.assertEqual(bucket.getTokens(), 2)
+
+class HistoricalDataPacerTestCase(unittest.TestCase):
+    def __acquire(self, pacer, clock, count, contractKey=None):
+        times = []
+        for i in xrange(count):
+            if contractKey is None:
+                key = "inst%d" % (i % 100)
+            else:
+                key = contractKey
+            pacer.acquire(key, (key, i))
+            pacer.release()
+            times.append(clock.time())
+        return times
+
+    def testRequestsPerPeriod(self):
+        clock = FakeClock()
+        pacer = ibpacing.HistoricalDataPacer(clock=clock.time, sleep=clock.sleep)
+        times = self.__acquire(pacer, clock, 500)
+        # Never more than MAX_REQUESTS within REQUESTS_PERIOD.
+        for i in xrange(len(times) - ibpacing.MAX_REQUESTS):
+            self.assertTrue(times[i + ibpacing.MAX_REQUESTS] - times[i] >= ibpacing.REQUESTS_PERIOD)
+        # The first burst goes out without waiting.
+        self.assertEqual(times[ibpacing.BURST - 1], times[0])
+
+    def testSameContract(self):
+        clock = FakeClock()
+        pacer = ibpacing.HistoricalDataPacer(clock=clock.time, sleep=clock.sleep)
+        times = self.__acquire(pacer, clock, ibpacing.BURST, "ABC")
+        for i in xrange(len(times) - ibpacing.MAX_CONTRACT_REQUESTS):
+            self.assertTrue(times[i + ibpacing.MAX_CONTRACT_REQUESTS] - times[i] >= ibpacing.CONTRACT_PERIOD)
+
+    def testIdenticalRequests(self):
+        clock = FakeClock()
+        pacer = ibpacing.HistoricalDataPacer(clock=clock.time, sleep=clock.sleep)
+        self.assertTrue(pacer.tryAcquire("ABC", "req"))
+        pacer.release()
+        self.assertFalse(pacer.tryAcquire("ABC", "req"))
+        self.assertEqual(pacer.getDelay("ABC", "req"), ibpacing.IDENTICAL_PERIOD)
+        self.assertTrue(pacer.tryAcquire("ABC", "another req"))
+        pacer.release()
+        clock.sleep(ibpacing.IDENTICAL_PERIOD)
+        self.assertTrue(pacer.tryAcquire("ABC", "req"))
+
+    def testInFlight(self):
+        clock = FakeClock()
+        pacer = ibpacing.HistoricalDataPacer(maxInFlight=2, clock=clock.time, sleep=clock.sleep)
+        self.assertTrue(pacer.tryAcquire("ABC", 1))
+        self.assertTrue(pacer.tryAcquire("DEF", 2))
+        self.assertEqual(pacer.getInFlight(), 2)
+        self.assertFalse(pacer.tryAcquire("GHI", 3))
+        pacer.release()
+        self.assertTrue(pacer.tryAcquire("GHI", 3))
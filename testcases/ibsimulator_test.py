@@ -0,0 +1,211 @@
+# PyAlgoTrade
+#
+# Copyright 2013 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Tibor Kiss <tibor.kiss@gmail.com>
+"""
+
+import unittest
+import tempfile
+import shutil
+import os
+
+from pyalgotrade import strategy
+from pyalgotrade.barfeed import yahoofeed
+from pyalgotrade.utils import dt
+from pyalgotrade.providers.interactivebrokers import ibsimulator
+from pyalgotrade.providers.interactivebrokers import ibconnection
+from pyalgotrade.providers.interactivebrokers import ibfeed
+from pyalgotrade.providers.interactivebrokers import ibbroker
+from ib.ext.Contract import Contract
+from ib.ext.Order import Order
+import common
+
+def build_feed():
+    ret = yahoofeed.Feed()
+    ret.addBarsFromCSV("orcl", common.get_data_file_path("orcl-2000-yahoofinance.csv"))
+    return ret
+
+def build_contract(instrument):
+    ret = Contract()
+    ret.m_symbol = instrument
+    ret.m_secType = "STK"
+    ret.m_exchange = "SMART"
+    ret.m_currency = "USD"
+    return ret
+
+# Records the callbacks from the simulator.
+class Wrapper:
+    def __init__(self):
+        self.realtimeBars = []
+        self.ticks = []
+        self.orderStatuses = []
+        self.executions = []
+        self.accountValues = {}
+        self.positions = {}
+        self.errors = []
+
+    def managedAccounts(self, accountsList):
+        pass
+
+    def nextValidId(self, orderId):
+        pass
+
+    def realtimeBar(self, tickerId, time_, open_, high, low, close, volume, vwap, tradeCount):
+        self.realtimeBars.append((tickerId, time_, open_, close))
+
+    def tickString(self, tickerId, tickType, value):
+        self.ticks.append((tickerId, tickType, value))
+
+    def orderStatus(self, orderId, status, filled, remaining, avgFillPrice, permId, parentId, lastFillPrice, clientId, whyHeld):
+        self.orderStatuses.append((orderId, status, filled, avgFillPrice))
+
+    def execDetails(self, orderId, contract, execution):
+        self.executions.append((orderId, contract.m_symbol, execution.m_shares, execution.m_price))
+
+    def updateAccountValue(self, key, value, currency, accountName):
+        self.accountValues[key] = value
+
+    def updatePortfolio(self, contract, position, marketPrice, marketValue, avgCost, unrealizedPNL, realizedPNL, accountName):
+        self.positions[contract.m_symbol] = position
+
+    def error(self, tickerId, errorCode=None, errorString=None):
+        self.errors.append((tickerId, errorCode))
+
+class SimulatedEClientSocketTestCase(unittest.TestCase):
+    def __buildSimulator(self, **kwargs):
+        sim = ibsimulator.SimulatedEClientSocket(build_feed(), **kwargs)
+        wrapper = Wrapper()
+        sim.setWrapper(wrapper)
+        sim.eConnect("localhost", 7496, 1)
+        return sim, wrapper
+
+    def testReplay(self):
+        sim, wrapper = self.__buildSimulator()
+        sim.reqRealTimeBars(1, build_contract("orcl"), 5, "TRADES", 0)
+        sim.reqMktData(2, build_contract("orcl"), "233", False)
+        finished = []
+        sim.getReplayFinishedEvent().subscribe(lambda: finished.append(True))
+        sim.start()
+        sim.join()
+
+        self.assertEqual(finished, [True])
+        self.assertEqual(len(wrapper.realtimeBars), 252)
+        self.assertEqual(wrapper.realtimeBars[0][2], 124.62)
+        self.assertEqual(len(wrapper.ticks), 252 * 4)
+        self.assertEqual(wrapper.ticks[0][2].split(";")[0], "124.62")
+
+    def testRecordedTicks(self):
+        bars = build_feed().getBars("orcl")
+        firstBarTime = dt.datetime_to_timestamp(bars[0].getDateTime())
+        secondBarTime = dt.datetime_to_timestamp(bars[1].getDateTime())
+        tmpDir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpDir, "ticks.csv")
+            f = open(path, "w")
+            f.write("Time,Price,Size\n")
+            f.write("%s,11,300\n" % (secondBarTime - 5))
+            f.write("%s,10,100\n" % (firstBarTime - 10))
+            f.write("%s,10.5,200\n" % (firstBarTime))
+            f.close()
+
+            sim, wrapper = self.__buildSimulator()
+            sim.addTicksFromCSV("orcl", path)
+            sim.reqMktData(2, build_contract("orcl"), "233", False)
+            sim.start()
+            sim.join()
+        finally:
+            shutil.rmtree(tmpDir)
+
+        # The recorded trades replace the ones made up from the bars.
+        self.assertEqual(len(wrapper.ticks), 3)
+        fields = [tick[2].split(";") for tick in wrapper.ticks]
+        self.assertEqual([field[0] for field in fields], ["10.0", "10.5", "11.0"])
+        self.assertEqual([int(field[1]) for field in fields], [100, 200, 300])
+        self.assertEqual(int(fields[0][2]), (firstBarTime - 10) * 1000)
+        self.assertEqual(int(fields[-1][3]), 600)
+        self.assertEqual(round(float(fields[-1][4]), 4), round((10 * 100 + 10.5 * 200 + 11 * 300) / 600.0, 4))
+
+    def testOrders(self):
+        sim, wrapper = self.__buildSimulator(cash=10000)
+        sim.reqAccountUpdates(True, "SIMULATED")
+        self.assertEqual(float(wrapper.accountValues["TotalCashBalance"]), 10000)
+
+        order = Order()
+        order.m_action = "BUY"
+        order.m_orderType = "MKT"
+        order.m_totalQuantity = 10
+        order.m_tif = "GTC"
+        sim.placeOrder(1, build_contract("orcl"), order)
+
+        limitOrder = Order()
+        limitOrder.m_action = "BUY"
+        limitOrder.m_orderType = "LMT"
+        limitOrder.m_lmtPrice = 1
+        limitOrder.m_totalQuantity = 10
+        limitOrder.m_tif = "GTC"
+        sim.placeOrder(2, build_contract("orcl"), limitOrder)
+        sim.cancelOrder(2)
+
+        sim.start()
+        sim.join()
+
+        self.assertEqual(wrapper.orderStatuses[0], (1, "Submitted", 0, 0.0))
+        self.assertEqual(wrapper.orderStatuses[2], (2, "Cancelled", 0, 0.0))
+        # Market orders get filled at the open of the next bar replayed.
+        self.assertEqual(wrapper.orderStatuses[3], (1, "Filled", 10, 124.62))
+        self.assertEqual(wrapper.executions, [(1, "orcl", 10, 124.62)])
+        self.assertEqual(wrapper.positions["orcl"], 10)
+        self.assertEqual(float(wrapper.accountValues["TotalCashBalance"]), 10000 - 1246.2)
+
+    def testHistoricalDataNotSimulated(self):
+        sim, wrapper = self.__buildSimulator()
+        sim.reqHistoricalData(3, build_contract("orcl"), "20001231 16:00:00", "1 Y", "1 day", "TRADES", 0, 2)
+        self.assertEqual(wrapper.errors, [(3, 321)])
+
+class SimulatedStrategy(strategy.Strategy):
+    def __init__(self, feed, broker):
+        strategy.Strategy.__init__(self, feed, broker=broker)
+        self.bars = 0
+        self.position = None
+        self.filled = False
+
+    def onBars(self, bars):
+        self.bars += 1
+        if self.position is None:
+            self.position = self.enterLong("orcl", 10, True)
+
+    def onEnterOk(self, position):
+        self.filled = True
+
+class LivePathTestCase(unittest.TestCase):
+    def testStrategy(self):
+        sim = ibsimulator.SimulatedEClientSocket(build_feed(), speed=10000000)
+        conn = ibconnection.Connection(accountCode="SIMULATED", eClientSocket=sim)
+        sim.setWrapper(conn)
+        feed = ibfeed.LiveFeed(conn, dispatchTimeout=0.01)
+        feed.subscribeRealtimeBars("orcl")
+        broker = ibbroker.Broker(feed, conn)
+        sim.getReplayFinishedEvent().subscribe(feed.stop)
+
+        strat = SimulatedStrategy(feed, broker)
+        sim.start()
+        strat.run()
+        sim.join()
+
+        self.assertEqual(strat.bars, 252)
+        self.assertTrue(strat.filled)
+        self.assertEqual(broker.getShares("orcl"), 10)
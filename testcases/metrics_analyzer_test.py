@@ -0,0 +1,106 @@
+# PyAlgoTrade
+#
+# Copyright 2013 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import unittest
+
+from pyalgotrade.barfeed import yahoofeed
+from pyalgotrade.broker import backtesting
+from pyalgotrade.stratanalyzer import metrics
+from pyalgotrade.stratanalyzer import returns
+from pyalgotrade.stratanalyzer import sharpe
+from pyalgotrade.stratanalyzer import sortino
+from pyalgotrade.stratanalyzer import drawdown
+from pyalgotrade import broker
+
+import strategy_test
+import common
+
+# A broker that counts how many times the equity is calculated.
+class CountingBroker(backtesting.Broker):
+    def __init__(self, cash, barFeed):
+        backtesting.Broker.__init__(self, cash, barFeed)
+        self.equityCalls = 0
+
+    def getEquity(self):
+        self.equityCalls += 1
+        return backtesting.Broker.getEquity(self)
+
+class PortfolioMetricsTestCase(unittest.TestCase):
+    def __runStrategy(self, analyzers, trade = True):
+        barFeed = yahoofeed.Feed()
+        barFeed.addBarsFromCSV("ige", common.get_data_file_path("sharpe-ratio-test-ige.csv"))
+        brk = CountingBroker(1000, barFeed)
+        strat = strategy_test.DummyStrategy(barFeed, 1000, brk)
+        for analyzer in analyzers:
+            strat.attachAnalyzer(analyzer)
+        if trade:
+            order = brk.createMarketOrder(broker.Order.Action.BUY, "ige", 10, True)
+            order.setGoodTillCanceled(True)
+            brk.placeOrder(order)
+        strat.run()
+        return strat
+
+    def testEquityOncePerBar(self):
+        retAnalyzer = returns.Returns()
+        analyzers = [retAnalyzer, sharpe.SharpeRatio(), sortino.SortinoRatio(), drawdown.DrawDown()]
+        strat = self.__runStrategy(analyzers)
+        # Once when attaching and once per bar.
+        self.assertEqual(strat.getBroker().equityCalls, len(retAnalyzer.getReturns()) + 1)
+
+    def testViews(self):
+        retAnalyzer = returns.Returns()
+        sharpeAnalyzer = sharpe.SharpeRatio()
+        sortinoAnalyzer = sortino.SortinoRatio()
+        ddAnalyzer = drawdown.DrawDown()
+        strat = self.__runStrategy([retAnalyzer, sharpeAnalyzer, sortinoAnalyzer, ddAnalyzer])
+        portfolioMetrics = metrics.PortfolioMetrics.getOrCreateShared(strat)
+
+        netReturns = retAnalyzer.getReturns()[:]
+        self.assertEqual(portfolioMetrics.getEquity(), strat.getBroker().getEquity())
+        self.assertEqual(portfolioMetrics.getCumulativeReturn(), retAnalyzer.getCumulativeReturns()[-1])
+        self.assertAlmostEqual(portfolioMetrics.getSharpeRatio(0.04, 252),
+                               sharpe.sharpe_ratio(netReturns, 0.04, 252), places=10)
+        self.assertEqual(portfolioMetrics.getSharpeRatio(0.04, 252), sharpeAnalyzer.getSharpeRatio(0.04, 252))
+        self.assertAlmostEqual(portfolioMetrics.getSortinoRatio(), sortino.sortino_ratio(netReturns, 0), places=10)
+        self.assertAlmostEqual(portfolioMetrics.getSortinoRatio(), sortinoAnalyzer.getSortinoRatio(), places=10)
+        self.assertEqual(portfolioMetrics.getMaxDrawDown(), ddAnalyzer.getMaxDrawDown())
+        self.assertEqual(portfolioMetrics.getLongestDrawDownDuration(), ddAnalyzer.getLongestDrawDownDuration())
+        self.assertTrue(portfolioMetrics.getMaxDrawDown() > 0)
+
+    def testCalmarRatio(self):
+        # A strategy that never trades has no drawdown.
+        portfolioMetrics = metrics.PortfolioMetrics()
+        retAnalyzer = returns.Returns()
+        strat = self.__runStrategy([portfolioMetrics, retAnalyzer], False)
+        # The metrics were calculated for every bar.
+        self.assertEqual(portfolioMetrics.getReturnStats().getCount(), len(retAnalyzer.getReturns()))
+        self.assertTrue(portfolioMetrics.getReturnStats().getCount() > 0)
+        self.assertEqual(portfolioMetrics.getEquity(), 1000)
+        self.assertEqual(portfolioMetrics.getMaxDrawDown(), 0)
+        self.assertEqual(portfolioMetrics.getCalmarRatio(), 0)
+        self.assertEqual(portfolioMetrics.getAnnualizedReturn(), 0)
+
+        retAnalyzer = returns.Returns()
+        strat = self.__runStrategy([retAnalyzer])
+        portfolioMetrics = metrics.PortfolioMetrics.getOrCreateShared(strat)
+        count = len(retAnalyzer.getReturns())
+        annualizedReturn = (1 + retAnalyzer.getCumulativeReturns()[-1]) ** (252 / float(count)) - 1
+        self.assertAlmostEqual(portfolioMetrics.getAnnualizedReturn(), annualizedReturn)
+        self.assertAlmostEqual(portfolioMetrics.getCalmarRatio(), annualizedReturn / portfolioMetrics.getMaxDrawDown())
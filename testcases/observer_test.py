@@ -85,3 +85,18 @@ class ObserverTestCase(unittest.TestCase):
         event.unsubscribe(handler2)
         event.emit()
         assert handlersData == [1, 1, 2, 2]
+
+    def testPriority(self):
+        handlersData = []
+        event = observer.Event()
+        event.subscribe(lambda: handlersData.append(1))
+        event.subscribe(lambda: handlersData.append(2), priority=-1)
+        event.subscribe(lambda: handlersData.append(3), priority=1)
+        event.subscribe(lambda: handlersData.append(4))
+        event.emit()
+        assert handlersData == [3, 1, 4, 2]
+
+    def testUnsubscribeNotSubscribed(self):
+        event = observer.Event()
+        with self.assertRaises(ValueError):
+            event.unsubscribe(lambda: None)
@@ -26,9 +26,11 @@ from pyalgotrade.barfeed import csvfeed
 from pyalgotrade.utils import dt
 from pyalgotrade.technical import ma
 from pyalgotrade.technical import stats
+from pyalgotrade import observer
 
 import os
 import datetime
+import timeit
 
 import sys
 sys.path.append("samples")
@@ -75,10 +77,19 @@ def run_stddev():
     for v in stddev:
         pass
 
+def run_observer_emit(handlerCount=3, emitCount=1000000):
+    print "Emitting an event with %d handlers" % (handlerCount)
+    event = observer.Event()
+    for i in xrange(handlerCount):
+        event.subscribe(lambda bars: None)
+    elapsed = min(timeit.repeat(lambda: event.emit(None), number=emitCount, repeat=3))
+    print "%.3f usecs per emit" % (elapsed * 1000000 / float(emitCount))
+
 def main():
     # Run only one of these.
     # run_smacross_strategy()
     # run_sma()
+    # run_observer_emit()
     run_stddev()
 
 def profile(method):
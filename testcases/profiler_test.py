@@ -0,0 +1,78 @@
+# PyAlgoTrade
+#
+# Copyright 2013 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Tibor Kiss <tibor.kiss@gmail.com>
+"""
+
+import unittest
+
+from pyalgotrade import strategy
+from pyalgotrade import profiler
+from pyalgotrade.barfeed import yahoofeed
+from pyalgotrade.technical import ma
+import common
+
+class SMAStrategy(strategy.Strategy):
+    def __init__(self, feed):
+        strategy.Strategy.__init__(self, feed, 1000)
+        self.sma = ma.SMA(feed["orcl"].getCloseDataSeries(), 10)
+        self.onBarsCalls = 0
+
+    def onBars(self, bars):
+        self.onBarsCalls += 1
+        # Access the last value twice to get cache hits.
+        self.sma[-1]
+        self.sma[-1]
+        if self.getBroker().getShares("orcl") == 0:
+            self.order("orcl", 1)
+
+class ProfilerTestCase(unittest.TestCase):
+    def testStrategy(self):
+        barFeed = yahoofeed.Feed()
+        barFeed.addBarsFromCSV("orcl", common.get_data_file_path("orcl-2000-yahoofinance.csv"))
+        strat = SMAStrategy(barFeed)
+
+        prof = profiler.Profiler(reportEvery=100)
+        prof.addIndicator("sma", strat.sma)
+        reports = []
+        prof.getReportEvent().subscribe(lambda p: reports.append(p.getBarsProcessed()))
+        strat.setProfiler(prof)
+        strat.run()
+
+        self.assertEqual(prof.getBarsProcessed(), 252)
+        self.assertEqual(reports, [100, 200, 252])
+        self.assertTrue(prof.getElapsed() > 0)
+        self.assertTrue(prof.getBarsPerSecond() > 0)
+        for phase in profiler.Phase.all:
+            self.assertEqual(prof.getPhaseStats(phase).getCalls(), 252)
+            self.assertTrue(prof.getPhaseStats(phase).getElapsed() >= 0)
+
+        name, hits, misses = prof.getIndicatorStats()[0]
+        self.assertEqual(name, "sma")
+        self.assertEqual(misses, 252 - 9)
+        self.assertEqual(hits, 252 - 9)
+
+        report = prof.getReport()
+        self.assertTrue(report.startswith("Bars: 252 "))
+        self.assertTrue("onBars" in report)
+        self.assertTrue("sma" in report)
+
+    def testCustomPhase(self):
+        prof = profiler.Profiler()
+        self.assertEqual(prof.call("custom", lambda x: x + 1, 1), 2)
+        self.assertEqual(prof.getPhaseStats("custom").getCalls(), 1)
+        self.assertTrue("custom" in prof.getReport())
@@ -0,0 +1,163 @@
+# PyAlgoTrade
+#
+# Copyright 2013 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Tibor Kiss <tibor.kiss@gmail.com>
+"""
+
+import unittest
+import datetime
+import pytz
+
+from pyalgotrade import bar
+from pyalgotrade import marketsession
+from pyalgotrade.barfeed import Frequency
+from pyalgotrade.barfeed import membf
+from pyalgotrade.barfeed import ninjatraderfeed
+from pyalgotrade.barfeed import resampled
+from pyalgotrade.providers.interactivebrokers import ibbar
+import common
+
+class MemFeed(membf.Feed):
+    def __init__(self, frequency, instrument, bars):
+        membf.Feed.__init__(self, frequency)
+        self.addBarsFromSequence(instrument, bars)
+
+def build_minute_bars(begin, count, price=10):
+    ret = []
+    for i in xrange(count):
+        ret.append(bar.Bar(begin + datetime.timedelta(minutes=i), price, price+1+i, price, price+1, 10, price+1))
+    return ret
+
+def consume(barFeed):
+    ret = []
+    barFeed.getNewBarsEvent().subscribe(ret.append)
+    barFeed.start()
+    while not barFeed.stopDispatching():
+        barFeed.dispatch()
+    barFeed.stop()
+    barFeed.join()
+    return ret
+
+class SlotTestCase(unittest.TestCase):
+    def testTruncate(self):
+        dateTime = datetime.datetime(2013, 3, 7, 15, 41, 12, 100)
+        self.assertEqual(resampled.get_slot_datetime(dateTime, Frequency.SECOND), datetime.datetime(2013, 3, 7, 15, 41, 12))
+        self.assertEqual(resampled.get_slot_datetime(dateTime, Frequency.MINUTE), datetime.datetime(2013, 3, 7, 15, 41))
+        self.assertEqual(resampled.get_slot_datetime(dateTime, Frequency.HOUR), datetime.datetime(2013, 3, 7, 15))
+        self.assertEqual(resampled.get_slot_datetime(dateTime, Frequency.DAY), datetime.datetime(2013, 3, 7))
+
+    def testMarketTimezone(self):
+        # 2013-03-08 02:00 UTC is 2013-03-07 21:00 in New York.
+        dateTime = pytz.utc.localize(datetime.datetime(2013, 3, 8, 2))
+        timezone = marketsession.USEquities.getTimezone()
+        slot = resampled.get_slot_datetime(dateTime, Frequency.DAY, timezone)
+        self.assertEqual(slot, timezone.localize(datetime.datetime(2013, 3, 7)))
+        self.assertEqual(resampled.get_slot_datetime(dateTime, Frequency.DAY), pytz.utc.localize(datetime.datetime(2013, 3, 8)))
+
+class ResampledBarFeedTestCase(unittest.TestCase):
+    def testInvalidFrequency(self):
+        barFeed = MemFeed(Frequency.MINUTE, "orcl", build_minute_bars(datetime.datetime(2013, 1, 1), 1))
+        with self.assertRaises(Exception):
+            resampled.ResampledBarFeed(barFeed, Frequency.MINUTE)
+
+    def testMinuteToHour(self):
+        # 90 bars spanning 2 hours.
+        barFeed = MemFeed(Frequency.MINUTE, "orcl", build_minute_bars(datetime.datetime(2013, 1, 1, 9, 30), 90))
+        hourFeed = resampled.ResampledBarFeed(barFeed, Frequency.HOUR)
+        self.assertEqual(hourFeed.getDefaultInstrument(), "orcl")
+
+        allBars = consume(hourFeed)
+        self.assertEqual(len(allBars), 2)
+
+        bar_ = allBars[0]["orcl"]
+        self.assertEqual(bar_.getDateTime(), datetime.datetime(2013, 1, 1, 9))
+        self.assertEqual(bar_.getOpen(), 10)
+        self.assertEqual(bar_.getHigh(), 10 + 30)
+        self.assertEqual(bar_.getLow(), 10)
+        self.assertEqual(bar_.getClose(), 11)
+        self.assertEqual(bar_.getVolume(), 300)
+        self.assertEqual(bar_.getBarCount(), 30)
+        self.assertFalse(bar_.getSessionClose())
+
+        bar_ = allBars[1]["orcl"]
+        self.assertEqual(bar_.getDateTime(), datetime.datetime(2013, 1, 1, 10))
+        self.assertEqual(bar_.getHigh(), 10 + 90)
+        self.assertEqual(bar_.getVolume(), 600)
+        self.assertTrue(bar_.getSessionClose())
+
+        self.assertEqual(len(hourFeed["orcl"]), 2)
+        self.assertEqual(len(barFeed["orcl"]), 90)
+
+    def testVWAP(self):
+        begin = datetime.datetime(2013, 1, 1, 9, 30)
+        bars = [
+            ibbar.Bar(begin, 10, 11, 9, 10, 100, 10, 5),
+            ibbar.Bar(begin + datetime.timedelta(minutes=1), 10, 12, 10, 11, 300, 11, 5),
+            ]
+        barFeed = MemFeed(Frequency.MINUTE, "spy", bars)
+        allBars = consume(resampled.ResampledBarFeed(barFeed, Frequency.HOUR))
+        self.assertEqual(len(allBars), 1)
+        self.assertEqual(allBars[0]["spy"].getVWAP(), (10*100 + 11*300) / 400.0)
+
+    def testSessionClose(self):
+        bars = build_minute_bars(datetime.datetime(2013, 1, 1, 14, 50), 20)
+        bars.extend(build_minute_bars(datetime.datetime(2013, 1, 2, 9, 30), 10))
+        barFeed = MemFeed(Frequency.MINUTE, "orcl", bars)
+        hourFeed = resampled.ResampledBarFeed(barFeed, Frequency.HOUR)
+
+        # Hourly bars are dispatched once the first minute bar for the next hour shows up, or once the feed is exhausted.
+        dispatched = []
+        hourFeed.getNewBarsEvent().subscribe(lambda bars: dispatched.append((barFeed.getCurrentBars().getDateTime(), bars.getDateTime(), bars["orcl"].getSessionClose())))
+        consume(barFeed)
+        self.assertEqual(dispatched, [
+            (datetime.datetime(2013, 1, 1, 15, 0), datetime.datetime(2013, 1, 1, 14), False),
+            (datetime.datetime(2013, 1, 2, 9, 30), datetime.datetime(2013, 1, 1, 15), True),
+            (datetime.datetime(2013, 1, 2, 9, 39), datetime.datetime(2013, 1, 2, 9), True),
+            ])
+
+    def testMultipleTimeframes(self):
+        barFeed = ninjatraderfeed.Feed(ninjatraderfeed.Frequency.MINUTE)
+        barFeed.addBarsFromCSV("spy", common.get_data_file_path("nt-spy-minute-2011-03.csv"))
+        hourFeed = resampled.ResampledBarFeed(barFeed, Frequency.HOUR)
+        dayFeed = resampled.ResampledBarFeed(barFeed, Frequency.DAY)
+        chainedDayFeed = resampled.ResampledBarFeed(hourFeed, Frequency.DAY)
+        minuteBars = consume(barFeed)
+
+        days = {}
+        hours = {}
+        for bars in minuteBars:
+            bar_ = bars["spy"]
+            days.setdefault(bar_.getDateTime().date(), []).append(bar_)
+            hours.setdefault(bar_.getDateTime().replace(minute=0, second=0), []).append(bar_)
+
+        self.assertEqual(len(hourFeed["spy"]), len(hours))
+        self.assertEqual(len(dayFeed["spy"]), len(days))
+        self.assertEqual(len(chainedDayFeed["spy"]), len(days))
+        for i in xrange(len(days)):
+            dayBar = dayFeed["spy"][i]
+            minuteBars = days[dayBar.getDateTime().date()]
+            self.assertEqual(dayBar.getOpen(), minuteBars[0].getOpen())
+            self.assertEqual(dayBar.getHigh(), max([b.getHigh() for b in minuteBars]))
+            self.assertEqual(dayBar.getLow(), min([b.getLow() for b in minuteBars]))
+            self.assertEqual(dayBar.getClose(), minuteBars[-1].getClose())
+            self.assertEqual(dayBar.getVolume(), sum([b.getVolume() for b in minuteBars]))
+
+            chainedBar = chainedDayFeed["spy"][i]
+            self.assertEqual(chainedBar.getDateTime(), dayBar.getDateTime())
+            self.assertEqual(chainedBar.getHigh(), dayBar.getHigh())
+            self.assertEqual(chainedBar.getVolume(), dayBar.getVolume())
+            self.assertAlmostEqual(chainedBar.getVWAP(), dayBar.getVWAP())
@@ -23,6 +23,7 @@ import unittest
 
 from pyalgotrade.barfeed import yahoofeed
 from pyalgotrade.stratanalyzer import sharpe
+from pyalgotrade.stratanalyzer import returns
 from pyalgotrade.broker import backtesting
 from pyalgotrade import broker
 
@@ -43,6 +44,25 @@ class SharpeRatioTestCase(unittest.TestCase):
         assert stratAnalyzer.getSharpeRatio(0, 252) == 0
         assert stratAnalyzer.getSharpeRatio(0, 252, annualized=True) == 0
 
+    def testMatchesSharpeRatioFunction(self):
+        barFeed = yahoofeed.Feed()
+        barFeed.addBarsFromCSV("ige", common.get_data_file_path("sharpe-ratio-test-ige.csv"))
+        strat = strategy_test.DummyStrategy(barFeed, 1000)
+        stratAnalyzer = sharpe.SharpeRatio()
+        strat.attachAnalyzer(stratAnalyzer)
+        retAnalyzer = returns.Returns()
+        strat.attachAnalyzer(retAnalyzer)
+
+        order = strat.getBroker().createMarketOrder(broker.Order.Action.BUY, "ige", 10, True)
+        order.setGoodTillCanceled(True)
+        strat.getBroker().placeOrder(order)
+        strat.run()
+
+        netReturns = retAnalyzer.getReturns()[:]
+        for riskFreeRate, annualized in [(0, True), (0.04, True), (0.04, False)]:
+            self.assertAlmostEqual(stratAnalyzer.getSharpeRatio(riskFreeRate, 252, annualized),
+                                   sharpe.sharpe_ratio(netReturns, riskFreeRate, 252, annualized), places=10)
+
     def __testIGE_BrokerImpl(self, quantity):
         initialCash = 42.09 * quantity
         # This testcase is based on an example from Ernie Chan's book:
@@ -23,6 +23,7 @@ import unittest
 
 from pyalgotrade.barfeed import yahoofeed
 from pyalgotrade.stratanalyzer import sortino
+from pyalgotrade.stratanalyzer import returns
 from pyalgotrade.broker import backtesting
 from pyalgotrade import broker
 
@@ -65,6 +66,28 @@ class SharpeRatioTestCase(unittest.TestCase):
         assert strat.getOrderUpdatedEvents() == 2
         assert round(stratAnalyzer.getSortinoRatio(), 4) == 1.375
 
+    def testWithoutReturns(self):
+        barFeed = yahoofeed.Feed()
+        barFeed.addBarsFromCSV("ige", common.get_data_file_path("sharpe-ratio-test-ige.csv"))
+        strat = strategy_test.DummyStrategy(barFeed, 1000)
+        stratAnalyzer = sortino.SortinoRatio(keepReturns=False)
+        strat.attachAnalyzer(stratAnalyzer)
+        keptAnalyzer = sortino.SortinoRatio(0.001)
+        strat.attachAnalyzer(keptAnalyzer)
+        retAnalyzer = returns.Returns()
+        strat.attachAnalyzer(retAnalyzer)
+
+        order = strat.getBroker().createMarketOrder(broker.Order.Action.BUY, "ige", 10, True)
+        order.setGoodTillCanceled(True)
+        strat.getBroker().placeOrder(order)
+        strat.run()
+
+        netReturns = retAnalyzer.getReturns()[:]
+        self.assertAlmostEqual(stratAnalyzer.getSortinoRatio(), sortino.sortino_ratio(netReturns, 0), places=10)
+        self.assertAlmostEqual(keptAnalyzer.getSortinoRatio(), sortino.sortino_ratio(netReturns, 0.001), places=10)
+        self.assertAlmostEqual(keptAnalyzer.getSortinoRatio(0), sortino.sortino_ratio(netReturns, 0), places=10)
+        self.assertRaises(Exception, stratAnalyzer.getSortinoRatio, 0.001)
+
     def testSortinoCalculation_Redrock(self):
         # Based on http://www.redrockcapital.com/Sortino__A__Sharper__Ratio_Red_Rock_Capital.pdf
         annual_returns = [0.17, 0.15, 0.23, -0.05, 0.12, 0.09, 0.13, -0.04]
@@ -0,0 +1,289 @@
+# PyAlgoTrade
+#
+# Copyright 2013 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import unittest
+import tempfile
+import shutil
+import os
+import cPickle
+import datetime
+
+from pyalgotrade import strategy
+from pyalgotrade.barfeed import Frequency
+from pyalgotrade.barfeed import yahoofeed
+from pyalgotrade.barfeed import ninjatraderfeed
+from pyalgotrade.barfeed import resampled
+from pyalgotrade.providers.interactivebrokers import ibbar
+from pyalgotrade.stratanalyzer import sharpe
+from pyalgotrade.stratanalyzer import trades
+import smacrossover_strategy_test
+import common
+
+class Interrupted(Exception):
+    pass
+
+class Checkpointer:
+    def __init__(self, strat, checkpointPath, checkpointBar, checkpointArgs):
+        self.__strat = strat
+        self.__checkpointPath = checkpointPath
+        self.__checkpointBar = checkpointBar
+        self.__checkpointArgs = checkpointArgs
+        self.__barCount = 0
+
+    def getBarCount(self):
+        return self.__barCount
+
+    def clearCheckpoint(self):
+        self.__checkpointBar = None
+
+    def onBars(self):
+        self.__barCount += 1
+        if self.__checkpointBar is not None:
+            if self.__barCount == self.__checkpointBar:
+                self.__strat.saveCheckpoint(self.__checkpointPath, **self.__checkpointArgs)
+            elif self.__barCount == self.__checkpointBar + 10:
+                # Simulate that the process died some time after the checkpoint was saved.
+                raise Interrupted()
+
+class CheckpointStrategy(smacrossover_strategy_test.LimitOrderStrategy):
+    def __init__(self, feed, checkpointPath = None, checkpointBar = None, **checkpointArgs):
+        smacrossover_strategy_test.LimitOrderStrategy.__init__(self, feed, 10, 25)
+        self.__checkpointer = Checkpointer(self, checkpointPath, checkpointBar, checkpointArgs)
+        # Set to test externals.
+        self.connection = None
+
+    def getBarCount(self):
+        return self.__checkpointer.getBarCount()
+
+    def clearCheckpoint(self):
+        self.__checkpointer.clearCheckpoint()
+
+    def onBars(self, bars):
+        smacrossover_strategy_test.LimitOrderStrategy.onBars(self, bars)
+        self.__checkpointer.onBars()
+
+# Trades when the close crosses the VWAP of the resampled bars.
+class VWAPCheckpointStrategy(strategy.Strategy):
+    def __init__(self, feed, checkpointPath = None, checkpointBar = None):
+        strategy.Strategy.__init__(self, feed, 1000)
+        self.__checkpointer = Checkpointer(self, checkpointPath, checkpointBar, {})
+        self.__position = None
+        self.__finalValue = None
+
+    def getBarCount(self):
+        return self.__checkpointer.getBarCount()
+
+    def clearCheckpoint(self):
+        self.__checkpointer.clearCheckpoint()
+
+    def getFinalValue(self):
+        return self.__finalValue
+
+    def onEnterCanceled(self, position):
+        self.__position = None
+
+    def onExitOk(self, position):
+        self.__position = None
+
+    def onBars(self, bars):
+        bar_ = bars.getBar("orcl")
+        if self.__position is None:
+            if bar_.getClose() > bar_.getVWAP():
+                self.__position = self.enterLong("orcl", 1)
+        elif bar_.getClose() < bar_.getVWAP() and not self.__position.exitFilled():
+            self.exitPosition(self.__position)
+        self.__checkpointer.onBars()
+
+    def onFinish(self, bars):
+        self.__finalValue = self.getBroker().getValue()
+
+# Like live connections, it can't be pickled.
+class Connection:
+    def __getstate__(self):
+        raise Exception("Can't be pickled")
+
+class CheckpointTestCase(unittest.TestCase):
+    def setUp(self):
+        self.__tmpDir = tempfile.mkdtemp()
+        self.__path = os.path.join(self.__tmpDir, "checkpoint.pickle")
+
+    def tearDown(self):
+        shutil.rmtree(self.__tmpDir)
+
+    def __buildStrategy(self, *args, **kwargs):
+        feed = yahoofeed.Feed()
+        feed.addBarsFromCSV("orcl", common.get_data_file_path("orcl-2001-yahoofinance.csv"))
+        return self.__buildStrategyWithFeed(feed, *args, **kwargs)
+
+    # The bars don't come from a CSV file, so they can't be loaded again.
+    def __buildSequenceStrategy(self, *args, **kwargs):
+        csvFeed = yahoofeed.Feed()
+        csvFeed.addBarsFromCSV("orcl", common.get_data_file_path("orcl-2001-yahoofinance.csv"))
+        feed = yahoofeed.Feed()
+        feed.addBarsFromSequence("orcl", csvFeed.getBars("orcl"))
+        return self.__buildStrategyWithFeed(feed, *args, **kwargs)
+
+    def __buildResampledStrategy(self, *args):
+        feed = ninjatraderfeed.Feed(Frequency.MINUTE)
+        feed.addBarsFromCSV("orcl", common.get_data_file_path("nt-spy-minute-2011-03.csv"))
+        ret = VWAPCheckpointStrategy(resampled.ResampledBarFeed(feed, Frequency.HOUR), *args)
+        return self.__attachAnalyzers(ret)
+
+    def __buildStrategyWithFeed(self, feed, *args, **kwargs):
+        return self.__attachAnalyzers(CheckpointStrategy(feed, *args, **kwargs))
+
+    def __runInterrupted(self, strat):
+        with self.assertRaises(Interrupted):
+            strat.run()
+        return os.path.getsize(self.__path)
+
+    def __attachAnalyzers(self, ret):
+        ret.attachAnalyzerEx(sharpe.SharpeRatio(), "sharpe")
+        ret.attachAnalyzerEx(trades.Trades(), "trades")
+        return ret
+
+    def __checkSameResults(self, strat, expected):
+        self.assertEqual(strat.getBarCount(), expected.getBarCount())
+        self.assertEqual(round(strat.getFinalValue(), 2), round(expected.getFinalValue(), 2))
+        self.assertEqual(strat.getNamedAnalyzer("sharpe").getSharpeRatio(0.04, 252), expected.getNamedAnalyzer("sharpe").getSharpeRatio(0.04, 252))
+        self.assertEqual(strat.getNamedAnalyzer("trades").getCount(), expected.getNamedAnalyzer("trades").getCount())
+
+    def testResume(self):
+        expected = self.__buildStrategy()
+        expected.run()
+        self.assertEqual(round(expected.getFinalValue(), 2), 1000 + 9.4)
+
+        strat = self.__buildStrategy(self.__path, 120)
+        with self.assertRaises(Interrupted):
+            strat.run()
+
+        resumed = strategy.load_checkpoint(self.__path)
+        # The checkpoint was saved after processing bar 120.
+        self.assertEqual(resumed.getBarCount(), 120)
+        resumed.clearCheckpoint()
+        resumed.resume()
+        self.__checkSameResults(resumed, expected)
+
+    def testBarsNotSaved(self):
+        expected = self.__buildStrategy()
+        expected.run()
+
+        seqSize = self.__runInterrupted(self.__buildSequenceStrategy(self.__path, 120))
+        resumed = strategy.load_checkpoint(self.__path)
+        self.assertEqual(len(resumed.getFeed().getBars("orcl")), len(expected.getFeed()["orcl"]) - 120)
+        resumed.clearCheckpoint()
+        resumed.resume()
+        self.__checkSameResults(resumed, expected)
+
+        # The bars that were not dispatched yet are loaded again from the file.
+        csvSize = self.__runInterrupted(self.__buildStrategy(self.__path, 120))
+        self.assertLess(csvSize, seqSize)
+        resumed = strategy.load_checkpoint(self.__path)
+        bars = resumed.getFeed().getBars("orcl")
+        self.assertEqual(len(bars), len(expected.getFeed()["orcl"]) - 120)
+        self.assertEqual(bars[0].getDateTime(), expected.getFeed()["orcl"][120].getDateTime())
+        resumed.clearCheckpoint()
+        resumed.resume()
+        self.__checkSameResults(resumed, expected)
+
+    def testTailSize(self):
+        expected = self.__buildStrategy()
+        expected.run()
+
+        fullSize = self.__runInterrupted(self.__buildStrategy(self.__path, 120))
+        tailSize = self.__runInterrupted(self.__buildStrategy(self.__path, 120, tailSize=30))
+        self.assertLess(tailSize, fullSize)
+
+        resumed = strategy.load_checkpoint(self.__path)
+        ds = resumed.getFeed()["orcl"]
+        self.assertEqual(len(ds), 120)
+        self.assertEqual(ds[89], None)
+        self.assertEqual(ds[90].getDateTime(), expected.getFeed()["orcl"][90].getDateTime())
+        # The periods of the indicators are covered, so the results don't change.
+        resumed.clearCheckpoint()
+        resumed.resume()
+        self.__checkSameResults(resumed, expected)
+        self.assertEqual(resumed.getFeed()["orcl"][-1].getDateTime(), expected.getFeed()["orcl"][-1].getDateTime())
+
+    def testExternals(self):
+        strat = self.__buildStrategy()
+        strat.connection = Connection()
+        with self.assertRaises(Exception):
+            strat.saveCheckpoint(self.__path)
+
+        strat.saveCheckpoint(self.__path, externals={"connection": strat.connection})
+        newConnection = Connection()
+        loaded = strategy.load_checkpoint(self.__path, externals={"connection": newConnection})
+        self.assertTrue(loaded.connection is newConnection)
+        with self.assertRaisesRegexp(Exception, "connection"):
+            strategy.load_checkpoint(self.__path)
+
+    def testResumeResampled(self):
+        expected = self.__buildResampledStrategy()
+        expected.run()
+
+        strat = self.__buildResampledStrategy(self.__path, 100)
+        with self.assertRaises(Interrupted):
+            strat.run()
+        vwap = strat.getFeed()["orcl"][99].getVWAP()
+
+        resumed = strategy.load_checkpoint(self.__path)
+        self.assertEqual(resumed.getBarCount(), 100)
+        # Resampled bars keep their own attributes.
+        bar_ = resumed.getFeed()["orcl"][-1]
+        self.assertEqual(bar_.getVWAP(), vwap)
+        self.assertTrue(bar_.getBarCount() > 0)
+        resumed.clearCheckpoint()
+        resumed.resume()
+        self.__checkSameResults(resumed, expected)
+
+    def testPickleBars(self):
+        bar_ = resampled.Bar(datetime.datetime(2013, 1, 1), 10, 12, 9, 11, 100, 11, 10.5, 3)
+        bar_.setSessionClose(True)
+        loaded = cPickle.loads(cPickle.dumps(bar_, cPickle.HIGHEST_PROTOCOL))
+        self.assertEqual(loaded.getClose(), 11)
+        self.assertTrue(loaded.getSessionClose())
+        self.assertEqual(loaded.getVWAP(), 10.5)
+        self.assertEqual(loaded.getBarCount(), 3)
+
+        bar_ = ibbar.Bar(datetime.datetime(2013, 1, 1), 10, 12, 9, 11, 100, 10.5, 7, 2.0)
+        loaded = cPickle.loads(cPickle.dumps(bar_, cPickle.HIGHEST_PROTOCOL))
+        self.assertEqual(loaded.getHigh(), 12)
+        self.assertEqual(loaded.getVWAP(), 10.5)
+        self.assertEqual(loaded.getTradeCount(), 7)
+        self.assertEqual(loaded.getShortable(), 2.0)
+
+    def testSaveBeforeRun(self):
+        expected = self.__buildStrategy()
+        expected.run()
+
+        self.__buildStrategy().saveCheckpoint(self.__path)
+        strat = strategy.load_checkpoint(self.__path)
+        strat.run()
+        self.__checkSameResults(strat, expected)
+
+    def testMethodPicklingNotChanged(self):
+        strat = self.__buildStrategy()
+        # Methods can only be pickled while saving checkpoints.
+        with self.assertRaises(TypeError):
+            cPickle.dumps(strat.getBarCount)
+        strat.saveCheckpoint(self.__path)
+        with self.assertRaises(TypeError):
+            cPickle.dumps(strat.getBarCount)
@@ -554,6 +554,32 @@ class LongPosTestCase(StrategyTestCase):
         strat.run()
         assert strat.getActivePosition().isOpen()
 
+    def testActivePositions(self):
+        strat = self.createStrategy(False, False)
+        strat.getBroker().setCash(48)
+        activePositions = []
+        strat.setOnBarsHandler(lambda strat, bars: activePositions.append(strat.getActivePositions(StrategyTestCase.TestInstrument)))
+
+        # Date,Open,High,Low,Close,Volume,Adj Close
+        # 2000-02-04,57.63,58.25,56.81,57.81,40925000,28.26 - sell succeeds
+        # 2000-02-03,55.38,57.00,54.25,56.69,55540600,27.71 - exit
+        # 2000-02-02,54.94,56.00,54.00,54.31,63940400,26.55
+        # 2000-02-01,51.25,54.31,50.00,54.00,57108800,26.40
+        # 2000-01-31,47.94,50.13,47.06,49.95,68152400,24.42 - buy succeeds
+        # 2000-01-28,51.50,51.94,46.63,47.38,86400600,23.16 - buy fails
+        # 2000-01-27,55.81,56.69,50.00,51.81,61061800,25.33 - enterLong
+
+        strat.addPosEntry(datetime_from_date(2000, 1, 27), strat.enterLong, StrategyTestCase.TestInstrument, 1, True)
+        strat.addPosExit(datetime_from_date(2000, 2, 3), strat.exitPosition)
+        strat.run()
+
+        self.assertEqual(strat.getExitOkEvents(), 1)
+        self.assertEqual(strat.getActivePositions(), [])
+        self.assertEqual(strat.getActivePositions(StrategyTestCase.TestInstrument), [])
+        self.assertEqual(strat.getActivePositions("other"), [])
+        # The position is active from the bar after it gets entered, up to the bar before the exit gets filled.
+        self.assertEqual(len([positions for positions in activePositions if len(positions)]), 5)
+
 class ShortPosTestCase(StrategyTestCase):
     def __testShortPositionImpl(self, simulateExternalBarFeed, simulateExternalBroker):
         strat = self.createStrategy(simulateExternalBarFeed, simulateExternalBroker)
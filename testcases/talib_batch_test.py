@@ -0,0 +1,109 @@
+# PyAlgoTrade
+#
+# Copyright 2013 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import unittest
+
+import numpy
+
+from pyalgotrade.barfeed import yahoofeed
+from pyalgotrade.technical import ma
+from pyalgotrade.talibext import batch
+import common
+
+try:
+    import talib
+    from pyalgotrade.talibext import indicator
+except ImportError:
+    talib = None
+
+# A numpy version of talib.SMA, so the tests don't need TA-Lib.
+def sma(values, period):
+    ret = numpy.empty(len(values))
+    ret.fill(numpy.nan)
+    sums = numpy.concatenate(([0], values.cumsum()))
+    ret[period-1:] = (sums[period:] - sums[:-period]) / float(period)
+    return ret
+
+def range_and_change(high, low, close):
+    return (high - low, close - numpy.concatenate(([numpy.nan], close[:-1])))
+
+class ComputeTestCase(unittest.TestCase):
+    def __loadFeed(self):
+        ret = yahoofeed.Feed()
+        ret.addBarsFromCSV("orcl", common.get_data_file_path("orcl-2000-yahoofinance.csv"))
+        ret.addBarsFromCSV("spy", common.get_data_file_path("spy-2010-yahoofinance.csv"))
+        return ret
+
+    def testAligned(self):
+        feed = self.__loadFeed()
+        results = batch.compute(feed, {"sma": batch.Indicator("c", sma, 10), "hlc": batch.Indicator("hlc", range_and_change)})
+        self.assertEqual(sorted(results.getInstruments()), ["orcl", "spy"])
+
+        smas = {}
+        for instrument in ["orcl", "spy"]:
+            smas[instrument] = ma.SMA(feed.getDataSeries(instrument).getCloseDataSeries(), 10)
+            computed = results.getDataSeries(instrument, "sma")
+            # Nothing was dispatched yet.
+            self.assertEqual(len(computed), 0)
+            self.assertEqual(len(computed.getValues()), len(feed.getBars(instrument)))
+
+        feed.start()
+        for bars in feed:
+            for instrument in bars.getInstruments():
+                barDs = feed.getDataSeries(instrument)
+                computed = results.getDataSeries(instrument, "sma")
+                self.assertEqual(len(computed), len(barDs))
+                self.assertEqual(computed.getDateTimes()[-1], bars.getDateTime())
+                if smas[instrument][-1] is None:
+                    self.assertEqual(computed[-1], None)
+                else:
+                    self.assertEqual(round(computed[-1], 5), round(smas[instrument][-1], 5))
+
+                bar_ = bars[instrument]
+                self.assertEqual(results.getDataSeries(instrument, "hlc", 0)[-1], bar_.getHigh() - bar_.getLow())
+                if len(barDs) > 1:
+                    self.assertEqual(results.getDataSeries(instrument, "hlc", 1)[-1], bar_.getClose() - barDs[-2].getClose())
+                else:
+                    self.assertEqual(results.getDataSeries(instrument, "hlc", 1)[-1], None)
+        feed.stop()
+        feed.join()
+        self.assertEqual(len(results.getDataSeries("orcl", "sma")), 252)
+        self.assertEqual(len(results.getDataSeries("spy", "sma")), 252)
+
+    def testInstruments(self):
+        feed = self.__loadFeed()
+        results = batch.compute(feed, {"sma": batch.Indicator("c", sma, 10)}, ["spy"])
+        self.assertEqual(results.getInstruments(), ["spy"])
+
+    def testInvalidInput(self):
+        with self.assertRaises(Exception):
+            batch.Indicator("x", sma, 10)
+
+    @unittest.skipIf(talib is None, "TA-Lib is not installed")
+    def testMACD(self):
+        feed = self.__loadFeed()
+        results = batch.compute(feed, {"macd": batch.Indicator("c", talib.MACD, 12, 26, 9)})
+        feed.start()
+        for bars in feed:
+            closeDs = feed.getDataSeries("orcl").getCloseDataSeries()
+            if "orcl" in bars and len(closeDs) > 40:
+                expected = indicator.MACD(closeDs, len(closeDs), 12, 26, 9)
+                for output in xrange(3):
+                    self.assertEqual(round(results.getDataSeries("orcl", "macd", output)[-1], 5), round(expected[output][-1], 5))
@@ -33,6 +33,7 @@ import numpy
 try:
     import talib
     from pyalgotrade.talibext import indicator
+    from pyalgotrade.talibext import incremental
 except ImportError:
     pytestmark = pytest.mark.skipif(True, reason="TA-Lib is not installed")
 
@@ -570,3 +571,59 @@ class TestCase(unittest.TestCase):
         assert compare(indicator.WMA(barDs.getCloseDataSeries(), 252, 2)[2], 94.52)
         assert compare(indicator.WMA(barDs.getCloseDataSeries(), 252, 2)[3], 94.86) # Original value 94.85
         assert compare(indicator.WMA(barDs.getCloseDataSeries(), 252, 2)[-1], 108.16)
+
+    def testIncrementalSMA(self):
+        barDs = self.__loadBarDS()
+        closeDs = dataseries.SequenceDataSeries()
+        sma = incremental.ds_indicator(closeDs, 1, talib.SMA, 2, memory=False)
+        for i in xrange(len(barDs)):
+            closeDs.appendValue(barDs[i].getClose())
+            # Update every other bar to calculate more than one value at once.
+            if i % 2 == 0:
+                sma.update()
+        self.assertEqual(len(sma.getDataSeries()), len(barDs))
+        self.assertEqual(sma.getDataSeries()[0], None)
+        expected = indicator.SMA(barDs.getCloseDataSeries(), 252, 2)
+        for i in xrange(1, len(barDs)):
+            assert compare(sma.getDataSeries()[i], expected[i])
+
+    def testIncrementalMACD(self):
+        barDs = self.__loadBarDS()
+        closeDs = dataseries.SequenceDataSeries()
+        count = 100
+        macd = incremental.ds_indicator(closeDs, count - 1, talib.MACD, 12, 26, 9)
+        for i in xrange(len(barDs)):
+            closeDs.appendValue(barDs[i].getClose())
+            macd.update()
+            if i >= count:
+                expected = indicator.MACD(closeDs, count, 12, 26, 9)
+                for output in xrange(3):
+                    assert compare(macd.getDataSeries(output)[-1], expected[output][-1])
+
+    def testIncrementalUpdateCadence(self):
+        barDs = self.__loadBarDS()
+        closeDs = dataseries.SequenceDataSeries()
+        count = 50
+        everyBar = incremental.ds_indicator(closeDs, count - 1, talib.MACD, 12, 26, 9)
+        sometimes = incremental.ds_indicator(closeDs, count - 1, talib.MACD, 12, 26, 9)
+        for i in xrange(len(barDs)):
+            closeDs.appendValue(barDs[i].getClose())
+            everyBar.update()
+            if i % 7 == 0:
+                sometimes.update()
+        sometimes.update()
+        for output in xrange(3):
+            self.assertEqual(everyBar.getDataSeries(output)[:], sometimes.getDataSeries(output)[:])
+        expected = indicator.MACD(closeDs, count, 12, 26, 9)
+        for output in xrange(3):
+            assert compare(sometimes.getDataSeries(output)[-1], expected[output][-1])
+
+    def testIncrementalADX(self):
+        barDs = dataseries.BarDataSeries()
+        count = 100
+        adx = incremental.hlc_indicator(barDs, count - 1, talib.ADX, 14)
+        for bar_ in self.__loadBarDS():
+            barDs.appendValue(bar_)
+            adx.update()
+            if len(barDs) >= count:
+                assert compare(adx.getDataSeries()[-1], indicator.ADX(barDs, count, 14)[-1])
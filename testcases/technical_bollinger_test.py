@@ -20,7 +20,10 @@
 
 import pytest
 import unittest
+import numpy
 from pyalgotrade.technical import bollinger
+from pyalgotrade.technical import ma
+from pyalgotrade import technical
 from pyalgotrade import dataseries
 
 class TestCase(unittest.TestCase):
@@ -44,3 +47,23 @@ class TestCase(unittest.TestCase):
             self.assertEquals(round(bBands.getUpperBand()[i], 2), expectedUpper[i-19])
             self.assertEquals(round(bBands.getLowerBand()[i], 2), expectedLower[i-19])
 
+    def testRegistry(self):
+        ds = dataseries.SequenceDataSeries([float(i) for i in xrange(30)])
+        registry = technical.IndicatorRegistry()
+        sma = registry.getOrCreate(ma.SMA, ds, 20)
+        bBands = bollinger.BollingerBands(ds, 20, 2, registry)
+        self.assertTrue(bBands.getMiddleBand() is sma)
+
+        # Both bands share the standard deviation.
+        self.assertEqual(len(registry), 4)
+        other = bollinger.BollingerBands(ds, 20, 2, registry)
+        self.assertTrue(other.getUpperBand() is bBands.getUpperBand())
+        self.assertTrue(other.getLowerBand() is bBands.getLowerBand())
+        self.assertEqual(len(registry), 4)
+        self.assertEqual(round(bBands.getUpperBand()[-1] - bBands.getLowerBand()[-1], 5), round(4 * numpy.std(range(10, 30)), 5))
+
+    def testBand(self):
+        ds = dataseries.SequenceDataSeries([float(i) for i in xrange(30)])
+        bBands = bollinger.BollingerBands(ds, 20, 2)
+        upperBand = bollinger.Band(bBands.getMiddleBand(), ds, 20, 2)
+        self.assertEqual(upperBand[-1], bBands.getUpperBand()[-1])
@@ -20,6 +20,9 @@
 
 import pytest
 import unittest
+import random
+
+import numpy
 
 from pyalgotrade.technical import cross
 from pyalgotrade.technical import ma
@@ -163,3 +166,40 @@ class TestCase(unittest.TestCase):
         for i in range(len(crs)):
             self.assertEqual(crs.getDateTimes()[i], None)
 
+    def testMissingValues(self):
+        rnd = random.Random(1234)
+        values1 = [rnd.randint(-3, 3) for i in range(200)]
+        values2 = [rnd.randint(-3, 3) for i in range(200)]
+        for i in [10, 11, 50, 120]:
+            values1[i] = None
+        values2[80] = None
+        ds1 = dataseries.SequenceDataSeries(values1)
+        ds2 = dataseries.SequenceDataSeries(values2)
+        diffs = cross.compute_diff(values1, values2)
+        for cls, signCheck in [(cross.CrossAbove, cross.positive), (cross.CrossBelow, cross.negative)]:
+            for period in [2, 3, 10]:
+                expected = []
+                for i in range(len(diffs)):
+                    window = diffs[max(0, i - period + 1):i + 1]
+                    expected.append(len([j for j in range(1, len(window)) if cross.is_cross(window[j-1], window[j], signCheck)]))
+
+                # Values in order.
+                crs = cls(ds1, ds2, period)
+                self.assertEqual(crs[:], expected)
+                # Random access.
+                crs = cls(ds1, ds2, period)
+                for i in range(300):
+                    pos = rnd.randint(0, len(expected) - 1)
+                    self.assertEqual(crs[pos], expected[pos])
+
+    def testBatch(self):
+        values1 = numpy.array([1, 1, 3, 1, numpy.nan, 3, 2, 3, 1, 1], dtype=numpy.float64)
+        values2 = numpy.array([2, 2, 2, 2, 2, 2, 2, 2, 2, numpy.nan], dtype=numpy.float64)
+        self.assertEqual(list(cross.cross_above_positions(values1, values2)), [2, 7])
+        self.assertEqual(list(cross.cross_below_positions(values1, values2)), [3, 8])
+
+        # Same crossings as the ones counted by the dataseries version.
+        values1 = [-1 if i % 3 == 0 else 1 for i in range(30)]
+        values2 = [0 for i in range(30)]
+        crs = self.__buildCrossTechnical(cross.CrossAbove, values1, values2, 2)
+        self.assertEqual(list(cross.cross_above_positions(values1, values2)), [i for i in range(len(crs)) if crs[i] == 1])
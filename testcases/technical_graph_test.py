@@ -0,0 +1,104 @@
+# PyAlgoTrade
+#
+# Copyright 2013 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import unittest
+
+from pyalgotrade.technical import graph
+from pyalgotrade.technical import ma
+from pyalgotrade.technical import cross
+from pyalgotrade.barfeed import yahoofeed
+from pyalgotrade import dataseries
+import common
+
+def round_or_none(value):
+    if value is None:
+        return None
+    return round(value, 5)
+
+class NodeTestCase(unittest.TestCase):
+    def __checkEqual(self, obtained, expected):
+        self.assertEqual(len(obtained), len(expected))
+        for i in xrange(len(expected)):
+            self.assertEqual(round_or_none(obtained[i]), round_or_none(expected[i]))
+
+    def testSMA(self):
+        values = [1, 2, None, 4, 5, 6, 7]
+        ds = dataseries.SequenceDataSeries()
+        indicatorGraph = graph.IndicatorGraph()
+        sma = indicatorGraph.add(graph.SMA(ds, 2))
+        for value in values:
+            ds.appendValue(value)
+            indicatorGraph.update()
+        self.assertEqual(sma[:], [None, 1.5, None, None, 4.5, 5.5, 6.5])
+
+    def testEMA(self):
+        ds = dataseries.SequenceDataSeries([float(i % 7) for i in xrange(50)])
+        ema = graph.EMA(ds, 10)
+        ema.update()
+        self.__checkEqual(ema, ma.EMA(ds, 10))
+
+    def testCross(self):
+        values1 = [1, 2, 3, 1, 2, 3, 1, 1, 4, 0]
+        values2 = [2, 2, 2, 2, 2, 2, 2, 2, 2, 2]
+        ds1 = dataseries.SequenceDataSeries(values1)
+        ds2 = dataseries.SequenceDataSeries(values2)
+        for period in [2, 3, 5]:
+            crossAbove = graph.CrossAbove(ds1, ds2, period)
+            crossBelow = graph.CrossBelow(ds1, ds2, period)
+            crossAbove.update()
+            crossBelow.update()
+            self.__checkEqual(crossAbove, cross.CrossAbove(ds1, ds2, period))
+            self.__checkEqual(crossBelow, cross.CrossBelow(ds1, ds2, period))
+
+    def testUpdateOrder(self):
+        ds = dataseries.SequenceDataSeries()
+        fast = graph.SMA(ds, 2)
+        slow = graph.EMA(ds, 5)
+        crossAbove = graph.CrossAbove(fast, slow)
+        indicatorGraph = graph.IndicatorGraph()
+        # Only the last node is added, and the ones it depends on get updated first.
+        indicatorGraph.add(crossAbove)
+        self.assertEqual(indicatorGraph.getNodes(), [fast, slow, crossAbove])
+        for i in xrange(20):
+            ds.appendValue(float(i % 4))
+            indicatorGraph.update()
+            self.assertEqual(len(crossAbove), len(ds))
+        self.__checkEqual(crossAbove[10:], cross.CrossAbove(ma.SMA(ds, 2), ma.EMA(ds, 5))[10:])
+
+    def testFeed(self):
+        barFeed = yahoofeed.Feed()
+        barFeed.addBarsFromCSV("orcl", common.get_data_file_path("orcl-2000-yahoofinance.csv"))
+        closeDs = barFeed["orcl"].getCloseDataSeries()
+        indicatorGraph = graph.IndicatorGraph(barFeed)
+        sma = indicatorGraph.add(graph.SMA(closeDs, 20))
+        expected = ma.SMA(closeDs, 20)
+
+        def onBars(bars):
+            # The values are ready by the time handlers with the default priority get the bars.
+            self.assertEqual(len(sma), len(closeDs))
+            self.assertEqual(round_or_none(sma[-1]), round_or_none(expected[-1]))
+        barFeed.getNewBarsEvent().subscribe(onBars)
+
+        barFeed.start()
+        while not barFeed.stopDispatching():
+            barFeed.dispatch()
+        barFeed.stop()
+        barFeed.join()
+        self.assertEqual(len(sma), 252)
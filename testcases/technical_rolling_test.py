@@ -0,0 +1,159 @@
+# PyAlgoTrade
+#
+# Copyright 2013 Gabriel Martin Becedillas Ruiz
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Gabriel Martin Becedillas Ruiz <gabriel.becedillas@gmail.com>
+"""
+
+import unittest
+import random
+
+import numpy
+
+from pyalgotrade.technical import rolling
+from pyalgotrade import dataseries
+
+def values_equal(v1, v2):
+    if v1 is None or numpy.isnan(v1):
+        return v2 is None or numpy.isnan(v2)
+    if v2 is None:
+        return False
+    return round(v1, 6) == round(v2, 6)
+
+def brute_force(values, period, func):
+    ret = []
+    for i in xrange(len(values)):
+        window = values[max(0, i - period + 1):i + 1]
+        if len(window) < period or None in window:
+            ret.append(None)
+        else:
+            ret.append(func(numpy.array(window, dtype=numpy.float64)))
+    return ret
+
+def percent_rank(window):
+    return (window < window[-1]).sum() * 100 / float(len(window) - 1)
+
+def zscore(window):
+    stdDev = window.std()
+    if stdDev == 0:
+        return None
+    return (window[-1] - window.mean()) / stdDev
+
+# Returns the position relative to the window instead of the absolute one.
+class ArgFilterWrapper(dataseries.DataSeries):
+    def __init__(self, argFilter):
+        self.__argFilter = argFilter
+
+    def getFirstValidPos(self):
+        return 0
+
+    def getLength(self):
+        return self.__argFilter.getLength()
+
+    def getValueAbsolute(self, pos):
+        ret = self.__argFilter.getValueAbsolute(pos)
+        if ret is not None:
+            ret -= pos - self.__argFilter.getWindowSize() + 1
+        return ret
+
+class RollingTestCase(unittest.TestCase):
+    def setUp(self):
+        rnd = random.Random(1234)
+        self.values = [100 + rnd.randint(-5, 5) + rnd.random() for i in xrange(200)]
+        self.values[50] = None
+        self.others = [value + rnd.random() if value is not None else None for value in self.values]
+
+    def __checkFilter(self, filterDS, expected):
+        self.assertEqual(len(filterDS), len(expected))
+        # Values in order.
+        for i in xrange(len(expected)):
+            self.assertTrue(values_equal(filterDS[i], expected[i]), "%s != %s at %d" % (filterDS[i], expected[i], i))
+
+    def __checkRandomAccess(self, buildFilter, expected):
+        filterDS = buildFilter()
+        rnd = random.Random(4321)
+        for i in xrange(300):
+            pos = rnd.randint(0, len(expected) - 1)
+            self.assertTrue(values_equal(filterDS[pos], expected[pos]))
+
+    def __check(self, buildFilter, period, func, batchFunc):
+        expected = brute_force(self.values, period, func)
+        self.__checkFilter(buildFilter(dataseries.SequenceDataSeries(self.values), period), expected)
+        self.__checkRandomAccess(lambda: buildFilter(dataseries.SequenceDataSeries(self.values), period), expected)
+        batch = batchFunc(numpy.array(self.values, dtype=numpy.float64), period)
+        for i in xrange(len(expected)):
+            self.assertTrue(values_equal(batch[i], expected[i]))
+
+    def testMinMax(self):
+        for period in [1, 2, 10, 30]:
+            self.__check(rolling.Min, period, numpy.min, rolling.rolling_min)
+            self.__check(rolling.Max, period, numpy.max, rolling.rolling_max)
+
+    def testArgMinMax(self):
+        for period in [1, 3, 20]:
+            # The position of the first value in the window for the window that ends at position i.
+            offset = numpy.arange(len(self.values)) - period + 1
+            self.__check(lambda ds, period: ArgFilterWrapper(rolling.ArgMin(ds, period)), period, numpy.argmin, lambda values, period: rolling.rolling_argmin(values, period) - offset)
+            self.__check(lambda ds, period: ArgFilterWrapper(rolling.ArgMax(ds, period)), period, numpy.argmax, lambda values, period: rolling.rolling_argmax(values, period) - offset)
+
+        # Positions are absolute. With repeated values, the first one is returned.
+        ds = dataseries.SequenceDataSeries([3, 1, 2, 1, 3])
+        argMin = rolling.ArgMin(ds, 3)
+        argMax = rolling.ArgMax(ds, 3)
+        self.assertEqual(argMin[:], [None, None, 1, 1, 3])
+        self.assertEqual(argMax[:], [None, None, 0, 2, 4])
+        self.assertEqual(list(rolling.rolling_argmax(numpy.array([3, 1, 2, 1, 3]), 3)[2:]), [0, 2, 4])
+
+    def testMoments(self):
+        for period in [1, 5, 30]:
+            self.__check(rolling.Sum, period, numpy.sum, rolling.rolling_sum)
+            self.__check(rolling.Mean, period, numpy.mean, rolling.rolling_mean)
+            self.__check(rolling.Variance, period, numpy.var, rolling.rolling_variance)
+        self.__check(lambda ds, period: rolling.Variance(ds, period, 1), 10, lambda w: w.var(ddof=1), lambda values, period: rolling.rolling_variance(values, period, 1))
+
+    def testZScore(self):
+        self.__check(rolling.ZScore, 10, zscore, rolling.rolling_zscore)
+        ds = dataseries.SequenceDataSeries([1, 1, 1])
+        self.assertEqual(rolling.ZScore(ds, 2)[-1], None)
+
+    def testPercentRank(self):
+        for period in [2, 10]:
+            self.__check(rolling.PercentRank, period, percent_rank, rolling.rolling_percent_rank)
+
+    def testCovarianceCorrelation(self):
+        period = 15
+        pairs = zip(self.values, self.others)
+        expectedCov = brute_force(pairs, period, lambda w: numpy.cov(w[:,0], w[:,1], bias=True)[0][1])
+        expectedCorr = brute_force(pairs, period, lambda w: numpy.corrcoef(w[:,0], w[:,1])[0][1])
+        ds1 = dataseries.SequenceDataSeries(self.values)
+        ds2 = dataseries.SequenceDataSeries(self.others)
+        self.__checkFilter(rolling.Covariance(ds1, ds2, period), expectedCov)
+        self.__checkFilter(rolling.Correlation(ds1, ds2, period), expectedCorr)
+
+        values1 = numpy.array(self.values, dtype=numpy.float64)
+        values2 = numpy.array(self.others, dtype=numpy.float64)
+        batchCov = rolling.rolling_covariance(values1, values2, period)
+        batchCorr = rolling.rolling_correlation(values1, values2, period)
+        for i in xrange(len(pairs)):
+            self.assertTrue(values_equal(batchCov[i], expectedCov[i]))
+            self.assertTrue(values_equal(batchCorr[i], expectedCorr[i]))
+
+    def testBigValues(self):
+        # Small variance compared to the values.
+        values = [1e9 + (i % 3) for i in xrange(100)]
+        variance = rolling.Variance(dataseries.SequenceDataSeries(values), 3)
+        for i in xrange(2, len(values)):
+            self.assertEqual(variance[i], numpy.array(values[i-2:i+1]).var())
@@ -22,6 +22,8 @@ import pytest
 import unittest
 import datetime
 from pyalgotrade.technical import stoch
+from pyalgotrade.technical import ma
+from pyalgotrade import technical
 from pyalgotrade import dataseries
 from pyalgotrade import bar
 
@@ -83,3 +85,12 @@ class TestCase(unittest.TestCase):
         self.assertEqual(len(stochFilter.getDateTimes()), len(closePrices))
         for i in range(len(stochFilter)):
             self.assertNotEqual(stochFilter.getDateTimes()[i], None)
+
+    def testRegistry(self):
+        barDS = self.__buildBarDataSeries([2, 2, 3], [3, 3, 3], [1, 1, 1])
+        registry = technical.IndicatorRegistry()
+        stochFilter = registry.getOrCreate(stoch.StochasticOscillator, barDS, 2, 2, registry=registry)
+        self.assertTrue(stoch.StochasticOscillator(barDS, 2, dSMAPeriod=2, registry=registry) is not stochFilter)
+        self.assertTrue(registry.getOrCreate(stoch.StochasticOscillator, barDS, 2, dSMAPeriod=2) is stochFilter)
+        self.assertTrue(registry.getOrCreate(ma.SMA, stochFilter, 2) is stochFilter.getD())
+        assert  values_equal(stochFilter.getD()[2], 75)
@@ -22,6 +22,7 @@ import pytest
 import unittest
 from pyalgotrade import technical
 from pyalgotrade import dataseries
+from pyalgotrade.technical import ma
 
 class CacheTest(unittest.TestCase):
     def testCacheSize1(self):
@@ -79,3 +80,30 @@ class DataSeriesFilterTest(unittest.TestCase):
             testFilter[20]
         values.append(10)
         assert testFilter[20] == 10
+
+class IndicatorRegistryTest(unittest.TestCase):
+    def testGetOrCreate(self):
+        registry = technical.IndicatorRegistry()
+        ds = dataseries.SequenceDataSeries([1, 2, 3])
+        sma = registry.getOrCreate(ma.SMA, ds, 2)
+        self.assertTrue(registry.getOrCreate(ma.SMA, ds, 2) is sma)
+        self.assertTrue(registry.getOrCreate(ma.SMA, dataSeries=ds, period=2) is sma)
+        self.assertTrue(registry.getOrCreate(ma.SMA, ds, period=2) is sma)
+        self.assertTrue(registry.getOrCreate(ma.SMA, ds, 3) is not sma)
+        self.assertTrue(registry.getOrCreate(ma.EMA, ds, 2) is not sma)
+        self.assertTrue(registry.getOrCreate(ma.SMA, dataseries.SequenceDataSeries([1, 2, 3]), 2) is not sma)
+        self.assertEqual(registry.getHits(), 3)
+        self.assertEqual(len(registry), 4)
+
+        # Lists are compared by value.
+        wma = registry.getOrCreate(ma.WMA, ds, [1, 2])
+        self.assertTrue(registry.getOrCreate(ma.WMA, ds, [1, 2]) is wma)
+        self.assertTrue(registry.getOrCreate(ma.WMA, ds, [2, 1]) is not wma)
+
+    def testBarDataSeries(self):
+        # Indicators on top of the same bar values are shared.
+        registry = technical.IndicatorRegistry()
+        barDs = dataseries.BarDataSeries()
+        sma = registry.getOrCreate(ma.SMA, barDs.getCloseDataSeries(), 2)
+        self.assertTrue(registry.getOrCreate(ma.SMA, barDs.getCloseDataSeries(), 2) is sma)
+        self.assertTrue(registry.getOrCreate(ma.SMA, barDs.getOpenDataSeries(), 2) is not sma)
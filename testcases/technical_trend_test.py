@@ -20,14 +20,22 @@
 
 import unittest
 import pytest
+import random
 
 from pyalgotrade import dataseries
 
-# SciPy (therefore pyalgotrade.technical) is not available in pypy
+# NumPy (therefore pyalgotrade.technical) is not available in pypy
 try:
+    import numpy
     from pyalgotrade.technical import trend
 except ImportError:
-    pytestmark = pytest.mark.skip(reason="SciPy is unavailable")
+    pytestmark = pytest.mark.skip(reason="NumPy is unavailable")
+
+# SciPy is only used to check the results.
+try:
+    from scipy import stats
+except ImportError:
+    stats = None
 
 class TestCase(unittest.TestCase):
     def __buildTrend(self, values, trendDays, positiveThreshold, negativeThreshold):
@@ -56,3 +64,49 @@ class TestCase(unittest.TestCase):
         self.assertEqual(len(trend.getDateTimes()), 5)
         for i in range(len(trend)):
             self.assertEqual(trend.getDateTimes()[i], None)
+
+@unittest.skipIf(stats is None, "SciPy is unavailable")
+class RegressionTestCase(unittest.TestCase):
+    def setUp(self):
+        rnd = random.Random(1234)
+        self.values = [1000 + i * 0.5 + rnd.random() for i in xrange(200)]
+        self.values[100] = None
+
+    def __checkValues(self, obtained, expected):
+        self.assertEqual(len(obtained), len(expected))
+        for i in xrange(len(expected)):
+            if expected[i] is None or numpy.isnan(expected[i]):
+                self.assertTrue(obtained[i] is None or numpy.isnan(obtained[i]))
+            else:
+                self.assertEqual(round(obtained[i], 6), round(expected[i], 6))
+
+    def __expected(self, period, func):
+        ret = []
+        for i in xrange(len(self.values)):
+            window = self.values[max(0, i - period + 1):i + 1]
+            if len(window) < period or None in window:
+                ret.append(None)
+            else:
+                ret.append(func(stats.linregress(range(period), window)))
+        return ret
+
+    def testSlope(self):
+        for period in [2, 10, 50]:
+            expected = self.__expected(period, lambda result: result[0])
+            ds = dataseries.SequenceDataSeries(self.values)
+            self.__checkValues(trend.Slope(ds, period), expected)
+            # Out of order.
+            slope = trend.Slope(ds, period)
+            self.__checkValues([slope[i] for i in reversed(xrange(len(ds)))][::-1], expected)
+            self.__checkValues(trend.rolling_slope(numpy.array(self.values, dtype=numpy.float64), period), expected)
+
+    def testRSquared(self):
+        expected = self.__expected(20, lambda result: result[2] ** 2)
+        self.__checkValues(trend.RSquared(dataseries.SequenceDataSeries(self.values), 20), expected)
+        self.__checkValues(trend.rolling_rsquared(numpy.array(self.values, dtype=numpy.float64), 20), expected)
+
+    def testForecast(self):
+        for offset in [0, 3]:
+            expected = self.__expected(20, lambda result: result[1] + result[0] * (19 + offset))
+            self.__checkValues(trend.Forecast(dataseries.SequenceDataSeries(self.values), 20, offset), expected)
+            self.__checkValues(trend.rolling_forecast(numpy.array(self.values, dtype=numpy.float64), 20, offset), expected)
@@ -20,6 +20,8 @@
 
 from pyalgotrade.utils import stats
 from pyalgotrade.utils import intersect
+from pyalgotrade.utils import align
+from pyalgotrade import dataseries
 
 import pytest
 import unittest
@@ -146,3 +148,92 @@ class CollectionsTestCase(unittest.TestCase):
         self.assertEqual(values, dateTimes2)
         self.assertEqual(ix1, range(size))
         self.assertEqual(ix1, ix2)
+
+class AlignTestCase(unittest.TestCase):
+    def __buildDS(self, values, seconds):
+        now = datetime.datetime(2013, 1, 1)
+        dateTimes = [now + datetime.timedelta(seconds=s) for s in seconds]
+        return dataseries.SequenceDataSeries(values, dateTimes)
+
+    def testIntersect(self):
+        values, indices = align.intersect(numpy.array([1, 2, 4, 5]), numpy.array([1, 2, 3, 5]), numpy.array([0, 1, 5]))
+        self.assertEqual(values.tolist(), [1, 5])
+        self.assertEqual([ix.tolist() for ix in indices], [[0, 3], [0, 3], [1, 2]])
+
+        values, indices = align.intersect(numpy.array([1, 2, 3]), numpy.array([4, 5, 6]))
+        self.assertEqual(len(values), 0)
+        self.assertEqual([len(ix) for ix in indices], [0, 0])
+
+    def testIntersectMatchesPurePython(self):
+        v1 = [1, 1, 2, 2, 3, 3]
+        v2 = [1, 2, 3]
+        values, indices = align.intersect(numpy.array(v1), numpy.array(v2))
+        expectedValues, expectedIx1, expectedIx2 = intersect(v1, v2)
+        self.assertEqual(values.tolist(), expectedValues)
+        self.assertEqual(indices[0].tolist(), expectedIx1)
+        self.assertEqual(indices[1].tolist(), expectedIx2)
+
+    def testTimestamps(self):
+        dateTimes = [datetime.datetime(1970, 1, 1, 0, 0, 1), datetime.datetime(1970, 1, 1, 0, 0, 1, 500)]
+        self.assertEqual(align.to_timestamps(dateTimes).tolist(), [1000000, 1000500])
+        self.assertEqual(align.to_timestamps(dateTimes).dtype, numpy.int64)
+
+    def testMatrixIntersect(self):
+        ds1 = self.__buildDS([1, 2, 3, 4], [0, 1, 2, 3])
+        ds2 = self.__buildDS([10, 30, 40], [0, 2, 3])
+        ds3 = self.__buildDS([100, 200, 400], [0, 1, 3])
+        dateTimes, matrix = align.aligned_matrix([ds1, ds2, ds3])
+        self.assertEqual(dateTimes, [ds1.getDateTimes()[0], ds1.getDateTimes()[3]])
+        self.assertEqual(matrix.tolist(), [[1, 10, 100], [4, 40, 400]])
+
+    def testMatrixNaN(self):
+        ds1 = self.__buildDS([1, None, 3], [0, 1, 2])
+        ds2 = self.__buildDS([10, 40], [1, 3])
+        dateTimes, matrix = align.aligned_matrix([ds1, ds2], align.FillPolicy.NAN)
+        self.assertEqual(len(dateTimes), 4)
+        self.assertEqual(dateTimes[-1], ds2.getDateTimes()[-1])
+        self.assertEqual(numpy.isnan(matrix).tolist(), [[False, True], [True, False], [False, True], [True, False]])
+        self.assertEqual(matrix[0, 0], 1)
+        self.assertEqual(matrix[3, 1], 40)
+
+    def testMatrixForwardFill(self):
+        ds1 = self.__buildDS([1, 2, 3], [0, 1, 2])
+        ds2 = self.__buildDS([10, 40], [1, 3])
+        dateTimes, matrix = align.aligned_matrix([ds1, ds2], align.FillPolicy.FORWARD)
+        self.assertEqual(len(dateTimes), 4)
+        self.assertEqual(matrix[1:].tolist(), [[2, 10], [3, 10], [3, 40]])
+        self.assertEqual(matrix[0, 0], 1)
+        self.assertTrue(numpy.isnan(matrix[0, 1]))
+
+    def testMatrixResample(self):
+        ds1 = self.__buildDS([1, 2, 3], [0, 10, 20])
+        ds2 = self.__buildDS([10, 20, 30], [5, 10, 15])
+        grid = [datetime.datetime(2013, 1, 1) + datetime.timedelta(seconds=s) for s in [10, 12, 20]]
+
+        dateTimes, matrix = align.aligned_matrix([ds1, ds2], align.FillPolicy.FORWARD, grid)
+        self.assertEqual(dateTimes, grid)
+        self.assertEqual(matrix.tolist(), [[2, 20], [2, 20], [3, 30]])
+
+        dateTimes, matrix = align.aligned_matrix([ds1, ds2], align.FillPolicy.INTERSECT, grid)
+        self.assertEqual(dateTimes, grid[:1])
+        self.assertEqual(matrix.tolist(), [[2, 20]])
+
+class RunningStatsTestCase(unittest.TestCase):
+    def testEmpty(self):
+        runningStats = stats.RunningStats()
+        self.assertEqual(runningStats.getMean(), None)
+        self.assertEqual(runningStats.getStdDev(), None)
+        runningStats.push(1)
+        self.assertEqual(runningStats.getMean(), 1)
+        self.assertEqual(runningStats.getStdDev(1), None)
+        self.assertEqual(runningStats.getStdDev(0), 0)
+
+    def testMatchesNumpy(self):
+        values = [0.0268, -0.0399, -0.019, -0.0277, -0.0282, -0.0264, -0.0183, 0.0314, -0.0141, -0.0244]
+        runningStats = stats.RunningStats()
+        for value in values:
+            runningStats.push(value)
+        self.assertEqual(runningStats.getCount(), len(values))
+        self.assertAlmostEqual(runningStats.getMean(), stats.mean(values), places=12)
+        self.assertAlmostEqual(runningStats.getStdDev(1), stats.stddev(values, 1), places=12)
+        self.assertAlmostEqual(runningStats.getStdDev(0), stats.stddev(values, 0), places=12)